@@ -1,5 +1,7 @@
 import logging
+import os
 import sys
+import threading
 from pathlib import Path
 from flask import Flask, send_from_directory
 from flask_cors import CORS
@@ -75,6 +77,10 @@ def create_app():
     # 启动时验证配置
     _validate_config_on_startup(logger)
 
+    # 后台工作线程（图片生成队列、批量任务）在处理第一个请求时启动：
+    # create_app() 每次调用（包括测试）都不会启动，Werkzeug 重载器的父进程不处理请求也不会启动
+    _register_background_workers(app, logger)
+
     # 根据是否有前端构建产物决定根路由行为
     if frontend_dist.exists():
         @app.route('/')
@@ -102,6 +108,45 @@ def create_app():
     return app
 
 
+def _register_background_workers(app, logger):
+    """注册首个请求前启动后台工作线程的钩子（每个应用只启动一次，测试模式下跳过）"""
+    started = threading.Event()
+    lock = threading.Lock()
+
+    @app.before_request
+    def _ensure_background_workers():
+        if started.is_set() or app.config.get('TESTING'):
+            return
+        with lock:
+            if not started.is_set():
+                start_background_workers(logger)
+                started.set()
+
+
+def start_background_workers(logger):
+    """启动图片生成队列和批量任务的工作线程（恢复上次进程中断的任务，重复调用无副作用）"""
+    _start_generation_queue(logger)
+    _start_bulk_jobs(logger)
+
+
+def _start_generation_queue(logger):
+    """启动持久化图片生成队列的工作线程"""
+    try:
+        from backend.services.generation_queue import get_generation_queue
+        get_generation_queue()
+    except Exception as e:
+        logger.error(f"❌ 图片生成队列启动失败: {e}")
+
+
+def _start_bulk_jobs(logger):
+    """启动批量图文生成任务的工作线程"""
+    try:
+        from backend.services.bulk_jobs import get_bulk_job_manager
+        get_bulk_job_manager()
+    except Exception as e:
+        logger.error(f"❌ 批量任务启动失败: {e}")
+
+
 def _validate_config_on_startup(logger):
     """启动时验证配置"""
     from pathlib import Path
@@ -184,6 +229,9 @@ def _validate_config_on_startup(logger):
 
 if __name__ == '__main__':
     app = create_app()
+    # 开启重载器时只在实际处理请求的子进程中立即启动，父进程只负责监视文件
+    if not Config.DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_workers(logging.getLogger())
     app.run(
         host=Config.HOST,
         port=Config.PORT,
@@ -12,6 +12,23 @@ class Config:
     CORS_ORIGINS = ['http://localhost:5173', 'http://localhost:3000']
     OUTPUT_DIR = 'output'
 
+    # 对外 HTTP 连接池（backend/utils/http_transport.py）
+    HTTP_POOL_CONNECTIONS = 32  # 缓存连接池的主机数
+    HTTP_POOL_MAXSIZE = 64  # 每个主机保留的最大连接数
+    HTTP_CONNECT_TIMEOUT = 10  # 未指定 timeout 时的连接超时（秒）
+    HTTP_READ_TIMEOUT = 300  # 未指定 timeout 时的读取超时（秒）
+
+    # 生成图片存储（backend/utils/image_renditions.py）
+    IMAGE_NORMALIZE_STORAGE = False  # 是否把服务商原图规整为画布尺寸后再保存
+    IMAGE_CANVAS_SIZE = (1080, 1440)  # 小红书 3:4 画布尺寸（宽, 高）
+
+    # 图片文件响应（backend/utils/file_response.py）
+    FILE_OFFLOAD_MODE = None  # 交给前置代理发送文件：None / 'x-accel'（nginx）/ 'x-sendfile'
+    FILE_OFFLOAD_PREFIX = '/_protected'  # x-accel 模式的 internal location 前缀（映射到项目根目录）
+
+    # 历史记录 ZIP 下载（backend/routes/history_routes.py）
+    HISTORY_ZIP_CACHE = False  # 是否缓存预构建的压缩包（cache/exports，任务目录变化后失效）
+
     _image_providers_config = None
     _text_providers_config = None
     _feishu_providers_config = None
@@ -97,6 +114,44 @@ class Config:
         logger.debug(f"当前激活的图片服务商: {active}")
         return active
 
+    @classmethod
+    def get_image_provider_pool(cls):
+        """
+        获取图片服务商池（provider_pool 配置）
+
+        支持两种写法：
+            provider_pool:
+              - vertex                # 只写名称，权重为 1
+              - name: openai_image
+                weight: 2
+
+        激活的服务商始终在池中（未列出时以权重 1 加入，排在最前）。
+
+        Returns:
+            list: [(服务商名称, 权重), ...]，未配置时只有激活的服务商
+        """
+        config = cls.load_image_providers_config()
+        active = cls.get_active_image_provider()
+
+        pool = []
+        for item in config.get('provider_pool') or []:
+            if isinstance(item, dict):
+                name, weight = item.get('name'), item.get('weight', 1)
+            else:
+                name, weight = item, 1
+            if not name or any(name == existing for existing, _ in pool):
+                continue
+            try:
+                weight = float(weight)
+            except (TypeError, ValueError):
+                weight = 1.0
+            if weight > 0:
+                pool.append((name, weight))
+
+        if not any(name == active for name, _ in pool):
+            pool.insert(0, (active, 1.0))
+        return pool
+
     @classmethod
     def get_image_provider_config(cls, provider_name: str = None):
         config = cls.load_image_providers_config()
@@ -1,11 +1,15 @@
 """图片生成器抽象基类"""
+import asyncio
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional
+from ..utils.concurrency import get_provider_limiter
 
 
 class ImageGeneratorBase(ABC):
     """图片生成器抽象基类"""
 
+    STREAM_CHUNK_SIZE = 64 * 1024  # 流式读取图片响应时的块大小
+
     def __init__(self, config: Dict[str, Any]):
         """
         初始化生成器
@@ -16,6 +20,8 @@ class ImageGeneratorBase(ABC):
         self.config = config
         self.api_key = config.get('api_key')
         self.base_url = config.get('base_url')
+        # 同一服务商的所有调用共享并发上限（跨任务、跨请求）
+        self.limiter = get_provider_limiter(config, kind="image")
 
     @abstractmethod
     def generate_image(
@@ -35,6 +41,26 @@ class ImageGeneratorBase(ABC):
         """
         pass
 
+    async def generate_image_async(
+        self,
+        prompt: str,
+        **kwargs
+    ) -> bytes:
+        """
+        生成图片（协程版本，参数和返回值与 generate_image 相同）
+
+        默认实现把同步调用放到线程中执行；支持异步 HTTP 的生成器会覆盖此方法，
+        等待响应期间不占用线程。
+
+        Args:
+            prompt: 提示词
+            **kwargs: 其他参数（如分辨率、宽高比等）
+
+        Returns:
+            图片二进制数据
+        """
+        return await asyncio.to_thread(self.generate_image, prompt, **kwargs)
+
     @abstractmethod
     def validate_config(self) -> bool:
         """
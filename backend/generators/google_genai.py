@@ -5,7 +5,7 @@ from typing import Dict, Any, Optional
 from google import genai
 from google.genai import types
 from .base import ImageGeneratorBase
-from ..utils.image_compressor import compress_image
+from ..utils.encoded_image import ImageInput, ensure_encoded
 
 logger = logging.getLogger(__name__)
 
@@ -332,7 +332,7 @@ class GoogleGenAIGenerator(ImageGeneratorBase):
         aspect_ratio: str = "3:4",
         temperature: float = 1.0,
         model: str = "gemini-3-pro-image-preview",
-        reference_image: Optional[bytes] = None,
+        reference_image: Optional[ImageInput] = None,
         **kwargs
     ) -> bytes:
         """
@@ -358,16 +358,11 @@ class GoogleGenAIGenerator(ImageGeneratorBase):
         # 如果有参考图，先添加参考图和说明
         if reference_image:
             logger.debug(f"  添加参考图片 ({len(reference_image)} bytes)")
-            # 压缩参考图到 200KB 以内
-            compressed_ref = compress_image(reference_image, max_size_kb=200)
-            logger.debug(f"  参考图压缩后: {len(compressed_ref)} bytes")
+            # 压缩参考图到 200KB 以内（任务内预编码的参考图直接复用同一个 Part）
+            encoded_ref = ensure_encoded(reference_image)
+            logger.debug(f"  参考图压缩后: {len(encoded_ref)} bytes")
             # 添加参考图
-            parts.append(types.Part(
-                inline_data=types.Blob(
-                    mime_type="image/png",
-                    data=compressed_ref
-                )
-            ))
+            parts.append(encoded_ref.genai_part())
             # 添加带参考说明的提示词
             enhanced_prompt = f"""请参考上面这张图片的视觉风格（包括配色、排版风格、字体风格、装饰元素风格），生成一张风格一致的新图片。
 
@@ -410,18 +405,19 @@ class GoogleGenAIGenerator(ImageGeneratorBase):
 
         image_data = None
         logger.debug(f"  开始调用 API: model={model}")
-        for chunk in self.client.models.generate_content_stream(
-            model=model,
-            contents=contents,
-            config=generate_content_config,
-        ):
-            if chunk.candidates and chunk.candidates[0].content and chunk.candidates[0].content.parts:
-                for part in chunk.candidates[0].content.parts:
-                    # 检查是否有图片数据
-                    if hasattr(part, 'inline_data') and part.inline_data:
-                        image_data = part.inline_data.data
-                        logger.debug(f"  收到图片数据: {len(image_data)} bytes")
-                        break
+        with self.limiter.slot():
+            for chunk in self.client.models.generate_content_stream(
+                model=model,
+                contents=contents,
+                config=generate_content_config,
+            ):
+                if chunk.candidates and chunk.candidates[0].content and chunk.candidates[0].content.parts:
+                    for part in chunk.candidates[0].content.parts:
+                        # 检查是否有图片数据
+                        if hasattr(part, 'inline_data') and part.inline_data:
+                            image_data = part.inline_data.data
+                            logger.debug(f"  收到图片数据: {len(image_data)} bytes")
+                            break
 
         if not image_data:
             logger.error("API 返回为空，未生成图片")
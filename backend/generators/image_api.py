@@ -1,10 +1,16 @@
 """Image API 图片生成器"""
 import logging
 import base64
+import io
+import re
 import requests
-from typing import Dict, Any, Optional, List, Union
+from typing import Dict, Any, Optional, List, Tuple, Union
 from .base import ImageGeneratorBase
-from ..utils.image_compressor import compress_image
+from ..utils.async_engine import get_async_http_client
+from ..utils.b64_stream import B64JsonStreamDecoder
+from ..utils.encoded_image import ImageInput, ensure_encoded
+from ..utils.http_transport import http_get, http_post
+from ..utils.resilience import ProviderError, ProviderTimeoutError, classify_error, error_for_status
 
 logger = logging.getLogger(__name__)
 
@@ -58,8 +64,8 @@ class ImageApiGenerator(ImageGeneratorBase):
         aspect_ratio: str = None,
         temperature: float = 1.0,
         model: str = None,
-        reference_image: Optional[bytes] = None,
-        reference_images: Optional[List[bytes]] = None,
+        reference_image: Optional[ImageInput] = None,
+        reference_images: Optional[List[ImageInput]] = None,
         **kwargs
     ) -> bytes:
         """
@@ -86,26 +92,128 @@ class ImageApiGenerator(ImageGeneratorBase):
 
         logger.info(f"Image API 生成图片: model={model}, aspect_ratio={aspect_ratio}, endpoint={self.endpoint_type}")
 
-        # 根据端点类型选择不同的生成方式
-        if 'chat' in self.endpoint_type or 'completions' in self.endpoint_type:
-            return self._generate_via_chat_api(prompt, aspect_ratio, model, reference_image, reference_images)
-        else:
-            return self._generate_via_images_api(prompt, aspect_ratio, model, reference_image, reference_images)
+        # 根据端点类型选择不同的生成方式（占用服务商共享的并发名额）
+        with self.limiter.slot():
+            if self._is_chat_endpoint():
+                return self._generate_via_chat_api(prompt, aspect_ratio, model, reference_image, reference_images)
+            else:
+                return self._generate_via_images_api(prompt, aspect_ratio, model, reference_image, reference_images)
 
-    def _generate_via_images_api(
+    async def generate_image_async(
         self,
         prompt: str,
-        aspect_ratio: str,
-        model: str,
-        reference_image: Optional[bytes] = None,
-        reference_images: Optional[List[bytes]] = None
+        aspect_ratio: str = None,
+        temperature: float = 1.0,
+        model: str = None,
+        reference_image: Optional[ImageInput] = None,
+        reference_images: Optional[List[ImageInput]] = None,
+        **kwargs
     ) -> bytes:
-        """通过 /v1/images/generations 端点生成图片"""
-        headers = {
+        """
+        生成图片（协程版本，使用 httpx 异步请求，参数与 generate_image 相同）
+
+        Returns:
+            生成的图片二进制数据
+        """
+        self.validate_config()
+
+        if aspect_ratio is None:
+            aspect_ratio = self.default_aspect_ratio
+
+        if model is None:
+            model = self.model
+
+        logger.info(f"Image API 异步生成图片: model={model}, aspect_ratio={aspect_ratio}, endpoint={self.endpoint_type}")
+
+        all_reference_images = self._collect_reference_images(reference_image, reference_images)
+        client = get_async_http_client()
+
+        async with self.limiter.async_slot():
+            if self._is_chat_endpoint():
+                api_url, headers, payload = self._build_chat_request(prompt, model, all_reference_images)
+                logger.info(f"Chat API 生成图片: {api_url}, model={model}")
+                response = await client.post(api_url, headers=headers, json=payload)
+                if response.status_code != 200:
+                    self._raise_chat_api_error(response.status_code, response.text, api_url, model, response.headers)
+
+                result = response.json()
+                logger.debug(f"Chat API 响应: {str(result)[:500]}")
+                image_data, image_url = self._extract_chat_image(result)
+                if image_url:
+                    logger.info(f"下载图片: {image_url[:100]}...")
+                    download = await client.get(image_url, timeout=60)
+                    if download.status_code != 200:
+                        raise self._download_error(download.status_code, download.headers)
+                    image_data = download.content
+                return image_data
+            else:
+                api_url, headers, payload = self._build_images_request(
+                    prompt, aspect_ratio, model, all_reference_images
+                )
+                logger.debug(f"  发送请求到: {api_url}")
+                async with client.stream("POST", api_url, headers=headers, json=payload) as response:
+                    if response.status_code != 200:
+                        await response.aread()
+                        self._raise_images_api_error(response.status_code, response.text, api_url, response.headers)
+
+                    # 边接收边解码 b64_json，不在内存中保留完整的 base64 文本
+                    sink = io.BytesIO()
+                    decoder = B64JsonStreamDecoder(sink)
+                    async for chunk in response.aiter_bytes(self.STREAM_CHUNK_SIZE):
+                        decoder.feed(chunk)
+                    return self._finish_images_stream(decoder, sink)
+
+    # ==================== 请求构建与响应解析（同步 / 异步共用） ====================
+
+    def _is_chat_endpoint(self) -> bool:
+        """是否为 chat/completions 类端点"""
+        return 'chat' in self.endpoint_type or 'completions' in self.endpoint_type
+
+    def _collect_reference_images(
+        self,
+        reference_image: Optional[ImageInput] = None,
+        reference_images: Optional[List[ImageInput]] = None
+    ) -> List[ImageInput]:
+        """收集所有参考图片（多张参考图 + 单张参考图，去重）"""
+        all_reference_images = []
+        if reference_images and len(reference_images) > 0:
+            all_reference_images.extend(reference_images)
+        if reference_image and reference_image not in all_reference_images:
+            all_reference_images.append(reference_image)
+        return all_reference_images
+
+    def _encode_reference_images(self, reference_images: List[ImageInput]) -> List[str]:
+        """
+        参考图片转为 data URI
+
+        任务内预编码的 EncodedImage 直接复用缓存的 data URI；bytes 则在此压缩并编码
+        """
+        image_uris = []
+        for idx, image in enumerate(reference_images):
+            encoded = ensure_encoded(image)
+            logger.debug(f"  参考图 {idx}: {len(encoded)} bytes ({encoded.mime_type})")
+            image_uris.append(encoded.data_uri)
+        return image_uris
+
+    def _build_headers(self) -> Dict[str, str]:
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
 
+    def _build_images_request(
+        self,
+        prompt: str,
+        aspect_ratio: str,
+        model: str,
+        reference_images: List[ImageInput]
+    ) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """
+        构建 /v1/images/generations 请求
+
+        Returns:
+            (api_url, headers, payload)
+        """
         payload = {
             "model": model,
             "prompt": prompt,
@@ -114,27 +222,12 @@ class ImageApiGenerator(ImageGeneratorBase):
             "image_size": self.image_size
         }
 
-        # 收集所有参考图片
-        all_reference_images = []
-        if reference_images and len(reference_images) > 0:
-            all_reference_images.extend(reference_images)
-        if reference_image and reference_image not in all_reference_images:
-            all_reference_images.append(reference_image)
-
         # 如果有参考图片，添加到 image 数组
-        if all_reference_images:
-            logger.debug(f"  添加 {len(all_reference_images)} 张参考图片")
-            image_uris = []
-            for idx, img_data in enumerate(all_reference_images):
-                compressed_img = compress_image(img_data, max_size_kb=200)
-                logger.debug(f"  参考图 {idx}: {len(img_data)} -> {len(compressed_img)} bytes")
-                base64_image = base64.b64encode(compressed_img).decode('utf-8')
-                data_uri = f"data:image/png;base64,{base64_image}"
-                image_uris.append(data_uri)
-
-            payload["image"] = image_uris
-
-            ref_count = len(all_reference_images)
+        if reference_images:
+            logger.debug(f"  添加 {len(reference_images)} 张参考图片")
+            payload["image"] = self._encode_reference_images(reference_images)
+
+            ref_count = len(reference_images)
             enhanced_prompt = f"""参考提供的 {ref_count} 张图片的风格（色彩、光影、构图、氛围），生成一张新图片。
 
 新图片内容：{prompt}
@@ -147,25 +240,36 @@ class ImageApiGenerator(ImageGeneratorBase):
             payload["prompt"] = enhanced_prompt
 
         api_url = f"{self.base_url}{self.endpoint_type}"
-        logger.debug(f"  发送请求到: {api_url}")
-        response = requests.post(api_url, headers=headers, json=payload, timeout=300)
-
-        if response.status_code != 200:
-            error_detail = response.text[:500]
-            logger.error(f"Image API 请求失败: status={response.status_code}, error={error_detail}")
-            raise Exception(
-                f"Image API 请求失败 (状态码: {response.status_code})\n"
-                f"错误详情: {error_detail}\n"
-                f"请求地址: {api_url}\n"
-                "可能原因：\n"
-                "1. API密钥无效或已过期\n"
-                "2. 请求参数不符合API要求\n"
-                "3. API服务端错误\n"
-                "4. Base URL配置错误\n"
-                "建议：检查API密钥和base_url配置"
-            )
-
-        result = response.json()
+        return api_url, self._build_headers(), payload
+
+    def _raise_images_api_error(self, status_code: int, text: str, api_url: str, headers=None) -> None:
+        """images 端点非 200 响应：按状态码抛出带排查建议的类型化异常"""
+        error_detail = text[:500]
+        logger.error(f"Image API 请求失败: status={status_code}, error={error_detail}")
+        raise error_for_status(status_code, (
+            f"Image API 请求失败 (状态码: {status_code})\n"
+            f"错误详情: {error_detail}\n"
+            f"请求地址: {api_url}\n"
+            "可能原因：\n"
+            "1. API密钥无效或已过期\n"
+            "2. 请求参数不符合API要求\n"
+            "3. API服务端错误\n"
+            "4. Base URL配置错误\n"
+            "建议：检查API密钥和base_url配置"
+        ), headers)
+
+    def _finish_images_stream(self, decoder: B64JsonStreamDecoder, sink: io.BytesIO) -> bytes:
+        """结束流式解码：b64_json 已写入 sink 时直接返回，否则按完整 JSON 解析"""
+        result = decoder.finish()
+        if result is not None:
+            return self._parse_images_result(result)
+
+        image_data = sink.getvalue()
+        logger.info(f"✅ Image API 图片生成成功: {len(image_data)} bytes")
+        return image_data
+
+    def _parse_images_result(self, result: Dict[str, Any]) -> bytes:
+        """从 images 端点响应中提取图片数据"""
         logger.debug(f"  API 响应: data 长度={len(result.get('data', []))}")
 
         if "data" in result and len(result["data"]) > 0:
@@ -192,46 +296,30 @@ class ImageApiGenerator(ImageGeneratorBase):
             "建议：检查API文档确认返回格式要求"
         )
 
-    def _generate_via_chat_api(
+    def _build_chat_request(
         self,
         prompt: str,
-        aspect_ratio: str,
         model: str,
-        reference_image: Optional[bytes] = None,
-        reference_images: Optional[List[bytes]] = None
-    ) -> bytes:
-        """通过 /v1/chat/completions 端点生成图片（如即梦 API）"""
-        import re
-
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+        reference_images: List[ImageInput]
+    ) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """
+        构建 /v1/chat/completions 请求
 
+        Returns:
+            (api_url, headers, payload)
+        """
         # 构建用户消息内容
         user_content: Any = prompt
 
-        # 收集所有参考图片
-        all_reference_images = []
-        if reference_images and len(reference_images) > 0:
-            all_reference_images.extend(reference_images)
-        if reference_image and reference_image not in all_reference_images:
-            all_reference_images.append(reference_image)
-
         # 如果有参考图片，构建多模态消息
-        if all_reference_images:
-            logger.debug(f"  添加 {len(all_reference_images)} 张参考图片到 chat 消息")
+        if reference_images:
+            logger.debug(f"  添加 {len(reference_images)} 张参考图片到 chat 消息")
             content_parts = [{"type": "text", "text": prompt}]
-
-            for idx, img_data in enumerate(all_reference_images):
-                compressed_img = compress_image(img_data, max_size_kb=200)
-                logger.debug(f"  参考图 {idx}: {len(img_data)} -> {len(compressed_img)} bytes")
-                base64_image = base64.b64encode(compressed_img).decode('utf-8')
+            for data_uri in self._encode_reference_images(reference_images):
                 content_parts.append({
                     "type": "image_url",
-                    "image_url": {"url": f"data:image/png;base64,{base64_image}"}
+                    "image_url": {"url": data_uri}
                 })
-
             user_content = content_parts
 
         payload = {
@@ -242,42 +330,46 @@ class ImageApiGenerator(ImageGeneratorBase):
         }
 
         api_url = f"{self.base_url}{self.endpoint_type}"
-        logger.info(f"Chat API 生成图片: {api_url}, model={model}")
-
-        response = requests.post(api_url, headers=headers, json=payload, timeout=300)
-
-        if response.status_code != 200:
-            error_detail = response.text[:500]
-            status_code = response.status_code
-
-            if status_code == 401:
-                raise Exception(
-                    "❌ API Key 认证失败\n\n"
-                    "【可能原因】\n"
-                    "1. API Key 无效或已过期\n"
-                    "2. API Key 格式错误\n\n"
-                    "【解决方案】\n"
-                    "在系统设置页面检查 API Key 是否正确"
-                )
-            elif status_code == 429:
-                raise Exception(
-                    "⏳ API 配额或速率限制\n\n"
-                    "【解决方案】\n"
-                    "1. 稍后再试\n"
-                    "2. 检查 API 配额使用情况"
-                )
-            else:
-                raise Exception(
-                    f"❌ Chat API 请求失败 (状态码: {status_code})\n\n"
-                    f"【错误详情】\n{error_detail[:300]}\n\n"
-                    f"【请求地址】{api_url}\n"
-                    f"【模型】{model}"
-                )
+        return api_url, self._build_headers(), payload
+
+    def _raise_chat_api_error(self, status_code: int, text: str, api_url: str, model: str, headers=None) -> None:
+        """chat 端点非 200 响应：按状态码抛出带排查建议的类型化异常"""
+        error_detail = text[:500]
+
+        if status_code == 401:
+            raise error_for_status(status_code, (
+                "❌ API Key 认证失败\n\n"
+                "【可能原因】\n"
+                "1. API Key 无效或已过期\n"
+                "2. API Key 格式错误\n\n"
+                "【解决方案】\n"
+                "在系统设置页面检查 API Key 是否正确"
+            ), headers)
+        elif status_code == 429:
+            raise error_for_status(status_code, (
+                "⏳ API 配额或速率限制\n\n"
+                "【解决方案】\n"
+                "1. 稍后再试\n"
+                "2. 检查 API 配额使用情况"
+            ), headers)
+        else:
+            raise error_for_status(status_code, (
+                f"❌ Chat API 请求失败 (状态码: {status_code})\n\n"
+                f"【错误详情】\n{error_detail[:300]}\n\n"
+                f"【请求地址】{api_url}\n"
+                f"【模型】{model}"
+            ), headers)
+
+    def _extract_chat_image(self, result: Dict[str, Any]) -> Tuple[Optional[bytes], Optional[str]]:
+        """
+        从 chat 端点响应中提取图片
 
-        result = response.json()
-        logger.debug(f"Chat API 响应: {str(result)[:500]}")
+        Returns:
+            (image_data, image_url)：二者之一非空；image_url 需要再下载
 
-        # 解析响应
+        Raises:
+            Exception: 响应中没有可识别的图片
+        """
         if "choices" in result and len(result["choices"]) > 0:
             choice = result["choices"][0]
             if "message" in choice and "content" in choice["message"]:
@@ -289,7 +381,7 @@ class ImageApiGenerator(ImageGeneratorBase):
                     urls = re.findall(pattern, content)
                     if urls:
                         logger.info(f"从 Markdown 提取到 {len(urls)} 张图片，下载第一张...")
-                        return self._download_image(urls[0])
+                        return None, urls[0]
 
                     # Markdown 图片 Base64: ![xxx](data:image/...)
                     base64_pattern = r'!\[.*?\]\((data:image\/[^;]+;base64,[^\s\)]+)\)'
@@ -297,18 +389,18 @@ class ImageApiGenerator(ImageGeneratorBase):
                     if base64_urls:
                         logger.info("从 Markdown 提取到 Base64 图片数据")
                         base64_data = base64_urls[0].split(",")[1]
-                        return base64.b64decode(base64_data)
+                        return base64.b64decode(base64_data), None
 
                     # 纯 Base64 data URL
                     if content.startswith("data:image"):
                         logger.info("检测到 Base64 图片数据")
                         base64_data = content.split(",")[1]
-                        return base64.b64decode(base64_data)
+                        return base64.b64decode(base64_data), None
 
                     # 纯 URL
                     if content.startswith("http://") or content.startswith("https://"):
                         logger.info("检测到图片 URL")
-                        return self._download_image(content.strip())
+                        return None, content.strip()
 
         raise Exception(
             "❌ 无法从 Chat API 响应中提取图片数据\n\n"
@@ -322,17 +414,80 @@ class ImageApiGenerator(ImageGeneratorBase):
             "2. 修改提示词后重试"
         )
 
+    # ==================== 同步请求 ====================
+
+    def _generate_via_images_api(
+        self,
+        prompt: str,
+        aspect_ratio: str,
+        model: str,
+        reference_image: Optional[ImageInput] = None,
+        reference_images: Optional[List[ImageInput]] = None
+    ) -> bytes:
+        """通过 /v1/images/generations 端点生成图片"""
+        all_reference_images = self._collect_reference_images(reference_image, reference_images)
+        api_url, headers, payload = self._build_images_request(prompt, aspect_ratio, model, all_reference_images)
+
+        logger.debug(f"  发送请求到: {api_url}")
+        with http_post(api_url, headers=headers, json=payload, timeout=300, stream=True) as response:
+            if response.status_code != 200:
+                self._raise_images_api_error(response.status_code, response.text, api_url, response.headers)
+
+            # 边接收边解码 b64_json，不在内存中保留完整的 base64 文本
+            sink = io.BytesIO()
+            decoder = B64JsonStreamDecoder(sink)
+            for chunk in response.iter_content(chunk_size=self.STREAM_CHUNK_SIZE):
+                decoder.feed(chunk)
+            return self._finish_images_stream(decoder, sink)
+
+    def _generate_via_chat_api(
+        self,
+        prompt: str,
+        aspect_ratio: str,
+        model: str,
+        reference_image: Optional[ImageInput] = None,
+        reference_images: Optional[List[ImageInput]] = None
+    ) -> bytes:
+        """通过 /v1/chat/completions 端点生成图片（如即梦 API）"""
+        all_reference_images = self._collect_reference_images(reference_image, reference_images)
+        api_url, headers, payload = self._build_chat_request(prompt, model, all_reference_images)
+        logger.info(f"Chat API 生成图片: {api_url}, model={model}")
+
+        response = http_post(api_url, headers=headers, json=payload, timeout=300)
+
+        if response.status_code != 200:
+            self._raise_chat_api_error(response.status_code, response.text, api_url, model, response.headers)
+
+        result = response.json()
+        logger.debug(f"Chat API 响应: {str(result)[:500]}")
+
+        image_data, image_url = self._extract_chat_image(result)
+        if image_url:
+            return self._download_image(image_url)
+        return image_data
+
+    @staticmethod
+    def _download_error(status_code: int, headers=None) -> ProviderError:
+        """下载图片返回非 200 时的类型化错误（5xx 可重试并计入熔断，4xx 直接失败）"""
+        return error_for_status(status_code, f"❌ 下载图片失败: HTTP {status_code}", headers)
+
     def _download_image(self, url: str) -> bytes:
         """下载图片并返回二进制数据"""
         logger.info(f"下载图片: {url[:100]}...")
         try:
-            response = requests.get(url, timeout=60)
-            if response.status_code == 200:
-                logger.info(f"✅ 图片下载成功: {len(response.content)} bytes")
-                return response.content
-            else:
-                raise Exception(f"下载图片失败: HTTP {response.status_code}")
+            response = http_get(url, timeout=60)
         except requests.exceptions.Timeout:
-            raise Exception("❌ 下载图片超时，请重试")
+            raise ProviderTimeoutError("❌ 下载图片超时，请重试")
         except Exception as e:
-            raise Exception(f"❌ 下载图片失败: {str(e)}")
+            # 连接错误等保留类型（可重试 / 计入熔断），无法归类的异常只补充说明
+            typed = classify_error(e)
+            if typed is None:
+                raise Exception(f"❌ 下载图片失败: {str(e)}") from e
+            raise type(typed)(
+                f"❌ 下载图片失败: {str(e)}", status_code=typed.status_code, retry_after=typed.retry_after
+            ) from e
+
+        if response.status_code != 200:
+            raise self._download_error(response.status_code, response.headers)
+        logger.info(f"✅ 图片下载成功: {len(response.content)} bytes")
+        return response.content
@@ -1,9 +1,14 @@
 """OpenAI 兼容接口图片生成器"""
 import logging
 import base64
-from typing import Dict, Any
+import io
+from typing import Dict, Any, Optional, Tuple
 import requests
 from .base import ImageGeneratorBase
+from ..utils.async_engine import get_async_http_client
+from ..utils.b64_stream import B64JsonStreamDecoder
+from ..utils.http_transport import http_get, http_post
+from ..utils.resilience import ProviderError, ProviderTimeoutError, classify_error, error_for_status
 
 logger = logging.getLogger(__name__)
 
@@ -76,31 +81,99 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
 
         logger.info(f"OpenAI 兼容 API 生成图片: model={model}, size={size}, endpoint={self.endpoint_type}")
 
-        # 根据端点路径决定使用哪种 API 方式
-        if 'chat' in self.endpoint_type or 'completions' in self.endpoint_type:
-            return self._generate_via_chat_api(prompt, size, model)
-        else:
-            # 默认使用 images API
-            return self._generate_via_images_api(prompt, size, model, quality)
+        # 根据端点路径决定使用哪种 API 方式（占用服务商共享的并发名额）
+        with self.limiter.slot():
+            if self._is_chat_endpoint():
+                return self._generate_via_chat_api(prompt, size, model)
+            else:
+                # 默认使用 images API
+                return self._generate_via_images_api(prompt, size, model, quality)
 
-    def _generate_via_images_api(
+    async def generate_image_async(
         self,
         prompt: str,
-        size: str,
-        model: str,
-        quality: str
+        size: str = "1024x1024",
+        model: str = None,
+        quality: str = "standard",
+        **kwargs
     ) -> bytes:
-        """通过 images API 端点生成"""
-        # 确保端点以 / 开头
+        """
+        生成图片（协程版本，使用 httpx 异步请求，参数与 generate_image 相同）
+
+        Returns:
+            图片二进制数据
+        """
+        if model is None:
+            model = self.default_model
+
+        logger.info(f"OpenAI 兼容 API 异步生成图片: model={model}, size={size}, endpoint={self.endpoint_type}")
+
+        client = get_async_http_client()
+
+        async with self.limiter.async_slot():
+            if self._is_chat_endpoint():
+                url, headers, payload = self._build_chat_request(prompt, model)
+                logger.info(f"Chat API 生成图片: {url}, model={model}")
+                response = await client.post(url, headers=headers, json=payload)
+                if response.status_code != 200:
+                    self._raise_chat_api_error(response.status_code, response.text, url, model, response.headers)
+                result = response.json()
+                logger.debug(f"Chat API 响应: {str(result)[:500]}")
+                image_data, image_url = self._extract_chat_image(result)
+            else:
+                url, headers, payload = self._build_images_request(prompt, size, model, quality)
+                logger.debug(f"  发送请求到: {url}")
+                async with client.stream("POST", url, headers=headers, json=payload) as response:
+                    if response.status_code != 200:
+                        await response.aread()
+                        self._raise_images_api_error(response.status_code, response.text, url, model, response.headers)
+
+                    # 边接收边解码 b64_json，不在内存中保留完整的 base64 文本
+                    sink = io.BytesIO()
+                    decoder = B64JsonStreamDecoder(sink)
+                    async for chunk in response.aiter_bytes(self.STREAM_CHUNK_SIZE):
+                        decoder.feed(chunk)
+                    image_data, image_url = self._finish_images_stream(decoder, sink)
+
+            if image_url:
+                logger.info(f"下载图片: {image_url[:100]}...")
+                download = await client.get(image_url, timeout=60)
+                if download.status_code != 200:
+                    raise self._download_error(download.status_code, download.headers)
+                image_data = download.content
+                logger.info(f"✅ 图片下载成功: {len(image_data)} bytes")
+            return image_data
+
+    # ==================== 请求构建与响应解析（同步 / 异步共用） ====================
+
+    def _is_chat_endpoint(self) -> bool:
+        """是否为 chat/completions 类端点"""
+        return 'chat' in self.endpoint_type or 'completions' in self.endpoint_type
+
+    def _endpoint_url(self) -> str:
+        """完整请求地址（确保端点以 / 开头）"""
         endpoint = self.endpoint_type if self.endpoint_type.startswith('/') else '/' + self.endpoint_type
-        url = f"{self.base_url}{endpoint}"
-        logger.debug(f"  发送请求到: {url}")
+        return f"{self.base_url}{endpoint}"
 
-        headers = {
+    def _build_headers(self) -> Dict[str, str]:
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
 
+    def _build_images_request(
+        self,
+        prompt: str,
+        size: str,
+        model: str,
+        quality: str
+    ) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """
+        构建 images API 请求
+
+        Returns:
+            (url, headers, payload)
+        """
         payload = {
             "model": model,
             "prompt": prompt,
@@ -113,26 +186,52 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
         if quality and model.startswith('dall-e'):
             payload["quality"] = quality
 
-        response = requests.post(url, headers=headers, json=payload, timeout=300)
+        return self._endpoint_url(), self._build_headers(), payload
+
+    def _raise_images_api_error(self, status_code: int, text: str, url: str, model: str, headers=None) -> None:
+        """images 端点非 200 响应：按状态码抛出带排查建议的类型化异常"""
+        error_detail = text[:500]
+        logger.error(f"OpenAI Images API 请求失败: status={status_code}, error={error_detail}")
+        raise error_for_status(status_code, (
+            f"OpenAI Images API 请求失败 (状态码: {status_code})\n"
+            f"错误详情: {error_detail}\n"
+            f"请求地址: {url}\n"
+            f"模型: {model}\n"
+            "可能原因：\n"
+            "1. API密钥无效或已过期\n"
+            "2. 模型名称不正确或无权访问\n"
+            "3. 请求参数不符合要求\n"
+            "4. API配额已用尽\n"
+            "5. Base URL配置错误\n"
+            "建议：检查API密钥、base_url和模型名称配置"
+        ), headers)
+
+    def _finish_images_stream(
+        self,
+        decoder: B64JsonStreamDecoder,
+        sink: io.BytesIO
+    ) -> Tuple[Optional[bytes], Optional[str]]:
+        """
+        结束流式解码：b64_json 已写入 sink 时直接返回，否则按完整 JSON 解析（如返回 url）
 
-        if response.status_code != 200:
-            error_detail = response.text[:500]
-            logger.error(f"OpenAI Images API 请求失败: status={response.status_code}, error={error_detail}")
-            raise Exception(
-                f"OpenAI Images API 请求失败 (状态码: {response.status_code})\n"
-                f"错误详情: {error_detail}\n"
-                f"请求地址: {url}\n"
-                f"模型: {model}\n"
-                "可能原因：\n"
-                "1. API密钥无效或已过期\n"
-                "2. 模型名称不正确或无权访问\n"
-                "3. 请求参数不符合要求\n"
-                "4. API配额已用尽\n"
-                "5. Base URL配置错误\n"
-                "建议：检查API密钥、base_url和模型名称配置"
-            )
+        Returns:
+            (image_data, image_url)
+        """
+        result = decoder.finish()
+        if result is not None:
+            return self._parse_images_result(result)
 
-        result = response.json()
+        img_bytes = sink.getvalue()
+        logger.info(f"✅ OpenAI Images API 图片生成成功: {len(img_bytes)} bytes")
+        return img_bytes, None
+
+    def _parse_images_result(self, result: Dict[str, Any]) -> Tuple[Optional[bytes], Optional[str]]:
+        """
+        从 images 端点响应中提取图片
+
+        Returns:
+            (image_data, image_url)：二者之一非空；image_url 需要再下载
+        """
         logger.debug(f"  API 响应: data 长度={len(result.get('data', []))}")
 
         if "data" not in result or len(result["data"]) == 0:
@@ -153,18 +252,12 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
         if "b64_json" in image_data:
             img_bytes = base64.b64decode(image_data["b64_json"])
             logger.info(f"✅ OpenAI Images API 图片生成成功: {len(img_bytes)} bytes")
-            return img_bytes
+            return img_bytes, None
 
         # 处理URL格式
         elif "url" in image_data:
             logger.debug(f"  下载图片 URL...")
-            img_response = requests.get(image_data["url"], timeout=60)
-            if img_response.status_code == 200:
-                logger.info(f"✅ OpenAI Images API 图片生成成功: {len(img_response.content)} bytes")
-                return img_response.content
-            else:
-                logger.error(f"下载图片失败: {img_response.status_code}")
-                raise Exception(f"下载图片失败: {img_response.status_code}")
+            return None, image_data["url"]
 
         else:
             logger.error(f"无法从响应中提取图片数据: {str(image_data)[:200]}")
@@ -177,30 +270,13 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
                 "建议：检查API文档确认图片返回格式"
             )
 
-    def _generate_via_chat_api(
-        self,
-        prompt: str,
-        size: str,
-        model: str
-    ) -> bytes:
+    def _build_chat_request(self, prompt: str, model: str) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
         """
-        通过 chat/completions 端点生成图片
+        构建 chat/completions 请求
 
-        支持多种返回格式：
-        1. Markdown 图片链接: ![xxx](url) - 即梦、部分中转站使用
-        2. Base64 data URL: data:image/xxx;base64,xxx
-        3. 纯图片 URL
+        Returns:
+            (url, headers, payload)
         """
-        # 确保端点以 / 开头
-        endpoint = self.endpoint_type if self.endpoint_type.startswith('/') else '/' + self.endpoint_type
-        url = f"{self.base_url}{endpoint}"
-        logger.info(f"Chat API 生成图片: {url}, model={model}")
-
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-
         payload = {
             "model": model,
             "messages": [
@@ -212,42 +288,49 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
             "max_tokens": 4096,
             "temperature": 1.0
         }
+        return self._endpoint_url(), self._build_headers(), payload
+
+    def _raise_chat_api_error(self, status_code: int, text: str, url: str, model: str, headers=None) -> None:
+        """chat 端点非 200 响应：按状态码抛出带排查建议的类型化异常"""
+        error_detail = text[:500]
+
+        # 详细的错误信息
+        if status_code == 401:
+            raise error_for_status(status_code, (
+                "❌ API Key 认证失败\n\n"
+                "【可能原因】\n"
+                "1. API Key 无效或已过期\n"
+                "2. API Key 格式错误\n\n"
+                "【解决方案】\n"
+                "在系统设置页面检查 API Key 是否正确"
+            ), headers)
+        elif status_code == 429:
+            raise error_for_status(status_code, (
+                "⏳ API 配额或速率限制\n\n"
+                "【解决方案】\n"
+                "1. 稍后再试\n"
+                "2. 检查 API 配额使用情况"
+            ), headers)
+        else:
+            raise error_for_status(status_code, (
+                f"❌ Chat API 请求失败 (状态码: {status_code})\n\n"
+                f"【错误详情】\n{error_detail[:300]}\n\n"
+                f"【请求地址】{url}\n"
+                f"【模型】{model}"
+            ), headers)
+
+    def _extract_chat_image(self, result: Dict[str, Any]) -> Tuple[Optional[bytes], Optional[str]]:
+        """
+        从 chat 端点响应中提取图片
 
-        response = requests.post(url, headers=headers, json=payload, timeout=300)
-
-        if response.status_code != 200:
-            error_detail = response.text[:500]
-            status_code = response.status_code
-
-            # 详细的错误信息
-            if status_code == 401:
-                raise Exception(
-                    "❌ API Key 认证失败\n\n"
-                    "【可能原因】\n"
-                    "1. API Key 无效或已过期\n"
-                    "2. API Key 格式错误\n\n"
-                    "【解决方案】\n"
-                    "在系统设置页面检查 API Key 是否正确"
-                )
-            elif status_code == 429:
-                raise Exception(
-                    "⏳ API 配额或速率限制\n\n"
-                    "【解决方案】\n"
-                    "1. 稍后再试\n"
-                    "2. 检查 API 配额使用情况"
-                )
-            else:
-                raise Exception(
-                    f"❌ Chat API 请求失败 (状态码: {status_code})\n\n"
-                    f"【错误详情】\n{error_detail[:300]}\n\n"
-                    f"【请求地址】{url}\n"
-                    f"【模型】{model}"
-                )
-
-        result = response.json()
-        logger.debug(f"Chat API 响应: {str(result)[:500]}")
+        支持多种返回格式：
+        1. Markdown 图片链接: ![xxx](url) - 即梦、部分中转站使用
+        2. Base64 data URL: data:image/xxx;base64,xxx
+        3. 纯图片 URL
 
-        # 解析响应
+        Returns:
+            (image_data, image_url)：二者之一非空；image_url 需要再下载
+        """
         if "choices" in result and len(result["choices"]) > 0:
             choice = result["choices"][0]
             if "message" in choice and "content" in choice["message"]:
@@ -259,18 +342,18 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
                     if image_urls:
                         # 下载第一张图片
                         logger.info(f"从 Markdown 提取到 {len(image_urls)} 张图片，下载第一张...")
-                        return self._download_image(image_urls[0])
+                        return None, image_urls[0]
 
                     # 2. 尝试解析 Base64 data URL
                     if content.startswith("data:image"):
                         logger.info("检测到 Base64 图片数据")
                         base64_data = content.split(",")[1]
-                        return base64.b64decode(base64_data)
+                        return base64.b64decode(base64_data), None
 
                     # 3. 尝试作为纯 URL 处理
                     if content.startswith("http://") or content.startswith("https://"):
                         logger.info("检测到图片 URL")
-                        return self._download_image(content.strip())
+                        return None, content.strip()
 
         raise ValueError(
             "❌ 无法从 Chat API 响应中提取图片数据\n\n"
@@ -284,6 +367,56 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
             "2. 修改提示词后重试"
         )
 
+    # ==================== 同步请求 ====================
+
+    def _generate_via_images_api(
+        self,
+        prompt: str,
+        size: str,
+        model: str,
+        quality: str
+    ) -> bytes:
+        """通过 images API 端点生成"""
+        url, headers, payload = self._build_images_request(prompt, size, model, quality)
+        logger.debug(f"  发送请求到: {url}")
+
+        with http_post(url, headers=headers, json=payload, timeout=300, stream=True) as response:
+            if response.status_code != 200:
+                self._raise_images_api_error(response.status_code, response.text, url, model, response.headers)
+
+            # 边接收边解码 b64_json，不在内存中保留完整的 base64 文本
+            sink = io.BytesIO()
+            decoder = B64JsonStreamDecoder(sink)
+            for chunk in response.iter_content(chunk_size=self.STREAM_CHUNK_SIZE):
+                decoder.feed(chunk)
+            img_bytes, image_url = self._finish_images_stream(decoder, sink)
+        if image_url:
+            return self._download_image(image_url)
+        return img_bytes
+
+    def _generate_via_chat_api(
+        self,
+        prompt: str,
+        size: str,
+        model: str
+    ) -> bytes:
+        """通过 chat/completions 端点生成图片"""
+        url, headers, payload = self._build_chat_request(prompt, model)
+        logger.info(f"Chat API 生成图片: {url}, model={model}")
+
+        response = http_post(url, headers=headers, json=payload, timeout=300)
+
+        if response.status_code != 200:
+            self._raise_chat_api_error(response.status_code, response.text, url, model, response.headers)
+
+        result = response.json()
+        logger.debug(f"Chat API 响应: {str(result)[:500]}")
+
+        image_data, image_url = self._extract_chat_image(result)
+        if image_url:
+            return self._download_image(image_url)
+        return image_data
+
     def _extract_markdown_image_urls(self, content: str) -> list:
         """
         从 Markdown 内容中提取图片 URL
@@ -297,20 +430,31 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
         logger.debug(f"从 Markdown 提取到 {len(urls)} 个图片 URL")
         return urls
 
+    @staticmethod
+    def _download_error(status_code: int, headers=None) -> ProviderError:
+        """下载图片返回非 200 时的类型化错误（5xx 可重试并计入熔断，4xx 直接失败）"""
+        return error_for_status(status_code, f"❌ 下载图片失败: HTTP {status_code}", headers)
+
     def _download_image(self, url: str) -> bytes:
         """下载图片并返回二进制数据"""
         logger.info(f"下载图片: {url[:100]}...")
         try:
-            response = requests.get(url, timeout=60)
-            if response.status_code == 200:
-                logger.info(f"✅ 图片下载成功: {len(response.content)} bytes")
-                return response.content
-            else:
-                raise Exception(f"下载图片失败: HTTP {response.status_code}")
+            response = http_get(url, timeout=60)
         except requests.exceptions.Timeout:
-            raise Exception("❌ 下载图片超时，请重试")
+            raise ProviderTimeoutError("❌ 下载图片超时，请重试")
         except Exception as e:
-            raise Exception(f"❌ 下载图片失败: {str(e)}")
+            # 连接错误等保留类型（可重试 / 计入熔断），无法归类的异常只补充说明
+            typed = classify_error(e)
+            if typed is None:
+                raise Exception(f"❌ 下载图片失败: {str(e)}") from e
+            raise type(typed)(
+                f"❌ 下载图片失败: {str(e)}", status_code=typed.status_code, retry_after=typed.retry_after
+            ) from e
+
+        if response.status_code != 200:
+            raise self._download_error(response.status_code, response.headers)
+        logger.info(f"✅ 图片下载成功: {len(response.content)} bytes")
+        return response.content
 
     def get_supported_sizes(self) -> list:
         """获取支持的图片尺寸"""
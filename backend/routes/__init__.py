@@ -12,6 +12,8 @@ API 路由模块
 - oauth_routes: OAuth 授权相关 API
 - analysis_routes: 对标分析相关 API
 - summary_routes: AI 总结相关 API
+- bulk_routes: 批量图文生成任务 API
+- pipeline_routes: 服务端图文生成流水线 API
 
 所有路由都注册到统一的 /api 前缀下
 """
@@ -47,6 +49,8 @@ def create_api_blueprint():
     from .template_routes import create_template_blueprint
     from .template_group_routes import create_template_group_blueprint
     from .optimizer_routes import create_optimizer_blueprint
+    from .bulk_routes import create_bulk_blueprint
+    from .pipeline_routes import create_pipeline_blueprint
 
     # 显式捕获 analysis_routes 导入错误
     try:
@@ -88,6 +92,10 @@ def create_api_blueprint():
     logger.debug("   ✅ template_group_routes registered")
     api_bp.register_blueprint(create_optimizer_blueprint())
     logger.debug("   ✅ optimizer_routes registered")
+    api_bp.register_blueprint(create_bulk_blueprint())
+    logger.debug("   ✅ bulk_routes registered")
+    api_bp.register_blueprint(create_pipeline_blueprint())
+    logger.debug("   ✅ pipeline_routes registered")
 
     # 显式捕获 analysis_routes 蓝图创建错误
     try:
@@ -0,0 +1,180 @@
+"""
+批量图文生成相关 API 路由
+
+包含功能：
+- 提交批量任务（主题列表或 CSV 文件）
+- 查询批量任务列表 / 详情与整体进度
+- 取消批量任务
+"""
+
+import logging
+from flask import Blueprint, request, jsonify
+from backend.services.bulk_jobs import get_bulk_job_manager, normalize_topics, parse_topics_csv
+from .utils import log_request, log_error
+
+logger = logging.getLogger(__name__)
+
+
+def create_bulk_blueprint():
+    """创建批量任务路由蓝图（工厂函数，支持多次调用）"""
+    bulk_bp = Blueprint('bulk', __name__)
+
+    @bulk_bp.route('/bulk-jobs', methods=['POST'])
+    def create_bulk_job():
+        """
+        提交批量图文生成任务
+
+        每个主题依次生成大纲、标题文案和图片，并写入独立的历史记录。
+
+        请求格式：
+        1. application/json
+           - topics: 主题列表
+           - name: 任务名称（可选）
+
+        2. multipart/form-data
+           - file: CSV 文件（有 topic / 主题 表头时取该列，否则取第一列）
+           - name: 任务名称（可选）
+
+        3. text/csv：请求体即 CSV 内容
+
+        返回：
+        - success: 是否成功
+        - job_id: 批量任务 ID
+        - total: 主题数量（已去重）
+        """
+        try:
+            topics, name = _parse_bulk_request()
+
+            log_request('/bulk-jobs', {'topics': len(topics), 'name': name})
+
+            if not topics:
+                return jsonify({
+                    "success": False,
+                    "error": "参数错误：主题列表不能为空。\n请提供 topics 列表或上传 CSV 文件。"
+                }), 400
+
+            manager = get_bulk_job_manager()
+            if len(topics) > manager.MAX_TOPICS:
+                return jsonify({
+                    "success": False,
+                    "error": f"参数错误：单个批量任务最多 {manager.MAX_TOPICS} 个主题，当前 {len(topics)} 个。"
+                }), 400
+
+            job_id = manager.create_job(topics, name)
+            return jsonify({
+                "success": True,
+                "job_id": job_id,
+                "total": len(topics)
+            }), 200
+
+        except Exception as e:
+            log_error('/bulk-jobs', e)
+            return jsonify({
+                "success": False,
+                "error": f"提交批量任务失败。\n错误详情: {str(e)}"
+            }), 500
+
+    @bulk_bp.route('/bulk-jobs', methods=['GET'])
+    def list_bulk_jobs():
+        """
+        获取最近的批量任务列表
+
+        查询参数：
+        - limit: 返回数量（默认 20，最大 100）
+
+        返回：
+        - success: 是否成功
+        - jobs: 任务列表（含状态与整体进度，不含主题详情）
+        """
+        try:
+            limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+            return jsonify({
+                "success": True,
+                "jobs": get_bulk_job_manager().list_jobs(limit)
+            }), 200
+
+        except Exception as e:
+            log_error('/bulk-jobs', e)
+            return jsonify({
+                "success": False,
+                "error": f"获取批量任务列表失败。\n错误详情: {str(e)}"
+            }), 500
+
+    @bulk_bp.route('/bulk-jobs/<job_id>', methods=['GET'])
+    def get_bulk_job(job_id):
+        """
+        获取批量任务详情
+
+        路径参数：
+        - job_id: 批量任务 ID
+
+        返回：
+        - success: 是否成功
+        - job: 任务状态、整体进度和每个主题的状态（stage / record_id / 图片进度）
+        """
+        try:
+            job = get_bulk_job_manager().get_job(job_id)
+            if job is None:
+                return jsonify({
+                    "success": False,
+                    "error": f"批量任务不存在：{job_id}"
+                }), 404
+
+            return jsonify({"success": True, "job": job}), 200
+
+        except Exception as e:
+            log_error(f'/bulk-jobs/{job_id}', e)
+            return jsonify({
+                "success": False,
+                "error": f"获取批量任务失败。\n错误详情: {str(e)}"
+            }), 500
+
+    @bulk_bp.route('/bulk-jobs/<job_id>/cancel', methods=['POST'])
+    def cancel_bulk_job(job_id):
+        """
+        取消批量任务（排队中的主题不再执行，生成中的主题会执行完）
+
+        路径参数：
+        - job_id: 批量任务 ID
+        """
+        try:
+            if not get_bulk_job_manager().cancel_job(job_id):
+                return jsonify({
+                    "success": False,
+                    "error": f"批量任务不存在：{job_id}"
+                }), 404
+
+            return jsonify({"success": True}), 200
+
+        except Exception as e:
+            log_error(f'/bulk-jobs/{job_id}/cancel', e)
+            return jsonify({
+                "success": False,
+                "error": f"取消批量任务失败。\n错误详情: {str(e)}"
+            }), 500
+
+    return bulk_bp
+
+
+def _parse_bulk_request():
+    """
+    解析批量任务请求
+
+    返回：
+        tuple: (topics, name) - 去重后的主题列表和任务名称
+    """
+    content_type = request.content_type or ''
+
+    if 'multipart/form-data' in content_type:
+        file = request.files.get('file')
+        text = file.read().decode('utf-8-sig') if file else ''
+        return parse_topics_csv(text), request.form.get('name', '')
+
+    if 'text/csv' in content_type:
+        return parse_topics_csv(request.get_data(as_text=True)), request.args.get('name', '')
+
+    data = request.get_json(silent=True) or {}
+    topics = data.get('topics') or []
+    if isinstance(topics, str):
+        topics = topics.splitlines()
+    return normalize_topics(topics), data.get('name', '')
@@ -5,19 +5,31 @@
 - 创建/获取/更新/删除历史记录 (CRUD)
 - 搜索历史记录
 - 获取统计信息
+- 列表和统计支持 ETag / 304（按索引数据版本号，轮询时未变化不重新查询）
 - 扫描和同步任务图片
-- 打包下载图片
+- 打包下载图片（流式 ZIP，支持批量）
 """
 
 import os
-import io
-import zipfile
 import logging
-from flask import Blueprint, request, jsonify, send_file
+import zlib
+from typing import Any, Callable, Dict, Iterator, List
+from urllib.parse import quote
+from flask import Blueprint, Response, request, jsonify, send_file, stream_with_context
+from backend.config import Config
 from backend.services.history import get_history_service
+from backend.utils.file_etag import versioned_image_url
+from backend.utils.zip_stream import ZipEntry, stream_zip
 
 logger = logging.getLogger(__name__)
 
+MAX_BULK_EXPORT = 200  # 批量下载一次最多的记录数
+ZIP_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "cache",
+    "exports"
+)
+
 
 def create_history_blueprint():
     """创建历史记录路由蓝图（工厂函数，支持多次调用）"""
@@ -90,29 +102,49 @@ def create_history_blueprint():
         """
         获取历史记录列表（分页）
 
+        支持两种分页方式：
+        - 页码分页（按创建时间倒序）：page + page_size
+        - 游标分页（按更新时间倒序）：带 cursor 参数时启用，第一页传空字符串，
+          之后传上一页返回的 next_cursor
+
+        支持 If-None-Match：记录没有任何变化时返回 304
+
         查询参数：
         - page: 页码（默认 1）
         - page_size: 每页数量（默认 20）
+        - cursor: 分页游标（可选）
         - status: 状态过滤（可选：all/completed/draft）
 
         返回：
         - success: 是否成功
-        - records: 记录列表
+        - records: 记录列表（附带 thumbnail_url：带版本号的封面 URL）
         - total: 总数
-        - total_pages: 总页数
+        - total_pages: 总页数（页码分页）
+        - next_cursor / has_more: 下一页游标 / 是否还有下一页（游标分页）
         """
         try:
-            page = int(request.args.get('page', 1))
             page_size = int(request.args.get('page_size', 20))
             status = request.args.get('status')
+            cursor = request.args.get('cursor')
 
             history_service = get_history_service()
-            result = history_service.list_records(page, page_size, status)
 
+            def build():
+                if cursor is not None:
+                    result = history_service.list_records_after(cursor, page_size, status)
+                else:
+                    page = int(request.args.get('page', 1))
+                    result = history_service.list_records(page, page_size, status)
+                _add_thumbnail_urls(result["records"], history_service.history_dir)
+                return result
+
+            return _versioned_json(history_service.get_version(), build)
+
+        except ValueError as e:
             return jsonify({
-                "success": True,
-                **result
-            }), 200
+                "success": False,
+                "error": f"参数错误：{str(e)}"
+            }), 400
 
         except Exception as e:
             error_msg = str(e)
@@ -131,7 +163,7 @@ def create_history_blueprint():
 
         返回：
         - success: 是否成功
-        - record: 完整的记录数据
+        - record: 完整的记录数据，另附 image_urls（文件名 -> 带版本号的图片 URL）
         """
         try:
             history_service = get_history_service()
@@ -143,9 +175,19 @@ def create_history_blueprint():
                     "error": f"历史记录不存在：{record_id}\n可能原因：记录已被删除或ID错误"
                 }), 404
 
+            task_id = (record.get("images") or {}).get("task_id")
+            image_urls = {}
+            if task_id:
+                task_dir = os.path.join(history_service.history_dir, task_id)
+                image_urls = {
+                    filename: versioned_image_url(task_id, filename, task_dir)
+                    for filename in record["images"].get("generated") or []
+                    if filename
+                }
+
             return jsonify({
                 "success": True,
-                "record": record
+                "record": {**record, "image_urls": image_urls}
             }), 200
 
         except Exception as e:
@@ -296,14 +338,18 @@ def create_history_blueprint():
     @history_bp.route('/history/search', methods=['GET'])
     def search_history():
         """
-        搜索历史记录
+        全文搜索历史记录（标题和大纲内容，按相关度排序）
 
         查询参数：
-        - keyword: 搜索关键词（必填）
+        - keyword: 搜索关键词（必填，多个关键词以空格分隔）
+        - page: 页码（默认 1）
+        - page_size: 每页数量（默认 20）
 
         返回：
         - success: 是否成功
-        - records: 匹配的记录列表
+        - records: 匹配的记录列表（含 title_highlight 高亮标题、snippet 高亮摘要）
+        - total: 命中总数
+        - total_pages: 总页数
         """
         try:
             keyword = request.args.get('keyword', '')
@@ -314,12 +360,16 @@ def create_history_blueprint():
                     "error": "参数错误：keyword 不能为空。\n请提供搜索关键词。"
                 }), 400
 
+            page = int(request.args.get('page', 1))
+            page_size = int(request.args.get('page_size', 20))
+
             history_service = get_history_service()
-            results = history_service.search_records(keyword)
+            result = history_service.search_records(keyword, page, page_size)
+            _add_thumbnail_urls(result["records"], history_service.history_dir)
 
             return jsonify({
                 "success": True,
-                "records": results
+                **result
             }), 200
 
         except Exception as e:
@@ -334,6 +384,8 @@ def create_history_blueprint():
         """
         获取历史记录统计信息
 
+        支持 If-None-Match：记录没有任何变化时返回 304
+
         返回：
         - success: 是否成功
         - total: 总记录数
@@ -341,12 +393,7 @@ def create_history_blueprint():
         """
         try:
             history_service = get_history_service()
-            stats = history_service.get_statistics()
-
-            return jsonify({
-                "success": True,
-                **stats
-            }), 200
+            return _versioned_json(history_service.get_version(), history_service.get_statistics)
 
         except Exception as e:
             error_msg = str(e)
@@ -390,16 +437,24 @@ def create_history_blueprint():
         """
         扫描所有任务并同步图片列表
 
+        只扫描自上次同步后有变化的任务目录（按目录 mtime 判断）
+
+        查询参数：
+        - force: 为 1 / true 时忽略上次同步状态，重新扫描所有任务
+
         返回：
         - success: 是否成功
-        - total_tasks: 扫描的任务总数
+        - total_tasks: 任务总数
+        - scanned: 本次实际扫描的任务数
+        - unchanged: 没有变化而跳过的任务数
         - synced: 成功同步的任务数
         - failed: 失败的任务数
         - orphan_tasks: 孤立任务列表（有图片但无记录）
         """
         try:
             history_service = get_history_service()
-            result = history_service.scan_all_tasks()
+            force = request.args.get('force', '').lower() in ('1', 'true')
+            result = history_service.scan_all_tasks(force=force)
 
             if not result.get("success"):
                 return jsonify(result), 500
@@ -452,20 +507,29 @@ def create_history_blueprint():
                     "error": f"任务目录不存在：{task_id}"
                 }), 404
 
-            # 创建内存中的 ZIP 文件
-            zip_buffer = _create_images_zip(task_dir)
-
             # 生成安全的下载文件名
             title = record.get('title', 'images')
             safe_title = _sanitize_filename(title)
             filename = f"{safe_title}.zip"
 
-            return send_file(
-                zip_buffer,
-                mimetype='application/zip',
-                as_attachment=True,
-                download_name=filename
-            )
+            entries = _collect_image_entries(task_dir)
+
+            if not Config.HISTORY_ZIP_CACHE:
+                return _zip_response(stream_zip(entries), filename)
+
+            # 预构建压缩包缓存：任务目录 mtime 变化（图片新增 / 替换）后自动失效
+            cache_path = _zip_cache_path(task_id, task_dir)
+            if os.path.exists(cache_path):
+                return send_file(
+                    cache_path,
+                    mimetype='application/zip',
+                    as_attachment=True,
+                    download_name=filename,
+                    conditional=True
+                )
+
+            _remove_stale_zip_cache(task_id, cache_path)
+            return _zip_response(stream_zip(entries, tee_path=cache_path), filename)
 
         except Exception as e:
             error_msg = str(e)
@@ -474,43 +538,185 @@ def create_history_blueprint():
                 "error": f"下载失败。\n错误详情: {error_msg}"
             }), 500
 
+    @history_bp.route('/history/download', methods=['POST'])
+    def download_history_bulk():
+        """
+        批量下载多条历史记录的图片为一个 ZIP 文件（流式输出）
+
+        请求体：
+        - record_ids: 记录 ID 列表（必填，最多 MAX_BULK_EXPORT 条）
+
+        每条记录的图片放在以标题命名的子目录中，没有图片的记录会被跳过。
+
+        返回：
+        - 成功：ZIP 文件下载
+        - 失败：JSON 错误信息
+        """
+        try:
+            data = request.get_json(silent=True) or {}
+            record_ids = data.get('record_ids')
+
+            if not isinstance(record_ids, list) or not record_ids:
+                return jsonify({
+                    "success": False,
+                    "error": "参数错误：record_ids 不能为空。\n请提供要下载的记录 ID 列表。"
+                }), 400
+
+            if len(record_ids) > MAX_BULK_EXPORT:
+                return jsonify({
+                    "success": False,
+                    "error": f"参数错误：一次最多下载 {MAX_BULK_EXPORT} 条记录。"
+                }), 400
+
+            history_service = get_history_service()
+            entries = []
+            used_names = set()
+
+            for record_id in dict.fromkeys(record_ids):
+                record = history_service.get_record(record_id)
+                task_id = (record or {}).get('images', {}).get('task_id')
+                if not task_id:
+                    continue
+
+                task_dir = os.path.join(history_service.history_dir, task_id)
+                if not os.path.isdir(task_dir):
+                    continue
+
+                # 同名标题追加序号，避免子目录冲突
+                folder = _sanitize_filename(record.get('title', 'images'))
+                name, suffix = folder, 2
+                while name in used_names:
+                    name = f"{folder}_{suffix}"
+                    suffix += 1
+                used_names.add(name)
+
+                entries.extend(_collect_image_entries(task_dir, prefix=f"{name}/"))
+
+            if not entries:
+                return jsonify({
+                    "success": False,
+                    "error": "所选记录都没有可下载的图片"
+                }), 404
+
+            return _zip_response(stream_zip(entries), 'images.zip')
+
+        except Exception as e:
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"批量下载失败。\n错误详情: {error_msg}"
+            }), 500
+
     return history_bp
 
 
-def _create_images_zip(task_dir: str) -> io.BytesIO:
+def _add_thumbnail_urls(records: List[Dict[str, Any]], history_dir: str) -> None:
+    """为记录摘要附加 thumbnail_url（带版本号的封面 URL，没有封面时为 None）"""
+    for record in records:
+        task_id, thumbnail = record.get("task_id"), record.get("thumbnail")
+        record["thumbnail_url"] = (
+            versioned_image_url(task_id, thumbnail, os.path.join(history_dir, task_id))
+            if task_id and thumbnail else None
+        )
+
+
+def _versioned_json(version: int, build: Callable[[], Dict[str, Any]]) -> Response:
     """
-    创建包含所有图片的 ZIP 文件
+    带 ETag 的 JSON 响应：ETag 由索引数据版本号和查询参数决定，
+    与 If-None-Match 匹配时直接返回 304，不执行查询
+
+    Args:
+        version: 索引数据版本号
+        build: 生成响应数据的函数
+
+    Returns:
+        Response
+    """
+    etag = f"v{version}-{zlib.crc32(request.query_string):08x}"
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = jsonify({"success": True, **build()})
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+
+def _collect_image_entries(task_dir: str, prefix: str = "") -> List[ZipEntry]:
+    """
+    收集任务目录中的页面图片（排除缩略图和衍生图目录），按页码排序
 
     Args:
         task_dir: 任务目录路径
+        prefix: 压缩包内的目录前缀
 
     Returns:
-        io.BytesIO: 内存中的 ZIP 文件
+        List[ZipEntry]: (文件路径, 压缩包内文件名) 列表
     """
-    memory_file = io.BytesIO()
+    pages = []
+    others = []
 
-    with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-        # 遍历任务目录中的所有图片（排除缩略图）
-        for filename in os.listdir(task_dir):
+    with os.scandir(task_dir) as it:
+        for entry in it:
+            filename = entry.name
             # 跳过缩略图文件
-            if filename.startswith('thumb_'):
+            if filename.startswith('thumb_') or not entry.is_file():
                 continue
 
             if filename.endswith(('.png', '.jpg', '.jpeg')):
-                file_path = os.path.join(task_dir, filename)
-
                 # 生成归档文件名（page_N.png 格式）
                 try:
                     index = int(filename.split('.')[0])
-                    archive_name = f"page_{index + 1}.png"
+                    pages.append((index, entry.path, f"{prefix}page_{index + 1}.png"))
                 except ValueError:
-                    archive_name = filename
+                    others.append((entry.path, f"{prefix}{filename}"))
+
+    pages.sort()
+    others.sort()
+    return [(path, arcname) for _, path, arcname in pages] + others
+
 
-                zf.write(file_path, archive_name)
+def _zip_cache_path(task_id: str, task_dir: str) -> str:
+    """预构建压缩包缓存路径：cache/exports/<task_id>-<任务目录 mtime>.zip"""
+    mtime_ns = os.stat(task_dir).st_mtime_ns
+    return os.path.join(ZIP_CACHE_DIR, f"{task_id}-{mtime_ns}.zip")
 
-    # 将指针移到开始位置
-    memory_file.seek(0)
-    return memory_file
+
+def _remove_stale_zip_cache(task_id: str, current_path: str) -> None:
+    """删除同一任务已失效的缓存压缩包"""
+    if not os.path.isdir(ZIP_CACHE_DIR):
+        return
+    for filename in os.listdir(ZIP_CACHE_DIR):
+        path = os.path.join(ZIP_CACHE_DIR, filename)
+        if filename.startswith(f"{task_id}-") and filename.endswith('.zip') and path != current_path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _zip_response(chunks: Iterator[bytes], filename: str) -> Response:
+    """
+    构建流式 ZIP 下载响应
+
+    Args:
+        chunks: ZIP 数据块
+        filename: 下载文件名（支持中文）
+
+    Returns:
+        Response
+    """
+    ascii_name = filename.encode('ascii', 'ignore').decode().strip() or 'images.zip'
+    if ascii_name.startswith('.'):
+        ascii_name = f"images{ascii_name}"
+    return Response(
+        stream_with_context(chunks),
+        mimetype='application/zip',
+        headers={
+            'Content-Disposition': f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}",
+            'X-Accel-Buffering': 'no',
+        }
+    )
 
 
 def _sanitize_filename(title: str) -> str:
@@ -2,7 +2,7 @@
 图片生成相关 API 路由
 
 包含功能：
-- 批量生成图片（SSE 流式返回）
+- 批量生成图片（SSE 流式返回，任务持久化到队列，支持断线重连）
 - 获取图片
 - 重试/重新生成单张图片
 - 批量重试失败图片
@@ -11,10 +11,18 @@
 
 import os
 import json
+import uuid
 import base64
 import logging
-from flask import Blueprint, request, jsonify, Response, send_file
+from flask import Blueprint, request, jsonify, Response
 from backend.services.image import get_image_service
+from backend.services.generation_queue import get_generation_queue
+from backend.utils.concurrency import get_all_limiter_stats
+from backend.utils.file_etag import get_file_etag
+from backend.utils.file_response import send_cached_file
+from backend.utils.http_transport import get_http_metrics
+from backend.utils.image_compressor import compress_image
+from backend.utils.image_renditions import RENDITION_SPECS, find_rendition, guess_image_mimetype
 from .utils import log_request, log_error
 
 logger = logging.getLogger(__name__)
@@ -31,6 +39,9 @@ def create_image_blueprint():
         """
         批量生成图片（SSE 流式返回）
 
+        任务写入持久化队列后由后台线程执行，浏览器断开不会中断生成。
+        同一 task_id 的任务仍在进行时重复提交，只会重新订阅事件流。
+
         请求体：
         - pages: 页面列表（必填）
         - task_id: 任务 ID
@@ -38,11 +49,15 @@ def create_image_blueprint():
         - user_topic: 用户原始输入主题
         - user_images: base64 编码的用户参考图片列表
 
+        请求头：
+        - Last-Event-ID: 重新连接时，从该事件之后开始补发
+
         返回：
-        SSE 事件流，包含以下事件类型：
-        - image: 单张图片生成完成
+        SSE 事件流（每个事件带 id），包含以下事件类型：
+        - progress: 生成进度
+        - complete: 单张图片生成完成
         - error: 生成错误
-        - complete: 全部完成
+        - finish: 全部完成
         """
         try:
             data = request.get_json()
@@ -68,32 +83,21 @@ def create_image_blueprint():
                     "error": "参数错误：pages 不能为空。\n请提供要生成的页面列表数据。"
                 }), 400
 
-            logger.info(f"🖼️  开始图片生成任务: {task_id}, 共 {len(pages)} 页")
-            image_service = get_image_service()
-
-            def generate():
-                """SSE 事件生成器"""
-                for event in image_service.generate_images(
-                    pages, task_id, full_outline,
-                    user_images=user_images if user_images else None,
-                    user_topic=user_topic
-                ):
-                    event_type = event["event"]
-                    event_data = event["data"]
+            if not task_id:
+                task_id = f"task_{uuid.uuid4().hex[:8]}"
 
-                    # 格式化为 SSE 格式
-                    yield f"event: {event_type}\n"
-                    yield f"data: {json.dumps(event_data, ensure_ascii=False)}\n\n"
+            logger.info(f"🖼️  开始图片生成任务: {task_id}, 共 {len(pages)} 页")
 
-            return Response(
-                generate(),
-                mimetype='text/event-stream',
-                headers={
-                    'Cache-Control': 'no-cache',
-                    'X-Accel-Buffering': 'no',
-                }
+            # 参考图先压缩再入库，避免队列中保存原始大图
+            queue = get_generation_queue()
+            queue.enqueue(
+                task_id, pages, full_outline,
+                user_images=[compress_image(img, max_size_kb=200) for img in user_images],
+                user_topic=user_topic
             )
 
+            return _event_stream_response(queue, task_id, _get_last_event_id())
+
         except Exception as e:
             log_error('/generate', e)
             error_msg = str(e)
@@ -102,6 +106,37 @@ def create_image_blueprint():
                 "error": f"图片生成异常。\n错误详情: {error_msg}\n建议：检查图片生成服务配置和后端日志"
             }), 500
 
+    @image_bp.route('/generate/<task_id>/events', methods=['GET'])
+    def generate_events(task_id):
+        """
+        重新订阅生成任务的事件流（断线重连）
+
+        路径参数：
+        - task_id: 任务 ID
+
+        请求头 / 查询参数：
+        - Last-Event-ID 或 last_event_id: 从该事件之后开始补发（默认从头开始）
+
+        返回：
+        SSE 事件流，格式与 /generate 相同
+        """
+        try:
+            queue = get_generation_queue()
+            if queue.get_job(task_id) is None:
+                return jsonify({
+                    "success": False,
+                    "error": f"任务不存在：{task_id}"
+                }), 404
+
+            return _event_stream_response(queue, task_id, _get_last_event_id())
+
+        except Exception as e:
+            log_error('/generate/events', e)
+            return jsonify({
+                "success": False,
+                "error": f"订阅任务事件失败。\n错误详情: {str(e)}"
+            }), 500
+
     # ==================== 图片获取 ====================
 
     @image_bp.route('/images/<task_id>/<filename>', methods=['GET'])
@@ -114,34 +149,58 @@ def create_image_blueprint():
         - filename: 文件名
 
         查询参数：
-        - thumbnail: 是否返回缩略图（默认 true）
+        - size: 返回规格 thumb / preview / full / original（优先于 thumbnail）
+        - thumbnail: 是否返回缩略图（默认 true，等价于 size=thumb；false 等价于 size=original）
+        - v: 版本号（原图的 ETag，生成结果和历史记录返回的 URL 自带），与当前原图一致时
+          原图和由其生成的衍生图返回 immutable 长期缓存
 
         返回：
-        - 成功：图片文件
+        - 成功：图片文件（衍生图尚未生成时返回原图），带 ETag，支持 304 和 Range
         - 失败：JSON 错误信息
         """
         try:
             logger.debug(f"获取图片: {task_id}/{filename}")
 
-            # 检查是否请求缩略图
-            thumbnail = request.args.get('thumbnail', 'true').lower() == 'true'
+            # 确定返回规格
+            size = request.args.get('size')
+            if size is None:
+                thumbnail = request.args.get('thumbnail', 'true').lower() == 'true'
+                size = 'thumb' if thumbnail else 'original'
+            version = request.args.get('v')
+            if size != 'original' and size not in RENDITION_SPECS:
+                return jsonify({
+                    "success": False,
+                    "error": f"不支持的图片规格：{size}，可选值：original / {' / '.join(RENDITION_SPECS)}"
+                }), 400
 
             # 构建 history 目录路径
             history_root = os.path.join(
                 os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
                 "history"
             )
-
-            if thumbnail:
-                # 尝试返回缩略图
-                thumb_filename = f"thumb_{filename}"
-                thumb_filepath = os.path.join(history_root, task_id, thumb_filename)
-
-                if os.path.exists(thumb_filepath):
-                    return send_file(thumb_filepath, mimetype='image/png')
-
-            # 返回原图
-            filepath = os.path.join(history_root, task_id, filename)
+            task_dir = os.path.join(history_root, task_id)
+            filepath = os.path.join(task_dir, filename)
+
+            if size != 'original':
+                # 优先返回衍生图（WebP / JPEG）
+                rendition = find_rendition(task_dir, filename, size)
+                if rendition:
+                    rendition_path, mimetype = rendition
+                    return send_cached_file(
+                        rendition_path, mimetype=mimetype,
+                        immutable=_is_current_derivative(filepath, rendition_path, version)
+                    )
+
+                # 兼容旧任务的 thumb_ 缩略图（内容为 JPEG）
+                if size == 'thumb':
+                    thumb_filepath = os.path.join(task_dir, f"thumb_{filename}")
+                    if os.path.exists(thumb_filepath):
+                        return send_cached_file(
+                            thumb_filepath, mimetype=guess_image_mimetype(thumb_filepath),
+                            immutable=_is_current_derivative(filepath, thumb_filepath, version)
+                        )
+
+            # 返回原图（衍生图尚未生成时同样返回原图，此时不是请求的规格，不长期缓存）
 
             if not os.path.exists(filepath):
                 return jsonify({
@@ -149,7 +208,10 @@ def create_image_blueprint():
                     "error": f"图片不存在：{task_id}/{filename}"
                 }), 404
 
-            return send_file(filepath, mimetype='image/png')
+            return send_cached_file(
+                filepath, mimetype=guess_image_mimetype(filepath),
+                version=version if size == 'original' else None
+            )
 
         except Exception as e:
             log_error('/images', e)
@@ -345,11 +407,16 @@ def create_image_blueprint():
           - generated: 已生成的图片
           - failed: 失败的图片
           - has_cover: 是否有封面图
+          - progress: 任务进度（total / completed / failed / status）
         """
         try:
             image_service = get_image_service()
             state = image_service.get_task_state(task_id)
 
+            # 内存中没有（如服务重启后），从持久化队列读取
+            if state is None:
+                state = get_generation_queue().get_task_state(task_id)
+
             if state is None:
                 return jsonify({
                     "success": False,
@@ -360,7 +427,8 @@ def create_image_blueprint():
             safe_state = {
                 "generated": state.get("generated", {}),
                 "failed": state.get("failed", {}),
-                "has_cover": state.get("cover_image") is not None
+                "has_cover": state.get("cover_image") is not None,
+                "progress": state.get("progress", {})
             }
 
             return jsonify({
@@ -391,11 +459,80 @@ def create_image_blueprint():
             "message": "服务正常运行"
         }), 200
 
+    @image_bp.route('/health/metrics', methods=['GET'])
+    def health_metrics():
+        """
+        运行指标接口
+
+        返回：
+        - http: 按主机统计的对外 HTTP 指标（新建 / 复用连接数、字节数、耗时）
+        - limiters: 各服务商的自适应并发限制器和熔断器状态
+        - image_routes: 图片服务商池的路由统计（请求数、错误率、延迟）
+        """
+        try:
+            image_routes = get_image_service().router.get_stats()
+        except Exception as e:
+            logger.warning(f"获取图片服务商路由统计失败: {e}")
+            image_routes = {}
+
+        return jsonify({
+            "success": True,
+            "http": get_http_metrics(),
+            "limiters": get_all_limiter_stats(),
+            "image_routes": image_routes
+        }), 200
+
     return image_bp
 
 
 # ==================== 辅助函数 ====================
 
+def _get_last_event_id() -> int:
+    """从请求头 Last-Event-ID 或查询参数 last_event_id 中读取断点事件 ID"""
+    value = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        return int(value) if value else 0
+    except ValueError:
+        return 0
+
+
+def _event_stream_response(queue, task_id: str, after_id: int = 0) -> Response:
+    """
+    将队列中的任务事件转换为 SSE 响应
+
+    Args:
+        queue: GenerationQueue 实例
+        task_id: 任务 ID
+        after_id: 从该事件 ID 之后开始发送
+
+    Returns:
+        Response: text/event-stream 响应
+    """
+    def generate():
+        """SSE 事件生成器"""
+        for item in queue.iter_events(task_id, after_id):
+            if item is None:
+                # 心跳，防止代理断开空闲连接
+                yield ": keep-alive\n\n"
+                continue
+
+            event_id, event_type, event_data = item
+
+            # 格式化为 SSE 格式（id 放在 data 之后，兼容前端按行解析）
+            yield f"event: {event_type}\n"
+            yield f"data: {json.dumps(event_data, ensure_ascii=False)}\n"
+            yield f"id: {event_id}\n\n"
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        }
+    )
+
+
 def _parse_base64_images(images_base64: list) -> list:
     """
     解析 base64 编码的图片列表
@@ -417,3 +554,19 @@ def _parse_base64_images(images_base64: list) -> list:
         images.append(base64.b64decode(img_b64))
 
     return images
+
+
+def _is_current_derivative(original_path: str, derivative_path: str, version) -> bool:
+    """
+    衍生图是否可以按版本号长期缓存：v 等于当前原图的 ETag，且衍生图不早于原图生成
+    （原图被重新生成后、新衍生图写入前，旧衍生图不能缓存在新版本的 URL 下）
+    """
+    if not version:
+        return False
+    try:
+        return (
+            version == get_file_etag(original_path)
+            and os.stat(derivative_path).st_mtime_ns >= os.stat(original_path).st_mtime_ns
+        )
+    except OSError:
+        return False
@@ -3,12 +3,14 @@
 
 包含功能：
 - 生成大纲（支持图片上传）
+- 流式生成大纲（SSE 逐字返回）
 """
 
 import time
+import json
 import base64
 import logging
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
 from backend.services.outline import get_outline_service
 from .utils import log_request, log_error
 
@@ -76,6 +78,50 @@ def create_outline_blueprint():
                 "error": f"大纲生成异常。\n错误详情: {error_msg}\n建议：检查后端日志获取更多信息"
             }), 500
 
+    @outline_bp.route('/outline/stream', methods=['POST'])
+    def generate_outline_stream():
+        """
+        流式生成大纲（SSE），请求格式与 /outline 相同
+
+        返回：
+        SSE 事件流：
+        - delta: 增量文本 {text}
+        - page: 新完成的一页 {page}
+        - complete: 与 /outline 的返回相同 {success, outline, pages, has_images}
+        - error: {success: false, error}
+        """
+        try:
+            topic, images = _parse_outline_request()
+
+            log_request('/outline/stream', {'topic': topic, 'images': images})
+
+            if not topic:
+                logger.warning("大纲生成请求缺少 topic 参数")
+                return jsonify({
+                    "success": False,
+                    "error": "参数错误：topic 不能为空。\n请提供要生成图文的主题内容。"
+                }), 400
+
+            logger.info(f"🔄 开始流式生成大纲，主题: {topic[:50]}...")
+            outline_service = get_outline_service()
+
+            def generate():
+                for event in outline_service.generate_outline_stream(topic, images if images else None):
+                    yield f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+
+            return Response(generate(), mimetype='text/event-stream', headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            })
+
+        except Exception as e:
+            log_error('/outline/stream', e)
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"大纲生成异常。\n错误详情: {error_msg}\n建议：检查后端日志获取更多信息"
+            }), 500
+
     return outline_bp
 
 
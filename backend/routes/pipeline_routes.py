@@ -0,0 +1,67 @@
+"""
+图文生成流水线相关 API 路由
+
+包含功能：
+- 一次请求完成大纲、标题文案和图片生成（SSE 流式返回）
+"""
+
+import json
+import logging
+from flask import Blueprint, Response, jsonify
+from backend.services.pipeline import GenerationPipeline
+from .outline_routes import _parse_outline_request
+from .utils import log_request, log_error
+
+logger = logging.getLogger(__name__)
+
+
+def create_pipeline_blueprint():
+    """创建生成流水线路由蓝图（工厂函数，支持多次调用）"""
+    pipeline_bp = Blueprint('pipeline', __name__)
+
+    @pipeline_bp.route('/pipeline', methods=['POST'])
+    def run_pipeline():
+        """
+        服务端生成流水线（SSE 流式返回）
+
+        大纲流式生成并增量解析，封面页文本完整后立即开始生成封面；
+        大纲完成后并发生成标题文案和其余页面。结果写入历史记录。
+
+        请求格式与 /outline 相同：
+        1. multipart/form-data：topic + images 文件列表
+        2. application/json：topic + images（base64 数组，可选）
+
+        返回：
+        SSE 事件流：progress / outline_page / outline / content / complete / error / finish
+        """
+        try:
+            topic, images = _parse_outline_request()
+
+            log_request('/pipeline', {'topic': topic, 'images': images})
+
+            if not topic:
+                return jsonify({
+                    "success": False,
+                    "error": "参数错误：topic 不能为空。\n请提供要生成图文的主题内容。"
+                }), 400
+
+            pipeline = GenerationPipeline(topic, images)
+            logger.info(f"🔄 开始生成流水线: {pipeline.task_id}, 主题: {topic[:50]}...")
+
+            def generate():
+                for event in pipeline.run():
+                    yield f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+
+            return Response(generate(), mimetype='text/event-stream', headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            })
+
+        except Exception as e:
+            log_error('/pipeline', e)
+            return jsonify({
+                "success": False,
+                "error": f"生成流水线异常。\n错误详情: {str(e)}\n建议：检查后端日志获取更多信息"
+            }), 500
+
+    return pipeline_bp
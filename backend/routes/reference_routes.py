@@ -11,6 +11,7 @@
 """
 
 import logging
+import os
 from flask import Blueprint, request, jsonify, Response
 from backend.config import Config
 from backend.services.feishu_service import get_feishu_service
@@ -776,18 +777,20 @@ def create_reference_blueprint():
 
     @reference_bp.route('/reference-images/<record_id>/<filename>', methods=['GET'])
     def serve_reference_image(record_id: str, filename: str):
-        """提供已下载的参考图片"""
+        """提供已下载的参考图片（下载后内容不再变化，返回 immutable 长期缓存）"""
         try:
             from backend.config import Config
-            from flask import send_from_directory
+            from werkzeug.security import safe_join
+            from backend.utils.file_response import send_cached_file
+            from backend.utils.image_renditions import guess_image_mimetype
 
             storage_path = Config.get_reference_images_path()
-            record_dir = storage_path / record_id
+            filepath = safe_join(str(storage_path), record_id, filename)
 
-            if not record_dir.exists():
+            if filepath is None or not os.path.isfile(filepath):
                 return jsonify({"error": "图片不存在"}), 404
 
-            return send_from_directory(str(record_dir), filename)
+            return send_cached_file(filepath, mimetype=guess_image_mimetype(filepath), immutable=True)
 
         except Exception as e:
             logger.error(f"提供图片失败: {e}")
@@ -889,6 +889,7 @@ class AnalysisService:
         Yields:
             Dict with event type and data:
             - {"event": "progress", "data": {...}}
+            - {"event": "delta", "data": {"record_id": ..., "text": ...}}  (incremental AI output)
             - {"event": "complete", "data": {...}}
             - {"event": "error", "data": {...}}
             - {"event": "finish", "data": {...}}
@@ -932,11 +933,19 @@ class AnalysisService:
             print(f"[ANALYSIS] 正在调用 AI API...")
             logger.info(f"[ANALYSIS_SERVICE] Calling AI text generation API")
 
-            analysis_response = text_client.generate_text(
+            # Stream tokens to the client as they arrive
+            chunks = []
+            for delta in text_client.generate_text_stream(
                 prompt=prompt,
                 temperature=0.7,  # Lower temp for more structured analysis
                 max_output_tokens=8000
-            )
+            ):
+                chunks.append(delta)
+                yield {
+                    "event": "delta",
+                    "data": {"record_id": record_id, "text": delta}
+                }
+            analysis_response = "".join(chunks)
 
             print(f"[ANALYSIS] AI 分析完成，返回内容长度: {len(analysis_response)} 字符")
             logger.info(f"[ANALYSIS_SERVICE] AI analysis completed, response length: {len(analysis_response)} chars")
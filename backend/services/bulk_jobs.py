@@ -0,0 +1,576 @@
+"""
+批量图文生成任务
+
+一次提交多个主题（列表或 CSV），每个主题依次执行：
+大纲（OutlineService）→ 标题文案（ContentService）→ 图片（ImageService），
+并写入独立的历史记录。
+
+- 调度：固定数量的工作线程从所有批量任务中领取主题；优先选择进行中主题最少、
+  最久未被调度的任务（轮转），一个几百条的大任务不会饿死后提交的小任务
+- 并发：服务商级的并发上限由 AIMD 限制器统一控制（与页面上的生成请求共享）
+- 持久化：任务与主题状态保存在 history/bulk_jobs.db（WAL 模式），
+  进程重启后执行中的主题重新排队，已生成大纲的主题沿用原历史记录继续生成
+- 租约：执行中的主题持有租约（owner + lease_expires，心跳续约），只有租约过期的主题才会被重新领取，
+  多个进程打开同一个数据库时不会重复执行仍在进行中的主题
+"""
+
+import csv
+import io
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from backend.utils.worker_lease import (
+    LEASE_SECONDS,
+    LeaseHeartbeat,
+    LeaseLostError,
+    ensure_lease_columns,
+    make_owner_id,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class BulkItemStatus:
+    """批量任务中单个主题的状态常量"""
+    QUEUED = "queued"        # 排队中
+    RUNNING = "running"      # 生成中
+    DONE = "done"            # 已完成（可能有部分图片失败）
+    FAILED = "failed"        # 失败
+    CANCELLED = "cancelled"  # 已取消
+
+
+class BulkJobStatus:
+    """批量任务状态常量（由主题状态汇总得出）"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    PARTIAL = "partial"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bulk_jobs (
+    job_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    cancelled INTEGER NOT NULL DEFAULT 0,
+    last_dispatched_at REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS bulk_items (
+    job_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    topic TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    record_id TEXT,
+    task_id TEXT,
+    images_total INTEGER NOT NULL DEFAULT 0,
+    images_done INTEGER NOT NULL DEFAULT 0,
+    images_failed INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    owner TEXT,
+    lease_expires REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_bulk_items_status ON bulk_items(status, job_id);
+"""
+
+
+def parse_topics_csv(text: str) -> List[str]:
+    """
+    从 CSV 文本中解析主题列表
+
+    有 topic / 主题 表头时取该列，否则取第一列；空行和重复主题会被忽略。
+
+    Args:
+        text: CSV 文本
+
+    Returns:
+        List[str]: 主题列表
+    """
+    rows = [row for row in csv.reader(io.StringIO(text.lstrip("﻿"))) if row]
+    if not rows:
+        return []
+
+    column = 0
+    header = [cell.strip().lower() for cell in rows[0]]
+    for name in ("topic", "主题"):
+        if name in header:
+            column = header.index(name)
+            rows = rows[1:]
+            break
+
+    return normalize_topics(row[column] if column < len(row) else "" for row in rows)
+
+
+def normalize_topics(topics) -> List[str]:
+    """去除首尾空白、空主题和重复主题（保持原顺序）"""
+    return list(dict.fromkeys(
+        topic.strip() for topic in topics if isinstance(topic, str) and topic.strip()
+    ))
+
+
+class BulkJobManager:
+    """批量图文生成任务管理器"""
+
+    WORKER_COUNT = 4  # 同时处理的主题数（服务商级并发由限制器另行控制）
+    POLL_INTERVAL = 1.0  # 工作线程空闲时的轮询间隔（秒）
+    MAX_TOPICS = 1000  # 单个批量任务的最大主题数
+    MAX_ATTEMPTS = 3  # 主题因进程重启被中断后的最大执行次数
+
+    def __init__(self, db_path: str = None, worker_count: int = None):
+        """
+        Args:
+            db_path: 数据库路径（默认 history/bulk_jobs.db）
+            worker_count: 工作线程数
+        """
+        if db_path is None:
+            history_dir = os.path.join(
+                os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                "history"
+            )
+            os.makedirs(history_dir, exist_ok=True)
+            db_path = os.path.join(history_dir, "bulk_jobs.db")
+
+        self.db_path = db_path
+        self.worker_count = worker_count or self.WORKER_COUNT
+        self.owner = make_owner_id()
+        self.lease_seconds = LEASE_SECONDS
+
+        self._local = threading.local()
+        self._cond = threading.Condition()
+        self._workers: List[threading.Thread] = []
+        self._heartbeat = LeaseHeartbeat("bulk-lease", self._renew_leases)
+        self._started = False
+        self._stopping = False
+
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            ensure_lease_columns(conn, "bulk_items")
+
+    # ==================== 数据库 ====================
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _notify(self) -> None:
+        with self._cond:
+            self._cond.notify_all()
+
+    def _update_item(self, job_id: str, position: int, **fields) -> None:
+        """
+        更新本实例持有的主题
+
+        Raises:
+            LeaseLostError: 主题租约已被其他进程接管（不再修改）
+        """
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        conn = self._connect()
+        cursor = conn.execute(
+            f"UPDATE bulk_items SET {assignments} WHERE job_id = ? AND position = ? AND owner = ?",
+            (*fields.values(), job_id, position, self.owner)
+        )
+        if not cursor.rowcount:
+            raise LeaseLostError(f"主题租约已被其他进程接管: {job_id}#{position}")
+        conn.execute("UPDATE bulk_jobs SET updated_at = ? WHERE job_id = ?", (fields["updated_at"], job_id))
+
+    # ==================== 提交与查询 ====================
+
+    def create_job(self, topics: List[str], name: str = "") -> str:
+        """
+        提交批量任务
+
+        Args:
+            topics: 主题列表（已去重、去空）
+            name: 任务名称（可选）
+
+        Returns:
+            str: 批量任务 ID
+
+        Raises:
+            ValueError: 主题为空或超过 MAX_TOPICS
+        """
+        if not topics:
+            raise ValueError("主题列表不能为空")
+        if len(topics) > self.MAX_TOPICS:
+            raise ValueError(f"单个批量任务最多 {self.MAX_TOPICS} 个主题，当前 {len(topics)} 个")
+
+        job_id = f"bulk_{uuid.uuid4().hex[:12]}"
+        now = time.time()
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO bulk_jobs (job_id, name, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (job_id, name or topics[0][:50], now, now)
+            )
+            conn.executemany(
+                "INSERT INTO bulk_items (job_id, position, topic, status, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(job_id, i, topic, BulkItemStatus.QUEUED, now) for i, topic in enumerate(topics)]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        logger.info(f"[批量任务] 已提交: {job_id}, {len(topics)} 个主题")
+        self._notify()
+        return job_id
+
+    def cancel_job(self, job_id: str) -> bool:
+        """
+        取消批量任务：排队中的主题不再执行，生成中的主题会执行完当前主题
+
+        Returns:
+            bool: 任务是否存在
+        """
+        conn = self._connect()
+        now = time.time()
+        cursor = conn.execute(
+            "UPDATE bulk_jobs SET cancelled = 1, updated_at = ? WHERE job_id = ?", (now, job_id)
+        )
+        if not cursor.rowcount:
+            return False
+        conn.execute(
+            "UPDATE bulk_items SET status = ?, updated_at = ? WHERE job_id = ? AND status = ?",
+            (BulkItemStatus.CANCELLED, now, job_id, BulkItemStatus.QUEUED)
+        )
+        logger.info(f"[批量任务] 已取消: {job_id}")
+        return True
+
+    @staticmethod
+    def _summarize(job: sqlite3.Row, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """汇总主题状态，得出任务状态和整体进度"""
+        counts = {status: 0 for status in (
+            BulkItemStatus.QUEUED, BulkItemStatus.RUNNING, BulkItemStatus.DONE,
+            BulkItemStatus.FAILED, BulkItemStatus.CANCELLED
+        )}
+        for item in items:
+            counts[item["status"]] = counts.get(item["status"], 0) + 1
+
+        if counts[BulkItemStatus.RUNNING] or (counts[BulkItemStatus.QUEUED] and
+                                              counts[BulkItemStatus.QUEUED] < len(items)):
+            status = BulkJobStatus.RUNNING
+        elif counts[BulkItemStatus.QUEUED]:
+            status = BulkJobStatus.QUEUED
+        elif job["cancelled"]:
+            status = BulkJobStatus.CANCELLED
+        elif counts[BulkItemStatus.FAILED] == len(items):
+            status = BulkJobStatus.FAILED
+        elif counts[BulkItemStatus.FAILED]:
+            status = BulkJobStatus.PARTIAL
+        else:
+            status = BulkJobStatus.COMPLETED
+
+        finished = counts[BulkItemStatus.DONE] + counts[BulkItemStatus.FAILED] + counts[BulkItemStatus.CANCELLED]
+        return {
+            "job_id": job["job_id"],
+            "name": job["name"],
+            "status": status,
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"],
+            "progress": {
+                "total": len(items),
+                "finished": finished,
+                "percent": round(finished * 100 / len(items), 1) if items else 100.0,
+                **counts,
+                "images_total": sum(item["images_total"] for item in items),
+                "images_done": sum(item["images_done"] for item in items),
+                "images_failed": sum(item["images_failed"] for item in items),
+            },
+        }
+
+    def get_job(self, job_id: str, include_items: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        获取批量任务状态与整体进度
+
+        Args:
+            job_id: 批量任务 ID
+            include_items: 是否返回每个主题的详情
+
+        Returns:
+            Optional[Dict]: 任务信息，不存在时返回 None
+        """
+        conn = self._connect()
+        job = conn.execute("SELECT * FROM bulk_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if job is None:
+            return None
+
+        items = [dict(row) for row in conn.execute(
+            "SELECT position, topic, status, stage, record_id, task_id, images_total, images_done, "
+            "images_failed, error, updated_at FROM bulk_items WHERE job_id = ? ORDER BY position",
+            (job_id,)
+        ).fetchall()]
+
+        result = self._summarize(job, items)
+        if include_items:
+            result["items"] = items
+        return result
+
+    def list_jobs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        获取最近的批量任务列表（不含主题详情）
+
+        Args:
+            limit: 最多返回的任务数
+        """
+        rows = self._connect().execute(
+            "SELECT job_id FROM bulk_jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [job for job in (self.get_job(row["job_id"], include_items=False) for row in rows) if job]
+
+    # ==================== 工作线程 ====================
+
+    def start(self) -> None:
+        """启动工作线程和租约心跳（重复调用无副作用）"""
+        with self._cond:
+            if self._started:
+                return
+            self._started = True
+
+        # 执行中的主题不在这里重置：租约过期的由 _claim_next 重新领取，
+        # 租约仍有效的说明另一个进程还在执行
+        interrupted = self._connect().execute(
+            "SELECT COUNT(*) FROM bulk_items WHERE status = ? AND (lease_expires IS NULL OR lease_expires < ?)",
+            (BulkItemStatus.RUNNING, time.time())
+        ).fetchone()[0]
+        if interrupted:
+            logger.info(f"[批量任务] {interrupted} 个被中断的主题租约已过期，将重新执行")
+
+        self._heartbeat.start()
+
+        for i in range(self.worker_count):
+            worker = threading.Thread(target=self._worker_loop, name=f"bulk-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+        logger.info(f"[批量任务] 已启动 {self.worker_count} 个工作线程: {self.db_path}")
+
+    def stop(self) -> None:
+        """通知工作线程退出（进行中的主题在租约过期后由其他进程或下次启动恢复）"""
+        self._stopping = True
+        self._heartbeat.stop()
+        self._notify()
+
+    def _renew_leases(self) -> int:
+        """为本实例执行中的主题续约"""
+        return self._connect().execute(
+            "UPDATE bulk_items SET lease_expires = ? WHERE owner = ? AND status = ?",
+            (time.time() + self.lease_seconds, self.owner, BulkItemStatus.RUNNING)
+        ).rowcount
+
+    def _claim_next(self) -> Optional[Dict[str, Any]]:
+        """
+        公平领取下一个主题（排队中，或租约已过期的执行中主题）
+
+        优先选择进行中主题最少的任务，相同时选择最久未被调度的任务，
+        同一任务内按提交顺序执行。
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute(
+                """
+                SELECT i.job_id, i.position, i.topic, i.record_id, i.task_id, i.attempts
+                FROM bulk_items i JOIN bulk_jobs j ON j.job_id = i.job_id
+                WHERE (i.status = ? OR (i.status = ? AND (i.lease_expires IS NULL OR i.lease_expires < ?)))
+                    AND j.cancelled = 0
+                ORDER BY
+                    (SELECT COUNT(*) FROM bulk_items r WHERE r.job_id = i.job_id AND r.status = ?),
+                    j.last_dispatched_at,
+                    i.position
+                LIMIT 1
+                """,
+                (BulkItemStatus.QUEUED, BulkItemStatus.RUNNING, now, BulkItemStatus.RUNNING)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE bulk_items SET status = ?, attempts = attempts + 1, owner = ?, lease_expires = ?, "
+                    "updated_at = ? WHERE job_id = ? AND position = ?",
+                    (BulkItemStatus.RUNNING, self.owner, now + self.lease_seconds, now,
+                     row["job_id"], row["position"])
+                )
+                conn.execute(
+                    "UPDATE bulk_jobs SET last_dispatched_at = ?, updated_at = ? WHERE job_id = ?",
+                    (now, now, row["job_id"])
+                )
+            conn.execute("COMMIT")
+            return dict(row) if row is not None else None
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _worker_loop(self) -> None:
+        while not self._stopping:
+            try:
+                item = self._claim_next()
+            except Exception as e:
+                logger.error(f"[批量任务] 领取主题失败: {e}")
+                item = None
+
+            if item is None:
+                with self._cond:
+                    self._cond.wait(self.POLL_INTERVAL)
+                continue
+
+            job_id, position = item["job_id"], item["position"]
+            try:
+                if item["attempts"] + 1 > self.MAX_ATTEMPTS:
+                    self._update_item(
+                        job_id, position, status=BulkItemStatus.FAILED,
+                        error=f"主题被中断次数过多（{self.MAX_ATTEMPTS} 次），已停止自动恢复"
+                    )
+                    continue
+
+                try:
+                    self._run_item(item)
+                except LeaseLostError:
+                    raise
+                except Exception as e:
+                    logger.error(f"[批量任务] 主题执行失败: {job_id}#{position}, {e}", exc_info=True)
+                    self._update_item(job_id, position, status=BulkItemStatus.FAILED, error=str(e))
+            except LeaseLostError as e:
+                logger.warning(f"[批量任务] 停止执行: {e}")
+
+    # ==================== 单个主题 ====================
+
+    def _run_item(self, item: Dict[str, Any]) -> None:
+        """执行单个主题：大纲 → 标题文案 → 图片，结果写入历史记录"""
+        from backend.services.content import get_content_service
+        from backend.services.history import RecordStatus, get_history_service
+        from backend.services.image import get_image_service
+        from backend.services.outline import get_outline_service
+
+        job_id, position, topic = item["job_id"], item["position"], item["topic"]
+        history_service = get_history_service()
+        logger.info(f"[批量任务] 开始主题: {job_id}#{position} {topic[:50]}")
+
+        # 进程重启后恢复：已有历史记录时沿用其中的大纲
+        record = history_service.get_record(item["record_id"]) if item["record_id"] else None
+        if record and record.get("outline", {}).get("pages"):
+            outline_text = record["outline"].get("raw", "")
+            pages = record["outline"]["pages"]
+            record_id, task_id = record["id"], item["task_id"]
+        else:
+            self._update_item(job_id, position, stage="outline")
+            outline = get_outline_service().generate_outline(topic)
+            if not outline.get("success"):
+                self._update_item(job_id, position, status=BulkItemStatus.FAILED, error=outline.get("error"))
+                return
+
+            outline_text, pages = outline["outline"], outline["pages"]
+            task_id = f"task_{uuid.uuid4().hex[:8]}"
+            record_id = history_service.create_record(
+                topic, {"raw": outline_text, "pages": pages}, task_id
+            )
+            self._update_item(job_id, position, record_id=record_id, task_id=task_id, images_total=len(pages))
+
+        # 标题、文案、标签（失败不影响图片生成）
+        if not (record or {}).get("content"):
+            self._update_item(job_id, position, stage="content")
+            content = get_content_service().generate_content(topic, outline_text)
+            if content.get("success"):
+                history_service.update_record(record_id, content={
+                    "titles": content["titles"],
+                    "copywriting": content["copywriting"],
+                    "tags": content["tags"],
+                })
+            else:
+                logger.warning(f"[批量任务] 文案生成失败: {job_id}#{position}, {content.get('error')}")
+
+        # 图片
+        self._update_item(job_id, position, stage="images")
+        history_service.update_record(
+            record_id, images={"task_id": task_id, "generated": []}, status=RecordStatus.GENERATING
+        )
+
+        image_service = get_image_service()
+        task_dir = os.path.join(history_service.history_dir, task_id)
+        done_indices = [
+            page["index"] for page in pages
+            if os.path.exists(os.path.join(task_dir, f"{page['index']}.png"))
+        ]
+
+        finish = None
+        completed = len(done_indices)
+        failed = 0
+        for event in image_service.generate_images(
+            pages, task_id, outline_text, user_topic=topic, skip_indices=done_indices
+        ):
+            if event["event"] == "complete" and "index" in event["data"]:
+                completed += 1
+                self._update_item(job_id, position, images_done=completed)
+            elif event["event"] == "error" and "index" in event["data"]:
+                failed += 1
+                self._update_item(job_id, position, images_failed=failed)
+            elif event["event"] == "finish":
+                finish = event["data"]
+
+        generated = sorted(
+            (f"{page['index']}.png" for page in pages
+             if os.path.exists(os.path.join(task_dir, f"{page['index']}.png"))),
+            key=lambda name: int(name.split(".")[0])
+        )
+        if not generated:
+            record_status = RecordStatus.ERROR
+        elif finish and finish.get("failed"):
+            record_status = RecordStatus.PARTIAL
+        else:
+            record_status = RecordStatus.COMPLETED
+
+        images = {"task_id": task_id, "generated": generated}
+        if finish and finish.get("providers"):
+            images["providers"] = finish["providers"]
+        history_service.update_record(
+            record_id,
+            images=images,
+            status=record_status,
+            thumbnail=generated[0] if generated else None
+        )
+
+        if generated:
+            self._update_item(
+                job_id, position, status=BulkItemStatus.DONE, stage=None,
+                images_done=len(generated), images_failed=len(pages) - len(generated), error=None
+            )
+            logger.info(f"[批量任务] 主题完成: {job_id}#{position}, 图片 {len(generated)}/{len(pages)}")
+        else:
+            self._update_item(
+                job_id, position, status=BulkItemStatus.FAILED,
+                images_done=0, images_failed=len(pages), error="所有图片生成失败"
+            )
+
+
+_manager_instance = None
+_manager_lock = threading.Lock()
+
+
+def get_bulk_job_manager() -> BulkJobManager:
+    """获取全局批量任务管理器（首次调用时恢复中断的主题并启动工作线程）"""
+    global _manager_instance
+    with _manager_lock:
+        if _manager_instance is None:
+            _manager_instance = BulkJobManager()
+            _manager_instance.start()
+        return _manager_instance
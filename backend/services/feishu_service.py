@@ -17,8 +17,7 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
-import requests
-
+from backend.utils.http_transport import http_get, http_post
 from backend.models.reference_models import (
     BloggerInfo,
     NoteMetrics,
@@ -247,7 +246,7 @@ class FeishuService:
 
         try:
             logger.info("Refreshing user access token...")
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
+            response = http_post(url, json=payload, headers=headers, timeout=10)
             response.raise_for_status()
             result = response.json()
 
@@ -346,7 +345,7 @@ class FeishuService:
                 }
 
                 logger.debug(f"Downloading image from: {url}")
-                response = requests.get(url, headers=headers, timeout=30, stream=True)
+                response = http_get(url, headers=headers, timeout=30, stream=True)
 
                 # Check for token expiration error in JSON response
                 content_type = response.headers.get("Content-Type", "")
@@ -472,7 +471,7 @@ class FeishuService:
 
         try:
             logger.debug("Fetching new tenant access token from Feishu...")
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
+            response = http_post(url, json=payload, headers=headers, timeout=10)
             response.raise_for_status()
             result = response.json()
 
@@ -560,7 +559,7 @@ class FeishuService:
         }
 
         try:
-            response = requests.get(url, headers=headers, timeout=10)
+            response = http_get(url, headers=headers, timeout=10)
             response.raise_for_status()
             result = response.json()
 
@@ -641,7 +640,7 @@ class FeishuService:
             }
 
             try:
-                response = requests.get(url, headers=headers, params=params, timeout=10)
+                response = http_get(url, headers=headers, params=params, timeout=10)
                 response.raise_for_status()
                 result = response.json()
 
@@ -710,7 +709,7 @@ class FeishuService:
             }
 
             try:
-                response = requests.post(url, headers=headers, params=params, json=payload, timeout=30)
+                response = http_post(url, headers=headers, params=params, json=payload, timeout=30)
                 response.raise_for_status()
                 result = response.json()
 
@@ -0,0 +1,600 @@
+"""
+持久化图片生成队列
+
+/api/generate 不再在 SSE 生成器里直接执行生成，而是把任务写入 SQLite，
+由后台工作线程消费。每个进度事件都会带自增 ID 落库，因此：
+- 浏览器断开连接后生成继续进行，重新连接时通过 Last-Event-ID 补发遗漏的事件
+- 进程重启后，未完成的任务重新入队，已生成的页面不会重复调用服务商
+- 执行中的任务持有租约（owner + lease_expires，心跳续约）：只有租约过期的任务才会被重新领取，
+  多个进程打开同一个队列时不会重复执行仍在进行中的任务
+
+数据库文件：history/generation_queue.db（WAL 模式）
+"""
+
+import base64
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Generator, List, Optional, Tuple
+
+from backend.utils.worker_lease import (
+    LEASE_SECONDS,
+    LeaseHeartbeat,
+    LeaseLostError,
+    ensure_lease_columns,
+    make_owner_id,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class QueueJobStatus:
+    """队列任务状态常量"""
+    QUEUED = "queued"      # 排队中
+    RUNNING = "running"    # 生成中
+    FINISHED = "finished"  # 已结束（finish 事件已写入）
+    FAILED = "failed"      # 执行异常
+
+
+class PageStatus:
+    """页面状态常量"""
+    PENDING = "pending"
+    DONE = "done"
+    ERROR = "error"
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    task_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    owner TEXT,
+    lease_expires REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at);
+
+CREATE TABLE IF NOT EXISTS pages (
+    task_id TEXT NOT NULL,
+    page_index INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    filename TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (task_id, page_index)
+);
+
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT NOT NULL,
+    event TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_task ON events(task_id, id);
+"""
+
+
+class GenerationQueue:
+    """基于 SQLite 的图片生成任务队列"""
+
+    WORKER_COUNT = 8  # 同时执行的任务数（服务商级并发由限制器另行控制）
+    POLL_INTERVAL = 1.0  # 工作线程 / SSE 读取方的轮询间隔（秒）
+    HEARTBEAT_INTERVAL = 15.0  # SSE 心跳间隔（秒）
+    RETENTION_SECONDS = 7 * 24 * 3600  # 已结束任务的事件保留时间
+    MAX_ATTEMPTS = 3  # 任务因进程重启被中断后的最大执行次数
+
+    def __init__(self, db_path: str = None, worker_count: int = None):
+        """
+        Args:
+            db_path: 数据库路径（默认 history/generation_queue.db）
+            worker_count: 工作线程数
+        """
+        if db_path is None:
+            history_dir = os.path.join(
+                os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                "history"
+            )
+            os.makedirs(history_dir, exist_ok=True)
+            db_path = os.path.join(history_dir, "generation_queue.db")
+
+        self.db_path = db_path
+        self.worker_count = worker_count or self.WORKER_COUNT
+        self.owner = make_owner_id()
+        self.lease_seconds = LEASE_SECONDS
+
+        self._local = threading.local()
+        self._cond = threading.Condition()
+        self._workers: List[threading.Thread] = []
+        self._heartbeat = LeaseHeartbeat("generation-lease", self._renew_leases)
+        self._started = False
+        self._stopping = False
+
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            ensure_lease_columns(conn, "jobs")
+
+    # ==================== 数据库 ====================
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _notify(self) -> None:
+        """唤醒等待新事件 / 新任务的线程"""
+        with self._cond:
+            self._cond.notify_all()
+
+    # ==================== 入队与状态 ====================
+
+    def enqueue(
+        self,
+        task_id: str,
+        pages: List[Dict],
+        full_outline: str = "",
+        user_images: Optional[List[bytes]] = None,
+        user_topic: str = ""
+    ) -> bool:
+        """
+        提交生成任务
+
+        同一 task_id 的任务仍在排队或执行时不会重复入队（直接复用，便于重新连接）；
+        已结束的任务会清空旧事件后重新入队。
+
+        Args:
+            task_id: 任务 ID
+            pages: 页面列表
+            full_outline: 完整大纲文本
+            user_images: 用户参考图片（建议已压缩）
+            user_topic: 用户原始输入
+
+        Returns:
+            bool: 是否新入队（False 表示复用进行中的任务）
+        """
+        payload = json.dumps({
+            "pages": pages,
+            "full_outline": full_outline,
+            "user_images": [
+                base64.b64encode(img).decode("ascii") for img in (user_images or [])
+            ],
+            "user_topic": user_topic,
+        }, ensure_ascii=False)
+        now = time.time()
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT status FROM jobs WHERE task_id = ?", (task_id,)
+            ).fetchone()
+            if row and row["status"] in (QueueJobStatus.QUEUED, QueueJobStatus.RUNNING):
+                conn.execute("COMMIT")
+                logger.info(f"[生成队列] 任务已在进行中，复用: {task_id}")
+                return False
+
+            conn.execute("DELETE FROM events WHERE task_id = ?", (task_id,))
+            conn.execute("DELETE FROM pages WHERE task_id = ?", (task_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (task_id, status, payload, attempts, error, created_at, updated_at) "
+                "VALUES (?, ?, ?, 0, NULL, ?, ?)",
+                (task_id, QueueJobStatus.QUEUED, payload, now, now)
+            )
+            conn.executemany(
+                "INSERT INTO pages (task_id, page_index, status, updated_at) VALUES (?, ?, ?, ?)",
+                [(task_id, page["index"], PageStatus.PENDING, now) for page in pages]
+            )
+            self._append_event(conn, task_id, "progress", {
+                "status": "queued",
+                "message": "任务已排队，等待生成...",
+                "current": 0,
+                "total": len(pages),
+                "phase": "queued"
+            })
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        logger.info(f"[生成队列] 任务入队: {task_id}, pages={len(pages)}")
+        self._notify()
+        return True
+
+    def get_job(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取任务状态（不含大纲与参考图等大字段）
+
+        Returns:
+            Optional[Dict]: task_id / status / error / created_at / updated_at / pages
+        """
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT task_id, status, error, attempts, created_at, updated_at FROM jobs WHERE task_id = ?",
+            (task_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        pages = conn.execute(
+            "SELECT page_index, status, filename, error FROM pages WHERE task_id = ? ORDER BY page_index",
+            (task_id,)
+        ).fetchall()
+
+        return {
+            "task_id": row["task_id"],
+            "status": row["status"],
+            "error": row["error"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "pages": [dict(page) for page in pages],
+        }
+
+    def get_task_state(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取与 ImageService.get_task_state 结构一致的任务状态（服务重启后使用）
+
+        Returns:
+            Optional[Dict]: generated / failed / cover_image / progress
+        """
+        job = self.get_job(task_id)
+        if job is None:
+            return None
+
+        generated = {
+            page["page_index"]: page["filename"]
+            for page in job["pages"] if page["status"] == PageStatus.DONE
+        }
+        failed = {
+            page["page_index"]: page["error"]
+            for page in job["pages"] if page["status"] == PageStatus.ERROR
+        }
+        return {
+            "generated": generated,
+            "failed": failed,
+            "cover_image": None,
+            "progress": {
+                "status": job["status"],
+                "total": len(job["pages"]),
+                "completed": len(generated),
+                "failed": len(failed),
+            }
+        }
+
+    # ==================== 事件 ====================
+
+    def _append_event(self, conn: sqlite3.Connection, task_id: str, event: str, data: Dict) -> int:
+        """写入事件（调用方负责事务）"""
+        cursor = conn.execute(
+            "INSERT INTO events (task_id, event, data, created_at) VALUES (?, ?, ?, ?)",
+            (task_id, event, json.dumps(data, ensure_ascii=False), time.time())
+        )
+        return cursor.lastrowid
+
+    def _record_event(self, task_id: str, event: Dict[str, Any]) -> None:
+        """
+        写入 ImageService 产生的事件，并同步页面状态
+
+        Raises:
+            LeaseLostError: 任务租约已被其他进程接管（不再写入）
+        """
+        event_type = event["event"]
+        data = event["data"]
+        now = time.time()
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            owned = conn.execute(
+                "UPDATE jobs SET updated_at = ? WHERE task_id = ? AND owner = ?", (now, task_id, self.owner)
+            ).rowcount
+            if not owned:
+                conn.execute("ROLLBACK")
+                raise LeaseLostError(f"任务租约已被其他进程接管: {task_id}")
+
+            self._append_event(conn, task_id, event_type, data)
+
+            if event_type == "complete" and "index" in data:
+                filename = data.get("image_url", "").rsplit("/", 1)[-1] or f"{data['index']}.png"
+                conn.execute(
+                    "UPDATE pages SET status = ?, filename = ?, error = NULL, updated_at = ? "
+                    "WHERE task_id = ? AND page_index = ?",
+                    (PageStatus.DONE, filename, now, task_id, data["index"])
+                )
+            elif event_type == "error" and "index" in data:
+                conn.execute(
+                    "UPDATE pages SET status = ?, error = ?, updated_at = ? "
+                    "WHERE task_id = ? AND page_index = ?",
+                    (PageStatus.ERROR, data.get("message"), now, task_id, data["index"])
+                )
+            conn.execute("COMMIT")
+        except LeaseLostError:
+            raise
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        self._notify()
+
+    def fetch_events(self, task_id: str, after_id: int = 0) -> List[Tuple[int, str, Dict]]:
+        """
+        读取指定事件 ID 之后的事件
+
+        Args:
+            task_id: 任务 ID
+            after_id: 起始事件 ID（不含）
+
+        Returns:
+            List[Tuple]: (event_id, event_type, data) 列表
+        """
+        rows = self._connect().execute(
+            "SELECT id, event, data FROM events WHERE task_id = ? AND id > ? ORDER BY id",
+            (task_id, after_id)
+        ).fetchall()
+        return [(row["id"], row["event"], json.loads(row["data"])) for row in rows]
+
+    def iter_events(
+        self,
+        task_id: str,
+        after_id: int = 0
+    ) -> Generator[Optional[Tuple[int, str, Dict]], None, None]:
+        """
+        持续读取任务事件，直到 finish 事件或任务结束
+
+        等待期间每隔 HEARTBEAT_INTERVAL 产出一次 None，调用方可据此发送 SSE 心跳。
+
+        Args:
+            task_id: 任务 ID
+            after_id: 起始事件 ID（不含），通常来自 Last-Event-ID
+
+        Yields:
+            (event_id, event_type, data) 或 None（心跳）
+        """
+        last_id = after_id
+        last_yield = time.monotonic()
+
+        while True:
+            events = self.fetch_events(task_id, last_id)
+            for event_id, event_type, data in events:
+                last_id = event_id
+                yield event_id, event_type, data
+                if event_type == "finish":
+                    return
+            if events:
+                last_yield = time.monotonic()
+                continue
+
+            job = self.get_job(task_id)
+            if job is None:
+                return
+            if job["status"] in (QueueJobStatus.FINISHED, QueueJobStatus.FAILED):
+                # 结束前最后再读一次，避免漏掉刚写入的事件
+                tail = self.fetch_events(task_id, last_id)
+                for event_id, event_type, data in tail:
+                    yield event_id, event_type, data
+                return
+
+            if time.monotonic() - last_yield >= self.HEARTBEAT_INTERVAL:
+                last_yield = time.monotonic()
+                yield None
+
+            with self._cond:
+                self._cond.wait(self.POLL_INTERVAL)
+
+    # ==================== 工作线程 ====================
+
+    def start(self) -> None:
+        """清理过期任务并启动工作线程和租约心跳（重复调用无副作用）"""
+        with self._cond:
+            if self._started:
+                return
+            self._started = True
+
+        self._recover()
+        self._heartbeat.start()
+
+        for i in range(self.worker_count):
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f"generation-worker-{i}",
+                daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+        logger.info(f"[生成队列] 已启动 {self.worker_count} 个工作线程: {self.db_path}")
+
+    def stop(self) -> None:
+        """通知工作线程退出（进行中的任务在租约过期后由其他进程或下次启动恢复）"""
+        self._stopping = True
+        self._heartbeat.stop()
+        self._notify()
+
+    def _renew_leases(self) -> int:
+        """为本实例执行中的任务续约"""
+        return self._connect().execute(
+            "UPDATE jobs SET lease_expires = ? WHERE owner = ? AND status = ?",
+            (time.time() + self.lease_seconds, self.owner, QueueJobStatus.RUNNING)
+        ).rowcount
+
+    def _recover(self) -> None:
+        """
+        启动时：统计等待恢复的中断任务，清理过期任务
+
+        执行中的任务不在这里重置：租约过期的由 _claim_next 重新领取，
+        租约仍有效的说明另一个进程还在执行，不能重复执行。
+        """
+        conn = self._connect()
+        now = time.time()
+        interrupted = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = ? AND (lease_expires IS NULL OR lease_expires < ?)",
+            (QueueJobStatus.RUNNING, now)
+        ).fetchone()[0]
+        if interrupted:
+            logger.info(f"[生成队列] {interrupted} 个被中断的任务租约已过期，将重新执行")
+
+        expire_before = now - self.RETENTION_SECONDS
+        expired = [
+            row["task_id"] for row in conn.execute(
+                "SELECT task_id FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (QueueJobStatus.FINISHED, QueueJobStatus.FAILED, expire_before)
+            ).fetchall()
+        ]
+        for task_id in expired:
+            conn.execute("DELETE FROM events WHERE task_id = ?", (task_id,))
+            conn.execute("DELETE FROM pages WHERE task_id = ?", (task_id,))
+            conn.execute("DELETE FROM jobs WHERE task_id = ?", (task_id,))
+        if expired:
+            logger.info(f"[生成队列] 清理 {len(expired)} 个过期任务")
+
+    def _claim_next(self) -> Optional[sqlite3.Row]:
+        """原子地领取一个排队中的任务，或租约已过期的执行中任务（持有进程已退出）"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute(
+                "SELECT task_id, payload, attempts FROM jobs "
+                "WHERE status = ? OR (status = ? AND (lease_expires IS NULL OR lease_expires < ?)) "
+                "ORDER BY created_at LIMIT 1",
+                (QueueJobStatus.QUEUED, QueueJobStatus.RUNNING, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, owner = ?, lease_expires = ?, "
+                    "updated_at = ? WHERE task_id = ?",
+                    (QueueJobStatus.RUNNING, self.owner, now + self.lease_seconds, now, row["task_id"])
+                )
+            conn.execute("COMMIT")
+            return row
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _worker_loop(self) -> None:
+        while not self._stopping:
+            try:
+                job = self._claim_next()
+            except Exception as e:
+                logger.error(f"[生成队列] 领取任务失败: {e}")
+                job = None
+
+            if job is None:
+                with self._cond:
+                    self._cond.wait(self.POLL_INTERVAL)
+                continue
+
+            self._run_job(job["task_id"], json.loads(job["payload"]), job["attempts"] + 1)
+
+    def _set_job_status(self, task_id: str, status: str, error: str = None) -> None:
+        """更新本实例持有的任务状态（租约已被接管时不修改）"""
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, error = ?, lease_expires = NULL, updated_at = ? "
+            "WHERE task_id = ? AND owner = ?",
+            (status, error, time.time(), task_id, self.owner)
+        )
+        self._notify()
+
+    def _run_job(self, task_id: str, payload: Dict[str, Any], attempt: int) -> None:
+        """执行单个任务，事件逐条落库"""
+        from backend.services.image import get_image_service
+
+        logger.info(f"[生成队列] 开始执行任务: {task_id} (第 {attempt} 次)")
+
+        if attempt > self.MAX_ATTEMPTS:
+            error = f"任务被中断次数过多（{self.MAX_ATTEMPTS} 次），已停止自动恢复"
+            self._fail_job(task_id, payload, error)
+            return
+
+        done_indices = [
+            page["page_index"]
+            for page in (self.get_job(task_id) or {}).get("pages", [])
+            if page["status"] == PageStatus.DONE
+        ]
+        user_images = [base64.b64decode(img) for img in payload.get("user_images", [])]
+
+        try:
+            image_service = get_image_service()
+            for event in image_service.generate_images(
+                payload["pages"],
+                task_id,
+                payload.get("full_outline", ""),
+                user_images=user_images or None,
+                user_topic=payload.get("user_topic", ""),
+                skip_indices=done_indices
+            ):
+                self._record_event(task_id, event)
+            self._set_job_status(task_id, QueueJobStatus.FINISHED)
+            logger.info(f"[生成队列] 任务完成: {task_id}")
+        except LeaseLostError as e:
+            logger.warning(f"[生成队列] 停止执行: {e}")
+        except Exception as e:
+            logger.error(f"[生成队列] 任务执行失败: {task_id}, {e}", exc_info=True)
+            self._fail_job(task_id, payload, str(e))
+
+    def _fail_job(self, task_id: str, payload: Dict[str, Any], error: str) -> None:
+        """任务异常结束：写入 error + finish 事件，保证读取方能够结束"""
+        job = self.get_job(task_id) or {"pages": []}
+        done = [p for p in job["pages"] if p["status"] == PageStatus.DONE]
+        failed_indices = [p["page_index"] for p in job["pages"] if p["status"] != PageStatus.DONE]
+
+        try:
+            self._write_failure(task_id, payload, error, done, failed_indices)
+        except LeaseLostError as e:
+            logger.warning(f"[生成队列] 不再写入失败结果: {e}")
+
+    def _write_failure(
+        self,
+        task_id: str,
+        payload: Dict[str, Any],
+        error: str,
+        done: List[Dict[str, Any]],
+        failed_indices: List[int]
+    ) -> None:
+        self._record_event(task_id, {
+            "event": "error",
+            "data": {
+                "status": "error",
+                "message": f"图片生成任务异常: {error}",
+                "retryable": True
+            }
+        })
+        self._record_event(task_id, {
+            "event": "finish",
+            "data": {
+                "success": False,
+                "task_id": task_id,
+                "images": [p["filename"] for p in done],
+                "total": len(payload.get("pages", [])),
+                "completed": len(done),
+                "failed": len(failed_indices),
+                "failed_indices": failed_indices
+            }
+        })
+        self._set_job_status(task_id, QueueJobStatus.FAILED, error)
+
+
+_queue_instance = None
+_queue_lock = threading.Lock()
+
+
+def get_generation_queue() -> GenerationQueue:
+    """获取全局生成队列实例（首次调用时恢复中断任务并启动工作线程）"""
+    global _queue_instance
+    with _queue_lock:
+        if _queue_instance is None:
+            _queue_instance = GenerationQueue()
+            _queue_instance.start()
+        return _queue_instance
@@ -5,14 +5,21 @@
 支持草稿、生成中、完成等多种状态流转。
 """
 
+import atexit
 import os
 import json
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 from pathlib import Path
 from enum import Enum
 
+from backend.services.history_search import highlight, make_snippet
+from backend.services.history_store import HistoryIndexStore
+from backend.services.history_writer import RecordWriteBehind, dump_record
+from backend.utils.atomic_file import atomic_write
+
 
 class RecordStatus:
     """历史记录状态常量"""
@@ -22,69 +29,80 @@ class RecordStatus:
     COMPLETED = "completed"   # 已完成：所有图片已生成
     ERROR = "error"          # 错误：生成过程中出现错误
 
+    # 生成结束的状态：更新为这些状态时立即落盘
+    FINAL = (PARTIAL, COMPLETED, ERROR)
+
 
 class HistoryService:
-    def __init__(self):
+    SCAN_WORKERS = 8  # 全量扫描时并行扫描任务目录的线程数
+
+    def __init__(self, history_dir: Optional[str] = None):
         """
         初始化历史记录服务
 
-        创建历史记录存储目录和索引文件
+        创建历史记录存储目录和索引数据库（首次启动时从旧的 index.json 迁移）
+
+        Args:
+            history_dir: 历史记录存储目录（默认项目根目录/history）
         """
-        # 历史记录存储目录（项目根目录/history）
-        self.history_dir = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-            "history"
-        )
+        if history_dir is None:
+            history_dir = os.path.join(
+                os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                "history"
+            )
+        self.history_dir = history_dir
         os.makedirs(self.history_dir, exist_ok=True)
 
-        # 索引文件路径
-        self.index_file = os.path.join(self.history_dir, "index.json")
-        self._init_index()
+        # 记录摘要索引（SQLite，取代 index.json）
+        self.index_store = HistoryIndexStore(os.path.join(self.history_dir, "history.db"))
+        self.index_store.migrate_from_json(os.path.join(self.history_dir, "index.json"), self.history_dir)
+        self.index_store.build_search_index(self.history_dir, _record_search_text)
 
-    def _init_index(self) -> None:
-        """
-        初始化索引文件
+        # 生成过程中的频繁更新先在内存中合并，短暂延迟后（或任务结束时）统一原子落盘
+        self._writer = RecordWriteBehind(self._write_record)
+        atexit.register(self._writer.flush_all)
 
-        如果索引文件不存在，则创建一个空索引
+    def _get_record_path(self, record_id: str) -> str:
         """
-        if not os.path.exists(self.index_file):
-            with open(self.index_file, "w", encoding="utf-8") as f:
-                json.dump({"records": []}, f, ensure_ascii=False, indent=2)
+        获取历史记录文件路径
 
-    def _load_index(self) -> Dict:
-        """
-        加载索引文件
+        Args:
+            record_id: 记录 ID
 
         Returns:
-            Dict: 索引数据，包含 records 列表
+            str: 记录文件的完整路径
         """
+        return os.path.join(self.history_dir, f"{record_id}.json")
+
+    def _read_record_file(self, record_id: str) -> Optional[Dict]:
+        """从磁盘读取记录文件（不存在或损坏时返回 None）"""
+        record_path = self._get_record_path(record_id)
+        if not os.path.exists(record_path):
+            return None
         try:
-            with open(self.index_file, "r", encoding="utf-8") as f:
+            with open(record_path, "r", encoding="utf-8") as f:
                 return json.load(f)
         except Exception:
-            return {"records": []}
-
-    def _save_index(self, index: Dict) -> None:
-        """
-        保存索引文件
-
-        Args:
-            index: 索引数据
-        """
-        with open(self.index_file, "w", encoding="utf-8") as f:
-            json.dump(index, f, ensure_ascii=False, indent=2)
+            return None
 
-    def _get_record_path(self, record_id: str) -> str:
+    def _write_record(self, record_id: str, record: Dict) -> None:
         """
-        获取历史记录文件路径
+        原子写入记录文件并同步索引（由写回缓冲在记录锁内调用）
 
         Args:
             record_id: 记录 ID
-
-        Returns:
-            str: 记录文件的完整路径
+            record: 完整记录
         """
-        return os.path.join(self.history_dir, f"{record_id}.json")
+        atomic_write(self._get_record_path(record_id), dump_record(record))
+        self.index_store.update(
+            record_id,
+            updated_at=record.get("updated_at"),
+            status=record.get("status"),
+            thumbnail=record.get("thumbnail"),
+            page_count=len((record.get("outline") or {}).get("pages", [])),
+            task_id=(record.get("images") or {}).get("task_id")
+        )
+        self.index_store.index_text(record_id, *_record_search_text(record))
 
     def create_record(
         self,
@@ -128,13 +146,10 @@ class HistoryService:
         }
 
         # 保存完整记录到独立文件
-        record_path = self._get_record_path(record_id)
-        with open(record_path, "w", encoding="utf-8") as f:
-            json.dump(record, f, ensure_ascii=False, indent=2)
+        atomic_write(self._get_record_path(record_id), dump_record(record))
 
         # 更新索引（用于快速列表查询）
-        index = self._load_index()
-        index["records"].insert(0, {
+        self.index_store.insert({
             "id": record_id,
             "title": topic,
             "created_at": now,
@@ -144,7 +159,7 @@ class HistoryService:
             "page_count": len(outline.get("pages", [])),  # 预期页数
             "task_id": task_id
         })
-        self._save_index(index)
+        self.index_store.index_text(record_id, *_record_search_text(record))
 
         return record_id
 
@@ -168,16 +183,11 @@ class HistoryService:
             - status: 当前状态
             - thumbnail: 缩略图文件名
         """
-        record_path = self._get_record_path(record_id)
-
-        if not os.path.exists(record_path):
-            return None
-
-        try:
-            with open(record_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return None
+        # 优先返回尚未落盘的最新内容
+        pending = self._writer.get(record_id)
+        if pending is not None:
+            return pending
+        return self._read_record_file(record_id)
 
     def record_exists(self, record_id: str) -> bool:
         """
@@ -189,6 +199,8 @@ class HistoryService:
         Returns:
             bool: 记录是否存在
         """
+        if self._writer.has_pending(record_id):
+            return True
         record_path = self._get_record_path(record_id)
         return os.path.exists(record_path)
 
@@ -198,7 +210,8 @@ class HistoryService:
         outline: Optional[Dict] = None,
         images: Optional[Dict] = None,
         status: Optional[str] = None,
-        thumbnail: Optional[str] = None
+        thumbnail: Optional[str] = None,
+        content: Optional[Dict] = None
     ) -> bool:
         """
         更新历史记录
@@ -212,6 +225,7 @@ class HistoryService:
             images: 图片信息（可选，包含 task_id 和 generated 列表）
             status: 状态（可选）
             thumbnail: 缩略图文件名（可选）
+            content: 标题、文案、标签（可选，包含 titles / copywriting / tags）
 
         Returns:
             bool: 更新是否成功，记录不存在时返回 False
@@ -224,62 +238,37 @@ class HistoryService:
             partial -> generating: 继续生成剩余图片
             partial -> completed: 剩余图片生成完成
         """
-        # 获取现有记录
-        record = self.get_record(record_id)
-        if not record:
-            return False
-
-        # 更新时间戳
-        now = datetime.now().isoformat()
-        record["updated_at"] = now
-
-        # 更新大纲内容（支持修改大纲）
-        if outline is not None:
-            record["outline"] = outline
-
-        # 更新图片信息
-        if images is not None:
-            record["images"] = images
-
-        # 更新状态（状态流转）
-        if status is not None:
-            record["status"] = status
-
-        # 更新缩略图
-        if thumbnail is not None:
-            record["thumbnail"] = thumbnail
-
-        # 保存完整记录
-        record_path = self._get_record_path(record_id)
-        with open(record_path, "w", encoding="utf-8") as f:
-            json.dump(record, f, ensure_ascii=False, indent=2)
-
-        # 同步更新索引
-        index = self._load_index()
-        for idx_record in index["records"]:
-            if idx_record["id"] == record_id:
-                idx_record["updated_at"] = now
-
-                # 更新状态
-                if status:
-                    idx_record["status"] = status
-
-                # 更新缩略图
-                if thumbnail:
-                    idx_record["thumbnail"] = thumbnail
-
-                # 更新页数（如果大纲被修改）
-                if outline:
-                    idx_record["page_count"] = len(outline.get("pages", []))
-
-                # 更新任务 ID
-                if images is not None and images.get("task_id"):
-                    idx_record["task_id"] = images.get("task_id")
-
-                break
-
-        self._save_index(index)
-        return True
+        def apply(record: Dict) -> None:
+            # 更新时间戳
+            record["updated_at"] = datetime.now().isoformat()
+
+            # 更新大纲内容（支持修改大纲）
+            if outline is not None:
+                record["outline"] = outline
+
+            # 更新图片信息
+            if images is not None:
+                record["images"] = images
+
+            # 更新状态（状态流转）
+            if status is not None:
+                record["status"] = status
+
+            # 更新缩略图
+            if thumbnail is not None:
+                record["thumbnail"] = thumbnail
+
+            # 更新标题、文案、标签
+            if content is not None:
+                record["content"] = content
+
+        # 合并到写回缓冲（同一记录串行），生成结束时立即落盘
+        return self._writer.update(
+            record_id,
+            self._read_record_file,
+            apply,
+            flush_now=status in RecordStatus.FINAL
+        )
 
     def delete_record(self, record_id: str) -> bool:
         """
@@ -296,10 +285,19 @@ class HistoryService:
         Returns:
             bool: 删除是否成功，记录不存在时返回 False
         """
-        record = self.get_record(record_id)
-        if not record:
-            return False
-
+        try:
+            with self._writer.lock_for(record_id):
+                record = self._writer.peek(record_id) or self._read_record_file(record_id)
+                if not record:
+                    return False
+                # 丢弃未落盘的更新，避免删除后又被写回
+                self._writer.discard(record_id)
+                return self._delete_record_files(record_id, record)
+        finally:
+            self._writer.forget(record_id)
+
+    def _delete_record_files(self, record_id: str, record: Dict) -> bool:
+        """删除任务图片目录、记录文件和索引（调用方需持有记录锁）"""
         # 删除关联的任务图片目录
         if record.get("images") and record["images"].get("task_id"):
             task_id = record["images"]["task_id"]
@@ -320,9 +318,7 @@ class HistoryService:
             return False
 
         # 从索引中移除
-        index = self._load_index()
-        index["records"] = [r for r in index["records"] if r["id"] != record_id]
-        self._save_index(index)
+        self.index_store.delete(record_id)
 
         return True
 
@@ -348,18 +344,12 @@ class HistoryService:
                 - page_size: 每页大小
                 - total_pages: 总页数
         """
-        index = self._load_index()
-        records = index.get("records", [])
-
-        # 按状态过滤
-        if status:
-            records = [r for r in records if r.get("status") == status]
-
-        # 分页计算
-        total = len(records)
-        start = (page - 1) * page_size
-        end = start + page_size
-        page_records = records[start:end]
+        # 过滤和分页在数据库中完成
+        page_records, total = self.index_store.list_records(
+            offset=(page - 1) * page_size,
+            limit=page_size,
+            status=status
+        )
 
         return {
             "records": page_records,
@@ -369,27 +359,89 @@ class HistoryService:
             "total_pages": (total + page_size - 1) // page_size
         }
 
-    def search_records(self, keyword: str) -> List[Dict]:
+    def list_records_after(
+        self,
+        cursor: Optional[str] = None,
+        page_size: int = 20,
+        status: Optional[str] = None
+    ) -> Dict:
         """
-        根据关键词搜索历史记录
+        游标分页获取历史记录列表（按更新时间倒序）
+
+        与页码分页不同，翻页代价与翻到第几页无关；翻页期间有记录新增或更新时不会重复或遗漏。
+
+        Args:
+            cursor: 上一页返回的 next_cursor（None 或空字符串表示第一页）
+            page_size: 每页记录数
+            status: 状态过滤（可选）
+
+        Returns:
+            Dict: 分页结果
+                - records: 当前页的记录列表
+                - total: 符合条件的总记录数
+                - page_size: 每页大小
+                - next_cursor: 下一页游标（没有下一页时为 None）
+                - has_more: 是否还有下一页
+
+        Raises:
+            ValueError: 游标格式错误
+        """
+        records, next_cursor = self.index_store.list_after(cursor or None, page_size, status)
+        return {
+            "records": records,
+            "total": self.index_store.count(status),
+            "page_size": page_size,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
+        }
+
+    def get_version(self) -> int:
+        """
+        历史记录列表的数据版本号（任何记录新增、更新、删除后都会变化，用于 ETag）
+
+        Returns:
+            int: 版本号
+        """
+        return self.index_store.get_version()
+
+    def search_records(self, keyword: str, page: int = 1, page_size: int = 20) -> Dict:
+        """
+        全文检索历史记录（标题和大纲各页文本）
+
+        中文按二元组分词，多个关键词之间为 AND 关系；结果按相关度排序，标题命中优先。
+        全文检索没有命中时退化为标题子串匹配（如 "phone" 匹配 "iPhone"）。
 
         Args:
             keyword: 搜索关键词（不区分大小写）
+            page: 页码，从 1 开始
+            page_size: 每页记录数
 
         Returns:
-            List[Dict]: 匹配的记录列表（按创建时间倒序）
+            Dict: 分页结果
+                - records: 当前页的记录列表，每条记录额外包含：
+                    - title_highlight: 高亮后的标题（HTML，命中部分以 <mark> 包裹）
+                    - snippet: 正文中命中位置附近的高亮摘要（HTML）
+                - total: 命中总数
+                - page: 当前页码
+                - page_size: 每页大小
+                - total_pages: 总页数
         """
-        index = self._load_index()
-        records = index.get("records", [])
+        rows, total = self.index_store.search(keyword, offset=(page - 1) * page_size, limit=page_size)
 
-        # 不区分大小写的标题搜索
-        keyword_lower = keyword.lower()
-        results = [
-            r for r in records
-            if keyword_lower in r.get("title", "").lower()
-        ]
+        records = []
+        for row in rows:
+            raw_title, raw_body = row.pop("raw_title"), row.pop("raw_body")
+            row["title_highlight"] = highlight(raw_title, keyword)
+            row["snippet"] = make_snippet(raw_body, keyword)
+            records.append(row)
 
-        return results
+        return {
+            "records": records,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": (total + page_size - 1) // page_size
+        }
 
     def get_statistics(self) -> Dict:
         """
@@ -405,16 +457,9 @@ class HistoryService:
                     - completed: 已完成数
                     - error: 错误数
         """
-        index = self._load_index()
-        records = index.get("records", [])
-
-        total = len(records)
-        status_count = {}
-
-        # 统计各状态的记录数
-        for record in records:
-            status = record.get("status", RecordStatus.DRAFT)
-            status_count[status] = status_count.get(status, 0) + 1
+        # 各状态的记录数由索引在每次状态变化时增量维护
+        status_count = self.index_store.count_by_status()
+        total = sum(status_count.values())
 
         return {
             "total": total,
@@ -451,69 +496,53 @@ class HistoryService:
                 "error": f"任务目录不存在: {task_id}"
             }
 
+        # 通过 task_id 反向索引查找关联的历史记录
+        return self._sync_task(task_id, task_dir, self.index_store.find_by_task(task_id))
+
+    def _sync_task(self, task_id: str, task_dir: str, record_id: Optional[str]) -> Dict[str, Any]:
+        """
+        扫描单个任务目录并同步到关联的记录（返回值同 scan_and_sync_task_images）
+
+        Args:
+            task_id: 任务 ID
+            task_dir: 任务目录
+            record_id: 关联的记录 ID（没有关联记录时为 None）
+        """
         try:
-            # 扫描目录下所有图片文件（排除缩略图）
-            image_files = []
-            for filename in os.listdir(task_dir):
-                # 跳过缩略图文件（以 thumb_ 开头）
-                if filename.startswith('thumb_'):
-                    continue
-                if filename.endswith('.png') or filename.endswith('.jpg') or filename.endswith('.jpeg'):
-                    image_files.append(filename)
-
-            # 按文件名排序（数字排序）
-            def get_index(filename):
-                try:
-                    return int(filename.split('.')[0])
-                except:
-                    return 999
-
-            image_files.sort(key=get_index)
-
-            # 查找关联的历史记录
-            index = self._load_index()
-            record_id = None
-            for rec in index.get("records", []):
-                # 通过遍历所有记录，找到 task_id 匹配的记录
-                record_detail = self.get_record(rec["id"])
-                if record_detail and record_detail.get("images", {}).get("task_id") == task_id:
-                    record_id = rec["id"]
-                    break
-
-            if record_id:
-                # 更新历史记录
-                record = self.get_record(record_id)
-                if record:
-                    # 根据生成图片数量判断状态
-                    expected_count = len(record.get("outline", {}).get("pages", []))
-                    actual_count = len(image_files)
-
-                    if actual_count == 0:
-                        status = RecordStatus.DRAFT  # 无图片：草稿
-                    elif actual_count >= expected_count:
-                        status = RecordStatus.COMPLETED  # 全部完成
-                    else:
-                        status = RecordStatus.PARTIAL  # 部分完成
-
-                    # 更新图片列表和状态
-                    self.update_record(
-                        record_id,
-                        images={
-                            "task_id": task_id,
-                            "generated": image_files
-                        },
-                        status=status,
-                        thumbnail=image_files[0] if image_files else None
-                    )
-
-                    return {
-                        "success": True,
-                        "record_id": record_id,
+            image_files = _list_task_images(task_dir)
+
+            record = self.get_record(record_id) if record_id else None
+            if record:
+                # 根据生成图片数量判断状态
+                expected_count = len(record.get("outline", {}).get("pages", []))
+                actual_count = len(image_files)
+
+                if actual_count == 0:
+                    status = RecordStatus.DRAFT  # 无图片：草稿
+                elif actual_count >= expected_count:
+                    status = RecordStatus.COMPLETED  # 全部完成
+                else:
+                    status = RecordStatus.PARTIAL  # 部分完成
+
+                # 更新图片列表和状态
+                self.update_record(
+                    record_id,
+                    images={
                         "task_id": task_id,
-                        "images_count": len(image_files),
-                        "images": image_files,
-                        "status": status
-                    }
+                        "generated": image_files
+                    },
+                    status=status,
+                    thumbnail=image_files[0] if image_files else None
+                )
+
+                return {
+                    "success": True,
+                    "record_id": record_id,
+                    "task_id": task_id,
+                    "images_count": len(image_files),
+                    "images": image_files,
+                    "status": status
+                }
 
             # 没有关联的记录，返回扫描结果
             return {
@@ -527,24 +556,30 @@ class HistoryService:
         except Exception as e:
             return {
                 "success": False,
+                "task_id": task_id,
                 "error": f"扫描任务失败: {str(e)}"
             }
 
-    def scan_all_tasks(self) -> Dict[str, Any]:
+    def scan_all_tasks(self, force: bool = False) -> Dict[str, Any]:
         """
         扫描所有任务文件夹，同步图片列表
 
-        批量扫描 history 目录下的所有任务文件夹，
-        同步图片列表并更新记录状态。
+        增量扫描：任务目录的 mtime 和关联记录自上次同步后都没有变化时跳过该目录；
+        有变化的目录并行扫描。
+
+        Args:
+            force: 是否忽略上次同步状态，重新扫描所有任务目录
 
         Returns:
             Dict[str, Any]: 扫描结果统计
                 - success: 是否成功
-                - total_tasks: 扫描的任务总数
+                - total_tasks: 任务目录总数
+                - scanned: 本次实际扫描的任务数
+                - unchanged: 没有变化而跳过的任务数
                 - synced: 成功同步的任务数
                 - failed: 失败的任务数
                 - orphan_tasks: 孤立任务列表（有图片但无记录）
-                - results: 详细结果列表
+                - results: 本次扫描的详细结果列表
                 - error: 错误信息（失败时）
         """
         if not os.path.exists(self.history_dir):
@@ -554,27 +589,44 @@ class HistoryService:
             }
 
         try:
-            synced_count = 0
-            failed_count = 0
-            orphan_tasks = []  # 没有关联记录的任务
-            results = []
-
-            # 遍历 history 目录
-            for item in os.listdir(self.history_dir):
-                item_path = os.path.join(self.history_dir, item)
-
-                # 只处理目录（任务文件夹）
-                if not os.path.isdir(item_path):
-                    continue
-
-                # 假设任务文件夹名就是 task_id
-                task_id = item
+            task_records = self.index_store.task_records()
+            last_scans = self.index_store.get_task_scans()
 
-                # 扫描并同步
-                result = self.scan_and_sync_task_images(task_id)
-                results.append(result)
+            # 遍历 history 目录，找出自上次同步后有变化的任务目录
+            task_ids = []
+            changed = []  # (task_id, task_dir, mtime_ns, record_id, page_count)
+            orphan_tasks = []  # 没有关联记录的任务
+            with os.scandir(self.history_dir) as it:
+                for entry in it:
+                    # 只处理目录（任务文件夹），文件夹名就是 task_id
+                    if not entry.is_dir():
+                        continue
+                    task_id = entry.name
+                    task_ids.append(task_id)
+
+                    # 先取 mtime 再扫描：扫描期间目录有变化时下次会重新扫描
+                    mtime_ns = entry.stat().st_mtime_ns
+                    record_id, page_count = task_records.get(task_id, (None, 0))
+                    if not force and last_scans.get(task_id) == (mtime_ns, record_id, page_count):
+                        if record_id is None:
+                            orphan_tasks.append(task_id)
+                        continue
+                    changed.append((task_id, entry.path, mtime_ns, record_id, page_count))
+
+            # 并行扫描有变化的目录
+            with ThreadPoolExecutor(max_workers=self.SCAN_WORKERS, thread_name_prefix="history-scan") as executor:
+                futures = [
+                    executor.submit(self._sync_task, task_id, task_dir, record_id)
+                    for task_id, task_dir, _, record_id, _ in changed
+                ]
+                results = [future.result() for future in futures]
 
+            synced_count = 0
+            failed_count = 0
+            scans = []
+            for (task_id, _, mtime_ns, record_id, page_count), result in zip(changed, results):
                 if result.get("success"):
+                    scans.append((task_id, mtime_ns, record_id, page_count))
                     if result.get("no_record"):
                         orphan_tasks.append(task_id)
                     else:
@@ -582,9 +634,17 @@ class HistoryService:
                 else:
                     failed_count += 1
 
+            if scans:
+                self.index_store.save_task_scans(scans)
+            removed = set(last_scans) - set(task_ids)
+            if removed:
+                self.index_store.delete_task_scans(removed)
+
             return {
                 "success": True,
-                "total_tasks": len(results),
+                "total_tasks": len(task_ids),
+                "scanned": len(changed),
+                "unchanged": len(task_ids) - len(changed),
                 "synced": synced_count,
                 "failed": failed_count,
                 "orphan_tasks": orphan_tasks,
@@ -598,6 +658,34 @@ class HistoryService:
             }
 
 
+def _record_search_text(record: Dict[str, Any]) -> tuple:
+    """记录中参与全文检索的 (标题, 正文)：正文为大纲各页文本"""
+    outline = record.get("outline") or {}
+    pages = outline.get("pages") or []
+    body = "\n".join(str(page.get("content", "")) for page in pages if isinstance(page, dict))
+    return record.get("title", ""), body or str(outline.get("raw", ""))
+
+
+def _list_task_images(task_dir: str) -> List[str]:
+    """任务目录下的图片文件名（排除缩略图，按页码排序）"""
+    with os.scandir(task_dir) as it:
+        # 跳过缩略图文件（以 thumb_ 开头）
+        image_files = [
+            entry.name for entry in it
+            if not entry.name.startswith('thumb_') and entry.name.endswith(('.png', '.jpg', '.jpeg'))
+        ]
+
+    # 按文件名排序（数字排序）
+    def get_index(filename):
+        try:
+            return int(filename.split('.')[0])
+        except ValueError:
+            return 999
+
+    image_files.sort(key=get_index)
+    return image_files
+
+
 _service_instance = None
 
 
@@ -0,0 +1,153 @@
+"""
+历史记录全文检索的分词、查询构造和高亮
+
+SQLite FTS5 自带的分词器按空白和标点切词，中文整句会被当作一个词，无法按词检索。
+这里在写入索引前自行分词，FTS5 只负责倒排索引和 bm25 排序：
+- 中日韩文字按相邻两字切分（二元组），每段末尾补一个单字，保证任意位置的单字也能前缀匹配
+- 其他文字按单词切分并转为小写
+- 查询按同样的规则切分：每段中文是一个短语（相邻二元组必须连续出现），单字和英文单词按前缀匹配，
+  各段之间为 AND 关系
+- 摘要和高亮在原文上计算（FTS5 的 snippet() 只能返回分词后的文本）
+"""
+
+import html
+import re
+from typing import List, Optional
+
+# 中日韩文字（假名、中日韩统一表意文字及扩展 A、兼容表意文字、韩文音节）
+_CJK = "぀-ヿ㐀-䶿一-鿿豈-﫿가-힯"
+_TERM_RE = re.compile(f"[{_CJK}]+|(?:(?![{_CJK}])[^\\W_])+")
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+SNIPPET_LENGTH = 80  # 摘要长度（字符）
+
+
+def _is_cjk(term: str) -> bool:
+    return bool(re.match(f"[{_CJK}]", term))
+
+
+def split_terms(text: str) -> List[str]:
+    """把文本切分为连续的中文段和单词"""
+    return _TERM_RE.findall(text or "")
+
+
+def tokenize(text: str) -> str:
+    """
+    生成写入 FTS5 的分词文本（词之间以空格分隔）
+
+    Args:
+        text: 原文
+
+    Returns:
+        str: 分词结果
+    """
+    tokens = []
+    for term in split_terms(text):
+        if _is_cjk(term):
+            tokens.extend(term[i:i + 2] for i in range(len(term) - 1))
+            tokens.append(term[-1])
+        else:
+            tokens.append(term.lower())
+    return " ".join(tokens)
+
+
+def build_match_query(keyword: str) -> Optional[str]:
+    """
+    把用户输入的关键词转换为 FTS5 MATCH 表达式
+
+    Args:
+        keyword: 搜索关键词
+
+    Returns:
+        Optional[str]: MATCH 表达式，关键词中没有可检索的文字时返回 None
+    """
+    phrases = []
+    for term in split_terms(keyword):
+        if _is_cjk(term) and len(term) > 1:
+            bigrams = " ".join(term[i:i + 2] for i in range(len(term) - 1))
+            phrases.append(f'"{bigrams}"')
+        else:
+            phrases.append(f'"{term.lower()}"*')
+    return " AND ".join(phrases) or None
+
+
+def _find_spans(text: str, terms: List[str]) -> List[tuple]:
+    """各检索词在原文中出现的位置（不区分大小写，合并重叠部分）"""
+    lowered = text.lower()
+    spans = []
+    for term in terms:
+        term = term.lower()
+        start = lowered.find(term)
+        while start != -1:
+            spans.append((start, start + len(term)))
+            start = lowered.find(term, start + len(term))
+    spans.sort()
+
+    merged = []
+    for start, end in spans:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _mark(text: str, spans: List[tuple], offset: int = 0) -> str:
+    """转义原文并用 <mark> 标出命中部分"""
+    parts = []
+    cursor = 0
+    for start, end in spans:
+        start, end = start - offset, end - offset
+        if end <= 0 or start >= len(text):
+            continue
+        start, end = max(start, 0), min(end, len(text))
+        parts.append(html.escape(text[cursor:start]))
+        parts.append(HIGHLIGHT_START + html.escape(text[start:end]) + HIGHLIGHT_END)
+        cursor = end
+    parts.append(html.escape(text[cursor:]))
+    return "".join(parts)
+
+
+def highlight(text: str, keyword: str) -> str:
+    """
+    高亮整段文本中的检索词（HTML 转义后用 <mark> 包裹命中部分）
+
+    Args:
+        text: 原文
+        keyword: 搜索关键词
+
+    Returns:
+        str: 高亮后的 HTML 文本
+    """
+    text = text or ""
+    return _mark(text, _find_spans(text, split_terms(keyword)))
+
+
+def make_snippet(text: str, keyword: str, length: int = SNIPPET_LENGTH) -> str:
+    """
+    截取第一个命中位置附近的摘要并高亮（没有命中时返回开头部分）
+
+    Args:
+        text: 原文
+        keyword: 搜索关键词
+        length: 摘要长度（字符）
+
+    Returns:
+        str: 高亮后的 HTML 摘要
+    """
+    text = " ".join((text or "").split())
+    spans = _find_spans(text, split_terms(keyword))
+
+    start = 0
+    if spans:
+        # 命中位置前保留约 1/4 的上下文
+        start = max(0, min(spans[0][0] - length // 4, len(text) - length))
+    window = text[start:start + length]
+
+    snippet = _mark(window, spans, offset=start)
+    if start > 0:
+        snippet = "…" + snippet
+    if start + length < len(text):
+        snippet += "…"
+    return snippet
@@ -0,0 +1,601 @@
+"""
+历史记录索引存储
+
+取代 history/index.json：记录摘要（列表、搜索、统计所需的字段）保存在 SQLite 中，
+完整记录（大纲、图片、文案）仍然是 history/<record_id>.json。
+- WAL 模式，读写互不阻塞；每次增删改只写一行，不再整体重写索引文件
+- status / created_at / task_id 建有索引，列表分页、状态过滤和统计直接在 SQL 中完成
+- 各状态的记录数和数据版本号由触发器在每次增删改时增量维护（counters 表），统计和 ETag 不需要扫描全表
+- 列表支持按 (updated_at, id) 的游标分页（keyset），翻页代价与页码无关
+- 标题和大纲页面文本建有 FTS5 全文索引（中文按二元组分词，见 history_search），按 bm25 排序
+- task_id 索引同时作为 任务 -> 记录 的反向索引；task_scans 记录每个任务目录上次同步时的 mtime，
+  增量扫描时跳过没有变化的任务目录
+- 首次启动时一次性从 index.json 和记录文件迁移（迁移后 index.json 重命名为 index.json.migrated）
+
+数据库文件：history/history.db
+"""
+
+import base64
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from backend.services.history_search import build_match_query, split_terms, tokenize
+
+logger = logging.getLogger(__name__)
+
+# 记录摘要字段（与旧 index.json 中每条记录的字段一致）
+SUMMARY_FIELDS = ("id", "title", "created_at", "updated_at", "status", "thumbnail", "page_count", "task_id")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    status TEXT NOT NULL,
+    thumbnail TEXT,
+    page_count INTEGER NOT NULL DEFAULT 0,
+    task_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_records_created ON records(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_records_status ON records(status, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_records_task ON records(task_id);
+CREATE INDEX IF NOT EXISTS idx_records_updated ON records(updated_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_records_status_updated ON records(status, updated_at DESC, id DESC);
+
+-- 计数器：status:<状态> 为该状态的记录数，version 在每次增删改时加一
+-- （触发器内不用 INSERT OR IGNORE：外层语句的冲突策略会覆盖触发器内的 OR 子句）
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_records_insert AFTER INSERT ON records BEGIN
+    INSERT INTO counters (name, value) SELECT 'status:' || NEW.status, 0
+        WHERE NOT EXISTS (SELECT 1 FROM counters WHERE name = 'status:' || NEW.status);
+    UPDATE counters SET value = value + 1 WHERE name = 'status:' || NEW.status;
+    UPDATE counters SET value = value + 1 WHERE name = 'version';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_records_delete AFTER DELETE ON records BEGIN
+    UPDATE counters SET value = value - 1 WHERE name = 'status:' || OLD.status;
+    UPDATE counters SET value = value + 1 WHERE name = 'version';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_records_update AFTER UPDATE ON records BEGIN
+    UPDATE counters SET value = value - 1 WHERE name = 'status:' || OLD.status;
+    INSERT INTO counters (name, value) SELECT 'status:' || NEW.status, 0
+        WHERE NOT EXISTS (SELECT 1 FROM counters WHERE name = 'status:' || NEW.status);
+    UPDATE counters SET value = value + 1 WHERE name = 'status:' || NEW.status;
+    UPDATE counters SET value = value + 1 WHERE name = 'version';
+END;
+
+-- 全文索引：title / body 为分词后的文本，raw_title / raw_body 为原文（用于摘要和高亮）
+-- prefix 为 1、2 字前缀建立索引，单字 / 短单词的前缀查询不需要展开整个词表
+CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5(
+    record_id UNINDEXED,
+    title,
+    body,
+    raw_title UNINDEXED,
+    raw_body UNINDEXED,
+    tokenize = 'unicode61',
+    prefix = '1 2'
+);
+
+CREATE TABLE IF NOT EXISTS task_scans (
+    task_id TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    record_id TEXT,
+    page_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def encode_cursor(updated_at: str, record_id: str) -> str:
+    """分页游标：上一页最后一条记录的 (updated_at, id)"""
+    raw = json.dumps([updated_at, record_id], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    解析分页游标
+
+    Raises:
+        ValueError: 游标格式错误
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        updated_at, record_id = json.loads(raw.decode("utf-8"))
+    except Exception:
+        raise ValueError(f"无效的分页游标: {cursor}")
+    if not isinstance(updated_at, str) or not isinstance(record_id, str):
+        raise ValueError(f"无效的分页游标: {cursor}")
+    return updated_at, record_id
+
+
+class HistoryIndexStore:
+    """基于 SQLite 的历史记录索引"""
+
+    # bm25 各列权重（record_id, title, body, raw_title, raw_body）：标题命中比正文命中更相关
+    SEARCH_WEIGHTS = "0.0, 10.0, 1.0, 0.0, 0.0"
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: 数据库路径
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        self._init_counters()
+
+    # ==================== 数据库 ====================
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_counters(self) -> None:
+        """首次创建计数器时按现有记录初始化（之后由触发器维护）"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM counters WHERE name = 'version'").fetchone() is None:
+                conn.execute("DELETE FROM counters")
+                conn.execute(
+                    "INSERT INTO counters (name, value) "
+                    "SELECT 'status:' || status, COUNT(*) FROM records GROUP BY status"
+                )
+                conn.execute("INSERT INTO counters (name, value) VALUES ('version', 0)")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _to_summary(row: sqlite3.Row) -> Dict[str, Any]:
+        return {field: row[field] for field in SUMMARY_FIELDS}
+
+    # ==================== 增删改 ====================
+
+    def insert(self, summary: Dict[str, Any]) -> None:
+        """
+        写入（或覆盖）一条记录摘要
+
+        Args:
+            summary: 记录摘要（id / title / created_at / updated_at / status / thumbnail / page_count / task_id）
+        """
+        # 用 UPSERT 而不是 INSERT OR REPLACE：REPLACE 隐式删除旧行时不触发删除触发器，计数会出错
+        self._connect().execute(
+            f"INSERT INTO records ({', '.join(SUMMARY_FIELDS)}) "
+            f"VALUES ({', '.join('?' for _ in SUMMARY_FIELDS)}) "
+            f"ON CONFLICT(id) DO UPDATE SET {', '.join(f'{k} = excluded.{k}' for k in SUMMARY_FIELDS[1:])}",
+            tuple(summary.get(field) for field in SUMMARY_FIELDS)
+        )
+
+    def update(self, record_id: str, **fields) -> bool:
+        """
+        更新记录摘要的部分字段
+
+        Args:
+            record_id: 记录 ID
+            **fields: 要更新的字段（值为 None 的字段忽略）
+
+        Returns:
+            bool: 记录是否存在
+        """
+        fields = {k: v for k, v in fields.items() if v is not None and k in SUMMARY_FIELDS and k != "id"}
+        if not fields:
+            return self.exists(record_id)
+        cursor = self._connect().execute(
+            f"UPDATE records SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?",
+            (*fields.values(), record_id)
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, record_id: str) -> bool:
+        """删除记录摘要和全文索引，返回记录是否存在"""
+        conn = self._connect()
+        conn.execute("DELETE FROM records_fts WHERE record_id = ?", (record_id,))
+        cursor = conn.execute("DELETE FROM records WHERE id = ?", (record_id,))
+        return cursor.rowcount > 0
+
+    def index_text(self, record_id: str, title: str, body: str) -> None:
+        """
+        写入（或更新）记录的全文索引，内容没有变化时跳过
+
+        Args:
+            record_id: 记录 ID
+            title: 标题
+            body: 正文（大纲各页文本）
+        """
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT rowid, raw_title, raw_body FROM records_fts WHERE record_id = ?", (record_id,)
+        ).fetchone()
+        if row and row["raw_title"] == title and row["raw_body"] == body:
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if row:
+                conn.execute("DELETE FROM records_fts WHERE rowid = ?", (row["rowid"],))
+            conn.execute(
+                "INSERT INTO records_fts (record_id, title, body, raw_title, raw_body) VALUES (?, ?, ?, ?, ?)",
+                (record_id, tokenize(title), tokenize(body), title, body)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ==================== 查询 ====================
+
+    def exists(self, record_id: str) -> bool:
+        row = self._connect().execute("SELECT 1 FROM records WHERE id = ?", (record_id,)).fetchone()
+        return row is not None
+
+    def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        """获取单条记录摘要"""
+        row = self._connect().execute("SELECT * FROM records WHERE id = ?", (record_id,)).fetchone()
+        return self._to_summary(row) if row else None
+
+    def iter_ids(self) -> List[str]:
+        """所有记录 ID（按创建时间倒序）"""
+        rows = self._connect().execute("SELECT id FROM records ORDER BY created_at DESC, rowid DESC").fetchall()
+        return [row["id"] for row in rows]
+
+    def list_records(
+        self,
+        offset: int = 0,
+        limit: int = 20,
+        status: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        分页获取记录摘要（按创建时间倒序）
+
+        Args:
+            offset: 跳过的记录数
+            limit: 返回的记录数
+            status: 状态过滤（可选）
+
+        Returns:
+            (records, total): 当前页的记录和符合条件的总数
+        """
+        conn = self._connect()
+        where, params = ("WHERE status = ?", (status,)) if status else ("", ())
+        total = self.count(status)
+        rows = conn.execute(
+            f"SELECT * FROM records {where} ORDER BY created_at DESC, rowid DESC LIMIT ? OFFSET ?",
+            (*params, max(0, limit), max(0, offset))
+        ).fetchall()
+        return [self._to_summary(row) for row in rows], total
+
+    def list_after(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = 20,
+        status: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        游标分页获取记录摘要（按更新时间倒序，keyset 分页）
+
+        Args:
+            cursor: 上一页返回的游标（None 表示第一页）
+            limit: 返回的记录数
+            status: 状态过滤（可选）
+
+        Returns:
+            (records, next_cursor): 当前页的记录和下一页的游标（没有下一页时为 None）
+
+        Raises:
+            ValueError: 游标格式错误
+        """
+        conditions, params = [], []
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if cursor:
+            conditions.append("(updated_at, id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        limit = max(1, limit)
+        # 多取一条判断是否还有下一页
+        rows = self._connect().execute(
+            f"SELECT * FROM records {where} ORDER BY updated_at DESC, id DESC LIMIT ?",
+            (*params, limit + 1)
+        ).fetchall()
+        records = [self._to_summary(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = records[-1]
+            next_cursor = encode_cursor(last["updated_at"], last["id"])
+        return records, next_cursor
+
+    def find_by_task(self, task_id: str) -> Optional[str]:
+        """任务 ID 对应的记录 ID（最新创建的一条）"""
+        row = self._connect().execute(
+            "SELECT id FROM records WHERE task_id = ? ORDER BY created_at DESC, rowid DESC LIMIT 1", (task_id,)
+        ).fetchone()
+        return row["id"] if row else None
+
+    def task_records(self) -> Dict[str, Tuple[str, int]]:
+        """所有任务 ID -> (记录 ID, 页数)（同一任务有多条记录时取最新创建的）"""
+        rows = self._connect().execute(
+            "SELECT task_id, id, page_count FROM records WHERE task_id IS NOT NULL "
+            "ORDER BY created_at ASC, rowid ASC"
+        ).fetchall()
+        return {row["task_id"]: (row["id"], row["page_count"]) for row in rows}
+
+    def search(
+        self,
+        keyword: str,
+        offset: int = 0,
+        limit: int = 20
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        全文检索标题和大纲文本（标题命中权重更高，按 bm25 相关度排序）
+
+        英文单词在索引中只能按前缀匹配（"phone" 匹配不到 "iPhone"），
+        全文检索没有命中时退化为标题子串匹配（按更新时间倒序）。
+
+        Args:
+            keyword: 搜索关键词
+            offset: 跳过的记录数
+            limit: 返回的记录数
+
+        Returns:
+            (records, total): 当前页的记录摘要（附带原文 raw_title / raw_body）和命中总数
+        """
+        query = build_match_query(keyword)
+        if not query:
+            return [], 0
+
+        conn = self._connect()
+        total = conn.execute(
+            "SELECT COUNT(*) FROM records_fts WHERE records_fts MATCH ?", (query,)
+        ).fetchone()[0]
+        if total == 0:
+            return self._search_title_substring(split_terms(keyword), offset, limit)
+
+        # 先只在全文索引内排序取出当前页，再读取原文和摘要（不为所有命中行读取原文）
+        rows = conn.execute(
+            "SELECT r.*, f.raw_title, f.raw_body FROM ("
+            f"    SELECT rowid, bm25(records_fts, {self.SEARCH_WEIGHTS}) AS score FROM records_fts "
+            "    WHERE records_fts MATCH ? ORDER BY score LIMIT ? OFFSET ?"
+            ") hit "
+            "JOIN records_fts f ON f.rowid = hit.rowid "
+            "JOIN records r ON r.id = f.record_id "
+            "ORDER BY hit.score",
+            (query, max(0, limit), max(0, offset))
+        ).fetchall()
+        return [
+            {**self._to_summary(row), "raw_title": row["raw_title"], "raw_body": row["raw_body"]}
+            for row in rows
+        ], total
+
+    def _search_title_substring(
+        self,
+        terms: List[str],
+        offset: int,
+        limit: int
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """标题包含所有检索词（不区分大小写的子串匹配）的记录"""
+        where = " AND ".join("instr(lower(f.raw_title), ?) > 0" for _ in terms)
+        params = [term.lower() for term in terms]
+
+        conn = self._connect()
+        total = conn.execute(
+            f"SELECT COUNT(*) FROM records_fts f WHERE {where}", params
+        ).fetchone()[0]
+        if total == 0:
+            return [], 0
+
+        rows = conn.execute(
+            "SELECT r.*, f.raw_title, f.raw_body FROM records_fts f "
+            "JOIN records r ON r.id = f.record_id "
+            f"WHERE {where} ORDER BY r.updated_at DESC, r.id DESC LIMIT ? OFFSET ?",
+            (*params, max(0, limit), max(0, offset))
+        ).fetchall()
+        return [
+            {**self._to_summary(row), "raw_title": row["raw_title"], "raw_body": row["raw_body"]}
+            for row in rows
+        ], total
+
+    def count_by_status(self) -> Dict[str, int]:
+        """各状态的记录数（读取增量维护的计数器）"""
+        rows = self._connect().execute(
+            "SELECT name, value FROM counters WHERE name LIKE 'status:%' AND value > 0"
+        ).fetchall()
+        return {row["name"][len("status:"):]: row["value"] for row in rows}
+
+    def count(self, status: Optional[str] = None) -> int:
+        """记录总数或指定状态的记录数（读取计数器）"""
+        if status:
+            row = self._connect().execute(
+                "SELECT value FROM counters WHERE name = ?", (f"status:{status}",)
+            ).fetchone()
+            return row["value"] if row else 0
+        row = self._connect().execute(
+            "SELECT COALESCE(SUM(value), 0) FROM counters WHERE name LIKE 'status:%'"
+        ).fetchone()
+        return row[0]
+
+    def get_version(self) -> int:
+        """数据版本号：记录摘要每次增删改都会加一（用于 ETag）"""
+        row = self._connect().execute("SELECT value FROM counters WHERE name = 'version'").fetchone()
+        return row["value"] if row else 0
+
+    # ==================== 任务目录扫描状态 ====================
+
+    def get_task_scans(self) -> Dict[str, Tuple[int, Optional[str], int]]:
+        """所有任务目录上次同步时的状态：task_id -> (mtime_ns, record_id, page_count)"""
+        rows = self._connect().execute("SELECT * FROM task_scans").fetchall()
+        return {row["task_id"]: (row["mtime_ns"], row["record_id"], row["page_count"]) for row in rows}
+
+    def save_task_scans(self, scans: Iterable[Tuple[str, int, Optional[str], int]]) -> None:
+        """
+        批量保存任务目录同步状态
+
+        Args:
+            scans: (task_id, mtime_ns, record_id, page_count) 列表
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO task_scans (task_id, mtime_ns, record_id, page_count) VALUES (?, ?, ?, ?)",
+                list(scans)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete_task_scans(self, task_ids: Iterable[str]) -> None:
+        """删除已不存在的任务目录的同步状态"""
+        self._connect().executemany("DELETE FROM task_scans WHERE task_id = ?", [(t,) for t in task_ids])
+
+    # ==================== 迁移 ====================
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def migrate_from_json(self, index_file: str, history_dir: str) -> int:
+        """
+        一次性从旧的 index.json 和记录文件迁移（已迁移过则直接返回）
+
+        以 index.json 中的摘要为准；index.json 中缺失但记录文件存在的记录
+        （旧版本并发写入丢失的索引项）从记录文件补回。
+        迁移成功后 index.json 重命名为 index.json.migrated 作为备份。
+
+        Args:
+            index_file: 旧索引文件路径
+            history_dir: 历史记录目录
+
+        Returns:
+            int: 迁移的记录数
+        """
+        if self._get_meta("migrated_from_json"):
+            return 0
+
+        summaries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(index_file):
+            try:
+                with open(index_file, "r", encoding="utf-8") as f:
+                    for item in json.load(f).get("records", []):
+                        if item.get("id"):
+                            summaries[item["id"]] = item
+            except Exception as e:
+                logger.warning(f"[历史索引] 读取 index.json 失败，仅从记录文件迁移: {e}")
+
+        for record in self._iter_record_files(history_dir):
+            summary = summaries.setdefault(record["id"], {})
+            # 记录文件才是完整数据：索引缺失的字段从记录文件补齐
+            summary.setdefault("id", record["id"])
+            summary.setdefault("title", record.get("title", ""))
+            summary.setdefault("created_at", record.get("created_at"))
+            summary.setdefault("updated_at", record.get("updated_at") or record.get("created_at"))
+            summary.setdefault("status", record.get("status"))
+            summary.setdefault("thumbnail", record.get("thumbnail"))
+            summary.setdefault("page_count", len((record.get("outline") or {}).get("pages", [])))
+            if not summary.get("task_id"):
+                summary["task_id"] = (record.get("images") or {}).get("task_id")
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 加锁后再检查一次（多进程同时启动时只迁移一次）
+            if self._get_meta("migrated_from_json"):
+                conn.execute("COMMIT")
+                return 0
+            conn.executemany(
+                f"INSERT OR IGNORE INTO records ({', '.join(SUMMARY_FIELDS)}) "
+                f"VALUES ({', '.join('?' for _ in SUMMARY_FIELDS)})",
+                [
+                    (
+                        s["id"], s.get("title") or "", s.get("created_at") or "", s.get("updated_at") or "",
+                        s.get("status") or "draft", s.get("thumbnail"), s.get("page_count") or 0, s.get("task_id")
+                    )
+                    for s in summaries.values()
+                ]
+            )
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from_json', '1')")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if os.path.exists(index_file):
+            try:
+                os.replace(index_file, f"{index_file}.migrated")
+            except OSError as e:
+                logger.warning(f"[历史索引] 重命名 index.json 失败: {e}")
+
+        if summaries:
+            logger.info(f"[历史索引] 已从 JSON 迁移 {len(summaries)} 条记录到 {self.db_path}")
+        return len(summaries)
+
+    def build_search_index(self, history_dir: str, record_text) -> int:
+        """
+        一次性为已有记录建立全文索引（已建立过则直接返回）
+
+        Args:
+            history_dir: 历史记录目录
+            record_text: 从完整记录提取 (标题, 正文) 的函数
+
+        Returns:
+            int: 建立索引的记录数
+        """
+        if self._get_meta("search_index_built"):
+            return 0
+
+        count = 0
+        for record in self._iter_record_files(history_dir):
+            if self.exists(record["id"]):
+                self.index_text(record["id"], *record_text(record))
+                count += 1
+        self._connect().execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('search_index_built', '1')")
+
+        if count:
+            logger.info(f"[历史索引] 已为 {count} 条记录建立全文索引")
+        return count
+
+    @staticmethod
+    def _iter_record_files(history_dir: str) -> Iterable[Dict[str, Any]]:
+        """遍历 history 目录下的记录文件（<uuid>.json）"""
+        try:
+            entries = list(os.scandir(history_dir))
+        except OSError:
+            return
+        for entry in entries:
+            if not entry.is_file() or not entry.name.endswith(".json") or entry.name == "index.json":
+                continue
+            try:
+                with open(entry.path, "r", encoding="utf-8") as f:
+                    record = json.load(f)
+            except Exception:
+                continue
+            if isinstance(record, dict) and record.get("id") == entry.name[:-5]:
+                yield record
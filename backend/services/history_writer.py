@@ -0,0 +1,194 @@
+"""
+历史记录写回缓冲（write-behind）
+
+生成过程中前端会频繁调用 PUT /history/<record_id>（每完成一页更新一次图片列表和状态），
+以前每次更新都要重写完整的记录文件和索引。这里把同一记录的连续更新合并在内存中：
+- 更新先合并到内存中的记录副本，读取时优先返回内存副本（读到自己刚写的内容）
+- 第一次未落盘的更新之后 FLUSH_DELAY 秒内统一落盘一次；状态变为结束态（任务完成）时立即落盘
+- 落盘使用临时文件 + 替换（atomic_write），读取方不会读到写了一半的文件
+- 同一记录的合并、落盘、删除都在该记录的锁内串行执行，不同记录互不阻塞
+"""
+
+import copy
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from backend.utils.atomic_file import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+def dump_record(record: Dict[str, Any]) -> bytes:
+    """记录序列化为 JSON 文件内容"""
+    return json.dumps(record, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+class _PendingRecord:
+    """尚未落盘的记录"""
+
+    __slots__ = ("record", "dirty_since")
+
+    def __init__(self, record: Dict[str, Any]):
+        self.record = record
+        self.dirty_since = time.monotonic()
+
+
+class RecordWriteBehind:
+    """按记录合并更新、延迟落盘的写缓冲（线程安全）"""
+
+    FLUSH_DELAY = 0.5  # 第一次未落盘的更新之后多久落盘（秒）
+
+    def __init__(
+        self,
+        write_record: Callable[[str, Dict[str, Any]], None],
+        flush_delay: Optional[float] = None
+    ):
+        """
+        Args:
+            write_record: 落盘回调 (record_id, record)，负责写记录文件和索引
+            flush_delay: 合并窗口（秒）
+        """
+        self._write_record = write_record
+        self.flush_delay = self.FLUSH_DELAY if flush_delay is None else flush_delay
+
+        self._pending: Dict[str, _PendingRecord] = {}
+        self._record_locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._cond = threading.Condition()
+        self._flusher: Optional[threading.Thread] = None
+
+        self._updates = 0
+        self._flushes = 0
+
+    def lock_for(self, record_id: str) -> threading.Lock:
+        """获取记录锁（同一记录的所有写操作串行执行）"""
+        with self._locks_guard:
+            lock = self._record_locks.get(record_id)
+            if lock is None:
+                lock = self._record_locks[record_id] = threading.Lock()
+            return lock
+
+    def update(
+        self,
+        record_id: str,
+        load_record: Callable[[str], Optional[Dict[str, Any]]],
+        apply: Callable[[Dict[str, Any]], None],
+        flush_now: bool = False
+    ) -> bool:
+        """
+        合并一次更新
+
+        Args:
+            record_id: 记录 ID
+            load_record: 内存中没有该记录时从磁盘加载的函数
+            apply: 在记录上原地应用修改
+            flush_now: 是否立即落盘（如任务结束）
+
+        Returns:
+            bool: 记录是否存在
+        """
+        with self.lock_for(record_id):
+            pending = self._pending.get(record_id)
+            if pending is None:
+                record = load_record(record_id)
+                if record is None:
+                    return False
+                pending = _PendingRecord(record)
+                self._pending[record_id] = pending
+            apply(pending.record)
+            self._updates += 1
+
+            if flush_now:
+                self._flush_locked(record_id)
+                return True
+
+        self._ensure_flusher()
+        return True
+
+    def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        """未落盘的记录副本（没有时返回 None）"""
+        with self.lock_for(record_id):
+            pending = self._pending.get(record_id)
+            return copy.deepcopy(pending.record) if pending else None
+
+    def peek(self, record_id: str) -> Optional[Dict[str, Any]]:
+        """未落盘的记录本身（不复制，调用方需持有记录锁）"""
+        pending = self._pending.get(record_id)
+        return pending.record if pending else None
+
+    def has_pending(self, record_id: str) -> bool:
+        return record_id in self._pending
+
+    def discard(self, record_id: str) -> None:
+        """丢弃未落盘的更新（删除记录时调用，调用方需持有记录锁）"""
+        self._pending.pop(record_id, None)
+
+    def forget(self, record_id: str) -> None:
+        """记录删除后释放记录锁"""
+        with self._locks_guard:
+            self._record_locks.pop(record_id, None)
+
+    def flush(self, record_id: str) -> None:
+        """立即落盘指定记录"""
+        with self.lock_for(record_id):
+            self._flush_locked(record_id)
+
+    def flush_all(self) -> None:
+        """落盘所有未落盘的记录（进程退出时调用）"""
+        for record_id in list(self._pending):
+            try:
+                self.flush(record_id)
+            except Exception as e:
+                logger.error(f"[历史写回] 落盘失败: {record_id}, {e}")
+
+    def _flush_locked(self, record_id: str) -> None:
+        """落盘（调用方需持有记录锁）"""
+        pending = self._pending.pop(record_id, None)
+        if pending is None:
+            return
+        try:
+            self._write_record(record_id, pending.record)
+        except Exception:
+            # 写入失败：放回缓冲，下一个合并窗口后再试
+            pending.dirty_since = time.monotonic()
+            self._pending.setdefault(record_id, pending)
+            raise
+        self._flushes += 1
+
+    # ==================== 后台落盘 ====================
+
+    def _ensure_flusher(self) -> None:
+        with self._cond:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="history-writer", daemon=True)
+                self._flusher.start()
+            self._cond.notify()
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+
+            time.sleep(self.flush_delay / 2)
+            now = time.monotonic()
+            due = [
+                record_id for record_id, pending in list(self._pending.items())
+                if now - pending.dirty_since >= self.flush_delay
+            ]
+            for record_id in due:
+                try:
+                    self.flush(record_id)
+                except Exception as e:
+                    logger.error(f"[历史写回] 落盘失败，稍后重试: {record_id}, {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取写回统计（合并的更新数 / 实际落盘数）"""
+        return {
+            "pending": len(self._pending),
+            "updates": self._updates,
+            "flushes": self._flushes,
+        }
@@ -1,14 +1,27 @@
 """图片生成服务"""
+import asyncio
 import logging
 import os
 import uuid
 import time
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, Any, Generator, List, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
+from contextlib import nullcontext
+from typing import Dict, Any, Generator, Iterable, List, Optional, Tuple
 from backend.config import Config
 from backend.generators.factory import ImageGeneratorFactory
-from backend.utils.image_compressor import compress_image
+from backend.services.image_cache import ImageCache, get_image_cache, make_cache_key
+from backend.services.image_job import ImageGenerationJob, ImageJobRegistry
+from backend.services.image_router import (
+    ImageProviderRouter,
+    ProviderRoute,
+    build_generator_kwargs,
+    get_image_provider,
+)
+from backend.utils.async_engine import get_async_engine
+from backend.utils.atomic_file import atomic_write
+from backend.utils.file_etag import versioned_image_url
+from backend.utils.image_postprocess import get_image_postprocessor
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +31,11 @@ class ImageService:
 
     # 并发配置
     MAX_CONCURRENT = 15  # 最大并发数
-    AUTO_RETRY_COUNT = 1  # 不自动重试，超时后让用户手动重试
+    AUTO_RETRY_COUNT = 3  # 单服务商时每页最多尝试次数（只重试限流 / 5xx / 超时 / 连接错误，服务商配置 max_retries 可覆盖）
+
+    # 对冲请求默认配置（需在服务商配置中设置 hedge_percentile 才会启用）
+    DEFAULT_HEDGE_BUDGET = 2  # 每个任务最多额外发起的重复请求数
+    SPECULATIVE_WORKER_RATIO = 2  # 线程模式下对冲 / 竞速请求共享线程池的大小（相对服务商并发上限之和的倍数）
 
     def __init__(self, provider_name: str = None):
         """
@@ -45,9 +62,26 @@ class ImageService:
         self.provider_name = provider_name
         self.provider_config = provider_config
 
+        # 服务商路由：配置 provider_pool 时页面分散到多个服务商，失败自动切换；
+        # 可重试错误按 Retry-After / 指数退避重试，服务商熔断时直接失败（由生成器的并发限制器检查）
+        self.router = ImageProviderRouter.from_config(
+            provider_name, provider_config, self.generator, max_attempts=self.AUTO_RETRY_COUNT
+        )
+
         # 检查是否启用短 prompt 模式
         self.use_short_prompt = provider_config.get('short_prompt', False)
 
+        # 执行模式：thread（默认，每页一个线程）或 async（共享事件循环 + 异步 HTTP）
+        self.use_async = provider_config.get('execution_mode', 'thread') == 'async'
+
+        # 缩略图 / 参考图压缩在进程池中执行，不占用生成线程
+        self.postprocessor = get_image_postprocessor()
+
+        # 内容寻址图片缓存（可选）：相同提示词 + 参数 + 参考图直接复用结果
+        self.image_cache: Optional[ImageCache] = None
+        if provider_config.get('image_cache', False):
+            self.image_cache = get_image_cache(provider_config.get('image_cache_max_mb'))
+
         # 加载提示词模板
         self.prompt_template = self._load_prompt_template()
         self.prompt_template_short = self._load_prompt_template(short=True)
@@ -59,13 +93,18 @@ class ImageService:
         )
         os.makedirs(self.history_root_dir, exist_ok=True)
 
-        # 当前任务的输出目录（每个任务一个子文件夹）
-        self.current_task_dir = None
+        # 任务注册表：每个任务独立保存输出目录、封面和进度（服务实例为全局单例，不能保存任务级状态）
+        self._jobs = ImageJobRegistry()
 
-        # 存储任务状态（用于重试）
-        self._task_states: Dict[str, Dict] = {}
+        # 线程模式的对冲请求和封面竞速共享一个线程池（不为每页 / 每个封面单独创建线程池）：
+        # 落选的请求无法中断，在池中执行完后丢弃结果，池大小即这类请求的上限
+        self._speculative_executor: Optional[ThreadPoolExecutor] = None
+        self._speculative_lock = threading.Lock()
 
-        logger.info(f"ImageService 初始化完成: provider={provider_name}, type={provider_type}")
+        logger.info(
+            f"ImageService 初始化完成: provider={provider_name}, type={provider_type}, "
+            f"mode={'async' if self.use_async else 'thread'}"
+        )
 
     def _load_prompt_template(self, short: bool = False) -> str:
         """加载 Prompt 模板"""
@@ -81,134 +120,635 @@ class ImageService:
         with open(prompt_path, "r", encoding="utf-8") as f:
             return f.read()
 
-    def _save_image(self, image_data: bytes, filename: str, task_dir: str = None) -> str:
+    def _get_max_workers(self) -> int:
+        """
+        单个任务的线程池大小
+
+        实际在途请求数由服务商共享的自适应并发限制器控制（见 backend/utils/concurrency.py），
+        这里只需保证线程数不超过限制器的上限。
+        """
+        return max(1, min(self.MAX_CONCURRENT, self.router.max_concurrency))
+
+    def _executor(self):
+        """
+        并发生成使用的执行器上下文
+
+        异步模式下协程提交到共享事件循环，不需要线程池，返回空上下文。
+        """
+        if self.use_async:
+            return nullcontext(None)
+        return ThreadPoolExecutor(max_workers=self._get_max_workers())
+
+    def _get_task_dir(self, task_id: str) -> str:
+        """获取任务输出目录（不存在则创建）"""
+        task_dir = os.path.join(self.history_root_dir, task_id)
+        os.makedirs(task_dir, exist_ok=True)
+        return task_dir
+
+    def _save_image(
+        self,
+        image_data: bytes,
+        filename: str,
+        task_dir: str,
+        renditions: bool = True
+    ) -> str:
         """
-        保存图片到本地，同时生成缩略图
+        保存图片到本地，衍生图（thumb / preview / full）在后处理进程池中异步生成
+
+        原图先原子写入（临时文件 + 替换），返回后即可发送 complete 事件；
+        衍生图生成完成前，图片接口会直接返回原图。
 
         Args:
             image_data: 图片二进制数据
             filename: 文件名
-            task_dir: 任务目录（如果为None则使用当前任务目录）
+            task_dir: 任务目录
+            renditions: 是否提交衍生图生成（封面由调用方与参考图一起生成）
 
         Returns:
             保存的文件路径
         """
-        if task_dir is None:
-            task_dir = self.current_task_dir
-
-        if task_dir is None:
+        if not task_dir:
             raise ValueError("任务目录未设置")
 
         # 保存原图
         filepath = os.path.join(task_dir, filename)
-        with open(filepath, "wb") as f:
-            f.write(image_data)
-
-        # 生成缩略图（50KB左右）
-        thumbnail_data = compress_image(image_data, max_size_kb=50)
-        thumbnail_filename = f"thumb_{filename}"
-        thumbnail_path = os.path.join(task_dir, thumbnail_filename)
-        with open(thumbnail_path, "wb") as f:
-            f.write(thumbnail_data)
+        atomic_write(filepath, image_data)
+
+        # 生成衍生图（存储规整模式下同时把原图改写为画布尺寸）
+        # 进程池只接收普通 bytes：服务商标签（LabeledImage）不跨进程传递
+        if renditions:
+            self.postprocessor.submit_renditions(
+                bytes(image_data), task_dir, filename,
+                Config.IMAGE_NORMALIZE_STORAGE, Config.IMAGE_CANVAS_SIZE
+            )
 
         return filepath
 
-    def _generate_single_image(
+    def _build_prompt(
+        self,
+        page: Dict,
+        full_outline: str = "",
+        user_topic: str = ""
+    ) -> str:
+        """根据配置选择模板（短 prompt 或完整 prompt）渲染页面提示词"""
+        page_type = page["type"]
+        page_content = page["content"]
+
+        if self.use_short_prompt and self.prompt_template_short:
+            # 短 prompt 模式：只包含页面类型和内容
+            prompt = self.prompt_template_short.format(
+                page_content=page_content,
+                page_type=page_type
+            )
+            logger.debug(f"  使用短 prompt 模式 ({len(prompt)} 字符)")
+            return prompt
+
+        # 完整 prompt 模式：包含大纲和用户需求
+        return self.prompt_template.format(
+            page_content=page_content,
+            page_type=page_type,
+            full_outline=full_outline,
+            user_topic=user_topic if user_topic else "未提供"
+        )
+
+    def _build_generator_kwargs(
+        self,
+        prompt: str,
+        reference_image: Optional[bytes] = None,
+        user_images: Optional[List[bytes]] = None
+    ) -> Dict[str, Any]:
+        """
+        根据服务商类型组装 generate_image / generate_image_async 的参数
+
+        reference_image / user_images 可以是 bytes，也可以是任务内预编码的 EncodedImage
+        """
+        return build_generator_kwargs(self.provider_config, prompt, reference_image, user_images)
+
+    def _request_image(
+        self,
+        page: Dict,
+        reference_image: Optional[bytes] = None,
+        full_outline: str = "",
+        user_images: Optional[List[bytes]] = None,
+        user_topic: str = "",
+        routes: Optional[List[ProviderRoute]] = None
+    ) -> bytes:
+        """
+        经服务商路由生成页面图片（只请求，不保存）
+
+        Args:
+            routes: 预先选好的服务商尝试顺序（默认由路由器选择）
+
+        Returns:
+            LabeledImage: 带服务商标签的图片数据
+        """
+        prompt = self._build_prompt(page, full_outline, user_topic)
+        return self.router.generate(
+            prompt, reference_image, user_images, label=f"图片 [{page['index']}]", routes=routes
+        )
+
+    async def _request_image_async(
         self,
         page: Dict,
-        task_id: str,
         reference_image: Optional[bytes] = None,
-        retry_count: int = 0,
+        full_outline: str = "",
+        user_images: Optional[List[bytes]] = None,
+        user_topic: str = "",
+        routes: Optional[List[ProviderRoute]] = None
+    ) -> bytes:
+        """_request_image 的协程版本（重试等待期间不阻塞事件循环）"""
+        prompt = self._build_prompt(page, full_outline, user_topic)
+        return await self.router.generate_async(
+            prompt, reference_image, user_images, label=f"图片 [{page['index']}]", routes=routes
+        )
+
+    def _get_cache_keys(
+        self,
+        page: Dict,
+        reference_image: Optional[bytes],
+        full_outline: str,
+        user_images: Optional[List[bytes]],
+        user_topic: str
+    ) -> Dict[str, str]:
+        """
+        计算页面在池内各服务商下的缓存 key（渲染后的 prompt + 该服务商的生成参数 + 参考图摘要）
+
+        页面可能由池中任一服务商生成，图片按实际生成的服务商写入缓存，
+        查找时依次检查各服务商的 key。
+
+        Returns:
+            Dict[str, str]: 服务商名称 -> 缓存 key（第一个为激活的服务商）
+        """
+        prompt = self._build_prompt(page, full_outline, user_topic)
+        return {
+            route.name: make_cache_key(
+                route.config.get('type', route.name),
+                build_generator_kwargs(route.config, prompt, reference_image, user_images)
+            )
+            for route in self.router.routes
+        }
+
+    def _get_cached_image(self, keys: Dict[str, str]) -> Optional[bytes]:
+        """依次查找各服务商的缓存"""
+        for key in keys.values():
+            cached = self.image_cache.get(key)
+            if cached is not None:
+                return cached
+        return None
+
+    @staticmethod
+    def _get_store_key(keys: Dict[str, str], image_data) -> Optional[str]:
+        """实际生成该图片的服务商对应的缓存 key（未知时返回 None，即使用登记时的 key）"""
+        return keys.get(get_image_provider(image_data))
+
+    def _fetch_image(
+        self,
+        page: Dict,
+        reference_image: Optional[bytes] = None,
+        full_outline: str = "",
+        user_images: Optional[List[bytes]] = None,
+        user_topic: str = "",
+        hedge_job: Optional[ImageGenerationJob] = None,
+        candidates: int = 1
+    ) -> bytes:
+        """
+        获取页面图片：启用缓存时先查缓存，相同 key 的并发请求只调用一次服务商
+
+        Args:
+            hedge_job: 所属任务（传入时启用对冲请求）
+            candidates: 同时发起的候选请求数（封面竞速，采用最先成功的一张）
+
+        Returns:
+            图片二进制数据
+        """
+        def request() -> bytes:
+            if candidates > 1:
+                return self._race_cover(page, candidates, full_outline, user_images, user_topic)
+            if hedge_job is not None:
+                return self._request_image_hedged(
+                    page, hedge_job, reference_image, full_outline, user_images, user_topic
+                )
+            return self._request_image(page, reference_image, full_outline, user_images, user_topic)
+
+        if self.image_cache is None:
+            return request()
+
+        # 相同请求的并发去重（single-flight）以激活服务商的 key 登记
+        keys = self._get_cache_keys(page, reference_image, full_outline, user_images, user_topic)
+        key = next(iter(keys.values()))
+        cached = self._get_cached_image(keys)
+        if cached is not None:
+            logger.info(f"图片 [{page['index']}] 命中缓存: {key[:12]}")
+            return cached
+
+        future, owner = self.image_cache.claim(key)
+        if not owner:
+            logger.info(f"图片 [{page['index']}] 与进行中的请求相同，等待其结果: {key[:12]}")
+            return future.result()
+
+        try:
+            image_data = request()
+        except BaseException as e:
+            self.image_cache.resolve(key, error=e)
+            raise
+        self.image_cache.resolve(key, data=image_data, store_key=self._get_store_key(keys, image_data))
+        return image_data
+
+    async def _fetch_image_async(
+        self,
+        page: Dict,
+        reference_image: Optional[bytes] = None,
+        full_outline: str = "",
+        user_images: Optional[List[bytes]] = None,
+        user_topic: str = "",
+        hedge_job: Optional[ImageGenerationJob] = None,
+        candidates: int = 1
+    ) -> bytes:
+        """_fetch_image 的协程版本（缓存读写放到线程中执行）"""
+        async def request() -> bytes:
+            if candidates > 1:
+                return await self._race_cover_async(page, candidates, full_outline, user_images, user_topic)
+            if hedge_job is not None:
+                return await self._request_image_hedged_async(
+                    page, hedge_job, reference_image, full_outline, user_images, user_topic
+                )
+            return await self._request_image_async(
+                page, reference_image, full_outline, user_images, user_topic
+            )
+
+        if self.image_cache is None:
+            return await request()
+
+        keys = self._get_cache_keys(page, reference_image, full_outline, user_images, user_topic)
+        key = next(iter(keys.values()))
+        cached = await asyncio.to_thread(self._get_cached_image, keys)
+        if cached is not None:
+            logger.info(f"图片 [{page['index']}] 命中缓存: {key[:12]}")
+            return cached
+
+        future, owner = self.image_cache.claim(key)
+        if not owner:
+            logger.info(f"图片 [{page['index']}] 与进行中的请求相同，等待其结果: {key[:12]}")
+            return await asyncio.wrap_future(future)
+
+        try:
+            image_data = await request()
+        except BaseException as e:
+            self.image_cache.resolve(key, error=e)
+            raise
+        await asyncio.to_thread(
+            self.image_cache.resolve, key, image_data, None, self._get_store_key(keys, image_data)
+        )
+        return image_data
+
+    def _get_hedge_delay(self, route: ProviderRoute) -> Optional[float]:
+        """
+        对冲等待时间：本次请求所选服务商最近调用延迟的 hedge_percentile 分位数
+
+        Args:
+            route: 主请求首先尝试的服务商
+
+        未配置 hedge_percentile 或样本不足时返回 None（不对冲）
+        """
+        percentile = self.provider_config.get('hedge_percentile')
+        if not percentile:
+            return None
+        return route.limiter.latency_percentile(float(percentile))
+
+    def _get_hedge_budget(self) -> int:
+        """每个任务的对冲预算（未启用对冲时为 0）"""
+        if not self.provider_config.get('hedge_percentile'):
+            return 0
+        return int(self.provider_config.get('hedge_budget', self.DEFAULT_HEDGE_BUDGET))
+
+    def _request_image_hedged(
+        self,
+        page: Dict,
+        job: ImageGenerationJob,
+        reference_image: Optional[bytes] = None,
         full_outline: str = "",
         user_images: Optional[List[bytes]] = None,
         user_topic: str = ""
-    ) -> Tuple[int, bool, Optional[str], Optional[str]]:
+    ) -> bytes:
+        """
+        带对冲的图片请求（线程模式）
+
+        主请求提交到共享线程池，当前线程最多等待对冲等待时间；仍未返回且任务还有对冲预算时，
+        再发起一次相同请求，两者中先成功的胜出。落选请求的线程无法中断，在后台结束后丢弃结果。
         """
-        生成单张图片（带自动重试）
+        args = (page, reference_image, full_outline, user_images, user_topic)
+        # 先选定主请求的服务商，按该服务商的延迟分布决定对冲等待时间；对冲请求重新选择服务商
+        routes = self.router.plan(bool(reference_image or user_images))
+        delay = self._get_hedge_delay(routes[0])
+        if delay is None:
+            return self._request_image(*args, routes=routes)
+
+        executor = self._get_speculative_executor()
+        futures = [executor.submit(self._request_image, *args, routes=routes)]
+        try:
+            done, _ = wait(futures, timeout=delay)
+            if not done and job.try_take_hedge():
+                logger.info(f"图片 [{page['index']}] 超过 {delay:.1f}s 未返回，发起对冲请求")
+                futures.append(executor.submit(self._request_image, *args))
+            return self._first_success(futures, f"图片 [{page['index']}]")
+        finally:
+            for future in futures:
+                future.cancel()
+
+    @staticmethod
+    def _first_success(futures: List[Future], label: str) -> bytes:
+        """返回最先成功的结果，全部失败时抛出第一个错误（不等待落选的请求）"""
+        first_error = None
+        for future in as_completed(futures):
+            try:
+                return future.result()
+            except Exception as e:
+                if len(futures) > 1:
+                    logger.warning(f"{label} 候选请求失败: {str(e)[:200]}")
+                first_error = first_error or e
+        raise first_error
+
+    def _get_speculative_executor(self) -> ThreadPoolExecutor:
+        """线程模式下对冲 / 竞速请求共享的线程池（懒创建）"""
+        with self._speculative_lock:
+            if self._speculative_executor is None:
+                self._speculative_executor = ThreadPoolExecutor(
+                    max_workers=max(1, self.router.max_concurrency * self.SPECULATIVE_WORKER_RATIO),
+                    thread_name_prefix="image-speculative"
+                )
+            return self._speculative_executor
+
+    async def _request_image_hedged_async(
+        self,
+        page: Dict,
+        job: ImageGenerationJob,
+        reference_image: Optional[bytes] = None,
+        full_outline: str = "",
+        user_images: Optional[List[bytes]] = None,
+        user_topic: str = ""
+    ) -> bytes:
+        """_request_image_hedged 的协程版本，落选请求会被取消"""
+        args = (page, reference_image, full_outline, user_images, user_topic)
+        routes = self.router.plan(bool(reference_image or user_images))
+        delay = self._get_hedge_delay(routes[0])
+        if delay is None:
+            return await self._request_image_async(*args, routes=routes)
+
+        pending = {asyncio.ensure_future(self._request_image_async(*args, routes=routes))}
+        first_error = None
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done and job.try_take_hedge():
+                logger.info(f"图片 [{page['index']}] 超过 {delay:.1f}s 未返回，发起对冲请求")
+                pending.add(asyncio.ensure_future(self._request_image_async(*args)))
+
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    first_error = first_error or task.exception()
+                if not pending:
+                    raise first_error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _generate_single_image(
+        self,
+        page: Dict,
+        task_dir: str,
+        reference_image: Optional[bytes] = None,
+        full_outline: str = "",
+        user_images: Optional[List[bytes]] = None,
+        user_topic: str = "",
+        hedge_job: Optional[ImageGenerationJob] = None
+    ) -> Tuple[int, bool, Optional[str], Optional[str], Optional[str]]:
+        """
+        生成单张图片（可重试错误由服务商路由的 RetryPolicy 自动重试）
 
         Args:
             page: 页面数据
-            task_id: 任务ID
+            task_dir: 任务输出目录
             reference_image: 参考图片（封面图）
-            retry_count: 当前重试次数
             full_outline: 完整的大纲文本
             user_images: 用户上传的参考图片列表
             user_topic: 用户原始输入
+            hedge_job: 所属任务（传入时启用对冲请求，消耗该任务的对冲预算）
 
         Returns:
-            (index, success, filename, error_message)
+            (index, success, filename, error_message, provider)：provider 为生成该页的服务商
         """
         index = page["index"]
-        page_type = page["type"]
-        page_content = page["content"]
 
         try:
-            logger.debug(f"生成图片 [{index}]: type={page_type}")
-
-            # 根据配置选择模板（短 prompt 或完整 prompt）
-            if self.use_short_prompt and self.prompt_template_short:
-                # 短 prompt 模式：只包含页面类型和内容
-                prompt = self.prompt_template_short.format(
-                    page_content=page_content,
-                    page_type=page_type
-                )
-                logger.debug(f"  使用短 prompt 模式 ({len(prompt)} 字符)")
-            else:
-                # 完整 prompt 模式：包含大纲和用户需求
-                prompt = self.prompt_template.format(
-                    page_content=page_content,
-                    page_type=page_type,
-                    full_outline=full_outline,
-                    user_topic=user_topic if user_topic else "未提供"
-                )
+            logger.debug(f"生成图片 [{index}]: type={page['type']}")
 
-            # 调用生成器生成图片
-            if self.provider_config.get('type') == 'google_genai':
-                logger.debug(f"  使用 Google GenAI 生成器")
-                image_data = self.generator.generate_image(
-                    prompt=prompt,
-                    aspect_ratio=self.provider_config.get('default_aspect_ratio', '3:4'),
-                    temperature=self.provider_config.get('temperature', 1.0),
-                    model=self.provider_config.get('model', 'gemini-3-pro-image-preview'),
-                    reference_image=reference_image,
-                )
-            elif self.provider_config.get('type') == 'image_api':
-                logger.debug(f"  使用 Image API 生成器")
-                # Image API 支持多张参考图片
-                # 组合参考图片：用户上传的图片 + 封面图
-                reference_images = []
-                if user_images:
-                    reference_images.extend(user_images)
-                if reference_image:
-                    reference_images.append(reference_image)
-
-                image_data = self.generator.generate_image(
-                    prompt=prompt,
-                    aspect_ratio=self.provider_config.get('default_aspect_ratio', '3:4'),
-                    temperature=self.provider_config.get('temperature', 1.0),
-                    model=self.provider_config.get('model', 'nano-banana-2'),
-                    reference_images=reference_images if reference_images else None,
-                )
+            image_data = self._fetch_image(
+                page, reference_image, full_outline, user_images, user_topic, hedge_job
+            )
+
+            # 保存图片到任务目录
+            filename = f"{index}.png"
+            self._save_image(image_data, filename, task_dir)
+            logger.info(f"✅ 图片 [{index}] 生成成功: {filename} ({get_image_provider(image_data) or '缓存'})")
+
+            return (index, True, filename, None, get_image_provider(image_data))
+
+        except Exception as e:
+            error_msg = str(e)
+            logger.error(f"❌ 图片 [{index}] 生成失败: {error_msg[:200]}")
+            return (index, False, None, error_msg, None)
+
+    async def _generate_single_image_async(
+        self,
+        page: Dict,
+        task_dir: str,
+        reference_image: Optional[bytes] = None,
+        full_outline: str = "",
+        user_images: Optional[List[bytes]] = None,
+        user_topic: str = "",
+        hedge_job: Optional[ImageGenerationJob] = None
+    ) -> Tuple[int, bool, Optional[str], Optional[str], Optional[str]]:
+        """
+        _generate_single_image 的协程版本（execution_mode: async 时使用）
+
+        等待服务商响应期间不占用线程；保存图片和生成缩略图是 CPU / 磁盘操作，放到线程中执行。
+
+        Returns:
+            (index, success, filename, error_message, provider)
+        """
+        index = page["index"]
+
+        try:
+            logger.debug(f"异步生成图片 [{index}]: type={page['type']}")
+
+            image_data = await self._fetch_image_async(
+                page, reference_image, full_outline, user_images, user_topic, hedge_job
+            )
+
+            filename = f"{index}.png"
+            await asyncio.to_thread(self._save_image, image_data, filename, task_dir)
+            logger.info(f"✅ 图片 [{index}] 生成成功: {filename} ({get_image_provider(image_data) or '缓存'})")
+
+            return (index, True, filename, None, get_image_provider(image_data))
+
+        except Exception as e:
+            error_msg = str(e)
+            logger.error(f"❌ 图片 [{index}] 生成失败: {error_msg[:200]}")
+            return (index, False, None, error_msg, None)
+
+    def _get_cover_candidates(self) -> int:
+        """封面候选数（cover_candidates 配置，最小为 1）"""
+        try:
+            return max(1, int(self.provider_config.get('cover_candidates', 1)))
+        except (TypeError, ValueError):
+            return 1
+
+    def _affordable_candidates(self, candidates: int, needs_reference: bool) -> int:
+        """
+        按服务商当前空闲的并发名额收缩候选数
+
+        落选的候选请求同样占用服务商的并发名额，多个任务同时生成封面时不能无限叠加；
+        服务商繁忙（名额已满）时退化为单个请求。
+        """
+        spare = sum(
+            max(0, route.limiter.limit - route.limiter.in_flight)
+            for route in self.router.plan(needs_reference)
+        )
+        return max(1, min(candidates, spare))
+
+    def _generate_cover(
+        self,
+        cover_page: Dict,
+        task_dir: str,
+        full_outline: str = "",
+        user_images: Optional[List[bytes]] = None,
+        user_topic: str = ""
+    ) -> Tuple[int, bool, Optional[str], Optional[str], Optional[bytes]]:
+        """
+        生成封面
+
+        cover_candidates > 1 时同时发起多次封面请求，采用最先成功的一张，
+        其余请求取消（异步模式）或丢弃结果（线程模式），从而缩短内容页开始生成前的等待。
+        启用缓存时先查缓存并登记 single-flight，胜出的封面写入缓存。
+
+        Returns:
+            (index, success, filename, error_message, image_data)：
+            image_data 为封面原图，用于直接在内存中生成参考图
+        """
+        index = cover_page["index"]
+        candidates = self._get_cover_candidates()
+        if candidates > 1:
+            candidates = self._affordable_candidates(candidates, bool(user_images))
+        if candidates > 1:
+            logger.info(f"封面 [{index}] 同时发起 {candidates} 个候选请求")
+
+        try:
+            if candidates > 1 and self.use_async:
+                image_data = get_async_engine().submit(
+                    self._fetch_image_async(
+                        cover_page, None, full_outline, user_images, user_topic, candidates=candidates
+                    )
+                ).result()
             else:
-                logger.debug(f"  使用 OpenAI 兼容生成器")
-                image_data = self.generator.generate_image(
-                    prompt=prompt,
-                    size=self.provider_config.get('default_size', '1024x1024'),
-                    model=self.provider_config.get('model'),
-                    quality=self.provider_config.get('quality', 'standard'),
+                image_data = self._fetch_image(
+                    cover_page, None, full_outline, user_images, user_topic, candidates=candidates
                 )
 
-            # 保存图片（使用当前任务目录）
             filename = f"{index}.png"
-            self._save_image(image_data, filename, self.current_task_dir)
-            logger.info(f"✅ 图片 [{index}] 生成成功: {filename}")
-
-            return (index, True, filename, None)
+            self._save_image(image_data, filename, task_dir, renditions=False)
+            logger.info(f"✅ 图片 [{index}] 生成成功: {filename} ({get_image_provider(image_data) or '缓存'})")
+            return (index, True, filename, None, image_data)
 
         except Exception as e:
             error_msg = str(e)
             logger.error(f"❌ 图片 [{index}] 生成失败: {error_msg[:200]}")
-            return (index, False, None, error_msg)
+            return (index, False, None, error_msg, None)
+
+    def _race_cover(
+        self,
+        cover_page: Dict,
+        candidates: int,
+        full_outline: str,
+        user_images: Optional[List[bytes]],
+        user_topic: str
+    ) -> bytes:
+        """线程模式：返回最先成功的封面，全部失败时抛出第一个错误"""
+        executor = self._get_speculative_executor()
+        futures = [
+            executor.submit(
+                self._request_image, cover_page, None, full_outline, user_images, user_topic
+            )
+            for _ in range(candidates)
+        ]
+        try:
+            return self._first_success(futures, f"封面 [{cover_page['index']}]")
+        finally:
+            # 不等待落选的请求：线程无法中断，在共享线程池中结束后丢弃结果
+            for future in futures:
+                future.cancel()
+
+    async def _race_cover_async(
+        self,
+        cover_page: Dict,
+        candidates: int,
+        full_outline: str,
+        user_images: Optional[List[bytes]],
+        user_topic: str
+    ) -> bytes:
+        """异步模式：返回最先成功的封面，并取消其余请求"""
+        pending = {
+            asyncio.ensure_future(
+                self._request_image_async(cover_page, None, full_outline, user_images, user_topic)
+            )
+            for _ in range(candidates)
+        }
+        first_error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    logger.warning(f"封面候选失败: {str(task.exception())[:200]}")
+                    first_error = first_error or task.exception()
+            raise first_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _submit_pages(
+        self,
+        executor: Optional[ThreadPoolExecutor],
+        job: ImageGenerationJob,
+        pages: List[Dict],
+        task_dir: str,
+        reference_image: Optional[bytes],
+        full_outline: str,
+        user_images: Optional[List[bytes]],
+        user_topic: str
+    ) -> Dict[Future, Dict]:
+        """
+        并发提交多个页面的生成任务（启用对冲时，慢请求会消耗 job 的对冲预算发起重复请求）
+
+        execution_mode 为 async 时提交到共享事件循环（不占用线程），否则提交到线程池。
+
+        Returns:
+            Dict[Future, page]: 可直接配合 as_completed 使用
+        """
+        hedge_job = job if job.hedge_budget > 0 else None
+        args = (task_dir, reference_image, full_outline, user_images, user_topic, hedge_job)
+        if self.use_async:
+            engine = get_async_engine()
+            return {
+                engine.submit(self._generate_single_image_async(page, *args)): page
+                for page in pages
+            }
+        return {
+            executor.submit(self._generate_single_image, page, *args): page
+            for page in pages
+        }
 
     def generate_images(
         self,
@@ -216,7 +756,8 @@ class ImageService:
         task_id: str = None,
         full_outline: str = "",
         user_images: Optional[List[bytes]] = None,
-        user_topic: str = ""
+        user_topic: str = "",
+        skip_indices: Optional[Iterable[int]] = None
     ) -> Generator[Dict[str, Any], None, None]:
         """
         生成图片（生成器，支持 SSE 流式返回）
@@ -228,6 +769,7 @@ class ImageService:
             full_outline: 完整的大纲文本（用于保持风格一致）
             user_images: 用户上传的参考图片列表（可选）
             user_topic: 用户原始输入（用于保持意图一致）
+            skip_indices: 已生成的页面索引（断点续跑时跳过，图片文件不存在的仍会重新生成）
 
         Yields:
             进度事件字典
@@ -238,9 +780,8 @@ class ImageService:
         logger.info(f"开始图片生成任务: task_id={task_id}, pages={len(pages)}")
 
         # 创建任务专属目录
-        self.current_task_dir = os.path.join(self.history_root_dir, task_id)
-        os.makedirs(self.current_task_dir, exist_ok=True)
-        logger.debug(f"任务目录: {self.current_task_dir}")
+        task_dir = self._get_task_dir(task_id)
+        logger.debug(f"任务目录: {task_dir}")
 
         total = len(pages)
         generated_images = []
@@ -250,18 +791,22 @@ class ImageService:
         # 压缩用户上传的参考图到200KB以内（减少内存和传输开销）
         compressed_user_images = None
         if user_images:
-            compressed_user_images = [compress_image(img, max_size_kb=200) for img in user_images]
-
-        # 初始化任务状态
-        self._task_states[task_id] = {
-            "pages": pages,
-            "generated": {},
-            "failed": {},
-            "cover_image": None,
-            "full_outline": full_outline,
-            "user_images": compressed_user_images,
-            "user_topic": user_topic
-        }
+            compressed_user_images = self.postprocessor.compress_references(user_images)
+
+        # 创建任务（任务级状态全部保存在 job 中，并发请求互不干扰）
+        job = self._jobs.create(
+            task_id, task_dir,
+            pages=pages,
+            full_outline=full_outline,
+            user_images=compressed_user_images,
+            user_topic=user_topic
+        )
+        job.reset_hedge_budget(self._get_hedge_budget())
+        job.start()
+
+        # 参考图在任务内只编码一次（data URI / inline Part），每页请求复用同一个对象
+        encoded_user_images = job.encoded_references.encode_all(compressed_user_images)
+        cover_reference = None
 
         # ==================== 第一阶段：生成封面 ====================
         cover_page = None
@@ -278,14 +823,34 @@ class ImageService:
             cover_page = pages[0]
             other_pages = pages[1:]
 
-        if cover_page:
+        # 断点续跑：只跳过图片文件确实存在的页面
+        resumed_indices = set()
+        if skip_indices:
+            resumed_indices = {
+                i for i in skip_indices
+                if os.path.exists(os.path.join(task_dir, f"{i}.png"))
+            }
+            if resumed_indices:
+                logger.info(f"断点续跑: 跳过已生成的 {len(resumed_indices)} 页")
+
+        if cover_page and cover_page["index"] in resumed_indices:
+            # 封面已生成：直接读取作为参考图
+            filename = f"{cover_page['index']}.png"
+            generated_images.append(filename)
+            job.mark_generated(cover_page["index"], filename)
+            with open(os.path.join(task_dir, filename), "rb") as f:
+                cover_image_data = self.postprocessor.compress_reference(f.read())
+            job.set_cover_image(cover_image_data)
+            cover_reference = job.encoded_references.encode(cover_image_data)
+        elif cover_page:
             # 发送封面生成进度
+            candidates = self._get_cover_candidates()
             yield {
                 "event": "progress",
                 "data": {
                     "index": cover_page["index"],
                     "status": "generating",
-                    "message": "正在生成封面...",
+                    "message": "正在生成封面..." if candidates <= 1 else f"正在生成封面（{candidates} 个候选）...",
                     "current": 1,
                     "total": total,
                     "phase": "cover"
@@ -293,36 +858,42 @@ class ImageService:
             }
 
             # 生成封面（使用用户上传的图片作为参考）
-            index, success, filename, error = self._generate_single_image(
-                cover_page, task_id, reference_image=None, full_outline=full_outline,
-                user_images=compressed_user_images, user_topic=user_topic
+            index, success, filename, error, cover_original = self._generate_cover(
+                cover_page, task_dir, full_outline=full_outline,
+                user_images=encoded_user_images, user_topic=user_topic
             )
 
             if success:
+                provider = get_image_provider(cover_original)
                 generated_images.append(filename)
-                self._task_states[task_id]["generated"][index] = filename
-
-                # 读取封面图片作为参考，并立即压缩到200KB以内
-                cover_path = os.path.join(self.current_task_dir, filename)
-                with open(cover_path, "rb") as f:
-                    cover_image_data = f.read()
-
-                # 压缩封面图（减少内存占用和后续传输开销）
-                cover_image_data = compress_image(cover_image_data, max_size_kb=200)
-                self._task_states[task_id]["cover_image"] = cover_image_data
+                job.mark_generated(index, filename, provider)
 
                 yield {
                     "event": "complete",
                     "data": {
                         "index": index,
                         "status": "done",
-                        "image_url": f"/api/images/{task_id}/{filename}",
+                        "image_url": versioned_image_url(task_id, filename, task_dir),
+                        "provider": provider,
                         "phase": "cover"
                     }
                 }
+
+                # 直接用内存中的封面原图，一次解码生成衍生图和200KB以内的参考图（减少内存占用和后续传输开销）
+                try:
+                    cover_image_data = self.postprocessor.renditions_with_reference(
+                        bytes(cover_original), task_dir, filename,
+                        Config.IMAGE_NORMALIZE_STORAGE, Config.IMAGE_CANVAS_SIZE
+                    )
+                except Exception as e:
+                    # 衍生图失败不影响后续页面：直接用封面原图作为参考图
+                    logger.error(f"封面衍生图生成失败，使用原图作为参考图: {e}")
+                    cover_image_data = bytes(cover_original)
+                job.set_cover_image(cover_image_data)
+                cover_reference = job.encoded_references.encode(cover_image_data)
             else:
                 failed_pages.append(cover_page)
-                self._task_states[task_id]["failed"][index] = error
+                job.mark_failed(index, error)
 
                 yield {
                     "event": "error",
@@ -335,6 +906,14 @@ class ImageService:
                     }
                 }
 
+        # 断点续跑：跳过已生成的内容页
+        for page in other_pages:
+            if page["index"] in resumed_indices:
+                filename = f"{page['index']}.png"
+                generated_images.append(filename)
+                job.mark_generated(page["index"], filename)
+        other_pages = [p for p in other_pages if p["index"] not in resumed_indices]
+
         # ==================== 第二阶段：生成其他页面 ====================
         if other_pages:
             # 检查是否启用高并发模式
@@ -353,22 +932,13 @@ class ImageService:
                     }
                 }
 
-                # 使用线程池并发生成
-                with ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT) as executor:
-                    # 提交所有任务
-                    future_to_page = {
-                        executor.submit(
-                            self._generate_single_image,
-                            page,
-                            task_id,
-                            cover_image_data,  # 使用封面作为参考
-                            0,  # retry_count
-                            full_outline,  # 传入完整大纲
-                            compressed_user_images,  # 用户上传的参考图片（已压缩）
-                            user_topic  # 用户原始输入
-                        ): page
-                        for page in other_pages
-                    }
+                # 使用线程池（或异步引擎）并发生成
+                with self._executor() as executor:
+                    # 提交所有任务（封面作为参考，传入完整大纲、已压缩的用户参考图和原始输入）
+                    future_to_page = self._submit_pages(
+                        executor, job, other_pages, task_dir, cover_reference,
+                        full_outline, encoded_user_images, user_topic
+                    )
 
                     # 发送每个页面的进度
                     for page in other_pages:
@@ -387,24 +957,25 @@ class ImageService:
                     for future in as_completed(future_to_page):
                         page = future_to_page[future]
                         try:
-                            index, success, filename, error = future.result()
+                            index, success, filename, error, provider = future.result()
 
                             if success:
                                 generated_images.append(filename)
-                                self._task_states[task_id]["generated"][index] = filename
+                                job.mark_generated(index, filename, provider)
 
                                 yield {
                                     "event": "complete",
                                     "data": {
                                         "index": index,
                                         "status": "done",
-                                        "image_url": f"/api/images/{task_id}/{filename}",
+                                        "image_url": versioned_image_url(task_id, filename, task_dir),
+                                        "provider": provider,
                                         "phase": "content"
                                     }
                                 }
                             else:
                                 failed_pages.append(page)
-                                self._task_states[task_id]["failed"][index] = error
+                                job.mark_failed(index, error)
 
                                 yield {
                                     "event": "error",
@@ -420,7 +991,7 @@ class ImageService:
                         except Exception as e:
                             failed_pages.append(page)
                             error_msg = str(e)
-                            self._task_states[task_id]["failed"][page["index"]] = error_msg
+                            job.mark_failed(page["index"], error_msg)
 
                             yield {
                                 "event": "error",
@@ -459,32 +1030,32 @@ class ImageService:
                     }
 
                     # 生成单张图片
-                    index, success, filename, error = self._generate_single_image(
+                    index, success, filename, error, provider = self._generate_single_image(
                         page,
-                        task_id,
-                        cover_image_data,
-                        0,
+                        task_dir,
+                        cover_reference,
                         full_outline,
-                        compressed_user_images,
+                        encoded_user_images,
                         user_topic
                     )
 
                     if success:
                         generated_images.append(filename)
-                        self._task_states[task_id]["generated"][index] = filename
+                        job.mark_generated(index, filename, provider)
 
                         yield {
                             "event": "complete",
                             "data": {
                                 "index": index,
                                 "status": "done",
-                                "image_url": f"/api/images/{task_id}/{filename}",
+                                "image_url": versioned_image_url(task_id, filename, task_dir),
+                                "provider": provider,
                                 "phase": "content"
                             }
                         }
                     else:
                         failed_pages.append(page)
-                        self._task_states[task_id]["failed"][index] = error
+                        job.mark_failed(index, error)
 
                         yield {
                             "event": "error",
@@ -498,6 +1069,8 @@ class ImageService:
                         }
 
         # ==================== 完成 ====================
+        job.finish()
+
         yield {
             "event": "finish",
             "data": {
@@ -507,7 +1080,8 @@ class ImageService:
                 "total": total,
                 "completed": len(generated_images),
                 "failed": len(failed_pages),
-                "failed_indices": [p["index"] for p in failed_pages]
+                "failed_indices": [p["index"] for p in failed_pages],
+                "providers": job.get_providers()
             }
         }
 
@@ -532,55 +1106,55 @@ class ImageService:
         Returns:
             生成结果
         """
-        self.current_task_dir = os.path.join(self.history_root_dir, task_id)
-        os.makedirs(self.current_task_dir, exist_ok=True)
+        task_dir = self._get_task_dir(task_id)
 
         reference_image = None
         user_images = None
 
-        # 首先尝试从任务状态中获取上下文
-        if task_id in self._task_states:
-            task_state = self._task_states[task_id]
-            if use_reference:
-                reference_image = task_state.get("cover_image")
-            # 如果没有传入上下文，则使用任务状态中的
-            if not full_outline:
-                full_outline = task_state.get("full_outline", "")
-            if not user_topic:
-                user_topic = task_state.get("user_topic", "")
-            user_images = task_state.get("user_images")
-
-        # 如果任务状态中没有封面图，尝试从文件系统加载
+        # 首先尝试从任务中获取上下文（服务重启后任务不存在，则创建空上下文的任务）
+        job = self._jobs.get_or_create(task_id, task_dir)
+        if use_reference:
+            reference_image = job.cover_image
+        # 如果没有传入上下文，则使用任务中保存的
+        if not full_outline:
+            full_outline = job.full_outline
+        if not user_topic:
+            user_topic = job.user_topic
+        user_images = job.user_images
+
+        # 如果任务中没有封面图，尝试从文件系统加载
         if use_reference and reference_image is None:
-            cover_path = os.path.join(self.current_task_dir, "0.png")
+            cover_path = os.path.join(task_dir, "0.png")
             if os.path.exists(cover_path):
                 with open(cover_path, "rb") as f:
                     cover_data = f.read()
                 # 压缩封面图到 200KB
-                reference_image = compress_image(cover_data, max_size_kb=200)
+                reference_image = self.postprocessor.compress_reference(cover_data)
+                job.set_cover_image(reference_image)
 
-        index, success, filename, error = self._generate_single_image(
+        reference_image = job.encoded_references.encode(reference_image)
+        user_images = job.encoded_references.encode_all(user_images)
+
+        index, success, filename, error, provider = self._generate_single_image(
             page,
-            task_id,
+            task_dir,
             reference_image,
-            0,
             full_outline,
             user_images,
             user_topic
         )
 
         if success:
-            if task_id in self._task_states:
-                self._task_states[task_id]["generated"][index] = filename
-                if index in self._task_states[task_id]["failed"]:
-                    del self._task_states[task_id]["failed"][index]
+            job.mark_generated(index, filename, provider)
 
             return {
                 "success": True,
                 "index": index,
-                "image_url": f"/api/images/{task_id}/{filename}"
+                "image_url": versioned_image_url(task_id, filename, task_dir),
+                "provider": provider
             }
         else:
+            job.mark_failed(index, error)
             return {
                 "success": False,
                 "index": index,
@@ -603,10 +1177,13 @@ class ImageService:
         Yields:
             进度事件
         """
-        # 获取参考图
-        reference_image = None
-        if task_id in self._task_states:
-            reference_image = self._task_states[task_id].get("cover_image")
+        task_dir = self._get_task_dir(task_id)
+        job = self._jobs.get_or_create(task_id, task_dir)
+        job.reset_hedge_budget(self._get_hedge_budget())
+
+        # 获取参考图（任务内只编码一次）
+        reference_image = job.encoded_references.encode(job.cover_image)
+        user_images = job.encoded_references.encode_all(job.user_images)
 
         total = len(pages)
         success_count = 0
@@ -620,47 +1197,34 @@ class ImageService:
             }
         }
 
-        # 并发重试
-        # 从任务状态中获取完整大纲
-        full_outline = ""
-        if task_id in self._task_states:
-            full_outline = self._task_states[task_id].get("full_outline", "")
-
-        with ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT) as executor:
-            future_to_page = {
-                executor.submit(
-                    self._generate_single_image,
-                    page,
-                    task_id,
-                    reference_image,
-                    0,  # retry_count
-                    full_outline  # 传入完整大纲
-                ): page
-                for page in pages
-            }
+        # 并发重试（使用任务中保存的大纲、用户参考图和原始输入）
+        with self._executor() as executor:
+            future_to_page = self._submit_pages(
+                executor, job, pages, task_dir, reference_image,
+                job.full_outline, user_images, job.user_topic
+            )
 
             for future in as_completed(future_to_page):
                 page = future_to_page[future]
                 try:
-                    index, success, filename, error = future.result()
+                    index, success, filename, error, provider = future.result()
 
                     if success:
                         success_count += 1
-                        if task_id in self._task_states:
-                            self._task_states[task_id]["generated"][index] = filename
-                            if index in self._task_states[task_id]["failed"]:
-                                del self._task_states[task_id]["failed"][index]
+                        job.mark_generated(index, filename, provider)
 
                         yield {
                             "event": "complete",
                             "data": {
                                 "index": index,
                                 "status": "done",
-                                "image_url": f"/api/images/{task_id}/{filename}"
+                                "image_url": versioned_image_url(task_id, filename, task_dir),
+                                "provider": provider
                             }
                         }
                     else:
                         failed_count += 1
+                        job.mark_failed(index, error)
                         yield {
                             "event": "error",
                             "data": {
@@ -734,14 +1298,22 @@ class ImageService:
         task_dir = os.path.join(self.history_root_dir, task_id)
         return os.path.join(task_dir, filename)
 
+    def get_job(self, task_id: str) -> Optional[ImageGenerationJob]:
+        """获取任务对象"""
+        return self._jobs.get(task_id)
+
     def get_task_state(self, task_id: str) -> Optional[Dict]:
         """获取任务状态"""
-        return self._task_states.get(task_id)
+        job = self._jobs.get(task_id)
+        if job is None:
+            return None
+        state = job.to_state()
+        state["progress"] = job.get_progress()
+        return state
 
     def cleanup_task(self, task_id: str):
         """清理任务状态（释放内存）"""
-        if task_id in self._task_states:
-            del self._task_states[task_id]
+        self._jobs.remove(task_id)
 
 
 # 全局服务实例
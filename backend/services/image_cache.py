@@ -0,0 +1,264 @@
+"""
+图片生成缓存（内容寻址）
+
+相同的渲染后提示词 + 生成参数 + 参考图摘要，生成结果可以直接复用。
+缓存文件保存在 cache/images/<摘要前两位>/<摘要>.png，按最近使用时间（文件 mtime）
+做 LRU 淘汰，总大小不超过 max_bytes。
+
+同一个 key 同时只会有一次真实的服务商调用（single-flight）：
+任务内内容完全相同的页面会等待第一次调用的结果，而不是重复请求。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, Optional, Tuple
+
+from backend.utils.encoded_image import EncodedImage
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(provider_type: str, generator_kwargs: Dict[str, Any]) -> str:
+    """
+    根据生成参数计算缓存 key
+
+    图片类参数（bytes / EncodedImage 及其列表）只取原图的 sha256 摘要参与计算。
+
+    Args:
+        provider_type: 服务商类型
+        generator_kwargs: 传给 generate_image 的参数（包含渲染后的 prompt）
+
+    Returns:
+        str: sha256 十六进制摘要
+    """
+    def normalize(value):
+        if isinstance(value, EncodedImage):
+            return "sha256:" + value.source_digest
+        if isinstance(value, (bytes, bytearray)):
+            return "sha256:" + hashlib.sha256(value).hexdigest()
+        if isinstance(value, (list, tuple)):
+            return [normalize(v) for v in value]
+        return value
+
+    material = {
+        "provider_type": provider_type,
+        "params": {k: normalize(v) for k, v in generator_kwargs.items()},
+    }
+    payload = json.dumps(material, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ImageCache:
+    """磁盘 LRU 图片缓存（线程安全）"""
+
+    DEFAULT_MAX_BYTES = 1024 * 1024 * 1024  # 默认上限 1GB
+
+    def __init__(self, root_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Args:
+            root_dir: 缓存目录
+            max_bytes: 缓存总大小上限（字节）
+        """
+        self.root_dir = root_dir
+        self.max_bytes = max(0, int(max_bytes))
+
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> 文件大小，按最近使用排序
+        self._total_bytes = 0
+        self._inflight: Dict[str, Future] = {}
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root_dir, key[:2], f"{key}.png")
+
+    def _load_index(self) -> None:
+        """扫描缓存目录，按 mtime 重建 LRU 顺序"""
+        entries = []
+        for sub in os.scandir(self.root_dir):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if not entry.name.endswith(".png"):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+
+        entries.sort()
+        for _, key, size in entries:
+            self._entries[key] = size
+            self._total_bytes += size
+
+        logger.info(f"图片缓存: {len(self._entries)} 个文件, {self._total_bytes / 1024 / 1024:.1f}MB")
+        with self._lock:
+            self._evict_locked()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        读取缓存
+
+        Args:
+            key: 缓存 key
+
+        Returns:
+            Optional[bytes]: 图片数据，未命中返回 None
+        """
+        with self._lock:
+            if key not in self._entries:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # 更新 mtime，重启后仍能还原 LRU 顺序
+            os.utime(path, None)
+        except OSError:
+            with self._lock:
+                size = self._entries.pop(key, None)
+                if size is not None:
+                    self._total_bytes -= size
+                self._misses += 1
+            return None
+
+        with self._lock:
+            self._hits += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """
+        写入缓存（先写临时文件再原子替换），超出上限时淘汰最久未使用的文件
+
+        Args:
+            key: 缓存 key
+            data: 图片数据
+        """
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            old_size = self._entries.pop(key, None)
+            if old_size is not None:
+                self._total_bytes -= old_size
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        """淘汰最久未使用的文件直到总大小不超过上限（调用方需持有锁）"""
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            logger.debug(f"图片缓存淘汰: {key[:12]} ({size} bytes)")
+
+    def claim(self, key: str) -> Tuple[Future, bool]:
+        """
+        登记一次生成（single-flight）
+
+        Args:
+            key: 缓存 key
+
+        Returns:
+            (future, owner)：owner 为 True 时由调用方负责生成并调用 resolve()；
+            否则等待 future 拿到同一次生成的结果
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            return future, True
+
+    def resolve(
+        self,
+        key: str,
+        data: Optional[bytes] = None,
+        error: Optional[BaseException] = None,
+        store_key: Optional[str] = None
+    ) -> None:
+        """
+        结束一次生成：成功时写入缓存，并唤醒等待同一 key 的调用
+
+        Args:
+            key: claim() 时使用的缓存 key
+            data: 生成的图片数据
+            error: 生成失败时的异常
+            store_key: 写入缓存使用的 key（默认与 key 相同，如实际生成的服务商与登记时不同）
+        """
+        if error is None and data is not None:
+            self.put(store_key or key, data)
+
+        with self._lock:
+            future = self._inflight.pop(key, None)
+
+        if future is not None:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(data)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            return {
+                "files": len(self._entries),
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "inflight": len(self._inflight),
+            }
+
+
+# 全局缓存实例
+_cache_instance: Optional[ImageCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_image_cache(max_size_mb: Optional[float] = None) -> ImageCache:
+    """
+    获取全局图片缓存（cache/images）
+
+    Args:
+        max_size_mb: 缓存上限（MB），传入时更新上限
+
+    Returns:
+        ImageCache: 缓存实例
+    """
+    global _cache_instance
+    with _cache_lock:
+        if _cache_instance is None:
+            root_dir = os.path.join(
+                os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                "cache",
+                "images"
+            )
+            max_bytes = ImageCache.DEFAULT_MAX_BYTES if max_size_mb is None else int(max_size_mb * 1024 * 1024)
+            _cache_instance = ImageCache(root_dir, max_bytes)
+        elif max_size_mb is not None:
+            with _cache_instance._lock:
+                _cache_instance.max_bytes = int(max_size_mb * 1024 * 1024)
+                _cache_instance._evict_locked()
+        return _cache_instance
@@ -0,0 +1,250 @@
+"""
+图片生成任务
+
+每次 /api/generate 调用对应一个 ImageGenerationJob，保存该任务专属的
+输出目录、页面、封面参考图和进度。ImageService 是全局单例，因此所有
+任务级状态都必须放在 Job 对象里，而不是挂在服务实例上。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from backend.utils.encoded_image import EncodedImageCache
+
+
+class JobStatus:
+    """任务状态常量"""
+    PENDING = "pending"        # 已创建，尚未开始
+    RUNNING = "running"        # 生成中
+    FINISHED = "finished"      # 已结束（无论成功与否）
+
+
+class ImageGenerationJob:
+    """单个图片生成任务的上下文"""
+
+    def __init__(
+        self,
+        task_id: str,
+        task_dir: str,
+        pages: Optional[List[Dict]] = None,
+        full_outline: str = "",
+        user_images: Optional[List[bytes]] = None,
+        user_topic: str = ""
+    ):
+        """
+        Args:
+            task_id: 任务 ID
+            task_dir: 任务输出目录（history/<task_id>）
+            pages: 页面列表
+            full_outline: 完整大纲文本
+            user_images: 用户上传的参考图片（已压缩）
+            user_topic: 用户原始输入
+        """
+        self.task_id = task_id
+        self.task_dir = task_dir
+        self.pages = pages or []
+        self.full_outline = full_outline
+        self.user_images = user_images
+        self.user_topic = user_topic
+
+        self.generated: Dict[int, str] = {}
+        self.failed: Dict[int, str] = {}
+        self.providers: Dict[int, str] = {}  # 页面索引 -> 生成该页的服务商（用于追踪风格一致性）
+        self.cover_image: Optional[bytes] = None
+
+        # 参考图编码缓存：封面和用户图片只压缩 / base64 编码一次，每页请求复用
+        self.encoded_references = EncodedImageCache()
+
+        # 对冲请求预算：本任务最多额外发起的重复请求数
+        self.hedge_budget = 0
+        self.hedges_used = 0
+
+        self.status = JobStatus.PENDING
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+        self._lock = threading.Lock()
+
+    def _touch(self) -> None:
+        self.updated_at = time.time()
+
+    def start(self) -> None:
+        """标记任务开始"""
+        with self._lock:
+            self.status = JobStatus.RUNNING
+            self._touch()
+
+    def finish(self) -> None:
+        """标记任务结束"""
+        with self._lock:
+            self.status = JobStatus.FINISHED
+            self._touch()
+
+    def set_cover_image(self, cover_image: Optional[bytes]) -> None:
+        """保存封面参考图（已压缩）"""
+        with self._lock:
+            self.cover_image = cover_image
+            self._touch()
+
+    def reset_hedge_budget(self, budget: int) -> None:
+        """重新设置对冲请求预算（每次生成 / 批量重试开始时调用）"""
+        with self._lock:
+            self.hedge_budget = max(0, int(budget))
+            self.hedges_used = 0
+
+    def try_take_hedge(self) -> bool:
+        """占用一次对冲请求预算，预算用完时返回 False"""
+        with self._lock:
+            if self.hedges_used >= self.hedge_budget:
+                return False
+            self.hedges_used += 1
+            return True
+
+    def mark_generated(self, index: int, filename: str, provider: Optional[str] = None) -> None:
+        """记录页面生成成功（及生成该页的服务商），并清除之前的失败状态"""
+        with self._lock:
+            self.generated[index] = filename
+            self.failed.pop(index, None)
+            if provider:
+                self.providers[index] = provider
+            self._touch()
+
+    def get_providers(self) -> Dict[int, str]:
+        """各页面的服务商标签"""
+        with self._lock:
+            return dict(self.providers)
+
+    def mark_failed(self, index: int, error: str) -> None:
+        """记录页面生成失败"""
+        with self._lock:
+            self.failed[index] = error
+            self._touch()
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status == JobStatus.FINISHED
+
+    def get_progress(self) -> Dict[str, Any]:
+        """
+        获取任务进度
+
+        Returns:
+            Dict: total / completed / failed / status
+        """
+        with self._lock:
+            return {
+                "status": self.status,
+                "total": len(self.pages),
+                "completed": len(self.generated),
+                "failed": len(self.failed),
+                "hedges": self.hedges_used,
+            }
+
+    def to_state(self) -> Dict[str, Any]:
+        """
+        导出任务状态快照（兼容旧的 _task_states 字典结构）
+
+        Returns:
+            Dict: pages / generated / failed / providers / cover_image / full_outline / user_images / user_topic
+        """
+        with self._lock:
+            return {
+                "pages": self.pages,
+                "generated": dict(self.generated),
+                "failed": dict(self.failed),
+                "providers": dict(self.providers),
+                "cover_image": self.cover_image,
+                "full_outline": self.full_outline,
+                "user_images": self.user_images,
+                "user_topic": self.user_topic,
+                "status": self.status,
+            }
+
+
+class ImageJobRegistry:
+    """
+    图片生成任务注册表（线程安全）
+
+    多个请求可以同时创建/读取各自的任务。已结束的任务会保留一段时间，
+    供重试接口复用封面和上下文；超过 JOB_TTL 或总数超过 MAX_JOBS 时，
+    优先淘汰最早结束的任务。
+    """
+
+    MAX_JOBS = 200  # 最多保留的任务数
+    JOB_TTL = 6 * 3600  # 已结束任务的保留时间（秒）
+
+    def __init__(self):
+        self._jobs: "OrderedDict[str, ImageGenerationJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(
+        self,
+        task_id: str,
+        task_dir: str,
+        pages: Optional[List[Dict]] = None,
+        full_outline: str = "",
+        user_images: Optional[List[bytes]] = None,
+        user_topic: str = ""
+    ) -> ImageGenerationJob:
+        """创建（或替换）任务"""
+        job = ImageGenerationJob(
+            task_id, task_dir,
+            pages=pages,
+            full_outline=full_outline,
+            user_images=user_images,
+            user_topic=user_topic
+        )
+        with self._lock:
+            self._jobs.pop(task_id, None)
+            self._jobs[task_id] = job
+            self._evict_locked()
+        return job
+
+    def get(self, task_id: str) -> Optional[ImageGenerationJob]:
+        """获取任务，不存在时返回 None"""
+        with self._lock:
+            return self._jobs.get(task_id)
+
+    def get_or_create(self, task_id: str, task_dir: str) -> ImageGenerationJob:
+        """获取任务，不存在时创建一个空上下文的任务（用于服务重启后的重试）"""
+        with self._lock:
+            job = self._jobs.get(task_id)
+            if job is None:
+                job = ImageGenerationJob(task_id, task_dir)
+                self._jobs[task_id] = job
+                self._evict_locked()
+            return job
+
+    def remove(self, task_id: str) -> None:
+        """移除任务（释放内存）"""
+        with self._lock:
+            self._jobs.pop(task_id, None)
+
+    def active_jobs(self) -> List[ImageGenerationJob]:
+        """获取所有未结束的任务"""
+        with self._lock:
+            return [job for job in self._jobs.values() if not job.is_finished]
+
+    def _evict_locked(self) -> None:
+        """淘汰过期或超量的已结束任务（调用方需持有锁）"""
+        now = time.time()
+        expired = [
+            task_id for task_id, job in self._jobs.items()
+            if job.is_finished and now - job.updated_at > self.JOB_TTL
+        ]
+        for task_id in expired:
+            del self._jobs[task_id]
+
+        if len(self._jobs) <= self.MAX_JOBS:
+            return
+
+        finished = sorted(
+            (job for job in self._jobs.values() if job.is_finished),
+            key=lambda job: job.updated_at
+        )
+        for job in finished:
+            if len(self._jobs) <= self.MAX_JOBS:
+                break
+            del self._jobs[job.task_id]
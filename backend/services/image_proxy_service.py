@@ -8,7 +8,7 @@ API 文档: https://imageproxy.zhongzhuan.chat
 """
 
 import logging
-import requests
+from backend.utils.http_transport import http_post
 from typing import Optional, Tuple
 
 logger = logging.getLogger(__name__)
@@ -39,7 +39,7 @@ class ImageProxyService:
             with open(image_path, 'rb') as f:
                 files = {'file': f}
                 # 发送请求（requests 自动处理 multipart/form-data）
-                response = requests.post(
+                response = http_post(
                     self.api_url,
                     files=files,
                     timeout=60
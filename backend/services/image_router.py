@@ -0,0 +1,344 @@
+"""
+图片服务商路由
+
+image_providers.yaml 中配置 provider_pool 后，同一个任务的页面会分散到池中的多个服务商：
+- 按权重 × 实时表现（延迟滑动平均、近期错误率、当前负载）加权随机选择服务商
+- 熔断中的服务商排到最后，只在其他服务商都失败时才会尝试
+- 调用失败自动切换到下一个服务商（池模式下每个服务商默认不重试，切换本身就是重试）
+- 需要参考图（封面 / 用户上传图片）的请求只路由到支持参考图的服务商，保持风格一致
+- 返回的图片数据带有服务商标签（LabeledImage），用于记录每页由哪个服务商生成
+
+未配置 provider_pool 时池中只有激活的服务商，行为与直接调用生成器相同（含自动重试）。
+"""
+
+import logging
+import random
+import threading
+from typing import Any, Dict, List, Optional
+
+from backend.generators.base import ImageGeneratorBase
+from backend.utils.resilience import RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+# 支持参考图的服务商类型（其他类型会忽略参考图，风格无法与封面保持一致）
+REFERENCE_CAPABLE_TYPES = ('google_genai', 'image_api')
+
+
+def build_generator_kwargs(
+    provider_config: Dict[str, Any],
+    prompt: str,
+    reference_image=None,
+    user_images=None
+) -> Dict[str, Any]:
+    """
+    根据服务商类型组装 generate_image / generate_image_async 的参数
+
+    reference_image / user_images 可以是 bytes，也可以是任务内预编码的 EncodedImage
+
+    Args:
+        provider_config: 服务商配置
+        prompt: 图片提示词
+        reference_image: 参考图片（封面图）
+        user_images: 用户上传的参考图片列表
+
+    Returns:
+        Dict: 生成器参数
+    """
+    provider_type = provider_config.get('type')
+    if provider_type == 'google_genai':
+        return {
+            "prompt": prompt,
+            "aspect_ratio": provider_config.get('default_aspect_ratio', '3:4'),
+            "temperature": provider_config.get('temperature', 1.0),
+            "model": provider_config.get('model', 'gemini-3-pro-image-preview'),
+            "reference_image": reference_image,
+        }
+    elif provider_type == 'image_api':
+        # Image API 支持多张参考图片
+        # 组合参考图片：用户上传的图片 + 封面图
+        reference_images = []
+        if user_images:
+            reference_images.extend(user_images)
+        if reference_image:
+            reference_images.append(reference_image)
+
+        return {
+            "prompt": prompt,
+            "aspect_ratio": provider_config.get('default_aspect_ratio', '3:4'),
+            "temperature": provider_config.get('temperature', 1.0),
+            "model": provider_config.get('model', 'nano-banana-2'),
+            "reference_images": reference_images if reference_images else None,
+        }
+    else:
+        return {
+            "prompt": prompt,
+            "size": provider_config.get('default_size', '1024x1024'),
+            "model": provider_config.get('model'),
+            "quality": provider_config.get('quality', 'standard'),
+        }
+
+
+class LabeledImage(bytes):
+    """
+    带服务商标签的图片数据（bytes 子类，可直接当作图片数据使用）
+
+    只在本进程内流转；交给后处理进程池等跨进程场景前应先用 bytes(image) 去掉标签。
+    """
+
+    provider: Optional[str] = None
+
+    def __new__(cls, data: bytes, provider: Optional[str]):
+        image = super().__new__(cls, data)
+        image.provider = provider
+        return image
+
+    def __reduce__(self):
+        # __new__ 需要两个参数，默认的 pickle 协议无法重建
+        return (LabeledImage, (bytes(self), self.provider))
+
+
+def get_image_provider(image_data) -> Optional[str]:
+    """读取图片数据上的服务商标签（缓存命中等未经路由的数据返回 None）"""
+    return getattr(image_data, 'provider', None)
+
+
+class ProviderRoute:
+    """池中的一个服务商"""
+
+    ERROR_EWMA_ALPHA = 0.2  # 错误率滑动平均系数
+
+    def __init__(
+        self,
+        name: str,
+        config: Dict[str, Any],
+        generator: ImageGeneratorBase,
+        weight: float,
+        retry_policy: RetryPolicy
+    ):
+        """
+        Args:
+            name: 服务商名称（image_providers.yaml 中的 key）
+            config: 服务商配置
+            generator: 生成器实例
+            weight: 路由权重
+            retry_policy: 该服务商的重试策略
+        """
+        self.name = name
+        self.config = config
+        self.generator = generator
+        self.weight = weight
+        self.retry_policy = retry_policy
+        self.supports_reference = config.get('type', name) in REFERENCE_CAPABLE_TYPES
+
+        self._error_rate = 0.0
+        self._requests = 0
+        self._failures = 0
+        self._lock = threading.Lock()
+
+    @property
+    def limiter(self):
+        return self.generator.limiter
+
+    @property
+    def available(self) -> bool:
+        """熔断器未打开（半开状态可以接受探测请求）"""
+        return self.limiter.breaker.state != self.limiter.breaker.OPEN
+
+    @property
+    def error_rate(self) -> float:
+        return self._error_rate
+
+    def record_result(self, success: bool) -> None:
+        """记录一次调用结果，更新错误率滑动平均"""
+        with self._lock:
+            self._requests += 1
+            if not success:
+                self._failures += 1
+            sample = 0.0 if success else 1.0
+            self._error_rate = self.ERROR_EWMA_ALPHA * sample + (1 - self.ERROR_EWMA_ALPHA) * self._error_rate
+
+    def score(self, default_latency: float, error_penalty: float) -> float:
+        """
+        路由得分：权重 / (延迟 × 错误惩罚 × 负载)，越高越优先
+
+        Args:
+            default_latency: 该服务商没有延迟样本时使用的延迟（秒）
+            error_penalty: 错误率惩罚系数
+        """
+        latency = self.limiter.latency_ewma or default_latency
+        load = 1.0 + self.limiter.in_flight / max(1, self.limiter.limit)
+        return self.weight / (max(latency, 0.1) * (1.0 + error_penalty * self._error_rate) * load)
+
+    def get_stats(self) -> Dict[str, Any]:
+        latency = self.limiter.latency_ewma
+        with self._lock:
+            return {
+                "weight": self.weight,
+                "requests": self._requests,
+                "failures": self._failures,
+                "error_rate": round(self._error_rate, 3),
+                "latency_ewma": round(latency, 3) if latency is not None else None,
+                "in_flight": self.limiter.in_flight,
+                "circuit": self.limiter.breaker.state,
+                "supports_reference": self.supports_reference,
+            }
+
+
+class ImageProviderRouter:
+    """按实时延迟和错误率在服务商池中路由图片请求，失败时自动切换"""
+
+    DEFAULT_LATENCY = 60.0  # 所有服务商都没有延迟样本时假设的延迟（秒）
+    ERROR_PENALTY = 4.0  # 错误率惩罚系数：错误率 100% 时得分降为 1/5
+
+    def __init__(self, routes: List[ProviderRoute]):
+        """
+        Args:
+            routes: 服务商列表，第一个为激活的服务商
+        """
+        if not routes:
+            raise ValueError("服务商池为空")
+        self.routes = routes
+
+    @classmethod
+    def from_config(cls, active_name: str, active_config: Dict[str, Any], active_generator: ImageGeneratorBase,
+                    max_attempts: int = 1) -> "ImageProviderRouter":
+        """
+        根据 provider_pool 配置创建路由器（配置有误的服务商跳过并记录日志）
+
+        Args:
+            active_name: 激活的服务商名称
+            active_config: 激活的服务商配置
+            active_generator: 激活的服务商生成器（复用 ImageService 已创建的实例）
+            max_attempts: 单服务商（未配置池）时的最大尝试次数
+
+        Returns:
+            ImageProviderRouter
+        """
+        from backend.config import Config
+        from backend.generators.factory import ImageGeneratorFactory
+
+        pool = Config.get_image_provider_pool()
+        if not any(name == active_name for name, _ in pool):
+            # 显式指定了池外的服务商：只使用该服务商
+            pool = [(active_name, 1.0)]
+        # 池模式下由切换服务商代替重试，未单独配置 max_retries 时每个服务商只尝试一次
+        attempts = 1 if len(pool) > 1 else max_attempts
+
+        routes = []
+        for name, weight in pool:
+            try:
+                if name == active_name:
+                    config, generator = active_config, active_generator
+                else:
+                    config = Config.get_image_provider_config(name)
+                    generator = ImageGeneratorFactory.create(config.get('type', name), config)
+            except Exception as e:
+                logger.error(f"[服务商路由] 跳过服务商 {name}: {e}")
+                continue
+            routes.append(ProviderRoute(
+                name, config, generator, weight,
+                RetryPolicy.from_provider_config(config, max_attempts=attempts)
+            ))
+
+        if len(routes) > 1:
+            logger.info(f"[服务商路由] 服务商池: {', '.join(f'{r.name}(w={r.weight:g})' for r in routes)}")
+        return cls(routes)
+
+    @property
+    def primary(self) -> ProviderRoute:
+        """激活的服务商"""
+        return self.routes[0]
+
+    @property
+    def is_pool(self) -> bool:
+        return len(self.routes) > 1
+
+    @property
+    def max_concurrency(self) -> int:
+        """池内所有服务商的并发上限之和"""
+        return sum(route.limiter.max_limit for route in self.routes)
+
+    def plan(self, needs_reference: bool) -> List[ProviderRoute]:
+        """
+        本次请求尝试服务商的顺序
+
+        第一个按得分加权随机选出（页面按权重分散到各服务商），其余按得分从高到低；
+        熔断中的服务商排在最后。
+        """
+        routes = self.routes
+        if needs_reference:
+            capable = [route for route in routes if route.supports_reference]
+            routes = capable or routes
+        if len(routes) == 1:
+            return list(routes)
+
+        # 还没有延迟样本的服务商按其他服务商的平均延迟估计，保证新服务商也能分到请求
+        known = [route.limiter.latency_ewma for route in routes if route.limiter.latency_ewma is not None]
+        default_latency = sum(known) / len(known) if known else self.DEFAULT_LATENCY
+
+        scored = [(route.score(default_latency, self.ERROR_PENALTY), route) for route in routes]
+        healthy = [(score, route) for score, route in scored if route.available]
+        broken = [route for score, route in sorted(scored, key=lambda item: -item[0]) if not route.available]
+        if not healthy:
+            return broken
+
+        first = random.choices([route for _, route in healthy], weights=[score for score, _ in healthy])[0]
+        rest = [route for _, route in sorted(healthy, key=lambda item: -item[0]) if route is not first]
+        return [first] + rest + broken
+
+    def generate(self, prompt: str, reference_image=None, user_images=None, label: str = "",
+                 routes: Optional[List[ProviderRoute]] = None) -> LabeledImage:
+        """
+        路由并生成图片（失败时依次切换到下一个服务商）
+
+        Args:
+            prompt: 图片提示词
+            reference_image: 参考图片（封面图）
+            user_images: 用户上传的参考图片列表
+            label: 调用名称（用于日志）
+            routes: 预先用 plan() 选好的尝试顺序（默认本次调用时选择）
+
+        Returns:
+            LabeledImage: 带服务商标签的图片数据
+        """
+        last_error = None
+        for route in routes or self.plan(bool(reference_image or user_images)):
+            kwargs = build_generator_kwargs(route.config, prompt, reference_image, user_images)
+            try:
+                image_data = route.retry_policy.call(
+                    lambda: route.generator.generate_image(**kwargs), name=f"{label} @{route.name}"
+                )
+            except Exception as e:
+                route.record_result(False)
+                last_error = e
+                if self.is_pool:
+                    logger.warning(f"[服务商路由] {label} 在 {route.name} 失败，切换服务商: {str(e)[:100]}")
+                continue
+            route.record_result(True)
+            return LabeledImage(image_data, route.name)
+        raise last_error
+
+    async def generate_async(self, prompt: str, reference_image=None, user_images=None, label: str = "",
+                             routes: Optional[List[ProviderRoute]] = None) -> LabeledImage:
+        """generate() 的协程版本"""
+        last_error = None
+        for route in routes or self.plan(bool(reference_image or user_images)):
+            kwargs = build_generator_kwargs(route.config, prompt, reference_image, user_images)
+            try:
+                image_data = await route.retry_policy.call_async(
+                    lambda: route.generator.generate_image_async(**kwargs), name=f"{label} @{route.name}"
+                )
+            except Exception as e:
+                route.record_result(False)
+                last_error = e
+                if self.is_pool:
+                    logger.warning(f"[服务商路由] {label} 在 {route.name} 失败，切换服务商: {str(e)[:100]}")
+                continue
+            route.record_result(True)
+            return LabeledImage(image_data, route.name)
+        raise last_error
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取池内各服务商的路由统计"""
+        return {route.name: route.get_stats() for route in self.routes}
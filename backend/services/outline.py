@@ -4,11 +4,110 @@ import re
 import base64
 import yaml
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterator, List, Any, Optional
 from backend.utils.text_client import get_text_chat_client
 
 logger = logging.getLogger(__name__)
 
+_PAGE_MARKER = re.compile(r'<page>', flags=re.IGNORECASE)
+
+_PAGE_TYPE_MAPPING = {
+    "封面": "cover",
+    "内容": "content",
+    "总结": "summary",
+}
+
+
+def _build_page(index: int, page_text: str) -> Optional[Dict[str, Any]]:
+    """把单页大纲文本转换为页面字典，空白页返回 None"""
+    page_text = page_text.strip()
+    if not page_text:
+        return None
+
+    page_type = "content"
+    type_match = re.match(r"\[(\S+)\]", page_text)
+    if type_match:
+        page_type = _PAGE_TYPE_MAPPING.get(type_match.group(1), "content")
+
+    return {
+        "index": index,
+        "type": page_type,
+        "content": page_text
+    }
+
+
+def parse_outline(outline_text: str) -> List[Dict[str, Any]]:
+    """
+    解析大纲文本为页面列表
+
+    按 <page> 分割页面（兼容旧的 --- 分隔符），页面 index 为分割后的序号。
+
+    Args:
+        outline_text: 大纲文本
+
+    Returns:
+        List[Dict]: 页面列表（index / type / content）
+    """
+    if _PAGE_MARKER.search(outline_text):
+        pages_raw = _PAGE_MARKER.split(outline_text)
+    else:
+        # 向后兼容：如果没有 <page> 则使用 ---
+        pages_raw = outline_text.split("---")
+
+    pages = []
+    for index, page_text in enumerate(pages_raw):
+        page = _build_page(index, page_text)
+        if page:
+            pages.append(page)
+    return pages
+
+
+class OutlineStreamParser:
+    """
+    增量解析流式输出的大纲
+
+    每读到一个 <page> 标记，就确定前一页的文本已经完整，立即产出该页；
+    页面 index 与 parse_outline 对完整文本的解析结果一致。
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0  # 下一页文本的起始位置
+        self._part_index = 0  # 下一页在分割结果中的序号
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        追加一段文本
+
+        Args:
+            chunk: 新到达的文本片段
+
+        Returns:
+            List[Dict]: 本次新确定的完整页面
+        """
+        # 标记可能被拆在两个片段之间，从上一页起始位置重新查找
+        self.text += chunk
+        pages = []
+        while True:
+            match = _PAGE_MARKER.search(self.text, self._pos)
+            if match is None:
+                break
+            page = _build_page(self._part_index, self.text[self._pos:match.start()])
+            if page:
+                pages.append(page)
+            self._part_index += 1
+            self._pos = match.end()
+        return pages
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """
+        文本结束，返回完整解析结果（以此为准）
+
+        Returns:
+            List[Dict]: 全部页面
+        """
+        return parse_outline(self.text)
+
 
 class OutlineService:
     def __init__(self):
@@ -96,38 +195,100 @@ class OutlineService:
             return f.read()
 
     def _parse_outline(self, outline_text: str) -> List[Dict[str, Any]]:
-        # 按 <page> 分割页面（兼容旧的 --- 分隔符）
-        if '<page>' in outline_text:
-            pages_raw = re.split(r'<page>', outline_text, flags=re.IGNORECASE)
-        else:
-            # 向后兼容：如果没有 <page> 则使用 ---
-            pages_raw = outline_text.split("---")
+        return parse_outline(outline_text)
 
-        pages = []
+    def _build_prompt(self, topic: str, images: Optional[List[bytes]] = None) -> str:
+        """构建大纲提示词"""
+        prompt = self.prompt_template.format(topic=topic)
 
-        for index, page_text in enumerate(pages_raw):
-            page_text = page_text.strip()
-            if not page_text:
-                continue
-
-            page_type = "content"
-            type_match = re.match(r"\[(\S+)\]", page_text)
-            if type_match:
-                type_cn = type_match.group(1)
-                type_mapping = {
-                    "封面": "cover",
-                    "内容": "content",
-                    "总结": "summary",
-                }
-                page_type = type_mapping.get(type_cn, "content")
+        if images and len(images) > 0:
+            prompt += f"\n\n注意：用户提供了 {len(images)} 张参考图片，请在生成大纲时考虑这些图片的内容和风格。这些图片可能是产品图、个人照片或场景图，请根据图片内容来优化大纲，使生成的内容与图片相关联。"
+            logger.debug(f"添加了 {len(images)} 张参考图片到提示词")
 
-            pages.append({
-                "index": index,
-                "type": page_type,
-                "content": page_text
-            })
+        return prompt
 
-        return pages
+    def _get_generation_params(self) -> Dict[str, Any]:
+        """从配置中获取模型参数"""
+        active_provider = self.text_config.get('active_provider', 'google_gemini')
+        providers = self.text_config.get('providers', {})
+        provider_config = providers.get(active_provider, {})
+
+        return {
+            "model": provider_config.get('model', 'gemini-2.0-flash-exp'),
+            "temperature": provider_config.get('temperature', 1.0),
+            "max_output_tokens": provider_config.get('max_output_tokens', 8000),
+        }
+
+    def stream_outline(
+        self,
+        topic: str,
+        images: Optional[List[bytes]] = None
+    ) -> Iterator[str]:
+        """
+        流式生成大纲文本
+
+        客户端支持流式输出（generate_text_stream）时逐段产出，否则一次性产出完整文本。
+        异常直接抛出，由调用方处理。
+
+        Args:
+            topic: 主题
+            images: 用户参考图片（可选）
+
+        Yields:
+            大纲文本片段
+        """
+        prompt = self._build_prompt(topic, images)
+        params = self._get_generation_params()
+        logger.info(f"调用文本生成 API（流式）: model={params['model']}, temperature={params['temperature']}")
+
+        stream = getattr(self.client, 'generate_text_stream', None)
+        if stream is None:
+            yield self.client.generate_text(prompt=prompt, images=images, **params)
+            return
+
+        yield from stream(prompt=prompt, images=images, **params)
+
+    def generate_outline_stream(
+        self,
+        topic: str,
+        images: Optional[List[bytes]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        流式生成大纲（SSE 事件）
+
+        Args:
+            topic: 主题
+            images: 用户参考图片（可选）
+
+        Yields:
+            - {"event": "delta", "data": {"text": ...}}：增量文本
+            - {"event": "page", "data": {"page": ...}}：新完成的一页
+            - {"event": "complete", "data": {...}}：与 generate_outline 的成功结果相同
+            - {"event": "error", "data": {"success": False, "error": ...}}
+        """
+        logger.info(f"开始流式生成大纲: topic={topic[:50]}..., images={len(images) if images else 0}")
+        parser = OutlineStreamParser()
+        try:
+            for chunk in self.stream_outline(topic, images):
+                yield {"event": "delta", "data": {"text": chunk}}
+                for page in parser.feed(chunk):
+                    yield {"event": "page", "data": {"page": page}}
+        except Exception as e:
+            logger.error(f"大纲生成失败: {e}")
+            yield {"event": "error", "data": {"success": False, "error": describe_outline_error(str(e))}}
+            return
+
+        pages = parser.finish()
+        logger.info(f"大纲解析完成，共 {len(pages)} 页")
+        yield {
+            "event": "complete",
+            "data": {
+                "success": True,
+                "outline": parser.text,
+                "pages": pages,
+                "has_images": images is not None and len(images) > 0
+            }
+        }
 
     def generate_outline(
         self,
@@ -136,28 +297,14 @@ class OutlineService:
     ) -> Dict[str, Any]:
         try:
             logger.info(f"开始生成大纲: topic={topic[:50]}..., images={len(images) if images else 0}")
-            prompt = self.prompt_template.format(topic=topic)
+            prompt = self._build_prompt(topic, images)
+            params = self._get_generation_params()
 
-            if images and len(images) > 0:
-                prompt += f"\n\n注意：用户提供了 {len(images)} 张参考图片，请在生成大纲时考虑这些图片的内容和风格。这些图片可能是产品图、个人照片或场景图，请根据图片内容来优化大纲，使生成的内容与图片相关联。"
-                logger.debug(f"添加了 {len(images)} 张参考图片到提示词")
-
-            # 从配置中获取模型参数
-            active_provider = self.text_config.get('active_provider', 'google_gemini')
-            providers = self.text_config.get('providers', {})
-            provider_config = providers.get(active_provider, {})
-
-            model = provider_config.get('model', 'gemini-2.0-flash-exp')
-            temperature = provider_config.get('temperature', 1.0)
-            max_output_tokens = provider_config.get('max_output_tokens', 8000)
-
-            logger.info(f"调用文本生成 API: model={model}, temperature={temperature}")
+            logger.info(f"调用文本生成 API: model={params['model']}, temperature={params['temperature']}")
             outline_text = self.client.generate_text(
                 prompt=prompt,
-                model=model,
-                temperature=temperature,
-                max_output_tokens=max_output_tokens,
-                images=images
+                images=images,
+                **params
             )
 
             logger.debug(f"API 返回文本长度: {len(outline_text)} 字符")
@@ -175,54 +322,7 @@ class OutlineService:
             error_msg = str(e)
             logger.error(f"大纲生成失败: {error_msg}")
 
-            # 根据错误类型提供更详细的错误信息
-            if "api_key" in error_msg.lower() or "unauthorized" in error_msg.lower() or "401" in error_msg:
-                detailed_error = (
-                    f"API 认证失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. API Key 无效或已过期\n"
-                    "2. API Key 没有访问该模型的权限\n"
-                    "解决方案：在系统设置页面检查并更新 API Key"
-                )
-            elif "model" in error_msg.lower() or "404" in error_msg:
-                detailed_error = (
-                    f"模型访问失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. 模型名称不正确\n"
-                    "2. 没有访问该模型的权限\n"
-                    "解决方案：在系统设置页面检查模型名称配置"
-                )
-            elif "timeout" in error_msg.lower() or "连接" in error_msg:
-                detailed_error = (
-                    f"网络连接失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. 网络连接不稳定\n"
-                    "2. API 服务暂时不可用\n"
-                    "3. Base URL 配置错误\n"
-                    "解决方案：检查网络连接，稍后重试"
-                )
-            elif "rate" in error_msg.lower() or "429" in error_msg or "quota" in error_msg.lower():
-                detailed_error = (
-                    f"API 配额限制。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. API 调用次数超限\n"
-                    "2. 账户配额用尽\n"
-                    "解决方案：等待配额重置，或升级 API 套餐"
-                )
-            else:
-                detailed_error = (
-                    f"大纲生成失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. Text API 配置错误或密钥无效\n"
-                    "2. 网络连接问题\n"
-                    "3. 模型无法访问或不存在\n"
-                    "建议：检查配置文件 text_providers.yaml"
-                )
+            detailed_error = describe_outline_error(error_msg)
 
             return {
                 "success": False,
@@ -230,6 +330,68 @@ class OutlineService:
             }
 
 
+def describe_outline_error(error_msg: str) -> str:
+    """
+    根据错误信息生成带原因和解决方案的大纲错误说明
+
+    Args:
+        error_msg: 原始错误信息
+
+    Returns:
+        str: 详细错误说明
+    """
+    # 根据错误类型提供更详细的错误信息
+    if "api_key" in error_msg.lower() or "unauthorized" in error_msg.lower() or "401" in error_msg:
+        detailed_error = (
+            f"API 认证失败。\n"
+            f"错误详情: {error_msg}\n"
+            "可能原因：\n"
+            "1. API Key 无效或已过期\n"
+            "2. API Key 没有访问该模型的权限\n"
+            "解决方案：在系统设置页面检查并更新 API Key"
+        )
+    elif "model" in error_msg.lower() or "404" in error_msg:
+        detailed_error = (
+            f"模型访问失败。\n"
+            f"错误详情: {error_msg}\n"
+            "可能原因：\n"
+            "1. 模型名称不正确\n"
+            "2. 没有访问该模型的权限\n"
+            "解决方案：在系统设置页面检查模型名称配置"
+        )
+    elif "timeout" in error_msg.lower() or "连接" in error_msg:
+        detailed_error = (
+            f"网络连接失败。\n"
+            f"错误详情: {error_msg}\n"
+            "可能原因：\n"
+            "1. 网络连接不稳定\n"
+            "2. API 服务暂时不可用\n"
+            "3. Base URL 配置错误\n"
+            "解决方案：检查网络连接，稍后重试"
+        )
+    elif "rate" in error_msg.lower() or "429" in error_msg or "quota" in error_msg.lower():
+        detailed_error = (
+            f"API 配额限制。\n"
+            f"错误详情: {error_msg}\n"
+            "可能原因：\n"
+            "1. API 调用次数超限\n"
+            "2. 账户配额用尽\n"
+            "解决方案：等待配额重置，或升级 API 套餐"
+        )
+    else:
+        detailed_error = (
+            f"大纲生成失败。\n"
+            f"错误详情: {error_msg}\n"
+            "可能原因：\n"
+            "1. Text API 配置错误或密钥无效\n"
+            "2. 网络连接问题\n"
+            "3. 模型无法访问或不存在\n"
+            "建议：检查配置文件 text_providers.yaml"
+        )
+
+    return detailed_error
+
+
 def get_outline_service() -> OutlineService:
     """
     获取大纲生成服务实例
@@ -0,0 +1,251 @@
+"""
+服务端图文生成流水线
+
+一次请求完成 大纲 → 标题文案 / 图片 的全部步骤，按依赖关系并发执行：
+
+    大纲（流式） ──┬─ 封面页文本完整 ──> 封面图片 ──┐
+                  └─ 大纲完成 ──┬──> 其余页面图片 <┘
+                               └──> 标题、文案、标签
+
+- 大纲按 <page> 标记增量解析，封面页文本一旦完整（读到下一个 <page>）就开始生成封面，
+  与大纲剩余部分的生成重叠
+- 大纲完成后创建历史记录，标题文案与其余页面图片并发生成
+- 生成在后台线程中执行，浏览器断开连接不会中断生成，结果写入历史记录
+"""
+
+import logging
+import queue
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Generator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()  # 事件队列结束标记
+
+
+class GenerationPipeline:
+    """单次图文生成流水线"""
+
+    def __init__(self, topic: str, user_images: Optional[List[bytes]] = None):
+        """
+        Args:
+            topic: 用户输入的主题
+            user_images: 用户上传的参考图片（可选）
+        """
+        self.topic = topic
+        self.user_images = user_images or None
+        self.task_id = f"task_{uuid.uuid4().hex[:8]}"
+        self.record_id: Optional[str] = None
+        self._providers: Dict[int, str] = {}  # 页面索引 -> 服务商（提前生成的封面与其余页面分两次生成）
+        self._events: "queue.Queue" = queue.Queue()
+
+    def _emit(self, event: str, data: Dict[str, Any]) -> None:
+        self._events.put({"event": event, "data": data})
+
+    def run(self) -> Generator[Dict[str, Any], None, None]:
+        """
+        启动流水线并产出事件（生成在后台线程中执行，停止读取不会中断生成）
+
+        事件类型：
+        - progress: 阶段进度（outline / copywriting / cover / content）
+        - outline_page: 大纲中新完成的一页
+        - outline: 大纲完成（outline / pages / record_id / task_id）
+        - content: 标题、文案、标签（或 error）
+        - complete / error: 单页图片完成 / 失败（与 /generate 相同）
+        - finish: 全部结束
+
+        Yields:
+            事件字典 {"event": ..., "data": ...}
+        """
+        worker = threading.Thread(target=self._execute, name=f"pipeline-{self.task_id}", daemon=True)
+        worker.start()
+
+        while True:
+            event = self._events.get()
+            if event is _DONE:
+                return
+            yield event
+
+    def _execute(self) -> None:
+        try:
+            self._run_stages()
+        except Exception as e:
+            logger.error(f"[流水线] 执行失败: {self.task_id}, {e}", exc_info=True)
+            self._emit("error", {"status": "error", "message": f"生成流水线异常: {e}", "retryable": True})
+            self._emit("finish", {
+                "success": False,
+                "task_id": self.task_id,
+                "record_id": self.record_id,
+                "error": str(e)
+            })
+        finally:
+            self._events.put(_DONE)
+
+    def _run_stages(self) -> None:
+        from backend.services.content import get_content_service
+        from backend.services.history import RecordStatus, get_history_service
+        from backend.services.image import get_image_service
+        from backend.services.outline import OutlineStreamParser, describe_outline_error, get_outline_service
+        from backend.utils.image_postprocess import get_image_postprocessor
+
+        outline_service = get_outline_service()
+        content_service = get_content_service()
+        image_service = get_image_service()
+        history_service = get_history_service()
+
+        # 参考图只压缩一次，封面和其余页面共用
+        user_images = None
+        if self.user_images:
+            user_images = get_image_postprocessor().compress_references(self.user_images)
+
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix=f"pipeline-{self.task_id}") as executor:
+            # ==================== 大纲（流式）+ 封面 ====================
+            self._emit("progress", {"status": "generating", "message": "正在生成大纲...", "phase": "outline"})
+
+            parser = OutlineStreamParser()
+            cover_future = None
+            cover_page = None
+            try:
+                for chunk in outline_service.stream_outline(self.topic, self.user_images):
+                    for page in parser.feed(chunk):
+                        self._emit("outline_page", {"page": page})
+                        # 只看第一页：是封面则文本已完整，立即开始生成封面
+                        if cover_future is None:
+                            cover_future = False
+                            if page["type"] == "cover":
+                                cover_page = page
+                                cover_future = executor.submit(
+                                    self._generate_cover, image_service, page, parser.text, user_images
+                                )
+            except Exception as e:
+                logger.error(f"[流水线] 大纲生成失败: {e}")
+                self._wait_cover(cover_future)
+                self._emit("error", {"status": "error", "message": describe_outline_error(str(e)), "phase": "outline"})
+                self._emit("finish", {"success": False, "task_id": self.task_id, "record_id": None})
+                return
+
+            outline_text = parser.text
+            pages = parser.finish()
+            if not pages:
+                self._wait_cover(cover_future)
+                self._emit("error", {"status": "error", "message": "大纲为空，无法生成图片", "phase": "outline"})
+                self._emit("finish", {"success": False, "task_id": self.task_id, "record_id": None})
+                return
+
+            self.record_id = history_service.create_record(
+                self.topic, {"raw": outline_text, "pages": pages}, self.task_id
+            )
+            self._emit("outline", {
+                "outline": outline_text,
+                "pages": pages,
+                "record_id": self.record_id,
+                "task_id": self.task_id
+            })
+
+            # ==================== 标题文案 ∥ 其余页面 ====================
+            content_future = executor.submit(self._generate_content, content_service, outline_text)
+
+            history_service.update_record(
+                self.record_id, images={"task_id": self.task_id, "generated": []}, status=RecordStatus.GENERATING
+            )
+
+            # 封面只有在与最终解析结果一致时才沿用，否则交给 generate_images 重新生成
+            skip_indices = []
+            if self._wait_cover(cover_future) and cover_page in pages:
+                skip_indices.append(cover_page["index"])
+
+            finish = {}
+            for event in image_service.generate_images(
+                pages, self.task_id, outline_text,
+                user_images=user_images,
+                user_topic=self.topic,
+                skip_indices=skip_indices
+            ):
+                if event["event"] == "finish":
+                    finish = event["data"]
+                    self._providers.update(finish.get("providers") or {})
+                else:
+                    self._events.put(event)
+
+            # 记录文件的读-改-写不能并发，文案在图片结束后统一写入
+            content = content_future.result()
+            if content.get("success"):
+                history_service.update_record(self.record_id, content={
+                    "titles": content["titles"],
+                    "copywriting": content["copywriting"],
+                    "tags": content["tags"],
+                })
+
+        generated = sorted(finish.get("images", []), key=lambda name: int(name.split(".")[0]))
+        if not generated:
+            status = RecordStatus.ERROR
+        elif finish.get("failed"):
+            status = RecordStatus.PARTIAL
+        else:
+            status = RecordStatus.COMPLETED
+        history_service.update_record(
+            self.record_id,
+            images={"task_id": self.task_id, "generated": generated, "providers": self._providers},
+            status=status,
+            thumbnail=generated[0] if generated else None
+        )
+
+        self._emit("finish", {
+            **finish,
+            "providers": self._providers,
+            "success": bool(finish.get("success")) and bool(content.get("success")),
+            "task_id": self.task_id,
+            "record_id": self.record_id,
+            "content_success": bool(content.get("success"))
+        })
+        logger.info(
+            f"[流水线] 完成: {self.task_id}, 图片 {finish.get('completed', 0)}/{finish.get('total', 0)}, "
+            f"文案 {'成功' if content.get('success') else '失败'}"
+        )
+
+    def _generate_cover(
+        self,
+        image_service,
+        cover_page: Dict[str, Any],
+        partial_outline: str,
+        user_images: Optional[List[bytes]]
+    ) -> bool:
+        """
+        提前生成封面（大纲尚未完成，使用已生成的部分大纲保持风格）
+
+        Returns:
+            bool: 封面是否生成成功
+        """
+        logger.info(f"[流水线] 封面页文本已完整，开始生成封面: {self.task_id}")
+        success = False
+        for event in image_service.generate_images(
+            [cover_page], self.task_id, partial_outline,
+            user_images=user_images,
+            user_topic=self.topic
+        ):
+            if event["event"] == "finish":
+                success = bool(event["data"].get("success"))
+                self._providers.update(event["data"].get("providers") or {})
+            else:
+                self._events.put(event)
+        return success
+
+    def _generate_content(self, content_service, outline_text: str) -> Dict[str, Any]:
+        """生成标题、文案、标签，完成后立即推送 content 事件"""
+        self._emit("progress", {"status": "generating", "message": "正在生成标题和文案...", "phase": "copywriting"})
+        content = content_service.generate_content(self.topic, outline_text)
+        self._emit("content", content)
+        return content
+
+    @staticmethod
+    def _wait_cover(cover_future) -> bool:
+        """等待提前生成的封面，返回是否成功"""
+        if not cover_future:
+            return False
+        try:
+            return cover_future.result()
+        except Exception as e:
+            logger.warning(f"[流水线] 提前生成封面失败，稍后随其他页面重新生成: {e}")
+            return False
@@ -267,6 +267,7 @@ class SummaryService:
         Yields:
             Dict with event type and data:
             - {"event": "progress", "data": {"step": ..., "message": ...}}
+            - {"event": "delta", "data": {"text": ...}}（AI 输出的增量文本）
             - {"event": "complete", "data": {"id": ..., "industry": ..., "content": ...}}
             - {"event": "error", "data": {"error": ...}}
             - {"event": "finish", "data": {"record_ids": ...}}
@@ -327,12 +328,19 @@ class SummaryService:
                 "data": {"step": "generating", "message": "AI 正在生成总结..."}
             }
 
-            # 调用 AI 生成总结
-            summary_content = text_client.generate_text(
+            # 调用 AI 生成总结（流式推送增量文本）
+            chunks = []
+            for delta in text_client.generate_text_stream(
                 prompt=prompt,
                 temperature=0.7,
                 max_output_tokens=8000
-            )
+            ):
+                chunks.append(delta)
+                yield {
+                    "event": "delta",
+                    "data": {"text": delta}
+                }
+            summary_content = "".join(chunks)
 
             yield {
                 "event": "progress",
@@ -11,6 +11,8 @@ from urllib.parse import urlparse
 from datetime import datetime
 import requests
 
+from backend.utils.http_transport import http_get
+
 logger = logging.getLogger(__name__)
 
 
@@ -164,7 +166,7 @@ class XHSImageFetcher:
                     'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
                 }
 
-                response = requests.get(
+                response = http_get(
                     url,
                     headers=headers,
                     timeout=self.timeout,
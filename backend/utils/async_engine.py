@@ -0,0 +1,96 @@
+"""
+异步执行引擎
+
+在后台线程中运行一个共享的 asyncio 事件循环，供图片生成以协程方式
+并发调用服务商。同步代码通过 submit() 提交协程，得到标准的
+concurrent.futures.Future，可以直接配合 as_completed 使用。
+
+相比每页一个线程阻塞在 requests.post 上，一个事件循环即可同时挂起
+数百个慢速图片请求。
+"""
+
+import asyncio
+import logging
+import threading
+import weakref
+from concurrent.futures import Future
+from typing import Coroutine
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# 异步 HTTP 客户端配置
+ASYNC_HTTP_TIMEOUT = httpx.Timeout(300.0, connect=30.0)
+ASYNC_HTTP_LIMITS = httpx.Limits(max_connections=500, max_keepalive_connections=100)
+
+
+class AsyncEngine:
+    """后台事件循环（懒启动，线程安全）"""
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    ready.set()
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run, name="async-image-engine", daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+                logger.info("异步图片生成引擎已启动")
+            return self._loop
+
+    def submit(self, coro: Coroutine) -> Future:
+        """
+        提交协程到后台事件循环
+
+        Args:
+            coro: 协程对象
+
+        Returns:
+            Future: 可在任意线程等待的结果
+        """
+        loop = self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+
+_engine_instance = None
+_engine_lock = threading.Lock()
+
+# 每个事件循环一个 AsyncClient（httpx 客户端不能跨事件循环使用）
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def get_async_engine() -> AsyncEngine:
+    """获取全局异步执行引擎"""
+    global _engine_instance
+    with _engine_lock:
+        if _engine_instance is None:
+            _engine_instance = AsyncEngine()
+        return _engine_instance
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    获取当前事件循环共享的 httpx.AsyncClient（需在协程内调用）
+
+    Returns:
+        httpx.AsyncClient: 带连接池的异步 HTTP 客户端
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(timeout=ASYNC_HTTP_TIMEOUT, limits=ASYNC_HTTP_LIMITS)
+        _clients[loop] = client
+    return client
@@ -0,0 +1,22 @@
+"""原子文件写入"""
+import os
+import threading
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """
+    原子写文件：先写临时文件再替换，读取方不会看到写了一半的文件
+
+    Args:
+        path: 目标路径
+        data: 文件内容
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
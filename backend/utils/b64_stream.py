@@ -0,0 +1,155 @@
+"""
+b64_json 响应流式解码
+
+images 端点返回的 JSON 中，图片以数 MB 的 base64 字符串（b64_json）内联。
+response.json() + b64decode 会同时持有原始文本、解析后的字符串和解码结果多份拷贝。
+
+B64JsonStreamDecoder 按块读取响应体：找到 "b64_json" 字段后，把字符串值边读边
+解码写入 sink（文件或缓冲区），响应体的 base64 部分不会整体驻留内存。
+
+- 处理 JSON 转义（\\/ 以及换行等空白转义）
+- 去掉 data:image/...;base64, 前缀
+- 响应中没有 b64_json 字段时（如返回 url 或错误信息），回退为解析完整 JSON
+"""
+
+import base64
+import binascii
+import json
+import re
+from typing import Any, BinaryIO, Dict, Iterable, Optional
+
+_KEY_PATTERN = re.compile(rb'"b64_json"\s*:\s*"')
+_DATA_URI_PREFIX = b"data:"
+_ESCAPES = ((b"\\/", b"/"), (b"\\n", b""), (b"\\r", b""), (b"\\t", b""))
+_WHITESPACE = b" \n\r\t"
+
+
+class B64JsonStreamDecoder:
+    """b64_json 字段的增量解码器"""
+
+    _SEARCH, _PREFIX, _VALUE, _DONE = range(4)
+
+    def __init__(self, sink: BinaryIO, field: bytes = b"b64_json"):
+        """
+        Args:
+            sink: 解码后图片数据的写入目标（需支持 write）
+            field: 要解码的字段名
+        """
+        self.sink = sink
+        self.bytes_written = 0
+        self._pattern = _KEY_PATTERN if field == b"b64_json" else re.compile(
+            rb'"' + re.escape(field) + rb'"\s*:\s*"'
+        )
+        self._state = self._SEARCH
+        self._head = bytearray()  # 字段之前的内容（回退解析时使用）
+        self._pending = b""  # 尚未凑满 4 字节的 base64 字符
+        self._carry = b""  # 跨块的转义字符 / data URI 前缀
+
+    @property
+    def found(self) -> bool:
+        """是否已找到 b64_json 字段"""
+        return self._state != self._SEARCH
+
+    def feed(self, chunk: bytes) -> None:
+        """输入一块响应数据"""
+        if not chunk or self._state == self._DONE:
+            return
+
+        if self._state == self._SEARCH:
+            self._head.extend(chunk)
+            match = self._pattern.search(self._head)
+            if match is None:
+                return
+            chunk = bytes(self._head[match.end():])
+            del self._head[match.start():]
+            self._state = self._PREFIX
+
+        if self._state == self._PREFIX:
+            data = self._carry + chunk
+            self._carry = b""
+            if len(data) < len(_DATA_URI_PREFIX) and _DATA_URI_PREFIX.startswith(data):
+                self._carry = data
+                return
+            if data.startswith(_DATA_URI_PREFIX):
+                comma = data.find(b",")
+                if comma < 0:
+                    self._carry = data
+                    return
+                data = data[comma + 1:]
+            self._state = self._VALUE
+            chunk = data
+
+        self._feed_value(chunk)
+
+    def _feed_value(self, chunk: bytes) -> None:
+        data = self._carry + chunk
+        self._carry = b""
+
+        end = data.find(b'"')
+        if end >= 0:
+            segment = data[:end]
+            self._state = self._DONE
+        else:
+            segment = data
+            # 末尾的反斜杠可能和下一块组成转义，留到下一块处理
+            if segment.endswith(b"\\"):
+                self._carry = b"\\"
+                segment = segment[:-1]
+
+        for escaped, replacement in _ESCAPES:
+            if escaped in segment:
+                segment = segment.replace(escaped, replacement)
+        segment = segment.translate(None, _WHITESPACE)
+
+        data = self._pending + segment
+        usable = len(data) - len(data) % 4
+        if self._state == self._DONE:
+            usable = len(data)
+        if usable:
+            self._write(data[:usable])
+        self._pending = data[usable:]
+
+    def _write(self, b64_bytes: bytes) -> None:
+        try:
+            decoded = base64.b64decode(b64_bytes)
+        except binascii.Error as e:
+            raise ValueError(f"b64_json 数据不是合法的 base64: {e}")
+        self.sink.write(decoded)
+        self.bytes_written += len(decoded)
+
+    def finish(self) -> Optional[Dict[str, Any]]:
+        """
+        结束解码
+
+        Returns:
+            None 表示图片已完整写入 sink；
+            未找到 b64_json 字段时返回完整解析的 JSON（由调用方按 url 等其他格式处理）
+
+        Raises:
+            ValueError: b64_json 字段不完整或响应不是合法 JSON
+        """
+        if self._state == self._DONE:
+            return None
+        if self._state == self._SEARCH:
+            try:
+                return json.loads(bytes(self._head))
+            except ValueError as e:
+                raise ValueError(f"API 响应不是合法的 JSON: {bytes(self._head[:300])!r}") from e
+        raise ValueError("b64_json 数据不完整：响应在图片数据结束前中断")
+
+
+def decode_b64_json_stream(chunks: Iterable[bytes], sink: BinaryIO) -> Optional[Dict[str, Any]]:
+    """
+    从响应块流中解码 b64_json 图片到 sink
+
+    Args:
+        chunks: 响应体数据块
+        sink: 图片写入目标
+
+    Returns:
+        None 表示图片已写入 sink；否则为完整解析的 JSON（没有 b64_json 字段）
+    """
+    decoder = B64JsonStreamDecoder(sink)
+    for chunk in chunks:
+        decoder.feed(chunk)
+    return decoder.finish()
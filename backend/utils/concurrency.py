@@ -0,0 +1,408 @@
+"""
+服务商级自适应并发控制
+
+同一个服务商（相同 base_url + API Key）的所有调用共享一个并发上限，
+无论调用来自 ImageService、TextChatClient、GenAIClient 还是图片生成器。
+上限按 AIMD（加性增、乘性减）自动调整：
+- 调用成功且延迟正常：上限 +1/上限（约每轮满负载 +1）
+- 遇到 429 / 配额限制：上限减半
+- 延迟超过 latency_target：上限 ×0.9
+每个冷却周期内最多下调一次，避免同一批 429 连续把上限压到底。
+
+每个限制器同时带有一个熔断器（backend.utils.resilience.CircuitBreaker）：
+slot() 在等待名额之前检查熔断状态，服务商故障期间直接失败，不占用名额、不等待超时。
+
+协程通过 async_slot() 等待名额时进入 FIFO 队列：release() 把名额直接移交给队首协程
+（经 call_soon_threadsafe 唤醒其所在的事件循环），不轮询，先到先得。
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Optional
+
+from .resilience import CircuitBreaker, is_rate_limit_error
+
+logger = logging.getLogger(__name__)
+
+# 默认最大并发数（与 ImageService.MAX_CONCURRENT 保持一致）
+DEFAULT_MAX_CONCURRENCY = 15
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD 自适应并发限制器（线程安全）"""
+
+    BACKOFF_RATIO = 0.5  # 限流时的乘性下调比例
+    SLOW_BACKOFF_RATIO = 0.9  # 延迟超标时的乘性下调比例
+    EWMA_ALPHA = 0.2  # 延迟滑动平均系数
+    MIN_COOLDOWN = 1.0  # 两次下调之间的最短间隔（秒）
+    LATENCY_WINDOW = 200  # 用于计算延迟分位数的最近成功调用数
+    LATENCY_MIN_SAMPLES = 20  # 样本数不足时不给出分位数
+
+    def __init__(
+        self,
+        name: str,
+        max_limit: int = DEFAULT_MAX_CONCURRENCY,
+        initial_limit: Optional[int] = None,
+        min_limit: int = 1,
+        latency_target: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        """
+        Args:
+            name: 限制器名称（用于日志）
+            max_limit: 并发上限的最大值
+            initial_limit: 初始并发上限（默认等于 max_limit）
+            min_limit: 并发上限的最小值
+            latency_target: 目标延迟（秒），超过后下调上限；None 表示只根据 429 调整
+            breaker: 熔断器（默认新建一个）
+        """
+        self.name = name
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        if initial_limit is None:
+            initial_limit = self.max_limit
+        self._limit = float(min(max(int(initial_limit), self.min_limit), self.max_limit))
+        self.latency_target = latency_target
+        self.breaker = breaker or CircuitBreaker(name)
+
+        self._in_flight = 0
+        self._latency_ewma: Optional[float] = None
+        self._latencies = deque(maxlen=self.LATENCY_WINDOW)
+        self._last_decrease = 0.0
+        self._successes = 0
+        self._failures = 0
+        self._overloads = 0
+
+        self._cond = threading.Condition()
+        # 等待名额的协程（FIFO）：(事件循环, future)
+        self._async_waiters: deque = deque()
+
+    @property
+    def limit(self) -> int:
+        """当前生效的并发上限"""
+        return max(self.min_limit, int(math.floor(self._limit)))
+
+    @property
+    def in_flight(self) -> int:
+        """当前进行中的调用数"""
+        return self._in_flight
+
+    @property
+    def latency_ewma(self) -> Optional[float]:
+        """最近成功调用的延迟滑动平均（秒），还没有成功调用时为 None"""
+        return self._latency_ewma
+
+    def configure(
+        self,
+        max_limit: Optional[int] = None,
+        latency_target: Optional[float] = None
+    ) -> None:
+        """更新配置（配置文件修改后调用）"""
+        with self._cond:
+            if max_limit is not None:
+                self.max_limit = max(self.min_limit, int(max_limit))
+                self._limit = min(self._limit, float(self.max_limit))
+            if latency_target is not None:
+                self.latency_target = latency_target
+            self._wake_async_waiters()
+            self._cond.notify_all()
+
+    def try_acquire(self) -> bool:
+        """尝试获取一个并发名额（不阻塞，有协程排队时不插队）"""
+        with self._cond:
+            if not self._async_waiters and self._in_flight < self.limit:
+                self._in_flight += 1
+                return True
+            return False
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        获取一个并发名额
+
+        Args:
+            timeout: 最长等待时间（秒），None 表示一直等待
+
+        Returns:
+            bool: 是否获取成功
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._in_flight >= self.limit:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self._in_flight += 1
+            return True
+
+    def release(
+        self,
+        latency: Optional[float] = None,
+        error: Optional[Exception] = None
+    ) -> None:
+        """
+        释放并发名额，并根据调用结果调整上限
+
+        Args:
+            latency: 本次调用耗时（秒），调用被取消时为 None
+            error: 调用抛出的异常（成功时为 None）
+        """
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+
+            if error is not None:
+                if is_rate_limit_error(error):
+                    self._overloads += 1
+                    self._decrease(self.BACKOFF_RATIO, "限流")
+                else:
+                    self._failures += 1
+            elif latency is not None:
+                self._successes += 1
+                self._record_latency(latency)
+                if self.latency_target and latency > self.latency_target:
+                    self._decrease(self.SLOW_BACKOFF_RATIO, "延迟超标")
+                elif self._limit < self.max_limit:
+                    self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+            # error 与 latency 都为空：调用被取消，只归还名额
+
+            self._wake_async_waiters()
+            self._cond.notify_all()
+
+    def _wake_async_waiters(self) -> None:
+        """把空闲名额按 FIFO 顺序移交给等待中的协程（调用方需持有锁）"""
+        while self._async_waiters and self._in_flight < self.limit:
+            loop, future = self._async_waiters.popleft()
+            # 名额在出队时即归该协程所有，唤醒后无需再次竞争
+            self._in_flight += 1
+            try:
+                loop.call_soon_threadsafe(self._grant_async_waiter, future)
+            except RuntimeError:
+                # 事件循环已关闭：该协程不会再运行，收回名额
+                self._in_flight -= 1
+
+    def _grant_async_waiter(self, future: asyncio.Future) -> None:
+        """在等待者的事件循环中完成移交；等待已被取消时归还名额"""
+        if future.cancelled():
+            self.release()
+        elif not future.done():
+            future.set_result(None)
+
+    async def _acquire_async(self) -> None:
+        """协程等待一个并发名额（FIFO）"""
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if not self._async_waiters and self._in_flight < self.limit:
+                self._in_flight += 1
+                return
+            future = loop.create_future()
+            self._async_waiters.append((loop, future))
+
+        try:
+            await future
+        except BaseException:
+            with self._cond:
+                try:
+                    self._async_waiters.remove((loop, future))
+                    granted = False
+                except ValueError:
+                    granted = True
+            # 已出队：future 被取消时由 _grant_async_waiter 归还名额，否则在这里归还
+            if granted and not future.cancelled():
+                self.release()
+            raise
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """
+        最近成功调用的延迟分位数
+
+        Args:
+            percentile: 分位数（0-100，如 95）
+
+        Returns:
+            Optional[float]: 延迟（秒），样本不足时返回 None
+        """
+        with self._cond:
+            if len(self._latencies) < self.LATENCY_MIN_SAMPLES:
+                return None
+            samples = sorted(self._latencies)
+        rank = math.ceil(len(samples) * min(max(percentile, 0.0), 100.0) / 100.0)
+        return samples[max(0, rank - 1)]
+
+    def _record_latency(self, latency: float) -> None:
+        self._latencies.append(latency)
+        if self._latency_ewma is None:
+            self._latency_ewma = latency
+        else:
+            self._latency_ewma = (
+                self.EWMA_ALPHA * latency + (1 - self.EWMA_ALPHA) * self._latency_ewma
+            )
+
+    def _decrease(self, ratio: float, reason: str) -> None:
+        """乘性下调上限（调用方需持有锁）"""
+        now = time.monotonic()
+        cooldown = max(self.MIN_COOLDOWN, self._latency_ewma or 0.0)
+        if now - self._last_decrease < cooldown:
+            return
+        old_limit = self.limit
+        self._limit = max(float(self.min_limit), self._limit * ratio)
+        self._last_decrease = now
+        logger.warning(f"[并发控制] {self.name} {reason}，并发上限 {old_limit} -> {self.limit}")
+
+    @contextmanager
+    def slot(self):
+        """
+        占用一个并发名额执行调用，结束后自动释放并反馈结果
+
+        用法：
+            with limiter.slot():
+                response = requests.post(...)
+
+        熔断器打开时直接抛出 CircuitOpenError，不等待名额。
+        """
+        self.breaker.before_call()
+        self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.release(time.monotonic() - start, error=e)
+            self.breaker.record_failure(e)
+            raise
+        except BaseException:
+            # 被取消 / 中断：只归还名额，不参与调整
+            self.release()
+            self.breaker.record_cancel()
+            raise
+        else:
+            self.release(time.monotonic() - start)
+            self.breaker.record_success()
+
+    @asynccontextmanager
+    async def async_slot(self):
+        """
+        slot() 的协程版本：等待名额时不阻塞事件循环
+
+        用法：
+            async with limiter.async_slot():
+                response = await client.post(...)
+        """
+        self.breaker.before_call()
+        try:
+            await self._acquire_async()
+        except BaseException:
+            self.breaker.record_cancel()
+            raise
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.release(time.monotonic() - start, error=e)
+            self.breaker.record_failure(e)
+            raise
+        except BaseException:
+            # 被取消 / 中断：只归还名额，不参与调整
+            self.release()
+            self.breaker.record_cancel()
+            raise
+        else:
+            self.release(time.monotonic() - start)
+            self.breaker.record_success()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取限制器统计信息"""
+        with self._cond:
+            return {
+                "name": self.name,
+                "limit": self.limit,
+                "max_limit": self.max_limit,
+                "in_flight": self._in_flight,
+                "latency_ewma": round(self._latency_ewma, 3) if self._latency_ewma is not None else None,
+                "successes": self._successes,
+                "failures": self._failures,
+                "overloads": self._overloads,
+                "circuit": self.breaker.get_stats(),
+            }
+
+
+# ==================== 全局注册表 ====================
+
+_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def provider_key(provider_config: Dict[str, Any], kind: str = "") -> str:
+    """
+    根据服务商配置生成限制器标识
+
+    同一 base_url + API Key 视为同一配额，API Key 只保留摘要
+
+    Args:
+        provider_config: 服务商配置
+        kind: 调用类别前缀（如 image / text）
+
+    Returns:
+        str: 限制器标识
+    """
+    provider_type = provider_config.get('type', '')
+    base_url = (provider_config.get('base_url') or '').rstrip('/')
+    api_key = provider_config.get('api_key') or ''
+    key_digest = hashlib.sha1(api_key.encode('utf-8')).hexdigest()[:8] if api_key else '-'
+    return f"{kind}:{provider_type}:{base_url}:{key_digest}"
+
+
+def get_provider_limiter(provider_config: Dict[str, Any], kind: str = "") -> AdaptiveConcurrencyLimiter:
+    """
+    获取（或创建）服务商共享的并发限制器
+
+    支持的服务商配置项：
+    - max_concurrency: 并发上限（默认 15）
+    - initial_concurrency: 初始并发上限（默认等于 max_concurrency）
+    - latency_target: 目标延迟（秒），超过后自动降低并发
+    - circuit_failure_threshold: 连续失败多少次后熔断（默认 5）
+    - circuit_reset_timeout: 熔断持续时间（秒，默认 30）
+
+    Args:
+        provider_config: 服务商配置
+        kind: 调用类别前缀（如 image / text）
+
+    Returns:
+        AdaptiveConcurrencyLimiter: 限制器实例
+    """
+    key = provider_key(provider_config, kind)
+    max_limit = int(provider_config.get('max_concurrency', DEFAULT_MAX_CONCURRENCY))
+    latency_target = provider_config.get('latency_target')
+    failure_threshold = provider_config.get('circuit_failure_threshold')
+    reset_timeout = provider_config.get('circuit_reset_timeout')
+
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = AdaptiveConcurrencyLimiter(
+                name=key,
+                max_limit=max_limit,
+                initial_limit=provider_config.get('initial_concurrency'),
+                latency_target=latency_target,
+                breaker=CircuitBreaker(
+                    key,
+                    failure_threshold=failure_threshold or 5,
+                    reset_timeout=reset_timeout or 30.0
+                )
+            )
+            _limiters[key] = limiter
+            logger.debug(f"[并发控制] 创建限制器: {key}, max={max_limit}")
+        else:
+            limiter.configure(max_limit=max_limit, latency_target=latency_target)
+            limiter.breaker.configure(failure_threshold, reset_timeout)
+        return limiter
+
+
+def get_all_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """获取所有限制器的统计信息"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.get_stats() for limiter in limiters}
@@ -0,0 +1,159 @@
+"""
+预编码参考图
+
+同一个任务的封面和用户参考图会随每一页请求重复发送。EncodedImage 在创建时
+压缩一次，base64、data URI 和 Google GenAI 的 inline Part 在首次使用时生成
+并缓存，之后每页请求直接复用同一个对象，不再重复压缩和编码。
+
+EncodedImage 创建后不可修改，可以在多个线程 / 协程之间共享。
+"""
+
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional, Union
+
+from .image_compressor import compress_image
+
+REFERENCE_MAX_KB = 200  # 参考图大小上限
+
+
+def detect_mime_type(data: bytes) -> str:
+    """根据文件头识别图片 MIME 类型（无法识别时按 PNG 处理）"""
+    if data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return "image/png"
+
+
+class EncodedImage:
+    """压缩并按需编码的参考图（不可变）"""
+
+    __slots__ = ("data", "mime_type", "source_digest", "_b64", "_data_uri", "_genai_part", "_lock")
+
+    def __init__(self, data: bytes, source_digest: str, mime_type: Optional[str] = None):
+        """
+        Args:
+            data: 压缩后的图片数据
+            source_digest: 原始图片的 sha256（用于去重和缓存 key）
+            mime_type: MIME 类型（默认根据文件头识别）
+        """
+        self.data = data
+        self.mime_type = mime_type or detect_mime_type(data)
+        self.source_digest = source_digest
+        self._b64: Optional[str] = None
+        self._data_uri: Optional[str] = None
+        self._genai_part: Any = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_bytes(cls, image_data: bytes, max_size_kb: int = REFERENCE_MAX_KB) -> "EncodedImage":
+        """
+        压缩原始图片并创建 EncodedImage
+
+        Args:
+            image_data: 原始图片数据
+            max_size_kb: 压缩目标大小（KB）
+
+        Returns:
+            EncodedImage
+        """
+        source_digest = hashlib.sha256(image_data).hexdigest()
+        return cls(compress_image(image_data, max_size_kb=max_size_kb), source_digest)
+
+    @property
+    def b64(self) -> str:
+        """base64 字符串"""
+        if self._b64 is None:
+            with self._lock:
+                if self._b64 is None:
+                    self._b64 = base64.b64encode(self.data).decode("ascii")
+        return self._b64
+
+    @property
+    def data_uri(self) -> str:
+        """data URI（data:<mime>;base64,...）"""
+        if self._data_uri is None:
+            encoded = self.b64
+            with self._lock:
+                if self._data_uri is None:
+                    self._data_uri = f"data:{self.mime_type};base64,{encoded}"
+        return self._data_uri
+
+    def genai_part(self) -> Any:
+        """Google GenAI 的 inline_data Part"""
+        if self._genai_part is None:
+            from google.genai import types
+
+            with self._lock:
+                if self._genai_part is None:
+                    self._genai_part = types.Part(
+                        inline_data=types.Blob(mime_type=self.mime_type, data=self.data)
+                    )
+        return self._genai_part
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, EncodedImage) and other.source_digest == self.source_digest
+
+    def __hash__(self) -> int:
+        return hash(self.source_digest)
+
+    def __repr__(self) -> str:
+        return f"EncodedImage({self.mime_type}, {len(self.data)} bytes, {self.source_digest[:12]})"
+
+
+ImageInput = Union[bytes, EncodedImage]
+
+
+def ensure_encoded(image: ImageInput, max_size_kb: int = REFERENCE_MAX_KB) -> EncodedImage:
+    """bytes 转为 EncodedImage；已经是 EncodedImage 的直接返回"""
+    if isinstance(image, EncodedImage):
+        return image
+    return EncodedImage.from_bytes(image, max_size_kb=max_size_kb)
+
+
+class EncodedImageCache:
+    """
+    参考图编码缓存（线程安全，每个任务一个）
+
+    以原始 bytes 对象为 key：同一个任务反复传入的是同一个 bytes 对象，
+    其哈希值由 Python 缓存，查找几乎没有开销。
+    """
+
+    MAX_ENTRIES = 32
+
+    def __init__(self, max_size_kb: int = REFERENCE_MAX_KB):
+        self.max_size_kb = max_size_kb
+        self._entries: "OrderedDict[bytes, EncodedImage]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def encode(self, image: Optional[ImageInput]) -> Optional[EncodedImage]:
+        """获取（或创建）图片的编码结果"""
+        if image is None or isinstance(image, EncodedImage):
+            return image
+
+        with self._lock:
+            encoded = self._entries.get(image)
+            if encoded is not None:
+                self._entries.move_to_end(image)
+                return encoded
+
+        encoded = EncodedImage.from_bytes(image, max_size_kb=self.max_size_kb)
+        with self._lock:
+            self._entries.setdefault(image, encoded)
+            while len(self._entries) > self.MAX_ENTRIES:
+                self._entries.popitem(last=False)
+            return self._entries[image]
+
+    def encode_all(self, images: Optional[List[ImageInput]]) -> Optional[List[EncodedImage]]:
+        """批量编码，保持顺序"""
+        if not images:
+            return None
+        return [self.encode(image) for image in images]
@@ -0,0 +1,72 @@
+"""
+文件内容 ETag 与带版本号的图片 URL
+
+- ETag 使用文件内容的 sha256（按 路径 + mtime + 大小 缓存，文件不变时不重复计算）
+- 生成结果、历史记录返回的图片 URL 带上 ?v=<ETag>：内容变化后 URL 随之变化，
+  图片接口据此对原图和衍生图返回长期缓存 + immutable（见 file_response）
+
+不依赖 Flask，服务层也可以直接使用。
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Tuple
+from urllib.parse import quote
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+_ETAG_CACHE_SIZE = 4096
+
+_etag_cache: "OrderedDict[str, Tuple[int, int, str]]" = OrderedDict()
+_etag_lock = threading.Lock()
+
+
+def get_file_etag(path: str) -> str:
+    """
+    获取文件内容的 ETag（sha256 前 32 位）
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        str: ETag（不带引号）
+    """
+    stat = os.stat(path)
+    with _etag_lock:
+        cached = _etag_cache.get(path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            _etag_cache.move_to_end(path)
+            return cached[2]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    etag = digest.hexdigest()[:32]
+
+    with _etag_lock:
+        _etag_cache[path] = (stat.st_mtime_ns, stat.st_size, etag)
+        _etag_cache.move_to_end(path)
+        while len(_etag_cache) > _ETAG_CACHE_SIZE:
+            _etag_cache.popitem(last=False)
+    return etag
+
+
+def versioned_image_url(task_id: str, filename: str, task_dir: str) -> str:
+    """
+    页面图片的 URL，带原图内容版本号 v（原图不存在时不带版本号）
+
+    Args:
+        task_id: 任务 ID
+        filename: 图片文件名
+        task_dir: 任务目录
+
+    Returns:
+        str: /api/images/<task_id>/<filename>?v=<ETag>
+    """
+    url = f"/api/images/{quote(task_id)}/{quote(filename)}"
+    try:
+        return f"{url}?v={get_file_etag(os.path.join(task_dir, filename))}"
+    except OSError:
+        return url
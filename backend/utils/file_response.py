@@ -0,0 +1,88 @@
+"""
+静态文件响应（图片接口共用）
+
+- ETag 使用文件内容的 sha256（见 file_etag，按 路径 + mtime + 大小 缓存）
+- If-None-Match 命中时返回 304，支持 Range 请求
+- immutable=True（或请求携带的版本号 v 等于当前 ETag）时返回长期缓存 + immutable；
+  否则 no-cache（浏览器每次用 ETag 校验，未变化时只返回 304）
+- 可选交给前置代理发送文件内容（Config.FILE_OFFLOAD_MODE）：
+  - x-accel：返回 X-Accel-Redirect（nginx），内部路径为 FILE_OFFLOAD_PREFIX + 相对项目根目录的路径
+  - x-sendfile：返回 X-Sendfile 绝对路径（Apache mod_xsendfile / lighttpd）
+"""
+
+import os
+from typing import Optional
+from urllib.parse import quote
+
+from flask import Response, request, send_file
+
+from backend.config import Config
+from backend.utils.file_etag import get_file_etag
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600  # immutable 文件的缓存时间（秒）
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _apply_cache_headers(response: Response, etag: str, immutable: bool) -> Response:
+    response.set_etag(etag)
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+    return response
+
+
+def _offload_response(path: str, mimetype: str, etag: str, immutable: bool) -> Optional[Response]:
+    """交给前置代理发送文件；未启用或文件不在项目目录内时返回 None"""
+    mode = (Config.FILE_OFFLOAD_MODE or "").lower()
+    if mode not in ("x-accel", "x-sendfile"):
+        return None
+
+    abs_path = os.path.abspath(path)
+    response = Response(mimetype=mimetype)
+    if mode == "x-accel":
+        relative = os.path.relpath(abs_path, PROJECT_ROOT)
+        if relative.startswith(".."):
+            return None
+        prefix = Config.FILE_OFFLOAD_PREFIX.rstrip("/")
+        response.headers["X-Accel-Redirect"] = quote(f"{prefix}/{relative.replace(os.sep, '/')}")
+    else:
+        response.headers["X-Sendfile"] = abs_path
+    return _apply_cache_headers(response, etag, immutable)
+
+
+def send_cached_file(
+    path: str,
+    mimetype: Optional[str] = None,
+    immutable: bool = False,
+    version: Optional[str] = None
+) -> Response:
+    """
+    发送文件，带内容 ETag、缓存头、304 和 Range 支持
+
+    Args:
+        path: 文件路径
+        mimetype: MIME 类型（默认按扩展名推断）
+        immutable: 文件内容是否永不变化（是则允许浏览器长期缓存）
+        version: URL 中携带的版本号，等于当前 ETag 时视为 immutable（内容变化后 URL 也会变化）
+
+    Returns:
+        Response
+    """
+    etag = get_file_etag(path)
+    immutable = immutable or (version is not None and version == etag)
+
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        return _apply_cache_headers(response, etag, immutable)
+
+    response = _offload_response(path, mimetype, etag, immutable)
+    if response is not None:
+        return response
+
+    # conditional=True：由 werkzeug 处理 If-Range / Range（206）
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=etag)
+    return _apply_cache_headers(response, etag, immutable)
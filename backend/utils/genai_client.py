@@ -1,70 +1,27 @@
 """Google GenAI 客户端封装"""
-import time
-import random
-from functools import wraps
+from typing import Iterator
 from google import genai
 from google.genai import types
 
 # 导入统一的错误解析函数
 from ..generators.google_genai import parse_genai_error
+from .concurrency import get_provider_limiter
+from .resilience import RetryPolicy, classify_error
 
 
-def retry_on_429(max_retries=3, base_delay=2):
-    """429 错误自动重试装饰器（带智能错误解析）"""
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            last_error = None
-            for attempt in range(max_retries):
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    last_error = e
-                    error_str = str(e).lower()
-
-                    # 不可重试的错误类型
-                    non_retryable = [
-                        "401", "unauthenticated",  # 认证错误
-                        "403", "permission_denied", "forbidden",  # 权限错误
-                        "404", "not_found",  # 资源不存在
-                        "invalid_argument",  # 参数错误
-                        "safety", "blocked", "filter",  # 安全过滤
-                    ]
-
-                    should_retry = True
-                    for keyword in non_retryable:
-                        if keyword in error_str:
-                            should_retry = False
-                            break
-
-                    if not should_retry:
-                        # 直接抛出，不重试
-                        raise Exception(parse_genai_error(e))
-
-                    # 可重试的错误
-                    if attempt < max_retries - 1:
-                        if "429" in error_str or "resource_exhausted" in error_str:
-                            wait_time = (base_delay ** attempt) + random.uniform(0, 1)
-                            print(f"[重试] 遇到资源限制，{wait_time:.1f}秒后重试 (尝试 {attempt + 2}/{max_retries})")
-                        else:
-                            wait_time = min(2 ** attempt, 10) + random.uniform(0, 1)
-                            print(f"[重试] 请求失败，{wait_time:.1f}秒后重试 (尝试 {attempt + 2}/{max_retries})")
-                        time.sleep(wait_time)
-                        continue
-
-                    # 重试次数耗尽
-                    raise Exception(parse_genai_error(e))
-
-            # 理论上不会到这里，但保险起见
-            raise Exception(parse_genai_error(last_error))
-        return wrapper
-    return decorator
+def _wrap_error(error: Exception) -> Exception:
+    """把 SDK 异常转换为带解决方案的错误信息，保留类型化错误的类别和 Retry-After"""
+    typed = classify_error(error)
+    message = parse_genai_error(error)
+    if typed is None:
+        return Exception(message)
+    return type(typed)(message, status_code=typed.status_code, retry_after=typed.retry_after)
 
 
 class GenAIClient:
     """GenAI 客户端封装类（已弃用，请使用 GoogleGenAIGenerator）"""
 
-    def __init__(self, api_key: str = None, base_url: str = None):
+    def __init__(self, api_key: str = None, base_url: str = None, provider_config: dict = None):
         self.api_key = api_key
         if not self.api_key:
             raise ValueError(
@@ -88,6 +45,13 @@ class GenAIClient:
 
         self.client = genai.Client(**client_kwargs)
 
+        # 同一服务商的所有调用共享并发上限（文本与图片分别计数）
+        limiter_config = provider_config or {"type": "google_gemini", "api_key": api_key, "base_url": base_url}
+        self.text_limiter = get_provider_limiter(limiter_config, kind="text")
+        self.image_limiter = get_provider_limiter(limiter_config, kind="image")
+        self.text_retry = RetryPolicy.from_provider_config(limiter_config, max_attempts=3)
+        self.image_retry = RetryPolicy.from_provider_config(limiter_config, max_attempts=5)
+
         # 默认安全设置：全部关闭
         self.default_safety_settings = [
             types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH", threshold="OFF"),
@@ -96,35 +60,16 @@ class GenAIClient:
             types.SafetySetting(category="HARM_CATEGORY_HARASSMENT", threshold="OFF"),
         ]
 
-    @retry_on_429(max_retries=3, base_delay=2)
-    def generate_text(
+    def _build_text_request(
         self,
         prompt: str,
-        model: str = "gemini-3-pro-preview",
         temperature: float = 1.0,
         max_output_tokens: int = 8000,
         use_search: bool = False,
         use_thinking: bool = False,
-        images: list = None,
-        system_prompt: str = None,
-        **kwargs
-    ) -> str:
-        """
-        生成文本
-
-        Args:
-            prompt: 提示词
-            model: 模型名称
-            temperature: 温度
-            max_output_tokens: 最大输出 token
-            use_search: 是否使用搜索
-            use_thinking: 是否启用思考模式
-            images: 图片列表（暂不支持）
-            system_prompt: 系统提示词（暂不支持）
-
-        Returns:
-            生成的文本
-        """
+        images: list = None
+    ):
+        """构建文本生成请求：(contents, config)"""
         parts = [types.Part(text=prompt)]
 
         if images:
@@ -159,21 +104,91 @@ class GenAIClient:
         if use_thinking:
             config_kwargs["thinking_config"] = types.ThinkingConfig(thinking_level="HIGH")
 
-        generate_content_config = types.GenerateContentConfig(**config_kwargs)
+        return contents, types.GenerateContentConfig(**config_kwargs)
+
+    def _stream_text_once(self, model: str, contents, config) -> Iterator[str]:
+        """发送一次流式请求，逐个产出文本片段"""
+        with self.text_limiter.slot():
+            for chunk in self.client.models.generate_content_stream(
+                model=model,
+                contents=contents,
+                config=config,
+            ):
+                if not chunk.candidates or not chunk.candidates[0].content or not chunk.candidates[0].content.parts:
+                    continue
+                if chunk.text:
+                    yield chunk.text
+
+    def generate_text(
+        self,
+        prompt: str,
+        model: str = "gemini-3-pro-preview",
+        temperature: float = 1.0,
+        max_output_tokens: int = 8000,
+        use_search: bool = False,
+        use_thinking: bool = False,
+        images: list = None,
+        system_prompt: str = None,
+        **kwargs
+    ) -> str:
+        """
+        生成文本
+
+        Args:
+            prompt: 提示词
+            model: 模型名称
+            temperature: 温度
+            max_output_tokens: 最大输出 token
+            use_search: 是否使用搜索
+            use_thinking: 是否启用思考模式
+            images: 图片列表（暂不支持）
+            system_prompt: 系统提示词（暂不支持）
+
+        Returns:
+            生成的文本
+        """
+        contents, config = self._build_text_request(
+            prompt, temperature, max_output_tokens, use_search, use_thinking, images
+        )
+        try:
+            return self.text_retry.call(
+                lambda: "".join(self._stream_text_once(model, contents, config)),
+                name="GenAI 文本"
+            )
+        except Exception as e:
+            raise _wrap_error(e)
+
+    def generate_text_stream(
+        self,
+        prompt: str,
+        model: str = "gemini-3-pro-preview",
+        temperature: float = 1.0,
+        max_output_tokens: int = 8000,
+        use_search: bool = False,
+        use_thinking: bool = False,
+        images: list = None,
+        system_prompt: str = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        流式生成文本（参数与 generate_text 相同）
 
-        result = ""
-        for chunk in self.client.models.generate_content_stream(
-            model=model,
-            contents=contents,
-            config=generate_content_config,
-        ):
-            if not chunk.candidates or not chunk.candidates[0].content or not chunk.candidates[0].content.parts:
-                continue
-            result += chunk.text
+        第一个片段到达前遇到可重试的错误会自动重试，之后出错直接抛出。
 
-        return result
+        Yields:
+            文本片段
+        """
+        contents, config = self._build_text_request(
+            prompt, temperature, max_output_tokens, use_search, use_thinking, images
+        )
+        try:
+            yield from self.text_retry.stream(
+                lambda: self._stream_text_once(model, contents, config),
+                name="GenAI 文本流式"
+            )
+        except Exception as e:
+            raise _wrap_error(e)
 
-    @retry_on_429(max_retries=5, base_delay=3)  # 图片生成重试更多次
     def generate_image(
         self,
         prompt: str,
@@ -212,18 +227,13 @@ class GenAIClient:
             ),
         )
 
-        image_data = None
-        for chunk in self.client.models.generate_content_stream(
-            model=model,
-            contents=contents,
-            config=generate_content_config,
-        ):
-            if chunk.candidates and chunk.candidates[0].content and chunk.candidates[0].content.parts:
-                for part in chunk.candidates[0].content.parts:
-                    # 检查是否有图片数据
-                    if hasattr(part, 'inline_data') and part.inline_data:
-                        image_data = part.inline_data.data
-                        break
+        try:
+            image_data = self.image_retry.call(
+                lambda: self._generate_image_once(model, contents, generate_content_config),
+                name="GenAI 图片"
+            )
+        except Exception as e:
+            raise _wrap_error(e)
 
         if not image_data:
             raise ValueError(
@@ -243,6 +253,23 @@ class GenAIClient:
 
         return image_data
 
+    def _generate_image_once(self, model: str, contents, config) -> bytes:
+        """发送一次图片生成请求，返回图片数据（没有图片时返回 None）"""
+        image_data = None
+        with self.image_limiter.slot():
+            for chunk in self.client.models.generate_content_stream(
+                model=model,
+                contents=contents,
+                config=config,
+            ):
+                if chunk.candidates and chunk.candidates[0].content and chunk.candidates[0].content.parts:
+                    for part in chunk.candidates[0].content.parts:
+                        # 检查是否有图片数据
+                        if hasattr(part, 'inline_data') and part.inline_data:
+                            image_data = part.inline_data.data
+                            break
+        return image_data
+
 
 # 全局客户端实例
 _client_instance = None
@@ -0,0 +1,208 @@
+"""
+共享 HTTP 传输层
+
+所有对外的同步 HTTP 调用（文本 / 图片服务商、飞书、图片代理、小红书图片下载）
+共用一个 requests.Session：每个主机维护一个 keep-alive 连接池，避免每次请求
+重新建立 TCP + TLS 连接。
+
+按主机统计：新建连接数、复用次数、发送 / 接收字节数、请求耗时。
+
+用法：
+    from backend.utils.http_transport import http_get, http_post
+
+    response = http_post(url, json=payload, timeout=30)
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger(__name__)
+
+TimeoutType = Union[float, Tuple[float, float]]
+
+
+class HostMetrics:
+    """单个主机的统计信息（线程安全）"""
+
+    def __init__(self, host: str):
+        self.host = host
+        self.requests = 0
+        self.errors = 0
+        self.connections_opened = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self._lock = threading.Lock()
+
+    def record_connection(self) -> None:
+        with self._lock:
+            self.connections_opened += 1
+
+    def record_request(self, latency: float, bytes_sent: int, bytes_received: int, error: bool = False) -> None:
+        with self._lock:
+            self.requests += 1
+            if error:
+                self.errors += 1
+            self.bytes_sent += bytes_sent
+            self.bytes_received += bytes_received
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "host": self.host,
+                "requests": self.requests,
+                "errors": self.errors,
+                "connections_opened": self.connections_opened,
+                "connections_reused": max(0, self.requests - self.connections_opened),
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+                "avg_latency": round(self.total_latency / self.requests, 3) if self.requests else None,
+                "max_latency": round(self.max_latency, 3),
+            }
+
+
+_metrics: Dict[str, HostMetrics] = {}
+_metrics_lock = threading.Lock()
+
+
+def _get_host_metrics(host: str) -> HostMetrics:
+    with _metrics_lock:
+        metrics = _metrics.get(host)
+        if metrics is None:
+            metrics = HostMetrics(host)
+            _metrics[host] = metrics
+        return metrics
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _get_host_metrics(self.host).record_connection()
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _get_host_metrics(self.host).record_connection()
+        return super()._new_conn()
+
+
+class _MeteredAdapter(HTTPAdapter):
+    """记录每个主机新建连接数、字节数和耗时的连接池适配器"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, stream=False, **kwargs):
+        host = urlsplit(request.url).hostname or ""
+        metrics = _get_host_metrics(host)
+        body = request.body
+        bytes_sent = len(body) if isinstance(body, (bytes, str)) else 0
+
+        start = time.monotonic()
+        try:
+            response = super().send(request, stream=stream, **kwargs)
+        except Exception:
+            metrics.record_request(time.monotonic() - start, bytes_sent, 0, error=True)
+            raise
+
+        # 流式响应不在这里读取内容，按 Content-Length 统计
+        if stream:
+            bytes_received = int(response.headers.get("Content-Length") or 0)
+        else:
+            bytes_received = len(response.content or b"")
+        metrics.record_request(
+            time.monotonic() - start, bytes_sent, bytes_received,
+            error=response.status_code >= 500
+        )
+        return response
+
+
+class HttpTransport:
+    """带连接池的共享 HTTP 客户端"""
+
+    POOL_CONNECTIONS = 32  # 缓存连接池的主机数
+    POOL_MAXSIZE = 64  # 每个主机保留的最大连接数
+    CONNECT_TIMEOUT = 10.0  # 默认连接超时（秒）
+    READ_TIMEOUT = 300.0  # 默认读取超时（秒）
+
+    def __init__(
+        self,
+        pool_connections: int = POOL_CONNECTIONS,
+        pool_maxsize: int = POOL_MAXSIZE,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        read_timeout: float = READ_TIMEOUT
+    ):
+        """
+        Args:
+            pool_connections: 缓存连接池的主机数
+            pool_maxsize: 每个主机的最大连接数（超过时新连接用完即关闭，不阻塞）
+            connect_timeout: 调用方未指定 timeout 时的连接超时
+            read_timeout: 调用方未指定 timeout 时的读取超时
+        """
+        self.default_timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = _MeteredAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        logger.debug(f"HTTP 连接池: hosts={pool_connections}, maxsize={pool_maxsize}")
+
+    def request(self, method: str, url: str, timeout: Optional[TimeoutType] = None, **kwargs) -> requests.Response:
+        """发送请求（参数与 requests.request 相同）"""
+        return self.session.request(method, url, timeout=timeout or self.default_timeout, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+
+_transport_instance: Optional[HttpTransport] = None
+_transport_lock = threading.Lock()
+
+
+def get_http_transport() -> HttpTransport:
+    """获取全局 HTTP 传输实例（连接池参数来自 Config.HTTP_* 配置）"""
+    global _transport_instance
+    with _transport_lock:
+        if _transport_instance is None:
+            from backend.config import Config
+
+            _transport_instance = HttpTransport(
+                pool_connections=Config.HTTP_POOL_CONNECTIONS,
+                pool_maxsize=Config.HTTP_POOL_MAXSIZE,
+                connect_timeout=Config.HTTP_CONNECT_TIMEOUT,
+                read_timeout=Config.HTTP_READ_TIMEOUT
+            )
+        return _transport_instance
+
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    """通过共享连接池发送 GET 请求（参数与 requests.get 相同）"""
+    return get_http_transport().get(url, **kwargs)
+
+
+def http_post(url: str, **kwargs) -> requests.Response:
+    """通过共享连接池发送 POST 请求（参数与 requests.post 相同）"""
+    return get_http_transport().post(url, **kwargs)
+
+
+def get_http_metrics() -> Dict[str, Dict[str, Any]]:
+    """获取按主机统计的 HTTP 指标"""
+    with _metrics_lock:
+        metrics = list(_metrics.values())
+    return {m.host: m.to_dict() for m in metrics}
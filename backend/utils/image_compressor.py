@@ -1,94 +1,241 @@
 """图片压缩工具"""
 import io
+import logging
+import math
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
 from PIL import Image
-from typing import Optional
 
+logger = logging.getLogger(__name__)
 
-def compress_image(
-    image_data: bytes,
-    max_size_kb: int = 200,  # 默认200KB
+MIN_DIMENSION = 512  # 缩小尺寸时的最小边长
+SIZE_SAFETY_RATIO = 0.92  # 按像素数估算缩放比例时预留的余量
+
+
+def _open_image(image_data: bytes, max_dimension: int) -> Image.Image:
+    """
+    解码图片并缩放到 max_dimension 以内（转换为 RGB）
+
+    JPEG 使用 draft 在解码阶段按 1/2、1/4、1/8 缩小，其他格式先用 reduce
+    做整数倍缩小，最后再用 LANCZOS 精确缩放，避免对全尺寸图片做 LANCZOS。
+    """
+    img = Image.open(io.BytesIO(image_data))
+
+    if img.format == 'JPEG':
+        img.draft('RGB', (max_dimension, max_dimension))
+
+    # 转换为 RGB（处理 RGBA 等格式）
+    if img.mode in ('RGBA', 'LA', 'P'):
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        img = background
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    return _fit(img, max_dimension)
+
+
+def _fit(img: Image.Image, max_dimension: int) -> Image.Image:
+    """把图片缩小到最长边不超过 max_dimension"""
+    width, height = img.size
+    longest = max(width, height)
+    if longest <= max_dimension:
+        return img
+
+    # 先整数倍快速缩小（保留至少 2 倍余量给 LANCZOS，保证画质）
+    factor = longest // (max_dimension * 2)
+    if factor >= 2:
+        img = img.reduce(factor)
+        width, height = img.size
+
+    ratio = max_dimension / max(width, height)
+    new_size = (max(1, int(width * ratio)), max(1, int(height * ratio)))
+    return img.resize(new_size, Image.Resampling.LANCZOS)
+
+
+def _encode(img: Image.Image, quality: int, optimize: bool = False) -> bytes:
+    output = io.BytesIO()
+    img.save(output, format='JPEG', quality=quality, optimize=optimize)
+    return output.getvalue()
+
+
+def _bisect_quality(
+    img: Image.Image,
+    max_size_bytes: int,
+    quality_min: int,
+    quality_max: int
+) -> Tuple[int, bytes]:
+    """
+    二分查找满足大小要求的最高质量
+
+    JPEG 大小随质量单调递增，二分最多约 log2(区间长度) 次编码。
+
+    Returns:
+        (quality, data)：都不满足时返回最低质量的结果
+    """
+    low, high = quality_min, quality_max
+    best: Optional[Tuple[int, bytes]] = None
+    lowest: Optional[bytes] = None
+
+    while low <= high:
+        quality = (low + high) // 2
+        data = _encode(img, quality)
+        if quality == quality_min:
+            lowest = data
+        if len(data) <= max_size_bytes:
+            best = (quality, data)
+            low = quality + 1
+        else:
+            high = quality - 1
+
+    if best is not None:
+        return best
+    if lowest is None:
+        lowest = _encode(img, quality_min)
+    return quality_min, lowest
+
+
+def _compress_decoded(
+    img: Image.Image,
+    max_size_bytes: int,
+    quality_start: int,
+    quality_min: int
+) -> bytes:
+    """对已解码的图片压缩到 max_size_bytes 以内"""
+    quality, data = _bisect_quality(img, max_size_bytes, quality_min, quality_start)
+
+    # 最低质量仍然太大：按"文件大小 ∝ 像素数"估算缩放比例，一次缩到位
+    while len(data) > max_size_bytes and max(img.size) > MIN_DIMENSION:
+        scale = math.sqrt(max_size_bytes / len(data)) * SIZE_SAFETY_RATIO
+        target = max(MIN_DIMENSION, int(max(img.size) * min(scale, 0.9)))
+        img = _fit(img, target)
+        quality, data = _bisect_quality(img, max_size_bytes, quality_min, quality_start)
+
+    # 最终结果用 optimize 重新编码（只会更小）
+    return _encode(img, quality, optimize=True)
+
+
+def decode_image(image_data: bytes, max_dimension: int = 4096) -> Image.Image:
+    """
+    解码图片为 RGB 模式（透明背景填充为白色），最长边不超过 max_dimension
+
+    Args:
+        image_data: 图片数据
+        max_dimension: 最大边长（像素）
+
+    Returns:
+        PIL 图片
+    """
+    return _open_image(image_data, max_dimension)
+
+
+def compress_pil_image(
+    img: Image.Image,
+    max_size_kb: int = 200,
     quality_start: int = 85,
     quality_min: int = 20,
     max_dimension: int = 2048
 ) -> bytes:
     """
-    压缩图片到指定大小以内
+    压缩已解码的 RGB 图片（调用方已持有 PIL 图片时使用，避免重复解码）
 
     Args:
-        image_data: 原始图片数据
+        img: RGB 模式的 PIL 图片
         max_size_kb: 最大文件大小（KB）
         quality_start: 起始压缩质量（1-100）
         quality_min: 最低压缩质量（1-100）
         max_dimension: 最大边长（像素）
 
     Returns:
-        压缩后的图片数据
+        JPEG 数据
     """
-    max_size_bytes = max_size_kb * 1024
+    return _compress_decoded(_fit(img, max_dimension), max_size_kb * 1024, quality_start, quality_min)
 
-    # 如果原图已经小于目标大小，直接返回
-    if len(image_data) <= max_size_bytes:
-        return image_data
 
-    try:
-        # 打开图片
-        img = Image.open(io.BytesIO(image_data))
-
-        # 转换为 RGB（处理 RGBA 等格式）
-        if img.mode in ('RGBA', 'LA', 'P'):
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'P':
-                img = img.convert('RGBA')
-            background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-            img = background
-        elif img.mode != 'RGB':
-            img = img.convert('RGB')
-
-        # 如果图片尺寸过大，先缩小
-        width, height = img.size
-        if width > max_dimension or height > max_dimension:
-            ratio = min(max_dimension / width, max_dimension / height)
-            new_width = int(width * ratio)
-            new_height = int(height * ratio)
-            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+def compress_image_multi(
+    image_data: bytes,
+    targets_kb: Iterable[int],
+    quality_start: int = 85,
+    quality_min: int = 20,
+    max_dimension: int = 2048
+) -> Dict[int, bytes]:
+    """
+    一次解码，压缩出多个大小目标（如 50KB 缩略图 + 200KB 参考图）
 
-        # 逐步降低质量直到满足大小要求
-        quality = quality_start
-        compressed_data = None
+    Args:
+        image_data: 原始图片数据
+        targets_kb: 目标大小列表（KB）
+        quality_start: 起始压缩质量（1-100）
+        quality_min: 最低压缩质量（1-100）
+        max_dimension: 最大边长（像素）
 
-        while quality >= quality_min:
-            output = io.BytesIO()
-            img.save(output, format='JPEG', quality=quality, optimize=True)
-            compressed_data = output.getvalue()
+    Returns:
+        Dict[目标大小KB, 压缩后的图片数据]；原图已小于目标或压缩失败时为原图
+    """
+    targets = sorted(set(int(t) for t in targets_kb), reverse=True)
+    results: Dict[int, bytes] = {}
 
-            if len(compressed_data) <= max_size_bytes:
-                break
+    pending = [t for t in targets if len(image_data) > t * 1024]
+    for target in targets:
+        if target not in pending:
+            results[target] = image_data
+    if not pending:
+        return results
 
-            quality -= 5
+    start = time.perf_counter()
+    try:
+        img = _open_image(image_data, max_dimension)
+        decode_ms = (time.perf_counter() - start) * 1000
 
-        # 如果还是太大，进一步缩小尺寸
-        if len(compressed_data) > max_size_bytes:
-            width, height = img.size
-            while len(compressed_data) > max_size_bytes and max(width, height) > 512:
-                width = int(width * 0.9)
-                height = int(height * 0.9)
-                img_resized = img.resize((width, height), Image.Resampling.LANCZOS)
+        for target in pending:
+            results[target] = _compress_decoded(img, target * 1024, quality_start, quality_min)
 
-                output = io.BytesIO()
-                img_resized.save(output, format='JPEG', quality=quality_min, optimize=True)
-                compressed_data = output.getvalue()
+        total_ms = (time.perf_counter() - start) * 1000
+        summary = ", ".join(
+            f"{len(results[t]) / 1024:.1f}KB(≤{t}KB)" for t in pending
+        )
+        logger.debug(
+            f"[图片压缩] {len(image_data) / 1024:.1f}KB → {summary}, "
+            f"解码 {decode_ms:.0f}ms, 总计 {total_ms:.0f}ms"
+        )
 
-        original_size_kb = len(image_data) / 1024
-        compressed_size_kb = len(compressed_data) / 1024
-        compression_ratio = (1 - compressed_size_kb / original_size_kb) * 100
+    except Exception as e:
+        logger.warning(f"[图片压缩] 压缩失败，返回原图: {e}")
+        for target in pending:
+            results[target] = image_data
 
-        print(f"[图片压缩] {original_size_kb:.1f}KB → {compressed_size_kb:.1f}KB (压缩 {compression_ratio:.1f}%)")
+    return results
 
-        return compressed_data
 
-    except Exception as e:
-        print(f"[图片压缩] 压缩失败，返回原图: {e}")
-        return image_data
+def compress_image(
+    image_data: bytes,
+    max_size_kb: int = 200,  # 默认200KB
+    quality_start: int = 85,
+    quality_min: int = 20,
+    max_dimension: int = 2048
+) -> bytes:
+    """
+    压缩图片到指定大小以内
+
+    Args:
+        image_data: 原始图片数据
+        max_size_kb: 最大文件大小（KB）
+        quality_start: 起始压缩质量（1-100）
+        quality_min: 最低压缩质量（1-100）
+        max_dimension: 最大边长（像素）
+
+    Returns:
+        压缩后的图片数据
+    """
+    return compress_image_multi(
+        image_data, [max_size_kb],
+        quality_start=quality_start,
+        quality_min=quality_min,
+        max_dimension=max_dimension
+    )[max_size_kb]
 
 
 def compress_images(images: list[bytes], max_size_kb: int = 200) -> list[bytes]:
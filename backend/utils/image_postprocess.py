@@ -0,0 +1,141 @@
+"""
+图片后处理
+
+生成结果落盘后，衍生图和参考图压缩（PIL 解码、缩放、多次编码）属于 CPU 密集
+操作。这里把它们放到进程池中执行，不占用调用服务商的工作线程，也不受 GIL 限制。
+
+子进程使用 forkserver（不支持时用 spawn）启动：调用方是多线程进程，直接 fork
+会把其他线程持有的锁（日志、SQLite、HTTP 连接池等）以加锁状态复制到子进程中，可能导致死锁。
+
+进程池不可用时（如受限环境无法创建子进程）自动退化为在当前线程执行。
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from .image_compressor import compress_image
+from .image_renditions import DEFAULT_CANVAS_SIZE, build_renditions
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_MAX_KB = 200  # 参考图大小上限
+
+
+def _get_mp_context():
+    """子进程启动方式：优先 forkserver，不支持时（如 Windows）使用 spawn"""
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+
+class ImagePostProcessor:
+    """图片后处理进程池（懒启动）"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Args:
+            max_workers: 进程数（默认 CPU 核数）
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._disabled = False
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        with self._lock:
+            if self._pool is None and not self._disabled:
+                try:
+                    mp_context = _get_mp_context()
+                    self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=mp_context)
+                    logger.info(
+                        f"图片后处理进程池已启动: workers={self.max_workers}, "
+                        f"start_method={mp_context.get_start_method()}"
+                    )
+                except (OSError, NotImplementedError, ValueError) as e:
+                    logger.warning(f"无法创建图片后处理进程池，改为在当前线程处理: {e}")
+                    self._disabled = True
+            return self._pool
+
+    def submit(self, fn, *args) -> Future:
+        """
+        提交后处理任务
+
+        Returns:
+            Future: 任务结果
+        """
+        pool = self._get_pool()
+        if pool is not None:
+            try:
+                return pool.submit(fn, *args)
+            except RuntimeError as e:
+                # 进程池已损坏（子进程异常退出），重建后再试一次
+                logger.warning(f"图片后处理进程池不可用，重新创建: {e}")
+                with self._lock:
+                    self._pool = None
+                pool = self._get_pool()
+                if pool is not None:
+                    return pool.submit(fn, *args)
+
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def submit_renditions(
+        self,
+        image_data: bytes,
+        task_dir: str,
+        filename: str,
+        normalize: bool = False,
+        canvas_size: Tuple[int, int] = DEFAULT_CANVAS_SIZE
+    ) -> Future:
+        """后台生成衍生图（thumb / preview / full），normalize 时同时规整原图"""
+        future = self.submit(build_renditions, image_data, task_dir, filename, normalize, canvas_size)
+        future.add_done_callback(_log_failure)
+        return future
+
+    def renditions_with_reference(
+        self,
+        image_data: bytes,
+        task_dir: str,
+        filename: str,
+        normalize: bool = False,
+        canvas_size: Tuple[int, int] = DEFAULT_CANVAS_SIZE
+    ) -> bytes:
+        """生成衍生图并返回参考图（封面使用，只解码一次）"""
+        return self.submit(
+            build_renditions, image_data, task_dir, filename, normalize, canvas_size, REFERENCE_MAX_KB
+        ).result()
+
+    def compress_reference(self, image_data: bytes, max_size_kb: int = REFERENCE_MAX_KB) -> bytes:
+        """压缩参考图（在进程池中执行并等待结果）"""
+        return self.submit(compress_image, image_data, max_size_kb).result()
+
+    def compress_references(self, images: List[bytes], max_size_kb: int = REFERENCE_MAX_KB) -> List[bytes]:
+        """并行压缩多张参考图，保持原顺序"""
+        futures = [self.submit(compress_image, image_data, max_size_kb) for image_data in images]
+        return [future.result() for future in futures]
+
+
+def _log_failure(future: Future) -> None:
+    error = future.exception()
+    if error is not None:
+        logger.error(f"图片后处理失败: {error}")
+
+
+_processor_instance: Optional[ImagePostProcessor] = None
+_processor_lock = threading.Lock()
+
+
+def get_image_postprocessor() -> ImagePostProcessor:
+    """获取全局图片后处理器"""
+    global _processor_instance
+    with _processor_lock:
+        if _processor_instance is None:
+            _processor_instance = ImagePostProcessor()
+        return _processor_instance
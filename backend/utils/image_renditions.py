@@ -0,0 +1,158 @@
+"""
+多分辨率图片衍生存储
+
+每张生成的页面图片在 <task_dir>/renditions/ 下生成一次固定规格的衍生图：
+- thumb: 最长边 480，画廊 / 列表使用
+- preview: 最长边 1080，大图预览使用
+- full: 原始分辨率（规整模式下为画布尺寸）的高质量压缩版
+
+优先输出 WebP，Pillow 不支持 WebP 时输出 JPEG。衍生图放在子目录中，
+历史记录扫描和 ZIP 导出只处理任务目录下的一级文件，不会把它们当成页面。
+
+可选的存储规整模式（normalize）会把服务商返回的原图按小红书画布尺寸
+（默认 1080x1440，3:4）裁切缩放后重新写回原文件，避免 history/ 堆积 2K/4K PNG。
+"""
+
+import io
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageOps, features
+
+from .atomic_file import atomic_write
+from .image_compressor import compress_pil_image, decode_image
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = "renditions"
+
+# 名称 -> (最长边，None 表示不缩放; 质量)
+RENDITION_SPECS: Dict[str, Tuple[Optional[int], int]] = {
+    "thumb": (480, 70),
+    "preview": (1080, 80),
+    "full": (None, 90),
+}
+
+DEFAULT_CANVAS_SIZE = (1080, 1440)  # 小红书 3:4 画布
+
+_MIME_TYPES = {
+    ".webp": "image/webp",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+}
+
+
+def _rendition_format() -> Tuple[str, str]:
+    """输出格式：(PIL 格式名, 扩展名)"""
+    if features.check("webp"):
+        return "WEBP", ".webp"
+    return "JPEG", ".jpg"
+
+
+def rendition_path(task_dir: str, filename: str, name: str, ext: Optional[str] = None) -> str:
+    """
+    衍生图路径：<task_dir>/renditions/<页面文件名去扩展名>_<name><ext>
+
+    Args:
+        task_dir: 任务目录
+        filename: 页面图片文件名（如 0.png）
+        name: 规格名称（thumb / preview / full）
+        ext: 扩展名（默认当前输出格式）
+    """
+    stem = os.path.splitext(filename)[0]
+    if ext is None:
+        ext = _rendition_format()[1]
+    return os.path.join(task_dir, RENDITIONS_DIR, f"{stem}_{name}{ext}")
+
+
+def guess_image_mimetype(path: str) -> str:
+    """根据文件头识别图片 MIME 类型（旧的 thumb_*.png 实际是 JPEG），无法识别时按扩展名"""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(12)
+    except OSError:
+        header = b""
+    if header[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if header[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    return _MIME_TYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
+
+
+def find_rendition(task_dir: str, filename: str, name: str) -> Optional[Tuple[str, str]]:
+    """
+    查找已生成的衍生图
+
+    Returns:
+        (路径, MIME 类型)，不存在时返回 None
+    """
+    for ext in (".webp", ".jpg"):
+        path = rendition_path(task_dir, filename, name, ext)
+        if os.path.exists(path):
+            return path, _MIME_TYPES[ext]
+    return None
+
+
+def _encode(img: Image.Image, fmt: str, quality: int) -> bytes:
+    output = io.BytesIO()
+    if fmt == "WEBP":
+        img.save(output, format=fmt, quality=quality, method=4)
+    else:
+        img.save(output, format=fmt, quality=quality, optimize=True, progressive=True)
+    return output.getvalue()
+
+
+def build_renditions(
+    image_data: bytes,
+    task_dir: str,
+    filename: str,
+    normalize: bool = False,
+    canvas_size: Tuple[int, int] = DEFAULT_CANVAS_SIZE,
+    reference_kb: Optional[int] = None
+) -> Optional[bytes]:
+    """
+    一次解码生成全部衍生图（在后处理进程池中执行，必须是模块级函数）
+
+    Args:
+        image_data: 原图数据
+        task_dir: 任务目录
+        filename: 页面图片文件名
+        normalize: 是否把原图规整为画布尺寸并写回原文件
+        canvas_size: 规整画布尺寸 (宽, 高)
+        reference_kb: 需要同时返回的参考图大小上限（KB），None 表示不需要
+
+    Returns:
+        参考图数据（reference_kb 为 None 时返回 None）
+    """
+    start = time.perf_counter()
+    img = decode_image(image_data)
+
+    if normalize:
+        img = ImageOps.fit(img, canvas_size, Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        img.save(output, format="PNG", compress_level=6)
+        atomic_write(os.path.join(task_dir, filename), output.getvalue())
+
+    os.makedirs(os.path.join(task_dir, RENDITIONS_DIR), exist_ok=True)
+    fmt, ext = _rendition_format()
+    for name, (max_edge, quality) in RENDITION_SPECS.items():
+        rendition = img
+        if max_edge and max(img.size) > max_edge:
+            rendition = img.copy()
+            rendition.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        atomic_write(rendition_path(task_dir, filename, name, ext), _encode(rendition, fmt, quality))
+
+    reference = None
+    if reference_kb is not None:
+        reference = image_data if len(image_data) <= reference_kb * 1024 else compress_pil_image(img, reference_kb)
+
+    logger.debug(
+        f"[衍生图] {filename}: {img.size[0]}x{img.size[1]}, format={fmt}, "
+        f"normalize={normalize}, 耗时 {(time.perf_counter() - start) * 1000:.0f}ms"
+    )
+    return reference
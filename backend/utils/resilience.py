@@ -0,0 +1,455 @@
+"""
+服务商调用的容错：类型化错误、重试退避、熔断
+
+- 类型化错误：生成器 / 文本客户端按 HTTP 状态码抛出 ProviderError 子类，
+  携带状态码和服务商返回的 Retry-After，不再依赖在异常文本中搜索 "429"
+- RetryPolicy：指数退避 + 完全抖动（full jitter），服务商给出 Retry-After 时按其等待；
+  只重试限流、5xx、超时、连接错误，认证失败 / 参数错误直接抛出
+- CircuitBreaker：每个服务商一个（与并发限制器同一标识），连续失败达到阈值后打开，
+  打开期间的调用直接抛出 CircuitOpenError（毫秒级失败，不再逐个等待超时）；
+  冷却结束后进入半开状态，只放行一个探测请求，成功则关闭，失败则重新打开
+
+限流（429）不计入熔断：服务商仍在正常响应，由并发限制器下调并发处理。
+"""
+
+import asyncio
+import email.utils
+import logging
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, Mapping, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+# ==================== 类型化错误 ====================
+
+class ProviderError(Exception):
+    """服务商调用失败的基类"""
+
+    retryable = False  # 是否值得重试
+    trips_breaker = False  # 是否计入熔断失败
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        """
+        Args:
+            message: 错误信息（展示给用户）
+            status_code: HTTP 状态码（可选）
+            retry_after: 服务商建议的等待时间（秒，可选）
+        """
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class RateLimitError(ProviderError):
+    """限流或配额不足（429）"""
+    retryable = True
+
+
+class ProviderServerError(ProviderError):
+    """服务商内部错误或暂时不可用（5xx）"""
+    retryable = True
+    trips_breaker = True
+
+
+class ProviderTimeoutError(ProviderError):
+    """请求超时"""
+    retryable = True
+    trips_breaker = True
+
+
+class ProviderConnectionError(ProviderError):
+    """无法连接服务商"""
+    retryable = True
+    trips_breaker = True
+
+
+class AuthenticationError(ProviderError):
+    """API Key 无效或没有权限（401 / 403）"""
+
+
+class InvalidRequestError(ProviderError):
+    """请求参数错误、模型不存在等（4xx）"""
+
+
+class CircuitOpenError(ProviderError):
+    """熔断器打开，调用未发出"""
+
+
+# 识别未类型化限流错误（如 SDK 抛出的异常）的关键字
+_RATE_LIMIT_KEYWORDS = (
+    "429",
+    "rate limit",
+    "rate_limit",
+    "too many requests",
+    "resource_exhausted",
+    "速率限制",
+)
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """
+    解析 Retry-After 响应头（秒数或 HTTP 日期）
+
+    Args:
+        headers: 响应头（requests / httpx 的 headers 均可，大小写不敏感）
+
+    Returns:
+        Optional[float]: 等待秒数，没有或无法解析时返回 None
+    """
+    if not headers:
+        return None
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def error_for_status(
+    status_code: int,
+    message: str,
+    headers: Optional[Mapping[str, str]] = None
+) -> ProviderError:
+    """
+    根据 HTTP 状态码创建对应的类型化错误
+
+    Args:
+        status_code: HTTP 状态码
+        message: 错误信息
+        headers: 响应头（用于读取 Retry-After）
+
+    Returns:
+        ProviderError: 错误对象（由调用方 raise）
+    """
+    retry_after = parse_retry_after(headers)
+    if status_code == 429:
+        error_cls = RateLimitError
+    elif status_code in (401, 403):
+        error_cls = AuthenticationError
+    elif status_code == 408:
+        error_cls = ProviderTimeoutError
+    elif status_code >= 500:
+        error_cls = ProviderServerError
+    else:
+        error_cls = InvalidRequestError
+    return error_cls(message, status_code=status_code, retry_after=retry_after)
+
+
+def classify_error(error: BaseException) -> Optional[ProviderError]:
+    """
+    把任意异常归类为类型化错误（用于第三方 SDK / HTTP 库抛出的异常）
+
+    Args:
+        error: 异常对象
+
+    Returns:
+        Optional[ProviderError]: 已是 ProviderError 时原样返回；能识别时返回新建的错误；否则 None
+    """
+    if isinstance(error, ProviderError):
+        return error
+
+    # requests / httpx / SDK 的超时与连接错误（按类名识别，避免导入这些库）
+    for cls in type(error).__mro__:
+        name = cls.__name__
+        if "Timeout" in name:
+            return ProviderTimeoutError(str(error))
+        if name in ("ConnectionError", "ConnectError", "RemoteProtocolError"):
+            return ProviderConnectionError(str(error))
+    if isinstance(error, TimeoutError):
+        return ProviderTimeoutError(str(error))
+
+    # SDK 错误通常带有 code / status_code 属性（如 google.genai.errors.APIError）
+    status_code = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if isinstance(status_code, int) and 400 <= status_code < 600:
+        response = getattr(error, "response", None)
+        return error_for_status(status_code, str(error), getattr(response, "headers", None))
+
+    error_str = str(error).lower()
+    if any(keyword in error_str for keyword in _RATE_LIMIT_KEYWORDS):
+        return RateLimitError(str(error), status_code=429)
+    return None
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """判断异常是否为限流 / 配额错误"""
+    return isinstance(classify_error(error), RateLimitError)
+
+
+# ==================== 重试 ====================
+
+class RetryPolicy:
+    """指数退避 + 完全抖动的重试策略"""
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        max_retry_after: float = 60.0
+    ):
+        """
+        Args:
+            max_attempts: 最大尝试次数（含第一次）
+            base_delay: 退避基数（秒）
+            max_delay: 单次退避上限（秒）
+            max_retry_after: 服务商要求等待超过该时间时不再重试，直接抛出
+        """
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self.max_retry_after = float(max_retry_after)
+
+    @classmethod
+    def from_provider_config(cls, provider_config: Dict[str, Any], max_attempts: int = 3) -> "RetryPolicy":
+        """
+        从服务商配置创建重试策略
+
+        支持的配置项：
+        - max_retries: 失败后的重试次数（默认 max_attempts - 1）
+        - retry_base_delay: 退避基数（秒，默认 1）
+        - retry_max_delay: 单次退避上限（秒，默认 30）
+        """
+        retries = provider_config.get("max_retries")
+        if retries is not None:
+            max_attempts = int(retries) + 1
+        return cls(
+            max_attempts=max_attempts,
+            base_delay=float(provider_config.get("retry_base_delay", 1.0)),
+            max_delay=float(provider_config.get("retry_max_delay", 30.0))
+        )
+
+    def next_delay(self, attempt: int, error: BaseException) -> Optional[float]:
+        """
+        计算第 attempt 次（从 0 开始）失败后的等待时间
+
+        Args:
+            attempt: 已失败的尝试序号
+            error: 本次失败的异常
+
+        Returns:
+            Optional[float]: 等待秒数；不应重试时返回 None
+        """
+        if attempt >= self.max_attempts - 1:
+            return None
+        typed = classify_error(error)
+        if typed is None or not typed.retryable:
+            return None
+
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if typed.retry_after is not None:
+            if typed.retry_after > self.max_retry_after:
+                return None
+            # 不早于服务商要求的时间，再加少量抖动避免同时醒来
+            return typed.retry_after + random.uniform(0, self.base_delay)
+        return backoff
+
+    def _log_retry(self, name: str, attempt: int, delay: float, error: BaseException) -> None:
+        logger.warning(
+            f"[重试] {name} 第 {attempt + 1}/{self.max_attempts} 次失败"
+            f"（{type(classify_error(error) or error).__name__}），{delay:.1f}s 后重试: {str(error)[:100]}"
+        )
+
+    def call(self, func: Callable[[], T], name: str = "") -> T:
+        """
+        按策略执行调用（线程版本）
+
+        Args:
+            func: 无参调用
+            name: 调用名称（用于日志）
+
+        Returns:
+            调用结果
+        """
+        attempt = 0
+        while True:
+            try:
+                return func()
+            except Exception as e:
+                delay = self.next_delay(attempt, e)
+                if delay is None:
+                    raise
+                self._log_retry(name, attempt, delay, e)
+                time.sleep(delay)
+                attempt += 1
+
+    async def call_async(self, func: Callable[[], Awaitable[T]], name: str = "") -> T:
+        """call() 的协程版本：等待期间不阻塞事件循环"""
+        attempt = 0
+        while True:
+            try:
+                return await func()
+            except Exception as e:
+                delay = self.next_delay(attempt, e)
+                if delay is None:
+                    raise
+                self._log_retry(name, attempt, delay, e)
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def stream(self, open_stream: Callable[[], Iterator[T]], name: str = "") -> Iterator[T]:
+        """
+        流式调用的重试：只在产出第一个片段之前重试，已产出内容后出错直接抛出
+        （调用方已经把部分内容推送给前端，重试会导致内容重复）
+
+        Args:
+            open_stream: 创建流式迭代器的函数
+            name: 调用名称（用于日志）
+
+        Yields:
+            流式片段
+        """
+        attempt = 0
+        while True:
+            started = False
+            try:
+                for item in open_stream():
+                    started = True
+                    yield item
+                return
+            except Exception as e:
+                delay = None if started else self.next_delay(attempt, e)
+                if delay is None:
+                    raise
+                self._log_retry(name, attempt, delay, e)
+                time.sleep(delay)
+                attempt += 1
+
+
+# ==================== 熔断 ====================
+
+class CircuitBreaker:
+    """服务商熔断器（线程安全）"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            name: 熔断器名称（用于日志）
+            failure_threshold: 连续失败多少次后打开
+            reset_timeout: 打开后多久进入半开状态（秒）
+        """
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._rejected = 0
+        self._opened_count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def configure(self, failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None) -> None:
+        """更新配置（配置文件修改后调用）"""
+        with self._lock:
+            if failure_threshold is not None:
+                self.failure_threshold = max(1, int(failure_threshold))
+            if reset_timeout is not None:
+                self.reset_timeout = float(reset_timeout)
+
+    def _current_state(self) -> str:
+        """当前状态（调用方需持有锁）：打开超过冷却时间视为半开"""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def before_call(self) -> None:
+        """
+        调用前检查：熔断打开时直接抛出 CircuitOpenError
+
+        半开状态只放行一个探测请求，其余请求同样直接失败。
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                logger.info(f"[熔断] {self.name} 半开，放行探测请求")
+                return
+            self._rejected += 1
+            remaining = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+        raise CircuitOpenError(
+            f"⚠️ 服务商暂时不可用（连续失败已触发熔断），约 {remaining:.0f} 秒后自动恢复\n\n"
+            "【解决方案】\n"
+            "1. 稍后再试\n"
+            "2. 检查服务商状态页或 Base URL 配置",
+            retry_after=remaining
+        )
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"[熔断] {self.name} 探测成功，恢复正常")
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, error: BaseException) -> None:
+        """
+        记录调用失败：只有 5xx / 超时 / 连接错误计入熔断
+
+        其他错误（限流、4xx、无法归类的异常）不改变熔断状态，也不清零连续失败次数：
+        这类调用可能是熔断前就已发出的请求，不能据此关闭熔断；半开状态下只归还探测名额。
+        """
+        typed = classify_error(error)
+        if isinstance(typed, CircuitOpenError):
+            return
+        if typed is None or not typed.trips_breaker:
+            self.record_cancel()
+            return
+
+        with self._lock:
+            self._consecutive_failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if state != self.OPEN:
+                    self._opened_count += 1
+                    logger.warning(
+                        f"[熔断] {self.name} 连续失败 {self._consecutive_failures} 次，"
+                        f"熔断 {self.reset_timeout:.0f}s: {str(error)[:100]}"
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def record_cancel(self) -> None:
+        """调用被取消：归还半开状态的探测名额"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取熔断器统计信息"""
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._consecutive_failures,
+                "opened": self._opened_count,
+                "rejected": self._rejected,
+            }
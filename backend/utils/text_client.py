@@ -1,46 +1,24 @@
 """Text API 客户端封装"""
-import time
-import random
+import json
 import base64
-import requests
-from functools import wraps
-from typing import List, Optional, Union
-from .image_compressor import compress_image
-
-
-def retry_on_429(max_retries=3, base_delay=2):
-    """429 错误自动重试装饰器"""
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            for attempt in range(max_retries):
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    error_str = str(e)
-                    if "429" in error_str or "rate" in error_str.lower():
-                        if attempt < max_retries - 1:
-                            wait_time = (base_delay ** attempt) + random.uniform(0, 1)
-                            print(f"[重试] 遇到限流，{wait_time:.1f}秒后重试 (尝试 {attempt + 2}/{max_retries})")
-                            time.sleep(wait_time)
-                            continue
-                    raise
-            raise Exception(
-                f"Text API 重试 {max_retries} 次后仍失败。\n"
-                "可能原因：\n"
-                "1. API持续限流或配额不足\n"
-                "2. 网络连接持续不稳定\n"
-                "3. API服务暂时不可用\n"
-                "建议：稍后再试，或联系API服务提供商"
-            )
-        return wrapper
-    return decorator
+from .http_transport import http_post
+from typing import Iterator, List, Union
+from .encoded_image import EncodedImage, ensure_encoded
+from .concurrency import get_provider_limiter
+from .resilience import ProviderError, RetryPolicy, error_for_status
 
 
 class TextChatClient:
     """Text API 客户端封装类"""
 
-    def __init__(self, api_key: str = None, base_url: str = None, endpoint_type: str = None, model: str = None):
+    def __init__(
+        self,
+        api_key: str = None,
+        base_url: str = None,
+        endpoint_type: str = None,
+        model: str = None,
+        provider_config: dict = None
+    ):
         self.api_key = api_key
         self.model = model  # 保存模型配置
         if not self.api_key:
@@ -58,6 +36,11 @@ class TextChatClient:
             endpoint = '/' + endpoint
         self.chat_endpoint = f"{self.base_url}{endpoint}"
 
+        # 同一服务商的所有文本调用共享并发上限和熔断器
+        provider_config = provider_config or {"type": "openai_compatible", "api_key": api_key, "base_url": base_url}
+        self.limiter = get_provider_limiter(provider_config, kind="text")
+        self.retry_policy = RetryPolicy.from_provider_config(provider_config, max_attempts=3)
+
     def _encode_image_to_base64(self, image_data: bytes) -> str:
         """将图片数据编码为 base64"""
         return base64.b64encode(image_data).decode('utf-8')
@@ -65,14 +48,14 @@ class TextChatClient:
     def _build_content_with_images(
         self,
         text: str,
-        images: List[Union[bytes, str]] = None
+        images: List[Union[bytes, EncodedImage, str]] = None
     ) -> Union[str, List[dict]]:
         """
         构建包含图片的 content
 
         Args:
             text: 文本内容
-            images: 图片列表，可以是 bytes（图片数据）或 str（URL）
+            images: 图片列表，可以是 bytes（图片数据）、EncodedImage（预编码图片）或 str（URL）
 
         Returns:
             如果没有图片，返回纯文本；有图片则返回多模态内容列表
@@ -83,12 +66,9 @@ class TextChatClient:
         content = [{"type": "text", "text": text}]
 
         for img in images:
-            if isinstance(img, bytes):
-                # 压缩图片到 200KB 以内
-                compressed_img = compress_image(img, max_size_kb=200)
-                # 图片数据，转为 base64 data URL
-                base64_data = self._encode_image_to_base64(compressed_img)
-                image_url = f"data:image/png;base64,{base64_data}"
+            if isinstance(img, (bytes, EncodedImage)):
+                # 压缩图片到 200KB 以内并转为 base64 data URL（预编码的 EncodedImage 直接复用）
+                image_url = ensure_encoded(img).data_uri
             else:
                 # 已经是 URL
                 image_url = img
@@ -100,8 +80,7 @@ class TextChatClient:
 
         return content
 
-    @retry_on_429(max_retries=3, base_delay=2)
-    def generate_text(
+    def _build_payload(
         self,
         prompt: str,
         model: str = None,
@@ -109,22 +88,9 @@ class TextChatClient:
         max_output_tokens: int = 8000,
         images: List[Union[bytes, str]] = None,
         system_prompt: str = None,
-        **kwargs
-    ) -> str:
-        """
-        生成文本（支持图片输入）
-
-        Args:
-            prompt: 提示词
-            model: 模型名称
-            temperature: 温度
-            max_output_tokens: 最大输出 token
-            images: 图片列表（可选）
-            system_prompt: 系统提示词（可选）
-
-        Returns:
-            生成的文本
-        """
+        stream: bool = False
+    ) -> dict:
+        """构建 chat/completions 请求体"""
         messages = []
 
         # 使用配置的模型，如果没有则使用调用时传入的模型
@@ -144,100 +110,144 @@ class TextChatClient:
             "content": content
         })
 
-        payload = {
+        return {
             "model": actual_model,
             "messages": messages,
             "temperature": temperature,
             "max_tokens": max_output_tokens,
-            "stream": False
+            "stream": stream
         }
 
-        headers = {
+    def _build_headers(self, stream: bool = False) -> dict:
+        return {
             "Content-Type": "application/json",
-            "Accept": "application/json",
+            "Accept": "text/event-stream" if stream else "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
 
-        response = requests.post(
-            self.chat_endpoint,
-            json=payload,
-            headers=headers,
-            timeout=300  # 5分钟超时
+    def _raise_for_status(self, response, actual_model: str) -> None:
+        """非 200 响应按状态码抛出带解决方案的类型化异常（携带 Retry-After）"""
+        if response.status_code == 200:
+            return
+
+        error_detail = response.text[:500]
+        status_code = response.status_code
+
+        # 根据状态码给出更详细的错误信息
+        if status_code == 401:
+            message = (
+                "❌ API Key 认证失败\n\n"
+                "【可能原因】\n"
+                "1. API Key 无效或已过期\n"
+                "2. API Key 格式错误（复制时可能包含空格）\n"
+                "3. API Key 被禁用或删除\n\n"
+                "【解决方案】\n"
+                "1. 在系统设置页面检查 API Key 是否正确\n"
+                "2. 重新获取 API Key\n"
+                f"\n【请求地址】{self.chat_endpoint}"
+            )
+        elif status_code == 403:
+            message = (
+                "❌ 权限被拒绝\n\n"
+                "【可能原因】\n"
+                "1. API Key 没有访问该模型的权限\n"
+                "2. 账户配额已用尽\n"
+                "3. 区域限制\n\n"
+                "【解决方案】\n"
+                "1. 检查 API 权限配置\n"
+                "2. 尝试使用其他模型\n"
+                f"\n【原始错误】{error_detail[:200]}"
+            )
+        elif status_code == 404:
+            message = (
+                "❌ 模型不存在或 API 端点错误\n\n"
+                "【可能原因】\n"
+                f"1. 模型 '{actual_model}' 不存在或已下线\n"
+                "2. Base URL 配置错误\n\n"
+                "【解决方案】\n"
+                "1. 检查模型名称是否正确\n"
+                "2. 检查 Base URL 配置\n"
+                f"\n【请求地址】{self.chat_endpoint}"
+            )
+        elif status_code == 429:
+            message = (
+                "⏳ API 配额或速率限制\n\n"
+                "【说明】\n"
+                "请求频率过高或配额已用尽。\n\n"
+                "【解决方案】\n"
+                "1. 稍后再试（等待 1-2 分钟）\n"
+                "2. 检查 API 配额使用情况\n"
+                "3. 考虑升级计划获取更多配额"
+            )
+        elif status_code >= 500:
+            message = (
+                f"⚠️ API 服务器错误 ({status_code})\n\n"
+                "【说明】\n"
+                "这是服务端的临时故障，与您的配置无关。\n\n"
+                "【解决方案】\n"
+                "1. 稍等几分钟后重试\n"
+                "2. 如果持续出现，检查服务商状态页"
+            )
+        else:
+            message = (
+                f"❌ API 请求失败 (状态码: {status_code})\n\n"
+                f"【原始错误】\n{error_detail}\n\n"
+                f"【请求地址】{self.chat_endpoint}\n"
+                f"【模型】{actual_model}\n\n"
+                "【通用解决方案】\n"
+                "1. 检查 API Key 是否正确\n"
+                "2. 检查 Base URL 配置\n"
+                "3. 检查模型名称是否正确"
+            )
+
+        raise error_for_status(status_code, message, response.headers)
+
+    def generate_text(
+        self,
+        prompt: str,
+        model: str = None,
+        temperature: float = 1.0,
+        max_output_tokens: int = 8000,
+        images: List[Union[bytes, str]] = None,
+        system_prompt: str = None,
+        **kwargs
+    ) -> str:
+        """
+        生成文本（支持图片输入）
+
+        Args:
+            prompt: 提示词
+            model: 模型名称
+            temperature: 温度
+            max_output_tokens: 最大输出 token
+            images: 图片列表（可选）
+            system_prompt: 系统提示词（可选）
+
+        Returns:
+            生成的文本
+        """
+        payload = self._build_payload(
+            prompt, model, temperature, max_output_tokens, images, system_prompt, stream=False
         )
+        return self.retry_policy.call(lambda: self._generate_once(payload), name="Text API")
+
+    def _generate_once(self, payload: dict) -> str:
+        """发送一次非流式请求"""
+        with self.limiter.slot():
+            response = http_post(
+                self.chat_endpoint,
+                json=payload,
+                headers=self._build_headers(),
+                timeout=300  # 5分钟超时
+            )
 
-        if response.status_code != 200:
-            error_detail = response.text[:500]
-            status_code = response.status_code
-
-            # 根据状态码给出更详细的错误信息
-            if status_code == 401:
-                raise Exception(
-                    "❌ API Key 认证失败\n\n"
-                    "【可能原因】\n"
-                    "1. API Key 无效或已过期\n"
-                    "2. API Key 格式错误（复制时可能包含空格）\n"
-                    "3. API Key 被禁用或删除\n\n"
-                    "【解决方案】\n"
-                    "1. 在系统设置页面检查 API Key 是否正确\n"
-                    "2. 重新获取 API Key\n"
-                    f"\n【请求地址】{self.chat_endpoint}"
-                )
-            elif status_code == 403:
-                raise Exception(
-                    "❌ 权限被拒绝\n\n"
-                    "【可能原因】\n"
-                    "1. API Key 没有访问该模型的权限\n"
-                    "2. 账户配额已用尽\n"
-                    "3. 区域限制\n\n"
-                    "【解决方案】\n"
-                    "1. 检查 API 权限配置\n"
-                    "2. 尝试使用其他模型\n"
-                    f"\n【原始错误】{error_detail[:200]}"
-                )
-            elif status_code == 404:
-                raise Exception(
-                    "❌ 模型不存在或 API 端点错误\n\n"
-                    "【可能原因】\n"
-                    f"1. 模型 '{actual_model}' 不存在或已下线\n"
-                    "2. Base URL 配置错误\n\n"
-                    "【解决方案】\n"
-                    "1. 检查模型名称是否正确\n"
-                    "2. 检查 Base URL 配置\n"
-                    f"\n【请求地址】{self.chat_endpoint}"
-                )
-            elif status_code == 429:
-                raise Exception(
-                    "⏳ API 配额或速率限制\n\n"
-                    "【说明】\n"
-                    "请求频率过高或配额已用尽。\n\n"
-                    "【解决方案】\n"
-                    "1. 稍后再试（等待 1-2 分钟）\n"
-                    "2. 检查 API 配额使用情况\n"
-                    "3. 考虑升级计划获取更多配额"
-                )
-            elif status_code >= 500:
-                raise Exception(
-                    f"⚠️ API 服务器错误 ({status_code})\n\n"
-                    "【说明】\n"
-                    "这是服务端的临时故障，与您的配置无关。\n\n"
-                    "【解决方案】\n"
-                    "1. 稍等几分钟后重试\n"
-                    "2. 如果持续出现，检查服务商状态页"
-                )
-            else:
-                raise Exception(
-                    f"❌ API 请求失败 (状态码: {status_code})\n\n"
-                    f"【原始错误】\n{error_detail}\n\n"
-                    f"【请求地址】{self.chat_endpoint}\n"
-                    f"【模型】{actual_model}\n\n"
-                    "【通用解决方案】\n"
-                    "1. 检查 API Key 是否正确\n"
-                    "2. 检查 Base URL 配置\n"
-                    "3. 检查模型名称是否正确"
-                )
-
-        result = response.json()
+            # 错误在名额内抛出，便于限制器感知 429 限流
+            self._raise_for_status(response, payload["model"])
 
+        return self._extract_text(response.json())
+
+    def _extract_text(self, result: dict) -> str:
+        """从非流式响应中提取生成的文本"""
         # 提取生成的文本
         if "choices" in result and len(result["choices"]) > 0:
             return result["choices"][0]["message"]["content"]
@@ -252,6 +262,64 @@ class TextChatClient:
                 "建议：检查API文档确认响应格式"
             )
 
+    def generate_text_stream(
+        self,
+        prompt: str,
+        model: str = None,
+        temperature: float = 1.0,
+        max_output_tokens: int = 8000,
+        images: List[Union[bytes, str]] = None,
+        system_prompt: str = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        流式生成文本（参数与 generate_text 相同）
+
+        使用 "stream": true 请求，逐个产出服务商返回的增量文本（SSE delta）。
+        第一个片段到达前遇到限流 / 服务端错误会自动重试；服务商忽略 stream 参数直接返回
+        完整 JSON 时，一次性产出全部文本。
+
+        Yields:
+            增量文本片段
+        """
+        payload = self._build_payload(
+            prompt, model, temperature, max_output_tokens, images, system_prompt, stream=True
+        )
+        return self.retry_policy.stream(lambda: self._stream_once(payload), name="Text API 流式")
+
+    def _stream_once(self, payload: dict) -> Iterator[str]:
+        """发送一次流式请求并解析 SSE 增量"""
+        with self.limiter.slot():
+            response = http_post(
+                self.chat_endpoint,
+                json=payload,
+                headers=self._build_headers(stream=True),
+                timeout=300,
+                stream=True
+            )
+            with response:
+                self._raise_for_status(response, payload["model"])
+
+                if "application/json" in response.headers.get("Content-Type", ""):
+                    yield self._extract_text(response.json())
+                    return
+
+                for line in response.iter_lines(chunk_size=None):
+                    if not line or not line.startswith(b"data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == b"[DONE]":
+                        break
+
+                    chunk = json.loads(data)
+                    if chunk.get("error"):
+                        raise ProviderError(f"Text API 流式响应错误: {str(chunk['error'])[:500]}")
+
+                    for choice in chunk.get("choices") or []:
+                        delta = (choice.get("delta") or {}).get("content")
+                        if delta:
+                            yield delta
+
 
 def get_text_chat_client(provider_config: dict):
     """
@@ -276,6 +344,12 @@ def get_text_chat_client(provider_config: dict):
 
     if provider_type == 'google_gemini':
         from .genai_client import GenAIClient
-        return GenAIClient(api_key=api_key, base_url=base_url)
+        return GenAIClient(api_key=api_key, base_url=base_url, provider_config=provider_config)
     else:
-        return TextChatClient(api_key=api_key, base_url=base_url, endpoint_type=endpoint_type, model=model)
+        return TextChatClient(
+            api_key=api_key,
+            base_url=base_url,
+            endpoint_type=endpoint_type,
+            model=model,
+            provider_config=provider_config
+        )
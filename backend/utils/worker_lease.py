@@ -0,0 +1,72 @@
+"""
+后台队列任务的租约（lease）
+
+同一个 SQLite 队列可能同时被多个进程打开（Werkzeug 重载器、多进程部署、重启交接期间）。
+领取任务时写入 owner 和 lease_expires，执行期间由心跳线程定期续约：
+- 只有租约过期（持有进程已退出或卡死）的任务才会被其他进程重新领取
+- 启动时不再把所有 running 任务重置为排队，仍在执行的任务不会被重复执行
+- 租约被其他进程接管后，原进程写入结果时发现 owner 不匹配，停止执行（LeaseLostError）
+"""
+
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import uuid
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = 60.0  # 租约有效期（秒）
+RENEW_INTERVAL = 15.0  # 心跳续约间隔（秒）
+
+
+class LeaseLostError(Exception):
+    """任务租约已过期并被其他进程接管"""
+
+
+def make_owner_id() -> str:
+    """当前进程内队列实例的 owner 标识（主机名:进程号:随机后缀）"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def ensure_lease_columns(conn: sqlite3.Connection, table: str) -> None:
+    """旧数据库补充 owner / lease_expires 列"""
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+    if "owner" not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN owner TEXT")
+    if "lease_expires" not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN lease_expires REAL")
+
+
+class LeaseHeartbeat:
+    """定期续约的后台线程"""
+
+    def __init__(self, name: str, renew: Callable[[], int], interval: float = RENEW_INTERVAL):
+        """
+        Args:
+            name: 线程名
+            renew: 续约函数（返回续约的任务数）
+            interval: 续约间隔（秒）
+        """
+        self.name = name
+        self.renew = renew
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.renew()
+            except Exception as e:
+                logger.error(f"[{self.name}] 续约失败: {e}")
@@ -0,0 +1,127 @@
+"""
+流式 ZIP 写入
+
+边读文件边输出 ZIP 数据块，不在内存中构建整个压缩包：
+- 已压缩的图片（PNG / JPEG / WebP / GIF）使用 ZIP_STORED，其他文件使用 ZIP_DEFLATED
+- 输出目标不可 seek，zipfile 会自动使用数据描述符（data descriptor）记录 CRC 和大小
+- 可选 tee_path：同时把完整压缩包写到磁盘（完成后原子替换，中途断开则丢弃），用于缓存预构建的压缩包
+
+用法：
+    return Response(stream_zip([(path, "page_1.png")]), mimetype="application/zip")
+"""
+
+import logging
+import os
+import threading
+import time
+import zipfile
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024  # 读取文件和输出数据块的大小
+STORED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif')
+
+ZipEntry = Tuple[str, str]  # (文件路径, 压缩包内文件名)
+
+
+class _ChunkSink:
+    """只追加的输出对象：zipfile 写入的数据暂存在这里，由生成器取走"""
+
+    def __init__(self, tee: Optional[BinaryIO] = None):
+        self._chunks: List[bytes] = []
+        self._tee = tee
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        if data:
+            self._chunks.append(data)
+            self._position += len(data)
+            if self._tee is not None:
+                self._tee.write(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # zipfile 需要 tell() 记录每个文件头的偏移量
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _compress_type(filename: str) -> int:
+    if filename.lower().endswith(STORED_EXTENSIONS):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def stream_zip(
+    entries: Iterable[ZipEntry],
+    tee_path: Optional[str] = None,
+    chunk_size: int = CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    流式生成 ZIP 数据
+
+    Args:
+        entries: (文件路径, 压缩包内文件名) 列表，不存在的文件会被跳过
+        tee_path: 同时写入的压缩包缓存路径（可选）
+        chunk_size: 读取文件的块大小
+
+    Yields:
+        ZIP 数据块
+    """
+    tee = None
+    tmp_path = None
+    if tee_path:
+        os.makedirs(os.path.dirname(tee_path), exist_ok=True)
+        tmp_path = f"{tee_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        tee = open(tmp_path, "wb")
+
+    sink = _ChunkSink(tee)
+    completed = False
+    start = time.perf_counter()
+    try:
+        with zipfile.ZipFile(sink, "w") as zf:
+            for file_path, arcname in entries:
+                try:
+                    stat = os.stat(file_path)
+                    src = open(file_path, "rb")
+                except OSError as e:
+                    logger.warning(f"[ZIP] 跳过无法读取的文件 {file_path}: {e}")
+                    continue
+
+                with src:
+                    zinfo = zipfile.ZipInfo(arcname, time.localtime(stat.st_mtime)[:6])
+                    zinfo.compress_type = _compress_type(arcname)
+                    zinfo.file_size = stat.st_size
+                    with zf.open(zinfo, "w") as dest:
+                        for chunk in iter(lambda: src.read(chunk_size), b""):
+                            dest.write(chunk)
+                            data = sink.drain()
+                            if data:
+                                yield data
+
+                data = sink.drain()
+                if data:
+                    yield data
+
+        # 中央目录在 close 时写入
+        data = sink.drain()
+        if data:
+            yield data
+        completed = True
+        logger.debug(f"[ZIP] 输出 {sink.tell() / 1024:.1f}KB, 耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+    finally:
+        if tee is not None:
+            tee.close()
+            if completed:
+                os.replace(tmp_path, tee_path)
+            elif os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -180,6 +180,7 @@ export interface HistoryRecord {
   updated_at: string
   status: string
   thumbnail: string | null
+  thumbnail_url?: string | null  // 带版本号的封面 URL（可长期缓存）
   page_count: number
   task_id: string | null
 }
@@ -202,6 +203,7 @@ export interface HistoryDetail {
   }
   status: string
   thumbnail: string | null
+  image_urls?: Record<string, string>  // 文件名 -> 带版本号的图片 URL（可长期缓存）
 }
 
 /**
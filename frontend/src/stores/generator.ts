@@ -344,9 +344,8 @@ export const useGeneratorStore = defineStore('generator', {
     updateImage(index: number, newUrl: string) {
       const image = this.images.find(img => img.index === index)
       if (image) {
-        // 添加时间戳避免缓存
-        const timestamp = Date.now()
-        image.url = `${newUrl}?t=${timestamp}`
+        // 带版本号（?v=）的 URL 内容变化后自然不同；旧格式 URL 添加时间戳避免缓存
+        image.url = newUrl.includes('?') ? newUrl : `${newUrl}?t=${Date.now()}`
         image.status = 'done'
         delete image.error
       }
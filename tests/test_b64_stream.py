@@ -0,0 +1,125 @@
+"""
+b64_json 流式解码测试：任意分块边界下与整体解析结果一致
+"""
+import base64
+import io
+import json
+import random
+
+import pytest
+
+from backend.utils.b64_stream import B64JsonStreamDecoder, decode_b64_json_stream
+
+IMAGE = random.Random(0).randbytes(301)  # 长度不是 3 的倍数，结尾带 "=" 填充
+
+
+def make_body(b64: str, escape_slashes=False, prefix="") -> bytes:
+    body = json.dumps({"created": 1, "data": [{"revised_prompt": "a \"cat\"", "b64_json": prefix + b64}]})
+    if escape_slashes:
+        body = body.replace("/", "\\/")
+    return body.encode()
+
+
+def reference_decode(body: bytes) -> bytes:
+    """整体解析：json.loads + 去掉 data URI 前缀 + b64decode"""
+    value = json.loads(body)["data"][0]["b64_json"]
+    if value.startswith("data:"):
+        value = value.split(",", 1)[1]
+    return base64.b64decode("".join(value.split()))
+
+
+def decode_in_chunks(body: bytes, sizes):
+    sink = io.BytesIO()
+    decoder = B64JsonStreamDecoder(sink)
+    pos = 0
+    for size in sizes:
+        decoder.feed(body[pos:pos + size])
+        pos += size
+    decoder.feed(body[pos:])
+    return decoder.finish(), sink.getvalue(), decoder
+
+
+BODIES = {
+    "plain": make_body(base64.b64encode(IMAGE).decode()),
+    "escaped_slashes": make_body(base64.b64encode(IMAGE).decode(), escape_slashes=True),
+    "line_wrapped": make_body(base64.encodebytes(IMAGE).decode()),
+    "data_uri": make_body(base64.b64encode(IMAGE).decode(), prefix="data:image/png;base64,"),
+    "data_uri_escaped": make_body(
+        base64.b64encode(IMAGE).decode(), escape_slashes=True, prefix="data:image/png;base64,"
+    ),
+}
+
+
+@pytest.mark.parametrize("name", BODIES)
+class TestChunkBoundaries:
+    """分块位置不影响解码结果"""
+
+    def test_reference_matches_image(self, name):
+        assert reference_decode(BODIES[name]) == IMAGE
+
+    def test_single_chunk(self, name):
+        result, data, decoder = decode_in_chunks(BODIES[name], [])
+        assert result is None
+        assert data == IMAGE
+        assert decoder.bytes_written == len(IMAGE)
+
+    def test_every_split_point(self, name):
+        body = BODIES[name]
+        for split in range(1, len(body)):
+            result, data, _ = decode_in_chunks(body, [split])
+            assert result is None, split
+            assert data == IMAGE, split
+
+    @pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 64])
+    def test_fixed_chunk_sizes(self, name, size):
+        body = BODIES[name]
+        result, data, _ = decode_in_chunks(body, [size] * (len(body) // size))
+        assert result is None
+        assert data == IMAGE
+
+
+class TestKeyAndFallback:
+    """字段定位与无 b64_json 时的回退"""
+
+    def test_key_split_across_chunks(self):
+        body = BODIES["plain"]
+        key = body.index(b'"b64_json"')
+        for split in range(key, key + len(b'"b64_json": "') + 1):
+            result, data, decoder = decode_in_chunks(body, [split])
+            assert decoder.found
+            assert data == IMAGE, split
+
+    def test_whitespace_around_colon(self):
+        body = b'{"data": [{"b64_json" :  "' + base64.b64encode(IMAGE) + b'"}]}'
+        result, data, _ = decode_in_chunks(body, [10] * (len(body) // 10))
+        assert result is None
+        assert data == IMAGE
+
+    def test_url_response_falls_back_to_json(self):
+        body = json.dumps({"data": [{"url": "https://cdn.example.com/a.png"}]}).encode()
+        sink = io.BytesIO()
+        result = decode_b64_json_stream([body[:7], body[7:]], sink)
+        assert result == {"data": [{"url": "https://cdn.example.com/a.png"}]}
+        assert sink.getvalue() == b""
+
+    def test_invalid_json_without_field(self):
+        with pytest.raises(ValueError, match="不是合法的 JSON"):
+            decode_b64_json_stream([b"<html>502 Bad Gateway</html>"], io.BytesIO())
+
+    def test_truncated_value(self):
+        body = BODIES["plain"]
+        with pytest.raises(ValueError, match="不完整"):
+            decode_b64_json_stream([body[:len(body) // 2]], io.BytesIO())
+
+    def test_invalid_base64(self):
+        with pytest.raises(ValueError, match="不是合法的 base64"):
+            decode_b64_json_stream([b'{"b64_json": "abc"}'], io.BytesIO())
+
+    def test_custom_field(self):
+        body = json.dumps({"image": base64.b64encode(IMAGE).decode()}).encode()
+        sink = io.BytesIO()
+        decoder = B64JsonStreamDecoder(sink, field=b"image")
+        for i in range(0, len(body), 9):
+            decoder.feed(body[i:i + 9])
+        assert decoder.finish() is None
+        assert sink.getvalue() == IMAGE
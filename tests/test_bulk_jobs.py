@@ -0,0 +1,46 @@
+"""
+批量图文生成任务测试
+"""
+import os
+import time
+
+import pytest
+
+from backend.services.bulk_jobs import BulkItemStatus, BulkJobManager
+from backend.utils.worker_lease import LeaseLostError
+
+
+@pytest.fixture
+def bulk_db(temp_history_dir):
+    return os.path.join(temp_history_dir, "bulk_jobs.db")
+
+
+class TestLeaseRecovery:
+    """中断主题的租约恢复"""
+
+    def test_start_does_not_requeue_live_items(self, bulk_db):
+        running = BulkJobManager(bulk_db)
+        job_id = running.create_job(["主题一"])
+        assert running._claim_next()["position"] == 0
+
+        other = BulkJobManager(bulk_db, worker_count=1)
+        other._stopping = True  # 只执行启动时的恢复逻辑，工作线程立即退出
+        other.start()
+        other._heartbeat.stop()
+        assert other._claim_next() is None
+        assert other.get_job(job_id)["items"][0]["status"] == BulkItemStatus.RUNNING
+
+    def test_expired_lease_is_reclaimed(self, bulk_db):
+        crashed = BulkJobManager(bulk_db)
+        job_id = crashed.create_job(["主题一", "主题二"])
+        crashed._claim_next()
+        crashed._connect().execute("UPDATE bulk_items SET lease_expires = ? WHERE position = 0", (time.time() - 1,))
+
+        other = BulkJobManager(bulk_db)
+        item = other._claim_next()
+        assert (item["job_id"], item["position"]) == (job_id, 0)
+
+        with pytest.raises(LeaseLostError):
+            crashed._update_item(job_id, 0, status=BulkItemStatus.DONE)
+        other._update_item(job_id, 0, status=BulkItemStatus.DONE)
+        assert other.get_job(job_id)["items"][0]["status"] == BulkItemStatus.DONE
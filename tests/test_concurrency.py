@@ -0,0 +1,252 @@
+"""
+服务商级并发控制测试
+"""
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from backend.utils import concurrency
+from backend.utils.concurrency import AdaptiveConcurrencyLimiter, get_provider_limiter, provider_key
+from backend.utils.resilience import CircuitOpenError, ProviderServerError, RateLimitError
+
+
+class FakeClock:
+    """可手动推进的单调时钟"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(concurrency, "time", SimpleNamespace(monotonic=fake))
+    return fake
+
+
+def finish(limiter, latency=None, error=None):
+    """占用并归还一个名额"""
+    assert limiter.try_acquire()
+    limiter.release(latency, error=error)
+
+
+def rate_limited():
+    return RateLimitError("429 Too Many Requests", status_code=429)
+
+
+class TestAsyncSlot:
+    """协程等待名额"""
+
+    def test_waiters_are_served_in_fifo_order(self):
+        limiter = AdaptiveConcurrencyLimiter("test", max_limit=1)
+        order = []
+
+        async def worker(i, gate):
+            async with limiter.async_slot():
+                order.append(i)
+                await gate.wait()
+
+        async def main():
+            gates = [asyncio.Event() for _ in range(4)]
+            tasks = []
+            for i, gate in enumerate(gates):
+                tasks.append(asyncio.create_task(worker(i, gate)))
+                await asyncio.sleep(0)
+            for gate in gates:
+                gate.set()
+                await asyncio.sleep(0)
+            await asyncio.wait_for(asyncio.gather(*tasks), timeout=5)
+
+        asyncio.run(main())
+        assert order == [0, 1, 2, 3]
+        assert limiter.in_flight == 0
+
+    def test_cancelled_waiter_hands_slot_on(self):
+        limiter = AdaptiveConcurrencyLimiter("test", max_limit=1)
+
+        async def main():
+            assert limiter.try_acquire()
+            cancelled = asyncio.create_task(limiter._acquire_async())
+            waiting = asyncio.create_task(limiter._acquire_async())
+            await asyncio.sleep(0)
+
+            cancelled.cancel()
+            limiter.release()
+            await asyncio.wait_for(waiting, timeout=5)
+            assert cancelled.cancelled()
+            assert limiter.in_flight == 1
+            limiter.release()
+
+        asyncio.run(main())
+        assert limiter.in_flight == 0
+
+    def test_release_from_another_thread_wakes_waiter(self):
+        limiter = AdaptiveConcurrencyLimiter("test", max_limit=1)
+        assert limiter.acquire()
+
+        async def main():
+            waiter = asyncio.create_task(limiter._acquire_async())
+            await asyncio.sleep(0)
+            threading.Timer(0.05, limiter.release).start()
+            await asyncio.wait_for(waiter, timeout=5)
+
+        asyncio.run(main())
+        assert limiter.in_flight == 1
+        assert not limiter.try_acquire()
+
+
+class TestAIMD:
+    """加性增、乘性减"""
+
+    def test_additive_increase_up_to_max(self, clock):
+        limiter = AdaptiveConcurrencyLimiter("test", max_limit=4, initial_limit=2)
+        finish(limiter, latency=1.0)
+        finish(limiter, latency=1.0)
+        assert limiter.limit == 2  # 每次成功 +1/上限：2 -> 2.5 -> 2.9
+        finish(limiter, latency=1.0)
+        assert limiter.limit == 3
+
+        for _ in range(50):
+            finish(limiter, latency=1.0)
+        assert limiter.limit == 4
+        assert limiter.get_stats()["successes"] == 53
+
+    def test_rate_limit_halves_once_per_cooldown(self, clock):
+        limiter = AdaptiveConcurrencyLimiter("test", max_limit=16)
+        finish(limiter, error=rate_limited())
+        assert limiter.limit == 8
+
+        # 同一批请求陆续返回的 429 不会连续下调
+        finish(limiter, error=rate_limited())
+        assert limiter.limit == 8
+
+        clock.advance(AdaptiveConcurrencyLimiter.MIN_COOLDOWN)
+        finish(limiter, error=rate_limited())
+        assert limiter.limit == 4
+        assert limiter.get_stats()["overloads"] == 3
+
+    def test_cooldown_follows_latency(self, clock):
+        limiter = AdaptiveConcurrencyLimiter("test", max_limit=16)
+        finish(limiter, latency=10.0)
+        finish(limiter, error=rate_limited())
+        clock.advance(5)
+        finish(limiter, error=rate_limited())
+        assert limiter.limit == 8
+        clock.advance(5)
+        finish(limiter, error=rate_limited())
+        assert limiter.limit == 4
+
+    def test_never_below_min_limit(self, clock):
+        limiter = AdaptiveConcurrencyLimiter("test", max_limit=4, min_limit=2)
+        for _ in range(5):
+            finish(limiter, error=rate_limited())
+            clock.advance(60)
+        assert limiter.limit == 2
+
+    def test_slow_success_backs_off(self, clock):
+        limiter = AdaptiveConcurrencyLimiter("test", max_limit=10, latency_target=5.0)
+        finish(limiter, latency=8.0)
+        assert limiter.limit == 9
+        clock.advance(60)
+        finish(limiter, latency=2.0)
+        assert limiter.limit == 9
+
+    def test_other_errors_and_cancels_keep_limit(self, clock):
+        limiter = AdaptiveConcurrencyLimiter("test", max_limit=8, initial_limit=4)
+        finish(limiter, error=ProviderServerError("503", status_code=503))
+        finish(limiter)
+        assert limiter.limit == 4
+        assert limiter.in_flight == 0
+        assert limiter.get_stats()["failures"] == 1
+
+    def test_configure_lowers_ceiling(self, clock):
+        limiter = AdaptiveConcurrencyLimiter("test", max_limit=10)
+        limiter.configure(max_limit=3, latency_target=2.0)
+        assert (limiter.limit, limiter.max_limit, limiter.latency_target) == (3, 3, 2.0)
+
+    def test_latency_percentile(self):
+        limiter = AdaptiveConcurrencyLimiter("test", max_limit=4)
+        for latency in range(1, AdaptiveConcurrencyLimiter.LATENCY_MIN_SAMPLES):
+            finish(limiter, latency=float(latency))
+        assert limiter.latency_percentile(95) is None
+
+        finish(limiter, latency=20.0)
+        assert limiter.latency_percentile(50) == 10.0
+        assert limiter.latency_percentile(100) == 20.0
+
+
+class TestSlot:
+    """slot() 占用名额并反馈结果"""
+
+    def test_blocks_at_limit(self):
+        limiter = AdaptiveConcurrencyLimiter("test", max_limit=1)
+        assert limiter.acquire()
+        assert not limiter.acquire(timeout=0.05)
+
+        threading.Timer(0.05, limiter.release).start()
+        assert limiter.acquire(timeout=5)
+        assert limiter.in_flight == 1
+
+    def test_slot_feeds_back_errors(self, clock):
+        limiter = AdaptiveConcurrencyLimiter("test", max_limit=8)
+        with pytest.raises(RateLimitError):
+            with limiter.slot():
+                assert limiter.in_flight == 1
+                raise rate_limited()
+        assert limiter.in_flight == 0
+        assert limiter.limit == 4
+
+    def test_open_breaker_fails_without_taking_slot(self):
+        limiter = AdaptiveConcurrencyLimiter("test", max_limit=1)
+        for _ in range(limiter.breaker.failure_threshold):
+            with pytest.raises(ProviderServerError):
+                with limiter.slot():
+                    raise ProviderServerError("503", status_code=503)
+
+        assert limiter.acquire()  # 名额被占满也不会等待
+        with pytest.raises(CircuitOpenError):
+            with limiter.slot():
+                pass
+        assert limiter.in_flight == 1
+
+
+class TestProviderLimiter:
+    """同一服务商（base_url + API Key）共享限制器"""
+
+    @pytest.fixture(autouse=True)
+    def empty_registry(self, monkeypatch):
+        monkeypatch.setattr(concurrency, "_limiters", {})
+
+    def test_shared_across_callers(self):
+        config = {"type": "image_api", "base_url": "https://api.example.com/", "api_key": "sk-secret"}
+        limiter = get_provider_limiter(config, kind="image")
+        assert get_provider_limiter(dict(config, base_url="https://api.example.com"), kind="image") is limiter
+        assert get_provider_limiter(dict(config, api_key="sk-other"), kind="image") is not limiter
+        assert get_provider_limiter(config, kind="text") is not limiter
+
+    def test_key_hides_api_key(self):
+        key = provider_key({"type": "image_api", "base_url": "https://api.example.com", "api_key": "sk-secret"})
+        assert "sk-secret" not in key
+
+    def test_config_options(self):
+        config = {
+            "type": "image_api", "api_key": "k", "max_concurrency": 6, "initial_concurrency": 2,
+            "latency_target": 30, "circuit_failure_threshold": 2, "circuit_reset_timeout": 10,
+        }
+        limiter = get_provider_limiter(config)
+        assert (limiter.limit, limiter.max_limit, limiter.latency_target) == (2, 6, 30)
+        assert (limiter.breaker.failure_threshold, limiter.breaker.reset_timeout) == (2, 10)
+
+    def test_reconfigure_existing_limiter(self):
+        config = {"type": "image_api", "api_key": "k", "max_concurrency": 8}
+        limiter = get_provider_limiter(config)
+        assert get_provider_limiter(dict(config, max_concurrency=3)) is limiter
+        assert (limiter.limit, limiter.max_limit) == (3, 3)
@@ -0,0 +1,124 @@
+"""
+预编码参考图测试：每张参考图只压缩、编码一次
+"""
+import base64
+import threading
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from backend.utils import encoded_image  # noqa: E402
+from backend.utils.encoded_image import (  # noqa: E402
+    EncodedImage,
+    EncodedImageCache,
+    detect_mime_type,
+    ensure_encoded,
+)
+
+JPEG = b"\xff\xd8\xff\xe0" + b"jpeg-data"
+
+
+@pytest.fixture
+def compress_calls(monkeypatch):
+    """以记录调用的桩函数代替压缩（返回 JPEG 头 + 原始数据）"""
+    calls = []
+
+    def compress_image(data, max_size_kb=200):
+        calls.append((data, max_size_kb))
+        return b"\xff\xd8\xff" + data
+    monkeypatch.setattr(encoded_image, "compress_image", compress_image)
+    return calls
+
+
+class TestEncodedImage:
+    """编码结果按需生成并缓存"""
+
+    @pytest.mark.parametrize("data, mime_type", [
+        (JPEG, "image/jpeg"),
+        (b"RIFF\x00\x00\x00\x00WEBPVP8 ", "image/webp"),
+        (b"GIF89a...", "image/gif"),
+        (b"\x89PNG\r\n\x1a\n", "image/png"),
+        (b"unknown", "image/png"),
+    ])
+    def test_detect_mime_type(self, data, mime_type):
+        assert detect_mime_type(data) == mime_type
+
+    def test_encodings_are_cached(self):
+        image = EncodedImage(JPEG, "digest")
+        assert image.b64 == base64.b64encode(JPEG).decode()
+        assert image.b64 is image.b64
+        assert image.data_uri == f"data:image/jpeg;base64,{image.b64}"
+        assert image.data_uri is image.data_uri
+        assert len(image) == len(JPEG)
+
+    def test_from_bytes_compresses_once(self, compress_calls):
+        image = EncodedImage.from_bytes(b"raw", max_size_kb=100)
+        assert compress_calls == [(b"raw", 100)]
+        assert image.data == b"\xff\xd8\xffraw"
+        assert image.mime_type == "image/jpeg"
+        assert image == EncodedImage(b"other", image.source_digest)
+
+    def test_ensure_encoded(self, compress_calls):
+        image = ensure_encoded(b"raw")
+        assert ensure_encoded(image) is image
+        assert len(compress_calls) == 1
+
+    def test_concurrent_b64_is_computed_once(self, monkeypatch):
+        image = EncodedImage(JPEG, "digest")
+        calls = []
+        b64encode = base64.b64encode
+
+        def counting_b64encode(data):
+            calls.append(1)
+            return b64encode(data)
+        monkeypatch.setattr(encoded_image.base64, "b64encode", counting_b64encode)
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(image.data_uri)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(set(results)) == 1
+        assert len(calls) == 1
+
+
+class TestEncodedImageCache:
+    """任务内的参考图缓存"""
+
+    def test_same_bytes_encoded_once(self, compress_calls):
+        cache = EncodedImageCache(max_size_kb=150)
+        cover = b"cover-image"
+        first = cache.encode(cover)
+        assert cache.encode(cover) is first
+        assert cache.encode(bytes(bytearray(cover))) is first  # 内容相同的 bytes 也命中
+        assert compress_calls == [(cover, 150)]
+
+    def test_passthrough(self, compress_calls):
+        cache = EncodedImageCache()
+        image = EncodedImage(JPEG, "digest")
+        assert cache.encode(None) is None
+        assert cache.encode(image) is image
+        assert cache.encode_all(None) is None
+        assert cache.encode_all([]) is None
+        assert compress_calls == []
+
+    def test_encode_all_keeps_order(self, compress_calls):
+        cache = EncodedImageCache()
+        images = cache.encode_all([b"a", b"b", b"a"])
+        assert [image.data for image in images] == [b"\xff\xd8\xffa", b"\xff\xd8\xffb", b"\xff\xd8\xffa"]
+        assert images[0] is images[2]
+        assert len(compress_calls) == 2
+
+    def test_lru_eviction(self, compress_calls, monkeypatch):
+        monkeypatch.setattr(EncodedImageCache, "MAX_ENTRIES", 2)
+        cache = EncodedImageCache()
+        a = cache.encode(b"a")
+        cache.encode(b"b")
+        cache.encode(b"a")  # a 变为最近使用
+        cache.encode(b"c")  # 淘汰 b
+
+        assert cache.encode(b"a") is a
+        cache.encode(b"b")
+        assert [data for data, _ in compress_calls] == [b"a", b"b", b"c", b"b"]
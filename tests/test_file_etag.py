@@ -0,0 +1,66 @@
+"""
+文件 ETag 与带版本号的图片 URL 测试
+"""
+import hashlib
+import os
+
+import pytest
+
+from backend.utils.file_etag import get_file_etag, versioned_image_url
+
+
+@pytest.fixture
+def task_dir(temp_history_dir):
+    path = os.path.join(temp_history_dir, "task_abc")
+    os.makedirs(path)
+    with open(os.path.join(path, "0.png"), "wb") as f:
+        f.write(b"first image")
+    return path
+
+
+class TestVersionedImageUrl:
+    """图片 URL 携带原图内容版本号"""
+
+    def test_etag_is_content_hash(self, task_dir):
+        path = os.path.join(task_dir, "0.png")
+        assert get_file_etag(path) == hashlib.sha256(b"first image").hexdigest()[:32]
+
+    def test_url_changes_with_content(self, task_dir):
+        first = versioned_image_url("task_abc", "0.png", task_dir)
+        assert first == f"/api/images/task_abc/0.png?v={get_file_etag(os.path.join(task_dir, '0.png'))}"
+
+        path = os.path.join(task_dir, "0.png")
+        with open(path, "wb") as f:
+            f.write(b"regenerated image")
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        assert versioned_image_url("task_abc", "0.png", task_dir) != first
+
+    def test_missing_file_has_no_version(self, task_dir):
+        assert versioned_image_url("task_abc", "9.png", task_dir) == "/api/images/task_abc/9.png"
+
+
+class TestImageRouteCaching:
+    """图片接口按版本号返回 immutable 缓存"""
+
+    @pytest.fixture
+    def routes(self):
+        pytest.importorskip("flask")
+        from backend.routes import image_routes
+        return image_routes
+
+    def test_derivative_is_current_only_for_matching_version(self, routes, task_dir):
+        original = os.path.join(task_dir, "0.png")
+        derivative = os.path.join(task_dir, "thumb_0.png")
+        with open(derivative, "wb") as f:
+            f.write(b"thumb")
+        version = get_file_etag(original)
+
+        assert routes._is_current_derivative(original, derivative, version)
+        assert not routes._is_current_derivative(original, derivative, "stale")
+        assert not routes._is_current_derivative(original, derivative, None)
+
+        # 原图比衍生图新（重新生成后衍生图尚未更新）
+        stat = os.stat(derivative)
+        os.utime(original, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        assert not routes._is_current_derivative(original, derivative, get_file_etag(original))
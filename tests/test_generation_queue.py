@@ -0,0 +1,88 @@
+"""
+持久化图片生成队列测试
+"""
+import os
+import time
+
+import pytest
+
+from backend.services.generation_queue import GenerationQueue, QueueJobStatus
+from backend.utils.worker_lease import LeaseLostError
+
+
+@pytest.fixture
+def queue_db(temp_history_dir):
+    return os.path.join(temp_history_dir, "generation_queue.db")
+
+
+class TestLeaseRecovery:
+    """中断任务的租约恢复"""
+
+    def test_live_lease_is_not_reclaimed(self, queue_db, sample_pages):
+        running = GenerationQueue(queue_db)
+        running.enqueue("task_live", sample_pages)
+        assert running._claim_next()["task_id"] == "task_live"
+
+        # 另一个进程（如重载器子进程）打开同一个队列
+        other = GenerationQueue(queue_db)
+        other._recover()
+        assert other._claim_next() is None
+        assert other.get_job("task_live")["status"] == QueueJobStatus.RUNNING
+
+    def test_expired_lease_is_reclaimed(self, queue_db, sample_pages):
+        crashed = GenerationQueue(queue_db)
+        crashed.enqueue("task_crashed", sample_pages)
+        crashed._claim_next()
+        crashed._connect().execute(
+            "UPDATE jobs SET lease_expires = ? WHERE task_id = ?", (time.time() - 1, "task_crashed")
+        )
+
+        other = GenerationQueue(queue_db)
+        other._recover()
+        job = other._claim_next()
+        assert job["task_id"] == "task_crashed"
+        assert job["attempts"] == 1
+
+        # 原进程的租约已被接管，不能再写入事件或修改状态
+        with pytest.raises(LeaseLostError):
+            crashed._record_event("task_crashed", {"event": "progress", "data": {"status": "generating"}})
+        crashed._set_job_status("task_crashed", QueueJobStatus.FINISHED)
+        assert other.get_job("task_crashed")["status"] == QueueJobStatus.RUNNING
+
+    def test_heartbeat_renews_own_leases(self, queue_db, sample_pages):
+        queue = GenerationQueue(queue_db)
+        queue.enqueue("task_renew", sample_pages)
+        queue._claim_next()
+        queue._connect().execute("UPDATE jobs SET lease_expires = 0")
+
+        assert queue._renew_leases() == 1
+        assert GenerationQueue(queue_db)._claim_next() is None
+
+
+class TestEventReplay:
+    """Last-Event-ID 断点续传"""
+
+    def test_replay_after_last_event_id(self, queue_db, sample_pages):
+        queue = GenerationQueue(queue_db)
+        queue.enqueue("task_replay", sample_pages)
+        queue._claim_next()
+        queue._record_event("task_replay", {
+            "event": "complete",
+            "data": {"index": 0, "status": "done", "image_url": "/api/images/task_replay/0.png"}
+        })
+        queue._record_event("task_replay", {
+            "event": "finish",
+            "data": {"success": True, "task_id": "task_replay", "images": ["0.png"]}
+        })
+        queue._set_job_status("task_replay", QueueJobStatus.FINISHED)
+
+        events = queue.fetch_events("task_replay")
+        assert [event_type for _, event_type, _ in events] == ["progress", "complete", "finish"]
+
+        last_event_id = events[0][0]
+        replayed = list(queue.iter_events("task_replay", after_id=last_event_id))
+        assert [event_id for event_id, _, _ in replayed] == [e[0] for e in events[1:]]
+        assert replayed[-1][1] == "finish"
+
+        assert list(queue.iter_events("task_replay", after_id=events[-1][0])) == []
+        assert queue.get_task_state("task_replay") is not None
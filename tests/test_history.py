@@ -0,0 +1,124 @@
+"""
+历史记录服务与接口测试
+"""
+import os
+
+import pytest
+
+from backend.services import history
+from backend.services.history import HistoryService
+from backend.utils.file_etag import get_file_etag
+
+
+@pytest.fixture
+def history_service(temp_history_dir):
+    service = HistoryService(temp_history_dir)
+    yield service
+    service._writer.flush_all()
+
+
+@pytest.fixture
+def records(history_service):
+    outlines = {
+        "秋季穿搭指南": ["封面：秋季穿搭", "内容：风衣和针织衫的基础款搭配"],
+        "iPhone 15 smartphone review": ["Cover", "Camera and battery life"],
+        "周末咖啡店探店": ["封面：城市咖啡地图", "内容：拿铁、手冲和秋季限定"],
+    }
+    return {
+        title: history_service.create_record(
+            title, {"raw": "\n".join(pages), "pages": [{"index": i, "content": c} for i, c in enumerate(pages)]}
+        )
+        for title, pages in outlines.items()
+    }
+
+
+class TestSearchRecords:
+    """历史记录全文检索"""
+
+    def test_highlight_and_snippet(self, history_service, records):
+        result = history_service.search_records("秋季")
+        assert result["total"] == 2
+        first = result["records"][0]
+        assert first["id"] == records["秋季穿搭指南"]
+        assert first["title_highlight"] == "<mark>秋季</mark>穿搭指南"
+        assert "<mark>秋季</mark>" in result["records"][1]["snippet"]
+
+    def test_substring_inside_latin_word(self, history_service, records):
+        result = history_service.search_records("phone")
+        assert [r["id"] for r in result["records"]] == [records["iPhone 15 smartphone review"]]
+        assert result["records"][0]["title_highlight"].startswith("i<mark>Phone</mark>")
+
+    def test_updated_record_is_reindexed(self, history_service, records):
+        record_id = records["周末咖啡店探店"]
+        history_service.update_record(record_id, outline={"raw": "", "pages": [{"index": 0, "content": "露营装备"}]})
+        history_service._writer.flush_all()
+        assert [r["id"] for r in history_service.search_records("露营")["records"]] == [record_id]
+
+    def test_pagination(self, history_service, records):
+        result = history_service.search_records("秋季", page=2, page_size=1)
+        assert result["total_pages"] == 2
+        assert len(result["records"]) == 1
+
+
+class TestHistoryRoutes:
+    """历史记录列表、游标分页与检索接口"""
+
+    @pytest.fixture(autouse=True)
+    def use_temp_history(self, history_service, monkeypatch):
+        pytest.importorskip("flask")
+        monkeypatch.setattr(history, "_service_instance", history_service)
+
+    def test_cursor_paging(self, client, records):
+        seen, cursor = [], ""
+        while cursor is not None:
+            data = client.get(f"/api/history?cursor={cursor}&page_size=2").get_json()
+            assert data["success"] and data["total"] == 3
+            seen.extend(r["id"] for r in data["records"])
+            cursor = data["next_cursor"]
+        assert sorted(seen) == sorted(records.values())
+
+        assert client.get("/api/history?cursor=bad").status_code == 400
+
+    def test_etag_until_changed(self, client, history_service, records):
+        response = client.get("/api/history/stats")
+        etag = response.headers["ETag"]
+        assert client.get("/api/history/stats", headers={"If-None-Match": etag}).status_code == 304
+
+        history_service.delete_record(records["秋季穿搭指南"])
+        assert client.get("/api/history/stats", headers={"If-None-Match": etag}).status_code == 200
+
+    def test_search(self, client, records):
+        data = client.get("/api/history/search?keyword=phone").get_json()
+        assert data["success"]
+        assert [r["id"] for r in data["records"]] == [records["iPhone 15 smartphone review"]]
+
+    def test_versioned_image_urls(self, client, history_service, records):
+        record_id = records["秋季穿搭指南"]
+        task_dir = os.path.join(history_service.history_dir, "task_versioned")
+        os.makedirs(task_dir)
+        for filename in ("0.png", "1.png"):
+            with open(os.path.join(task_dir, filename), "wb") as f:
+                f.write(filename.encode())
+        history_service.update_record(
+            record_id, images={"task_id": "task_versioned", "generated": ["0.png", "1.png"]}, thumbnail="0.png"
+        )
+        history_service._writer.flush_all()
+        version = get_file_etag(os.path.join(task_dir, "0.png"))
+
+        listed = {r["id"]: r for r in client.get("/api/history").get_json()["records"]}
+        assert listed[record_id]["thumbnail_url"] == f"/api/images/task_versioned/0.png?v={version}"
+        assert listed[records["周末咖啡店探店"]]["thumbnail_url"] is None
+
+        searched = client.get("/api/history/search?keyword=秋季穿搭").get_json()["records"]
+        assert searched[0]["thumbnail_url"] == listed[record_id]["thumbnail_url"]
+
+        image_urls = client.get(f"/api/history/{record_id}").get_json()["record"]["image_urls"]
+        assert image_urls["0.png"] == f"/api/images/task_versioned/0.png?v={version}"
+        assert image_urls["1.png"].startswith("/api/images/task_versioned/1.png?v=")
+
+        # 图片重新生成后 URL 随内容变化，浏览器不会继续使用旧的 immutable 缓存
+        with open(os.path.join(task_dir, "0.png"), "wb") as f:
+            f.write(b"regenerated")
+        image_urls = client.get(f"/api/history/{record_id}").get_json()["record"]["image_urls"]
+        assert image_urls["0.png"] == f"/api/images/task_versioned/0.png?v={get_file_etag(os.path.join(task_dir, '0.png'))}"
+        assert version not in image_urls["0.png"]
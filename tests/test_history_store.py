@@ -0,0 +1,151 @@
+"""
+历史记录 SQLite 索引测试
+"""
+import json
+import os
+
+import pytest
+
+from backend.services.history_store import HistoryIndexStore
+
+
+def make_summary(record_id, title="", updated_at="2025-01-01T00:00:00", status="draft", **fields):
+    return {
+        "id": record_id,
+        "title": title,
+        "created_at": updated_at,
+        "updated_at": updated_at,
+        "status": status,
+        "thumbnail": None,
+        "page_count": 0,
+        "task_id": None,
+        **fields,
+    }
+
+
+@pytest.fixture
+def store(temp_history_dir):
+    return HistoryIndexStore(os.path.join(temp_history_dir, "history.db"))
+
+
+class TestMigrateFromJson:
+    """从 index.json 一次性迁移"""
+
+    def write_record(self, history_dir, record):
+        with open(os.path.join(history_dir, f"{record['id']}.json"), "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+
+    def test_migrates_index_and_orphan_record_files(self, store, temp_history_dir, sample_history_record):
+        index_file = os.path.join(temp_history_dir, "index.json")
+        with open(index_file, "w", encoding="utf-8") as f:
+            json.dump({"records": [make_summary("test-record-001", "索引中的标题", status="completed")]}, f)
+        self.write_record(temp_history_dir, sample_history_record)
+        # index.json 中缺失、只有记录文件的记录
+        self.write_record(temp_history_dir, {
+            **sample_history_record, "id": "orphan-002", "title": "孤立记录", "status": "draft"
+        })
+
+        assert store.migrate_from_json(index_file, temp_history_dir) == 2
+
+        migrated = store.get("test-record-001")
+        assert migrated["title"] == "索引中的标题"
+        assert migrated["task_id"] == "task_12345678"
+        orphan = store.get("orphan-002")
+        assert orphan["title"] == "孤立记录" and orphan["page_count"] == 1
+        assert store.count() == 2
+        assert store.count_by_status()["completed"] == 1
+
+        assert not os.path.exists(index_file)
+        assert os.path.exists(f"{index_file}.migrated")
+
+    def test_runs_only_once(self, store, temp_history_dir, sample_history_record):
+        index_file = os.path.join(temp_history_dir, "index.json")
+        assert store.migrate_from_json(index_file, temp_history_dir) == 0
+        self.write_record(temp_history_dir, sample_history_record)
+        assert store.migrate_from_json(index_file, temp_history_dir) == 0
+        assert store.count() == 0
+
+
+class TestCountersAndCursor:
+    """触发器维护的计数器和游标分页"""
+
+    def test_counters_follow_insert_update_delete(self, store):
+        version = store.get_version()
+        store.insert(make_summary("a", status="draft"))
+        store.insert(make_summary("b", status="draft"))
+        store.insert(make_summary("a", status="draft", title="覆盖写入"))
+        assert store.count() == 2
+        assert store.count("draft") == 2
+
+        store.update("a", status="completed")
+        assert store.count("draft") == 1
+        assert store.count("completed") == 1
+
+        store.delete("b")
+        assert store.count() == 1
+        assert store.count("draft") == 0
+        assert store.get_version() > version
+
+    def test_list_after_pages_without_gaps(self, store):
+        for i in range(5):
+            store.insert(make_summary(f"r{i}", updated_at=f"2025-01-0{i + 1}T00:00:00"))
+        # 相同更新时间的记录按 id 区分先后
+        store.insert(make_summary("r5", updated_at="2025-01-05T00:00:00"))
+
+        seen, cursor = [], None
+        while True:
+            records, cursor = store.list_after(cursor, limit=2)
+            seen.extend(record["id"] for record in records)
+            if cursor is None:
+                break
+        assert seen == ["r5", "r4", "r3", "r2", "r1", "r0"]
+
+    def test_list_after_filters_status(self, store):
+        store.insert(make_summary("d", status="draft"))
+        store.insert(make_summary("c", status="completed"))
+        records, cursor = store.list_after(None, limit=10, status="completed")
+        assert [record["id"] for record in records] == ["c"] and cursor is None
+
+    def test_invalid_cursor(self, store):
+        with pytest.raises(ValueError):
+            store.list_after("not-a-cursor")
+
+
+class TestSearch:
+    """全文检索"""
+
+    @pytest.fixture
+    def indexed(self, store):
+        docs = [
+            ("r1", "秋季穿搭指南", "基础款搭配 风衣和针织衫", "2025-01-01T00:00:00"),
+            ("r2", "iPhone 15 smartphone review", "camera and battery life", "2025-01-02T00:00:00"),
+            ("r3", "周末咖啡店探店", "拿铁 手冲 秋季限定", "2025-01-03T00:00:00"),
+        ]
+        for record_id, title, body, updated_at in docs:
+            store.insert(make_summary(record_id, title, updated_at))
+            store.index_text(record_id, title, body)
+        return store
+
+    def test_title_hits_rank_first(self, indexed):
+        rows, total = indexed.search("秋季")
+        assert total == 2
+        assert [row["id"] for row in rows] == ["r1", "r3"]
+        assert rows[0]["raw_title"] == "秋季穿搭指南"
+
+    def test_terms_are_anded(self, indexed):
+        assert indexed.search("秋季 咖啡")[1] == 1
+        assert indexed.search("秋季 手机")[1] == 0
+
+    def test_latin_prefix_match(self, indexed):
+        rows, total = indexed.search("SMART")
+        assert total == 1 and rows[0]["id"] == "r2"
+
+    def test_latin_substring_falls_back_to_title(self, indexed):
+        rows, total = indexed.search("phone")
+        assert total == 1
+        assert rows[0]["id"] == "r2"
+        assert indexed.search("phone nothing")[1] == 0
+
+    def test_delete_removes_from_index(self, indexed):
+        indexed.delete("r1")
+        assert [row["id"] for row in indexed.search("秋季")[0]] == ["r3"]
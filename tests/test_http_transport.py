@@ -0,0 +1,122 @@
+"""
+共享 HTTP 传输层测试（本地 HTTP 服务器，验证连接复用和按主机统计）
+"""
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+requests = pytest.importorskip("requests")
+
+from backend.utils import http_transport  # noqa: E402
+from backend.utils.http_transport import HttpTransport, get_http_metrics  # noqa: E402
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def _reply(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/error":
+            self._reply(503, b"unavailable")
+        else:
+            self._reply(200, b"x" * 1000)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self._reply(200, body[::-1])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch):
+    monkeypatch.setattr(http_transport, "_metrics", {})
+
+
+@pytest.fixture
+def transport():
+    transport = HttpTransport(pool_connections=4, pool_maxsize=4, connect_timeout=5, read_timeout=5)
+    yield transport
+    transport.session.close()
+
+
+class TestHttpTransport:
+    """连接池复用与统计"""
+
+    def test_keep_alive_reuses_connection(self, server, transport):
+        for _ in range(3):
+            assert transport.get(f"{server}/ok").content == b"x" * 1000
+
+        stats = get_http_metrics()["127.0.0.1"]
+        assert stats["requests"] == 3
+        assert stats["connections_opened"] == 1
+        assert stats["connections_reused"] == 2
+        assert stats["bytes_received"] == 3000
+        assert stats["errors"] == 0
+
+    def test_post_bytes_sent(self, server, transport):
+        response = transport.post(f"{server}/echo", data=b"abcdef")
+        assert response.content == b"fedcba"
+        stats = get_http_metrics()["127.0.0.1"]
+        assert (stats["bytes_sent"], stats["bytes_received"]) == (6, 6)
+
+    def test_streamed_response_counts_content_length(self, server, transport):
+        with transport.get(f"{server}/ok", stream=True) as response:
+            assert sum(len(chunk) for chunk in response.iter_content(256)) == 1000
+        assert get_http_metrics()["127.0.0.1"]["bytes_received"] == 1000
+
+    def test_server_error_and_connection_error_counted(self, server, transport):
+        assert transport.get(f"{server}/error").status_code == 503
+
+        with socket.socket() as sock:  # 取一个空闲端口后关闭，保证连接被拒绝
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        with pytest.raises(requests.exceptions.ConnectionError):
+            transport.get(f"http://localhost:{port}/", timeout=1)
+
+        metrics = get_http_metrics()
+        assert metrics["127.0.0.1"]["errors"] == 1
+        assert metrics["localhost"]["errors"] == 1
+
+    def test_default_timeout(self, transport, monkeypatch):
+        calls = []
+        monkeypatch.setattr(transport.session, "request", lambda method, url, **kwargs: calls.append(kwargs))
+
+        transport.get("http://example.invalid/")
+        transport.post("http://example.invalid/", timeout=30, json={})
+        assert calls[0]["timeout"] == (5, 5)
+        assert calls[1]["timeout"] == 30
+
+
+class TestSharedTransport:
+    """所有调用方共用一个传输实例"""
+
+    def test_singleton(self, monkeypatch):
+        monkeypatch.setattr(http_transport, "_transport_instance", None)
+        transport = http_transport.get_http_transport()
+        assert http_transport.get_http_transport() is transport
+
+        calls = []
+        monkeypatch.setattr(transport, "request", lambda method, url, **kwargs: calls.append((method, url)))
+        http_transport.http_get("http://example.invalid/a")
+        http_transport.http_post("http://example.invalid/b")
+        assert calls == [("GET", "http://example.invalid/a"), ("POST", "http://example.invalid/b")]
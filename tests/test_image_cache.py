@@ -0,0 +1,34 @@
+"""
+图片缓存测试
+"""
+import pytest
+
+pytest.importorskip("PIL")
+
+from backend.services.image_cache import ImageCache, make_cache_key  # noqa: E402
+
+
+class TestImageCache:
+    """磁盘 LRU 缓存与 single-flight"""
+
+    def test_key_depends_on_provider(self):
+        kwargs = {"prompt": "封面", "model": "m"}
+        assert make_cache_key("google_genai", kwargs) != make_cache_key("image_api", kwargs)
+        assert make_cache_key("google_genai", kwargs) == make_cache_key("google_genai", dict(kwargs))
+
+    def test_resolve_stores_under_serving_provider_key(self, temp_history_dir):
+        cache = ImageCache(temp_history_dir)
+        claim_key = make_cache_key("provider_a", {"prompt": "p"})
+        served_key = make_cache_key("provider_b", {"prompt": "p"})
+
+        future, owner = cache.claim(claim_key)
+        assert owner
+        waiter, waiter_owner = cache.claim(claim_key)
+        assert not waiter_owner
+
+        cache.resolve(claim_key, data=b"image", store_key=served_key)
+
+        assert future.result() == b"image"
+        assert waiter.result() == b"image"
+        assert cache.get(served_key) == b"image"
+        assert cache.get(claim_key) is None
@@ -0,0 +1,133 @@
+"""
+图片压缩测试：二分质量查找、多目标一次解码
+"""
+import io
+import random
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from PIL import Image
+
+from backend.utils import image_compressor
+from backend.utils.image_compressor import (
+    _bisect_quality,
+    compress_image,
+    compress_image_multi,
+    decode_image,
+)
+
+
+def make_image(size=(1200, 1600), seed=0) -> Image.Image:
+    """带噪声的渐变图（JPEG 大小随质量明显变化）"""
+    rng = random.Random(seed)
+    width, height = size
+    small = Image.new("RGB", (width // 8, height // 8))
+    small.putdata([
+        (x * 255 // (width // 8), y * 255 // (height // 8), rng.randrange(256))
+        for y in range(height // 8) for x in range(width // 8)
+    ])
+    return small.resize(size, Image.Resampling.BILINEAR)
+
+
+def to_png(img: Image.Image) -> bytes:
+    output = io.BytesIO()
+    img.save(output, format="PNG")
+    return output.getvalue()
+
+
+@pytest.fixture(scope="module")
+def png_data():
+    return to_png(make_image())
+
+
+class TestBisectQuality:
+    """二分查找满足大小的最高质量"""
+
+    def test_returns_highest_quality_that_fits(self):
+        img = make_image((400, 400))
+        sizes = {q: len(image_compressor._encode(img, q)) for q in range(20, 86)}
+        limit = sorted(sizes.values())[len(sizes) // 2]
+
+        quality, data = _bisect_quality(img, limit, 20, 85)
+        assert len(data) <= limit
+        assert quality == max(q for q, size in sizes.items() if size <= limit)
+        assert data == image_compressor._encode(img, quality)
+
+    def test_falls_back_to_min_quality(self):
+        img = make_image((400, 400))
+        quality, data = _bisect_quality(img, 100, 20, 85)
+        assert quality == 20
+        assert data == image_compressor._encode(img, 20)
+
+    def test_encode_count_is_logarithmic(self, monkeypatch):
+        img = make_image((200, 200))
+        calls = []
+        encode = image_compressor._encode
+
+        def counting_encode(image, quality, optimize=False):
+            calls.append(quality)
+            return encode(image, quality, optimize)
+        monkeypatch.setattr(image_compressor, "_encode", counting_encode)
+
+        _bisect_quality(img, 10 ** 9, 20, 85)
+        assert len(calls) <= 7  # ceil(log2(66))
+        _bisect_quality(img, 1, 20, 85)
+        assert len(calls) <= 7 + 7
+
+
+class TestCompressImageMulti:
+    """一次解码，多个大小目标"""
+
+    def test_every_output_within_target(self, png_data):
+        targets = [50, 120, 200]
+        results = compress_image_multi(png_data, targets)
+        assert sorted(results) == targets
+        for target, data in results.items():
+            assert len(data) <= target * 1024, target
+            assert Image.open(io.BytesIO(data)).format == "JPEG"
+
+    def test_matches_single_target(self, png_data):
+        results = compress_image_multi(png_data, [200, 50])
+        for target in (50, 200):
+            assert results[target] == compress_image(png_data, max_size_kb=target)
+
+    def test_decodes_once(self, png_data, monkeypatch):
+        calls = []
+        open_image = image_compressor._open_image
+
+        def counting_open(data, max_dimension):
+            calls.append(max_dimension)
+            return open_image(data, max_dimension)
+        monkeypatch.setattr(image_compressor, "_open_image", counting_open)
+
+        compress_image_multi(png_data, [50, 120, 200])
+        assert len(calls) == 1
+
+    def test_small_image_returned_unchanged(self, png_data):
+        results = compress_image_multi(png_data, [10 ** 6, 50])
+        assert results[10 ** 6] is png_data
+        assert len(results[50]) <= 50 * 1024
+
+    def test_invalid_data_returns_original(self):
+        data = b"not an image" * 10000
+        assert compress_image_multi(data, [50]) == {50: data}
+
+    def test_respects_max_dimension(self, png_data):
+        data = compress_image(png_data, max_size_kb=500, max_dimension=800)
+        assert max(Image.open(io.BytesIO(data)).size) <= 800
+
+
+class TestDecodeImage:
+    """解码为 RGB，透明背景填充白色"""
+
+    def test_rgba_becomes_white_background(self):
+        img = Image.new("RGBA", (64, 64), (255, 0, 0, 0))
+        decoded = decode_image(to_png(img))
+        assert decoded.mode == "RGB"
+        assert decoded.getpixel((0, 0)) == (255, 255, 255)
+
+    def test_fits_max_dimension(self):
+        decoded = decode_image(to_png(make_image((1600, 800))), max_dimension=400)
+        assert decoded.size == (400, 200)
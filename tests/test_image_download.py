@@ -0,0 +1,83 @@
+"""
+图片生成器下载错误的归类（Image API / OpenAI 兼容接口）
+"""
+from types import SimpleNamespace
+
+import pytest
+
+requests = pytest.importorskip("requests")
+pytest.importorskip("httpx")
+
+from backend.generators import image_api, openai_compatible
+from backend.utils.resilience import (
+    InvalidRequestError,
+    ProviderConnectionError,
+    ProviderServerError,
+    ProviderTimeoutError,
+    RateLimitError,
+)
+
+
+@pytest.fixture(params=[
+    (image_api, image_api.ImageApiGenerator),
+    (openai_compatible, openai_compatible.OpenAICompatibleGenerator),
+], ids=["image_api", "openai_compatible"])
+def generator_module(request):
+    return request.param
+
+
+@pytest.fixture
+def generator(generator_module):
+    _, generator_cls = generator_module
+    return generator_cls({"api_key": "test-key", "base_url": "https://api.example.com"})
+
+
+@pytest.fixture
+def stub_get(monkeypatch, generator_module):
+    module, _ = generator_module
+
+    def install(result):
+        def fake_get(url, timeout=None):
+            if isinstance(result, BaseException):
+                raise result
+            return result
+        monkeypatch.setattr(module, "http_get", fake_get)
+    return install
+
+
+class TestDownloadImage:
+    """_download_image 的错误类型"""
+
+    def test_success_returns_content(self, generator, stub_get):
+        stub_get(SimpleNamespace(status_code=200, content=b"png", headers={}))
+        assert generator._download_image("https://cdn.example.com/a.png") == b"png"
+
+    @pytest.mark.parametrize("status_code, error_cls", [
+        (429, RateLimitError),
+        (503, ProviderServerError),
+        (404, InvalidRequestError),
+    ])
+    def test_http_error_is_typed(self, generator, stub_get, status_code, error_cls):
+        stub_get(SimpleNamespace(status_code=status_code, content=b"", headers={"Retry-After": "3"}))
+        with pytest.raises(error_cls) as exc_info:
+            generator._download_image("https://cdn.example.com/a.png")
+        assert exc_info.value.status_code == status_code
+        assert exc_info.value.retry_after == 3.0
+        assert str(exc_info.value).count("下载图片失败") == 1
+
+    def test_timeout_is_typed(self, generator, stub_get):
+        stub_get(requests.exceptions.Timeout("read timed out"))
+        with pytest.raises(ProviderTimeoutError):
+            generator._download_image("https://cdn.example.com/a.png")
+
+    def test_connection_error_keeps_type(self, generator, stub_get):
+        stub_get(requests.exceptions.ConnectionError("connection reset"))
+        with pytest.raises(ProviderConnectionError) as exc_info:
+            generator._download_image("https://cdn.example.com/a.png")
+        assert "connection reset" in str(exc_info.value)
+
+    def test_unknown_error_is_wrapped(self, generator, stub_get):
+        stub_get(ValueError("bad url"))
+        with pytest.raises(Exception, match="下载图片失败: bad url") as exc_info:
+            generator._download_image("https://cdn.example.com/a.png")
+        assert isinstance(exc_info.value.__cause__, ValueError)
@@ -0,0 +1,155 @@
+"""
+图片生成任务与任务注册表测试
+"""
+import threading
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from backend.services.image_job import ImageGenerationJob, ImageJobRegistry, JobStatus  # noqa: E402
+
+
+@pytest.fixture
+def registry():
+    return ImageJobRegistry()
+
+
+class TestImageGenerationJob:
+    """单个任务的状态"""
+
+    def test_progress_and_state(self, sample_pages):
+        job = ImageGenerationJob("task_a", "/tmp/task_a", pages=sample_pages, user_topic="秋季穿搭")
+        assert job.get_progress()["status"] == JobStatus.PENDING
+
+        job.start()
+        job.mark_failed(1, "超时")
+        job.mark_generated(0, "0.png", provider="provider_a")
+        job.mark_generated(1, "1.png")
+        job.set_cover_image(b"cover")
+
+        assert job.get_progress() == {
+            "status": JobStatus.RUNNING, "total": 4, "completed": 2, "failed": 0, "hedges": 0,
+        }
+        state = job.to_state()
+        assert state["generated"] == {0: "0.png", 1: "1.png"}
+        assert state["providers"] == {0: "provider_a"}
+        assert state["cover_image"] == b"cover"
+        assert state["user_topic"] == "秋季穿搭"
+
+        job.finish()
+        assert job.is_finished
+
+    def test_state_is_a_snapshot(self):
+        job = ImageGenerationJob("task_a", "/tmp/task_a")
+        state = job.to_state()
+        job.mark_generated(0, "0.png")
+        assert state["generated"] == {}
+
+    def test_hedge_budget(self):
+        job = ImageGenerationJob("task_a", "/tmp/task_a")
+        assert not job.try_take_hedge()
+
+        job.reset_hedge_budget(2)
+        assert [job.try_take_hedge() for _ in range(3)] == [True, True, False]
+        assert job.get_progress()["hedges"] == 2
+
+        job.reset_hedge_budget(-1)
+        assert job.hedge_budget == 0 and not job.try_take_hedge()
+
+    def test_hedge_budget_is_thread_safe(self):
+        job = ImageGenerationJob("task_a", "/tmp/task_a")
+        job.reset_hedge_budget(50)
+        taken = []
+        threads = [
+            threading.Thread(target=lambda: taken.extend(job.try_take_hedge() for _ in range(20)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert taken.count(True) == 50
+
+
+class TestImageJobRegistry:
+    """并发任务互不干扰，已结束任务按时间淘汰"""
+
+    def test_concurrent_jobs_are_isolated(self, registry, sample_pages):
+        jobs = [registry.create(f"task_{i}", f"/tmp/task_{i}", pages=sample_pages) for i in range(4)]
+
+        def run(job, index):
+            job.start()
+            job.set_cover_image(f"cover-{index}".encode())
+            for page in range(len(sample_pages)):
+                job.mark_generated(page, f"{index}-{page}.png")
+
+        threads = [threading.Thread(target=run, args=(job, i)) for i, job in enumerate(jobs)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for i in range(4):
+            state = registry.get(f"task_{i}").to_state()
+            assert state["cover_image"] == f"cover-{i}".encode()
+            assert set(state["generated"].values()) == {f"{i}-{page}.png" for page in range(4)}
+
+    def test_create_replaces_existing(self, registry):
+        old = registry.create("task_a", "/tmp/task_a", user_topic="旧")
+        new = registry.create("task_a", "/tmp/task_a", user_topic="新")
+        assert new is not old
+        assert registry.get("task_a") is new
+
+    def test_get_or_create_reuses_job(self, registry):
+        job = registry.create("task_a", "/tmp/task_a")
+        job.set_cover_image(b"cover")
+        assert registry.get_or_create("task_a", "/tmp/task_a") is job
+
+        restored = registry.get_or_create("task_b", "/tmp/task_b")
+        assert restored.pages == [] and restored.cover_image is None
+        assert registry.get("task_b") is restored
+
+    def test_remove_and_active_jobs(self, registry):
+        running = registry.create("task_running", "/tmp/r")
+        running.start()
+        registry.create("task_done", "/tmp/d").finish()
+
+        assert registry.active_jobs() == [running]
+        registry.remove("task_running")
+        registry.remove("task_missing")
+        assert registry.get("task_running") is None
+
+    def test_expired_finished_jobs_are_evicted(self, registry):
+        expired = registry.create("task_expired", "/tmp/e")
+        expired.finish()
+        expired.updated_at -= ImageJobRegistry.JOB_TTL + 1
+        stale_running = registry.create("task_running", "/tmp/r")
+        stale_running.start()
+        stale_running.updated_at -= ImageJobRegistry.JOB_TTL + 1
+
+        registry.create("task_new", "/tmp/n")
+        assert registry.get("task_expired") is None
+        assert registry.get("task_running") is stale_running
+
+    def test_max_jobs_evicts_oldest_finished_first(self, registry, monkeypatch):
+        monkeypatch.setattr(ImageJobRegistry, "MAX_JOBS", 3)
+        running = registry.create("task_running", "/tmp/r")
+        running.start()
+        for i, age in enumerate((30, 10, 20)):
+            job = registry.create(f"task_done_{i}", f"/tmp/{i}")
+            job.finish()
+            job.updated_at -= age
+
+        assert registry.get("task_running") is running
+        assert registry.get("task_done_0") is None
+        assert registry.get("task_done_1") is not None
+        assert registry.get("task_done_2") is not None
+
+    def test_running_jobs_are_never_evicted(self, registry, monkeypatch):
+        monkeypatch.setattr(ImageJobRegistry, "MAX_JOBS", 2)
+        jobs = [registry.create(f"task_{i}", f"/tmp/{i}") for i in range(4)]
+        for job in jobs:
+            job.start()
+        registry.create("task_extra", "/tmp/extra")
+        assert all(registry.get(job.task_id) is job for job in jobs)
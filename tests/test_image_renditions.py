@@ -0,0 +1,181 @@
+"""
+多分辨率衍生图测试：一次解码生成各规格、存储规整、按规格返回图片
+"""
+import io
+import os
+import shutil
+import uuid
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from PIL import Image  # noqa: E402
+
+from backend.utils import image_renditions  # noqa: E402
+from backend.utils.file_etag import get_file_etag  # noqa: E402
+from backend.utils.image_renditions import (  # noqa: E402
+    RENDITION_SPECS,
+    build_renditions,
+    find_rendition,
+    guess_image_mimetype,
+    rendition_path,
+)
+
+
+def make_png(size=(1536, 2048), color=(200, 120, 80)) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", size, color).save(output, format="PNG")
+    return output.getvalue()
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def image_size(path):
+    with Image.open(path) as img:
+        return img.size
+
+
+class TestBuildRenditions:
+    """一次解码生成 thumb / preview / full"""
+
+    def test_sizes_and_format(self, temp_history_dir):
+        original = make_png()
+        write(os.path.join(temp_history_dir, "0.png"), original)
+        assert build_renditions(original, temp_history_dir, "0.png") is None
+
+        for name, (max_edge, _) in RENDITION_SPECS.items():
+            path, mimetype = find_rendition(temp_history_dir, "0.png", name)
+            assert path == rendition_path(temp_history_dir, "0.png", name)
+            assert mimetype == guess_image_mimetype(path)
+            width, height = image_size(path)
+            assert max(width, height) == (max_edge or 2048)
+            assert width * 4 == height * 3
+        # 原图保持不变
+        with open(os.path.join(temp_history_dir, "0.png"), "rb") as f:
+            assert f.read() == original
+
+    def test_small_image_is_not_upscaled(self, temp_history_dir):
+        build_renditions(make_png((300, 400)), temp_history_dir, "1.png")
+        for name in RENDITION_SPECS:
+            assert image_size(find_rendition(temp_history_dir, "1.png", name)[0]) == (300, 400)
+
+    def test_normalize_rewrites_original_to_canvas(self, temp_history_dir):
+        write(os.path.join(temp_history_dir, "0.png"), make_png((2048, 2048)))
+        build_renditions(make_png((2048, 2048)), temp_history_dir, "0.png", normalize=True, canvas_size=(600, 800))
+
+        assert image_size(os.path.join(temp_history_dir, "0.png")) == (600, 800)
+        assert image_size(find_rendition(temp_history_dir, "0.png", "full")[0]) == (600, 800)
+        assert image_size(find_rendition(temp_history_dir, "0.png", "thumb")[0]) == (360, 480)
+
+    def test_reference_within_limit(self, temp_history_dir):
+        noisy = Image.frombytes("RGB", (1024, 1024), os.urandom(1024 * 1024 * 3))
+        output = io.BytesIO()
+        noisy.save(output, format="PNG")
+        reference = build_renditions(output.getvalue(), temp_history_dir, "0.png", reference_kb=100)
+        assert 0 < len(reference) <= 100 * 1024
+
+        small = make_png((64, 64))
+        assert build_renditions(small, temp_history_dir, "1.png", reference_kb=100) == small
+
+    def test_jpeg_fallback_without_webp(self, temp_history_dir, monkeypatch):
+        monkeypatch.setattr(image_renditions.features, "check", lambda feature: False)
+        build_renditions(make_png((200, 200)), temp_history_dir, "0.png")
+        path, mimetype = find_rendition(temp_history_dir, "0.png", "thumb")
+        assert path.endswith("0_thumb.jpg")
+        assert mimetype == "image/jpeg" == guess_image_mimetype(path)
+
+
+class TestGuessMimetype:
+    """按文件头识别类型（旧的 thumb_*.png 实际是 JPEG）"""
+
+    @pytest.mark.parametrize("filename, header, expected", [
+        ("thumb_0.png", b"\xff\xd8\xff\xe0", "image/jpeg"),
+        ("0.png", b"\x89PNG\r\n\x1a\n", "image/png"),
+        ("0.bin", b"RIFF\x00\x00\x00\x00WEBP", "image/webp"),
+        ("0.webp", b"????", "image/webp"),
+        ("0.dat", b"????", "application/octet-stream"),
+    ])
+    def test_header_then_extension(self, tmp_path, filename, header, expected):
+        path = tmp_path / filename
+        path.write_bytes(header + b"\x00" * 16)
+        assert guess_image_mimetype(str(path)) == expected
+
+    def test_missing_file_uses_extension(self, tmp_path):
+        assert guess_image_mimetype(str(tmp_path / "missing.jpg")) == "image/jpeg"
+
+
+class TestImageRoute:
+    """GET /api/images/<task>/<file>?size=..."""
+
+    @pytest.fixture
+    def task(self, client):
+        from backend.routes import image_routes
+
+        # 图片接口固定读取项目根目录下的 history/
+        history_root = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(image_routes.__file__)))), "history"
+        )
+        created_root = not os.path.exists(history_root)
+        task_id = f"task_test_{uuid.uuid4().hex[:8]}"
+        task_dir = os.path.join(history_root, task_id)
+        write(os.path.join(task_dir, "0.png"), make_png((1200, 1600)))
+        yield task_id, task_dir
+        shutil.rmtree(task_dir, ignore_errors=True)
+        if created_root and not os.listdir(history_root):
+            os.rmdir(history_root)
+
+    @pytest.fixture
+    def client(self):
+        pytest.importorskip("flask")
+        from backend.app import create_app
+
+        app = create_app()
+        app.config["TESTING"] = True
+        return app.test_client()
+
+    def test_serves_rendition(self, client, task):
+        task_id, task_dir = task
+        with open(os.path.join(task_dir, "0.png"), "rb") as f:
+            build_renditions(f.read(), task_dir, "0.png")
+        version = get_file_etag(os.path.join(task_dir, "0.png"))
+
+        response = client.get(f"/api/images/{task_id}/0.png?size=preview&v={version}")
+        assert response.status_code == 200
+        assert response.mimetype == find_rendition(task_dir, "0.png", "preview")[1]
+        assert max(Image.open(io.BytesIO(response.data)).size) == 1080
+        assert "immutable" in response.headers["Cache-Control"]
+
+        # thumbnail=true 等价于 size=thumb
+        response = client.get(f"/api/images/{task_id}/0.png")
+        assert max(Image.open(io.BytesIO(response.data)).size) == 480
+        assert "no-cache" in response.headers["Cache-Control"]
+
+    def test_falls_back_to_original(self, client, task):
+        task_id, task_dir = task
+        response = client.get(f"/api/images/{task_id}/0.png?size=preview")
+        assert response.status_code == 200
+        assert response.mimetype == "image/png"
+        assert Image.open(io.BytesIO(response.data)).size == (1200, 1600)
+
+        response = client.get(f"/api/images/{task_id}/0.png?thumbnail=false")
+        assert Image.open(io.BytesIO(response.data)).size == (1200, 1600)
+
+    def test_legacy_thumb_served_as_jpeg(self, client, task):
+        task_id, task_dir = task
+        output = io.BytesIO()
+        Image.new("RGB", (90, 120)).save(output, format="JPEG")
+        write(os.path.join(task_dir, "thumb_0.png"), output.getvalue())
+
+        response = client.get(f"/api/images/{task_id}/0.png?size=thumb")
+        assert response.mimetype == "image/jpeg"
+        assert response.data == output.getvalue()
+
+    def test_invalid_size_and_missing_file(self, client, task):
+        task_id, _ = task
+        assert client.get(f"/api/images/{task_id}/0.png?size=huge").status_code == 400
+        assert client.get(f"/api/images/{task_id}/9.png?size=original").status_code == 404
@@ -0,0 +1,255 @@
+"""
+图片服务商路由测试
+"""
+import asyncio
+import io
+import os
+import pickle
+from types import SimpleNamespace
+
+import pytest
+
+from backend.services import image_router
+from backend.services.image_router import (
+    ImageProviderRouter,
+    LabeledImage,
+    ProviderRoute,
+    get_image_provider,
+)
+from backend.utils.resilience import (
+    CircuitBreaker,
+    InvalidRequestError,
+    ProviderServerError,
+    RetryPolicy,
+)
+
+
+class StubGenerator:
+    """记录调用参数的生成器，按顺序返回 / 抛出 results 中的结果"""
+
+    def __init__(self, results=(b"image",), latency=None, in_flight=0, limit=4):
+        self.results = list(results)
+        self.calls = []
+        self.limiter = SimpleNamespace(
+            breaker=CircuitBreaker("stub", failure_threshold=1, reset_timeout=60),
+            latency_ewma=latency, in_flight=in_flight, limit=limit, max_limit=limit,
+        )
+
+    def _next(self, kwargs):
+        self.calls.append(kwargs)
+        result = self.results.pop(0) if len(self.results) > 1 else self.results[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def generate_image(self, **kwargs):
+        return self._next(kwargs)
+
+    async def generate_image_async(self, **kwargs):
+        return self._next(kwargs)
+
+
+def make_route(name, provider_type="openai_compatible", weight=1.0, max_attempts=1, **generator_kwargs):
+    return ProviderRoute(
+        name, {"type": provider_type}, StubGenerator(**generator_kwargs), weight,
+        RetryPolicy(max_attempts=max_attempts, base_delay=0)
+    )
+
+
+def open_breaker(route):
+    route.limiter.breaker.record_failure(ProviderServerError("503", status_code=503))
+    assert not route.available
+
+
+@pytest.fixture
+def first_by_score(monkeypatch):
+    """加权随机选择固定为得分最低的服务商，用于验证其余服务商按得分排序"""
+    picks = []
+
+    def choices(population, weights):
+        picks.append(dict(zip((route.name for route in population), weights)))
+        return [min(zip(weights, population), key=lambda item: item[0])[1]]
+    monkeypatch.setattr(image_router.random, "choices", choices)
+    return picks
+
+
+class TestLabeledImage:
+    """带服务商标签的图片数据"""
+
+    def test_behaves_like_bytes(self):
+        image = LabeledImage(b"\x89PNG data", "provider_a")
+        assert image == b"\x89PNG data"
+        assert get_image_provider(image) == "provider_a"
+        assert get_image_provider(b"plain") is None
+
+    def test_pickle_round_trip(self):
+        image = LabeledImage(b"image-bytes", "provider_b")
+        for protocol in range(2, pickle.HIGHEST_PROTOCOL + 1):
+            restored = pickle.loads(pickle.dumps(image, protocol=protocol))
+            assert restored == b"image-bytes"
+            assert restored.provider == "provider_b"
+
+
+class TestPostProcessorRoundTrip:
+    """路由返回的图片经过后处理进程池"""
+
+    @pytest.fixture
+    def png_bytes(self):
+        Image = pytest.importorskip("PIL.Image")
+        buffer = io.BytesIO()
+        Image.new("RGB", (600, 800), (200, 120, 80)).save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    def test_renditions_from_routed_image(self, png_bytes, temp_history_dir):
+        from backend.utils.image_postprocess import ImagePostProcessor
+        from backend.utils.image_renditions import RENDITIONS_DIR
+
+        processor = ImagePostProcessor(max_workers=1)
+        image = LabeledImage(png_bytes, "provider_a")
+        with open(os.path.join(temp_history_dir, "0.png"), "wb") as f:
+            f.write(image)
+
+        processor.submit_renditions(bytes(image), temp_history_dir, "0.png").result(timeout=60)
+        reference = processor.renditions_with_reference(bytes(image), temp_history_dir, "1.png")
+
+        assert os.listdir(os.path.join(temp_history_dir, RENDITIONS_DIR))
+        assert isinstance(reference, bytes) and reference
+
+    def test_labeled_image_survives_process_pool(self, png_bytes):
+        from backend.utils.image_postprocess import ImagePostProcessor
+
+        processor = ImagePostProcessor(max_workers=1)
+        image = LabeledImage(png_bytes, "provider_a")
+        assert processor.submit(len, image).result(timeout=60) == len(png_bytes)
+
+
+class TestPlan:
+    """尝试顺序：参考图过滤、按得分排序、熔断排最后"""
+
+    def test_single_route(self):
+        route = make_route("only")
+        assert ImageProviderRouter([route]).plan(needs_reference=True) == [route]
+
+    def test_reference_requests_use_capable_routes(self):
+        plain = make_route("plain", "openai_compatible")
+        genai = make_route("genai", "google_genai")
+        api = make_route("api", "image_api")
+        router = ImageProviderRouter([plain, genai, api])
+
+        assert set(router.plan(needs_reference=True)) == {genai, api}
+        assert set(router.plan(needs_reference=False)) == {plain, genai, api}
+
+    def test_reference_falls_back_when_none_capable(self):
+        routes = [make_route("a"), make_route("b")]
+        assert set(ImageProviderRouter(routes).plan(needs_reference=True)) == set(routes)
+
+    def test_rest_ordered_by_score(self, first_by_score):
+        fast = make_route("fast", latency=5.0)
+        slow = make_route("slow", latency=20.0)
+        busy = make_route("busy", latency=5.0, in_flight=4, limit=4)
+        flaky = make_route("flaky", latency=5.0)
+        for _ in range(5):
+            flaky.record_result(False)
+
+        plan = ImageProviderRouter([slow, flaky, busy, fast]).plan(needs_reference=False)
+        weights = first_by_score[-1]
+        assert weights["fast"] > weights["busy"] > weights["slow"]
+        assert weights["fast"] > weights["flaky"]
+        assert plan[0] is slow
+        assert plan[1] is fast
+        assert [route.name for route in plan[1:]] == sorted(
+            (name for name in weights if name != "slow"), key=lambda name: -weights[name]
+        )
+
+    def test_weight_scales_score(self, first_by_score):
+        heavy = make_route("heavy", weight=3.0, latency=10.0)
+        light = make_route("light", weight=1.0, latency=10.0)
+        ImageProviderRouter([light, heavy]).plan(needs_reference=False)
+        assert first_by_score[-1]["heavy"] == pytest.approx(3 * first_by_score[-1]["light"])
+
+    def test_broken_routes_last(self, first_by_score):
+        broken = make_route("broken", latency=1.0)
+        healthy = make_route("healthy", latency=30.0)
+        other = make_route("other", latency=10.0)
+        open_breaker(broken)
+
+        plan = ImageProviderRouter([broken, healthy, other]).plan(needs_reference=False)
+        assert plan[-1] is broken
+        assert "broken" not in first_by_score[-1]
+        assert set(plan[:2]) == {healthy, other}
+
+    def test_all_broken_still_planned(self):
+        routes = [make_route("a", latency=10.0), make_route("b", latency=1.0)]
+        for route in routes:
+            open_breaker(route)
+        assert ImageProviderRouter(routes).plan(needs_reference=False) == [routes[1], routes[0]]
+
+    def test_new_route_uses_average_latency(self, first_by_score):
+        known = make_route("known", latency=10.0)
+        new = make_route("new")
+        ImageProviderRouter([known, new]).plan(needs_reference=False)
+        assert first_by_score[-1]["new"] == pytest.approx(first_by_score[-1]["known"])
+
+
+class TestGenerateFailover:
+    """失败时依次切换服务商"""
+
+    def test_switches_to_next_route(self):
+        first = make_route("first", results=[ProviderServerError("503", status_code=503)])
+        second = make_route("second", results=[b"second-image"])
+        router = ImageProviderRouter([first, second])
+
+        image = router.generate("prompt", label="P1", routes=[first, second])
+        assert image == b"second-image"
+        assert get_image_provider(image) == "second"
+        assert first.get_stats()["failures"] == 1
+        assert second.get_stats()["requests"] == 1
+        assert second.error_rate == 0.0
+
+    def test_non_retryable_error_still_fails_over(self):
+        first = make_route("first", results=[InvalidRequestError("unsupported", status_code=400)])
+        second = make_route("second")
+        router = ImageProviderRouter([first, second])
+        assert get_image_provider(router.generate("prompt", routes=[first, second])) == "second"
+
+    def test_raises_last_error_when_all_fail(self):
+        first = make_route("first", results=[ProviderServerError("first down", status_code=503)])
+        second = make_route("second", results=[ProviderServerError("second down", status_code=502)])
+        router = ImageProviderRouter([first, second])
+        with pytest.raises(ProviderServerError, match="second down"):
+            router.generate("prompt", routes=[first, second])
+
+    def test_retry_policy_applies_per_route(self):
+        route = make_route("single", max_attempts=2,
+                           results=[ProviderServerError("503", status_code=503), b"retried"])
+        image = ImageProviderRouter([route]).generate("prompt")
+        assert image == b"retried"
+        assert len(route.generator.calls) == 2
+
+    def test_kwargs_follow_route_type(self):
+        plain = make_route("plain", results=[ProviderServerError("503", status_code=503)])
+        genai = make_route("genai", "google_genai")
+        ImageProviderRouter([plain, genai]).generate(
+            "prompt", reference_image=b"cover", routes=[plain, genai]
+        )
+        assert "reference_image" not in plain.generator.calls[0]
+        assert genai.generator.calls[0]["reference_image"] == b"cover"
+
+    def test_uses_plan_when_routes_not_given(self):
+        plain = make_route("plain")
+        api = make_route("api", "image_api")
+        router = ImageProviderRouter([plain, api])
+        image = router.generate("prompt", user_images=[b"user"])
+        assert get_image_provider(image) == "api"
+        assert api.generator.calls[0]["reference_images"] == [b"user"]
+        assert plain.generator.calls == []
+
+    def test_async_switches_to_next_route(self):
+        first = make_route("first", results=[ProviderServerError("503", status_code=503)])
+        second = make_route("second", results=[b"async-image"])
+        router = ImageProviderRouter([first, second])
+
+        image = asyncio.run(router.generate_async("prompt", routes=[first, second]))
+        assert image == b"async-image"
+        assert get_image_provider(image) == "second"
+        assert first.get_stats()["failures"] == 1
@@ -0,0 +1,151 @@
+"""
+图片生成服务测试（服务商请求以桩函数代替）
+"""
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from backend.services.image import ImageService  # noqa: E402
+from backend.services.image_job import ImageGenerationJob  # noqa: E402
+from backend.services.image_router import LabeledImage  # noqa: E402
+
+
+def make_service(request_image, hedge_delay=None, max_concurrency=4, in_flight=0):
+    """只带有请求桩函数的 ImageService（不读取配置、不创建生成器）"""
+    service = ImageService.__new__(ImageService)
+    service.provider_config = {}
+    service.image_cache = None
+    service.use_async = False
+    service._speculative_executor = None
+    service._speculative_lock = threading.Lock()
+    route = SimpleNamespace(name="primary", limiter=SimpleNamespace(limit=max_concurrency, in_flight=in_flight))
+    service.router = SimpleNamespace(plan=lambda needs_reference: [route], max_concurrency=max_concurrency)
+    service._get_hedge_delay = lambda route: hedge_delay
+    service._request_image = request_image
+    return service
+
+
+def make_job(hedge_budget=1):
+    job = ImageGenerationJob("task_test", "/tmp")
+    job.reset_hedge_budget(hedge_budget)
+    return job
+
+
+PAGE = {"index": 1, "type": "content", "content": "内容页"}
+
+
+class TestHedgedRequest:
+    """线程模式的对冲请求：主请求与对冲请求先成功者胜出"""
+
+    def test_hedge_wins_over_stuck_primary(self):
+        release_primary = threading.Event()
+        calls = []
+
+        def request_image(*args, routes=None):
+            calls.append(routes)
+            if routes is not None:  # 主请求使用预先选定的服务商
+                release_primary.wait(5)
+                return LabeledImage(b"primary", "primary")
+            return LabeledImage(b"hedge", "backup")
+
+        service = make_service(request_image, hedge_delay=0.05)
+        job = make_job()
+        started = time.monotonic()
+        try:
+            assert service._request_image_hedged(PAGE, job) == b"hedge"
+            assert time.monotonic() - started < 2
+            assert job.hedges_used == 1 and len(calls) == 2
+        finally:
+            release_primary.set()
+
+    def test_fast_primary_skips_hedge(self):
+        service = make_service(lambda *args, routes=None: LabeledImage(b"primary", "primary"), hedge_delay=1.0)
+        job = make_job()
+        assert service._request_image_hedged(PAGE, job) == b"primary"
+        assert job.hedges_used == 0
+
+    def test_no_budget_waits_for_primary(self):
+        def request_image(*args, routes=None):
+            time.sleep(0.1)
+            return LabeledImage(b"primary", "primary")
+
+        job = make_job(hedge_budget=0)
+        assert make_service(request_image, hedge_delay=0.01)._request_image_hedged(PAGE, job) == b"primary"
+
+    def test_primary_failure_falls_back_to_hedge(self):
+        def request_image(*args, routes=None):
+            if routes is not None:
+                time.sleep(0.1)
+                raise RuntimeError("primary failed")
+            time.sleep(0.2)
+            return LabeledImage(b"hedge", "backup")
+
+        job = make_job()
+        assert make_service(request_image, hedge_delay=0.01)._request_image_hedged(PAGE, job) == b"hedge"
+
+    def test_all_failures_raise_first_error(self):
+        def request_image(*args, routes=None):
+            raise RuntimeError("primary failed" if routes is not None else "hedge failed")
+
+        with pytest.raises(RuntimeError, match="primary failed"):
+            make_service(request_image, hedge_delay=0.01)._request_image_hedged(PAGE, make_job(hedge_budget=0))
+
+
+class TestCoverRace:
+    """封面多候选竞速"""
+
+    COVER = {"index": 0, "type": "cover", "content": "封面"}
+
+    def test_first_success_wins(self):
+        release_slow = threading.Event()
+        calls = []
+
+        def request_image(*args, routes=None):
+            calls.append(1)
+            if len(calls) == 1:
+                release_slow.wait(5)
+                return LabeledImage(b"slow", "primary")
+            return LabeledImage(b"fast", "primary")
+
+        service = make_service(request_image)
+        try:
+            assert service._race_cover(self.COVER, 2, "", None, "") == b"fast"
+        finally:
+            release_slow.set()
+
+    def test_all_candidates_fail(self):
+        def request_image(*args, routes=None):
+            raise RuntimeError("cover failed")
+
+        with pytest.raises(RuntimeError, match="cover failed"):
+            make_service(request_image)._race_cover(self.COVER, 3, "", None, "")
+
+    def test_candidates_limited_by_spare_slots(self):
+        assert make_service(None, max_concurrency=4)._affordable_candidates(3, False) == 3
+        assert make_service(None, max_concurrency=4, in_flight=3)._affordable_candidates(3, False) == 1
+        assert make_service(None, max_concurrency=4, in_flight=4)._affordable_candidates(3, False) == 1
+
+    def test_cover_race_reads_and_fills_cache(self, temp_history_dir):
+        from backend.services.image_cache import ImageCache, make_cache_key
+
+        calls = []
+
+        def request_image(*args, routes=None):
+            calls.append(1)
+            return LabeledImage(b"cover", "primary")
+
+        service = make_service(request_image)
+        service.image_cache = ImageCache(temp_history_dir)
+        key = make_cache_key("primary", {"prompt": "封面"})
+        service._get_cache_keys = lambda *args: {"primary": key}
+
+        assert service._fetch_image(self.COVER, candidates=2) == b"cover"
+        requested = len(calls)
+        assert service.image_cache.get(key) == b"cover"
+
+        assert service._fetch_image(self.COVER, candidates=2) == b"cover"
+        assert len(calls) == requested
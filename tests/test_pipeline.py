@@ -0,0 +1,198 @@
+"""
+服务端生成流水线测试（大纲 / 文案 / 图片服务以桩对象代替）
+"""
+import threading
+
+import pytest
+
+from backend.services import history
+from backend.services.history import HistoryService, RecordStatus
+
+pytest.importorskip("yaml")
+pytest.importorskip("requests")
+pytest.importorskip("PIL")
+
+from backend.services import content, image, outline  # noqa: E402
+from backend.services.outline import OutlineStreamParser, parse_outline  # noqa: E402
+from backend.services.pipeline import GenerationPipeline  # noqa: E402
+
+COVER = "[封面]\n标题：秋季穿搭指南\n背景：暖色调落叶"
+CONTENT = "[内容]\n风衣和针织衫的基础款搭配"
+SUMMARY = "[总结]\n三个穿搭要点"
+OUTLINE = f"{COVER}\n<page>\n{CONTENT}\n<page>\n{SUMMARY}"
+
+
+class TestOutlineStreamParser:
+    """增量解析与完整解析结果一致"""
+
+    @pytest.mark.parametrize("chunk_size", [1, 3, 7, len(OUTLINE)])
+    def test_matches_parse_outline(self, chunk_size):
+        parser = OutlineStreamParser()
+        streamed = []
+        for i in range(0, len(OUTLINE), chunk_size):
+            streamed.extend(parser.feed(OUTLINE[i:i + chunk_size]))
+
+        pages = parse_outline(OUTLINE)
+        assert streamed == pages[:-1]  # 最后一页在文本结束时才确定
+        assert parser.finish() == pages
+        assert parser.text == OUTLINE
+        assert [page["type"] for page in pages] == ["cover", "content", "summary"]
+
+    def test_cover_ready_at_next_marker(self):
+        parser = OutlineStreamParser()
+        assert parser.feed(COVER + "\n<pa") == []
+        assert parser.feed("GE>\n[内容]") == [{"index": 0, "type": "cover", "content": COVER}]
+
+    def test_empty_pages_keep_index(self):
+        parser = OutlineStreamParser()
+        pages = parser.feed("<page>\n" + COVER + "<page>")
+        assert pages == [{"index": 1, "type": "cover", "content": COVER}]
+        assert parser.finish() == parse_outline("<page>\n" + COVER + "<page>")
+
+
+class StubOutlineService:
+    """分段产出大纲；封面页完成后等待封面开始生成，验证两者重叠"""
+
+    def __init__(self, chunks, wait_for=None, error=None):
+        self.chunks = chunks
+        self.wait_for = wait_for
+        self.error = error
+        self.overlapped = None
+
+    def stream_outline(self, topic, images=None):
+        for i, chunk in enumerate(self.chunks):
+            yield chunk
+            if i == 1 and self.wait_for is not None:
+                self.overlapped = self.wait_for.wait(5)
+        if self.error:
+            raise self.error
+
+
+class StubImageService:
+    """记录每次 generate_images 调用，按页面产出 complete / finish 事件"""
+
+    def __init__(self, cover_success=True):
+        self.calls = []
+        self.cover_started = threading.Event()
+        self.cover_success = cover_success
+
+    def generate_images(self, pages, task_id, full_outline, user_images=None, user_topic="", skip_indices=None):
+        self.calls.append({"pages": pages, "outline": full_outline, "skip": skip_indices})
+        if len(pages) == 1 and pages[0]["type"] == "cover":
+            self.cover_started.set()
+        # 与 ImageService 一致：跳过的页面不再推送 complete，但计入 images
+        done = [p for p in pages if p["index"] not in (skip_indices or [])]
+        success = self.cover_success or len(pages) > 1
+        for page in done:
+            yield {"event": "complete", "data": {"index": page["index"], "status": "done"}}
+        yield {"event": "finish", "data": {
+            "success": success,
+            "task_id": task_id,
+            "images": [f"{p['index']}.png" for p in pages] if success else [],
+            "total": len(pages),
+            "completed": len(pages) if success else 0,
+            "failed": 0 if success else len(pages),
+            "providers": {p["index"]: "provider_a" for p in done} if success else {},
+        }}
+
+
+class StubContentService:
+    def __init__(self):
+        self.calls = []
+
+    def generate_content(self, topic, outline_text):
+        self.calls.append((topic, outline_text))
+        return {"success": True, "titles": ["秋季穿搭"], "copywriting": "文案", "tags": ["穿搭"]}
+
+
+@pytest.fixture
+def history_service(temp_history_dir, monkeypatch):
+    service = HistoryService(temp_history_dir)
+    monkeypatch.setattr(history, "get_history_service", lambda: service)
+    yield service
+    service._writer.flush_all()
+
+
+@pytest.fixture
+def services(monkeypatch, history_service):
+    image_service = StubImageService()
+    content_service = StubContentService()
+    outline_service = StubOutlineService(
+        [COVER + "\n", "<page>\n" + CONTENT, "\n<page>\n", SUMMARY], wait_for=image_service.cover_started
+    )
+    monkeypatch.setattr(image, "get_image_service", lambda: image_service)
+    monkeypatch.setattr(content, "get_content_service", lambda: content_service)
+    monkeypatch.setattr(outline, "get_outline_service", lambda: outline_service)
+    return outline_service, image_service, content_service
+
+
+def run_events(pipeline):
+    return list(pipeline.run())
+
+
+class TestGenerationPipeline:
+    """大纲 → 封面提前开始 → 文案 ∥ 其余页面"""
+
+    def test_cover_starts_before_outline_finishes(self, services, history_service):
+        outline_service, image_service, content_service = services
+        pipeline = GenerationPipeline("秋季穿搭")
+        events = run_events(pipeline)
+
+        assert outline_service.overlapped is True
+        cover_call, pages_call = image_service.calls
+        assert cover_call["pages"] == [parse_outline(OUTLINE)[0]]
+        assert OUTLINE.startswith(cover_call["outline"]) and cover_call["outline"] != OUTLINE
+        assert pages_call["outline"] == OUTLINE
+        assert pages_call["skip"] == [0]
+        assert content_service.calls == [("秋季穿搭", OUTLINE)]
+
+        names = [event["event"] for event in events]
+        assert names.count("outline_page") == 2
+        assert names.index("outline_page") < names.index("outline") < names.index("finish")
+        assert names[-1] == "finish"
+        assert sorted(e["data"]["index"] for e in events if e["event"] == "complete") == [0, 1, 2]
+        assert next(e for e in events if e["event"] == "content")["data"]["success"]
+
+        finish = events[-1]["data"]
+        assert finish["success"] and finish["content_success"]
+        assert finish["record_id"] == pipeline.record_id
+        assert finish["providers"] == {0: "provider_a", 1: "provider_a", 2: "provider_a"}
+
+        record = history_service.get_record(pipeline.record_id)
+        assert record["status"] == RecordStatus.COMPLETED
+        assert record["images"]["task_id"] == pipeline.task_id
+        assert record["images"]["generated"] == ["0.png", "1.png", "2.png"]
+        assert record["thumbnail"] == "0.png"
+        assert record["content"]["titles"] == ["秋季穿搭"]
+        assert record["outline"]["raw"] == OUTLINE
+
+    def test_failed_early_cover_is_regenerated(self, services, history_service):
+        _, image_service, _ = services
+        image_service.cover_success = False
+        pipeline = GenerationPipeline("秋季穿搭")
+        events = run_events(pipeline)
+
+        assert image_service.calls[1]["skip"] == []
+        assert events[-1]["data"]["success"]
+        assert history_service.get_record(pipeline.record_id)["images"]["generated"] == ["0.png", "1.png", "2.png"]
+
+    def test_outline_failure_stops_pipeline(self, services, history_service):
+        outline_service, image_service, content_service = services
+        outline_service.wait_for = None
+        outline_service.error = RuntimeError("429 Too Many Requests")
+        events = run_events(GenerationPipeline("秋季穿搭"))
+
+        assert [e["event"] for e in events if e["event"] in ("error", "finish")] == ["error", "finish"]
+        assert events[-1]["data"] == {"success": False, "task_id": events[-1]["data"]["task_id"], "record_id": None}
+        assert content_service.calls == []
+        assert len(image_service.calls) == 1  # 只有已开始的封面
+        assert history_service.list_records(1, 20)["total"] == 0
+
+    def test_empty_outline(self, services, history_service):
+        outline_service, image_service, _ = services
+        outline_service.chunks = ["   "]
+        events = run_events(GenerationPipeline("秋季穿搭"))
+
+        assert "大纲为空" in next(e for e in events if e["event"] == "error")["data"]["message"]
+        assert events[-1]["event"] == "finish" and not events[-1]["data"]["success"]
+        assert image_service.calls == []
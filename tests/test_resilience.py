@@ -0,0 +1,337 @@
+"""
+服务商容错测试：重试退避、错误归类、熔断状态转换
+"""
+import email.utils
+from types import SimpleNamespace
+
+import pytest
+
+from backend.utils import resilience
+from backend.utils.resilience import (
+    AuthenticationError,
+    CircuitBreaker,
+    CircuitOpenError,
+    InvalidRequestError,
+    ProviderConnectionError,
+    ProviderServerError,
+    ProviderTimeoutError,
+    RateLimitError,
+    RetryPolicy,
+    classify_error,
+    parse_retry_after,
+)
+
+WALL_EPOCH = 1_700_000_000.0
+
+
+class FakeClock:
+    """可手动推进的时钟（单调时钟与墙上时钟同步推进，sleep 只推进时间并记录）"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def wall(self):
+        return WALL_EPOCH + self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(resilience, "time", SimpleNamespace(monotonic=fake, time=fake.wall, sleep=fake.sleep))
+    return fake
+
+
+@pytest.fixture
+def upper_jitter(monkeypatch):
+    """random.uniform 固定返回上界，并记录每次的取值区间"""
+    calls = []
+
+    def uniform(low, high):
+        calls.append((low, high))
+        return high
+    monkeypatch.setattr(resilience, "random", SimpleNamespace(uniform=uniform))
+    return calls
+
+
+def server_error():
+    return ProviderServerError("upstream 503", status_code=503)
+
+
+class TestParseRetryAfter:
+    """Retry-After 响应头：秒数或 HTTP 日期"""
+
+    @pytest.mark.parametrize("value, expected", [
+        ("3", 3.0),
+        (" 1.5 ", 1.5),
+        ("0", 0.0),
+        ("-5", 0.0),
+    ])
+    def test_seconds(self, value, expected):
+        assert parse_retry_after({"Retry-After": value}) == expected
+
+    def test_lowercase_header(self):
+        assert parse_retry_after({"retry-after": "7"}) == 7.0
+
+    def test_http_date(self, clock):
+        value = email.utils.formatdate(clock.wall() + 120, usegmt=True)
+        assert parse_retry_after({"Retry-After": value}) == pytest.approx(120, abs=1)
+
+    def test_http_date_in_past(self, clock):
+        value = email.utils.formatdate(clock.wall() - 60, usegmt=True)
+        assert parse_retry_after({"Retry-After": value}) == 0.0
+
+    @pytest.mark.parametrize("headers", [None, {}, {"Retry-After": ""}, {"Retry-After": "soon"}])
+    def test_missing_or_invalid(self, headers):
+        assert parse_retry_after(headers) is None
+
+
+class TestRetryPolicy:
+    """指数退避 + 完全抖动"""
+
+    def test_full_jitter_range_doubles_until_cap(self, upper_jitter):
+        policy = RetryPolicy(max_attempts=10, base_delay=1.0, max_delay=5.0)
+        delays = [policy.next_delay(attempt, server_error()) for attempt in range(5)]
+        assert upper_jitter == [(0, 1.0), (0, 2.0), (0, 4.0), (0, 5.0), (0, 5.0)]
+        assert delays == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+    def test_jitter_stays_within_bounds(self):
+        policy = RetryPolicy(max_attempts=10, base_delay=0.5, max_delay=3.0)
+        for attempt in range(6):
+            cap = min(3.0, 0.5 * 2 ** attempt)
+            for _ in range(50):
+                assert 0 <= policy.next_delay(attempt, server_error()) <= cap
+
+    def test_retry_after_plus_jitter(self, upper_jitter):
+        policy = RetryPolicy(max_attempts=3, base_delay=1.0)
+        error = RateLimitError("429", status_code=429, retry_after=10)
+        assert policy.next_delay(0, error) == 11.0
+        assert upper_jitter[-1] == (0, 1.0)
+
+    def test_retry_after_over_limit_is_not_retried(self):
+        policy = RetryPolicy(max_attempts=3, max_retry_after=60)
+        error = RateLimitError("429", status_code=429, retry_after=120)
+        assert policy.next_delay(0, error) is None
+
+    @pytest.mark.parametrize("error", [
+        AuthenticationError("invalid key", status_code=401),
+        InvalidRequestError("bad request", status_code=400),
+        CircuitOpenError("open"),
+        ValueError("parse error"),
+    ])
+    def test_non_retryable_errors(self, error):
+        assert RetryPolicy(max_attempts=3).next_delay(0, error) is None
+
+    def test_stops_after_max_attempts(self):
+        policy = RetryPolicy(max_attempts=3)
+        assert policy.next_delay(1, server_error()) is not None
+        assert policy.next_delay(2, server_error()) is None
+
+    def test_from_provider_config(self):
+        policy = RetryPolicy.from_provider_config(
+            {"max_retries": 4, "retry_base_delay": "0.5", "retry_max_delay": 8}
+        )
+        assert (policy.max_attempts, policy.base_delay, policy.max_delay) == (5, 0.5, 8.0)
+
+    def test_call_retries_then_succeeds(self, clock, upper_jitter):
+        results = iter([server_error(), RateLimitError("429", status_code=429, retry_after=2), "ok"])
+
+        def func():
+            result = next(results)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        assert RetryPolicy(max_attempts=3, base_delay=1.0).call(func) == "ok"
+        assert clock.sleeps == [1.0, 3.0]
+
+    def test_call_raises_non_retryable_immediately(self, clock):
+        calls = []
+
+        def func():
+            calls.append(1)
+            raise AuthenticationError("invalid key", status_code=401)
+
+        with pytest.raises(AuthenticationError):
+            RetryPolicy(max_attempts=3).call(func)
+        assert len(calls) == 1
+        assert clock.sleeps == []
+
+    def test_stream_does_not_retry_after_first_chunk(self, clock):
+        opened = []
+
+        def open_stream():
+            opened.append(1)
+            yield "a"
+            raise server_error()
+
+        chunks = []
+        with pytest.raises(ProviderServerError):
+            for chunk in RetryPolicy(max_attempts=3).stream(open_stream):
+                chunks.append(chunk)
+        assert chunks == ["a"]
+        assert len(opened) == 1
+
+
+class ReadTimeout(Exception):
+    pass
+
+
+class ConnectError(Exception):
+    pass
+
+
+class ConnectionError(Exception):  # noqa: A001 - 与 requests 同名，按类名识别
+    pass
+
+
+class SdkError(Exception):
+    def __init__(self, message, code=None, status_code=None, headers=None):
+        super().__init__(message)
+        self.code = code
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+class TestClassifyError:
+    """第三方异常归类为类型化错误"""
+
+    def test_provider_error_returned_as_is(self):
+        error = server_error()
+        assert classify_error(error) is error
+
+    @pytest.mark.parametrize("error, expected", [
+        (ReadTimeout("read timed out"), ProviderTimeoutError),
+        (TimeoutError("timed out"), ProviderTimeoutError),
+        (ConnectError("connect failed"), ProviderConnectionError),
+        (ConnectionError("connection reset"), ProviderConnectionError),
+    ])
+    def test_by_class_name(self, error, expected):
+        typed = classify_error(error)
+        assert type(typed) is expected
+        assert str(typed) == str(error)
+
+    def test_subclass_matches_by_mro(self):
+        class ProxyTimeout(ReadTimeout):
+            pass
+        assert isinstance(classify_error(ProxyTimeout("proxy")), ProviderTimeoutError)
+
+    @pytest.mark.parametrize("kwargs, expected", [
+        ({"code": 503}, ProviderServerError),
+        ({"code": 401}, AuthenticationError),
+        ({"status_code": 400}, InvalidRequestError),
+        ({"status_code": 429}, RateLimitError),
+    ])
+    def test_by_status_attribute(self, kwargs, expected):
+        typed = classify_error(SdkError("sdk error", **kwargs))
+        assert type(typed) is expected
+        assert typed.status_code == next(iter(kwargs.values()))
+
+    def test_status_attribute_reads_retry_after(self):
+        typed = classify_error(SdkError("quota", code=429, headers={"Retry-After": "4"}))
+        assert isinstance(typed, RateLimitError)
+        assert typed.retry_after == 4.0
+
+    @pytest.mark.parametrize("message", [
+        "429 RESOURCE_EXHAUSTED",
+        "Rate limit reached for requests",
+        "Too Many Requests",
+        "触发速率限制",
+    ])
+    def test_rate_limit_keywords(self, message):
+        typed = classify_error(Exception(message))
+        assert isinstance(typed, RateLimitError)
+        assert typed.status_code == 429
+
+    @pytest.mark.parametrize("error", [
+        ValueError("unexpected response"),
+        KeyError("data"),
+        SdkError("weird code", code="UNKNOWN"),
+        SdkError("out of range", code=200),
+    ])
+    def test_unknown_errors_return_none(self, error):
+        assert classify_error(error) is None
+
+
+class TestCircuitBreaker:
+    """熔断器：closed -> open -> half_open -> closed / open"""
+
+    def test_opens_after_threshold(self, clock):
+        breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30)
+        for _ in range(2):
+            breaker.before_call()
+            breaker.record_failure(server_error())
+        assert breaker.state == CircuitBreaker.CLOSED
+
+        breaker.before_call()
+        breaker.record_failure(server_error())
+        assert breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError) as info:
+            breaker.before_call()
+        assert info.value.retry_after == pytest.approx(30)
+
+    def test_half_open_allows_single_probe(self, clock):
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+        breaker.record_failure(server_error())
+        clock.advance(29)
+        assert breaker.state == CircuitBreaker.OPEN
+
+        clock.advance(1)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        breaker.before_call()
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+        breaker.before_call()
+
+    def test_failed_probe_reopens(self, clock):
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+        breaker.record_failure(server_error())
+        clock.advance(30)
+        breaker.before_call()
+        breaker.record_failure(server_error())
+        assert breaker.state == CircuitBreaker.OPEN
+        clock.advance(29)
+        assert breaker.state == CircuitBreaker.OPEN
+
+    @pytest.mark.parametrize("error", [
+        RateLimitError("429", status_code=429),
+        InvalidRequestError("bad request", status_code=400),
+        ValueError("response parse error"),
+    ])
+    def test_non_tripping_errors_do_not_close_open_breaker(self, clock, error):
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+        breaker.record_failure(server_error())
+        # 熔断前已发出的请求此时才返回 4xx / 429 / 其他异常
+        breaker.record_failure(error)
+        assert breaker.state == CircuitBreaker.OPEN
+
+    def test_non_tripping_errors_keep_failure_streak(self, clock):
+        breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30)
+        breaker.record_failure(server_error())
+        breaker.record_failure(ValueError("parse error"))
+        breaker.record_failure(server_error())
+        breaker.record_failure(InvalidRequestError("bad request", status_code=400))
+        breaker.record_failure(server_error())
+        assert breaker.state == CircuitBreaker.OPEN
+
+    def test_non_tripping_probe_failure_releases_probe(self, clock):
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+        breaker.record_failure(server_error())
+        clock.advance(30)
+        breaker.before_call()
+        breaker.record_failure(InvalidRequestError("bad request", status_code=400))
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        breaker.before_call()  # 探测名额已归还
@@ -0,0 +1,290 @@
+"""
+流式文本生成测试：SSE 增量解析、JSON 回退、只在首个片段前重试、/outline/stream 事件
+"""
+import json
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("requests")
+
+from backend.utils import text_client  # noqa: E402
+from backend.utils.resilience import ProviderError, ProviderServerError, RateLimitError  # noqa: E402
+from backend.utils.text_client import TextChatClient  # noqa: E402
+
+
+def provider_config(provider_type="openai_compatible"):
+    """每个测试使用独立的 API Key，避免共享限制器的状态互相影响；退避为 0 不真正等待"""
+    return {"type": provider_type, "api_key": f"key-{uuid.uuid4().hex}", "retry_base_delay": 0}
+
+
+def sse_lines(*deltas, done=True):
+    lines = [b": keep-alive", b""]
+    for delta in deltas:
+        chunk = {"choices": [{"index": 0, "delta": {"content": delta}}]}
+        lines += [b"data: " + json.dumps(chunk, ensure_ascii=False).encode(), b""]
+    if done:
+        lines.append(b"data: [DONE]")
+    return lines
+
+
+class FakeResponse:
+    """requests 响应的最小替身（支持 with 语句和 iter_lines）"""
+
+    def __init__(self, status_code=200, lines=None, body=None, headers=None):
+        self.status_code = status_code
+        self.lines = lines or []
+        self.body = body
+        self.headers = headers or {
+            "Content-Type": "application/json" if body is not None else "text/event-stream"
+        }
+        self.text = json.dumps(body) if body is not None else ""
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.closed = True
+
+    def json(self):
+        return self.body
+
+    def iter_lines(self, chunk_size=None):
+        for line in self.lines:
+            if isinstance(line, Exception):
+                raise line
+            yield line
+
+
+@pytest.fixture
+def post(monkeypatch):
+    """按顺序返回预设响应的 http_post 桩，记录每次请求"""
+    calls = []
+    responses = []
+
+    def http_post(url, **kwargs):
+        calls.append((url, kwargs))
+        return responses.pop(0)
+    monkeypatch.setattr(text_client, "http_post", http_post)
+    return SimpleNamespace(calls=calls, responses=responses)
+
+
+@pytest.fixture
+def chat_client():
+    config = provider_config()
+    return TextChatClient(
+        api_key=config["api_key"], base_url="https://api.example.com", model="test-model", provider_config=config
+    )
+
+
+class TestTextChatClientStream:
+    """OpenAI 兼容接口的 SSE 流"""
+
+    def test_yields_sse_deltas(self, chat_client, post):
+        response = FakeResponse(lines=sse_lines("[封面]", "\n标题：", "秋季"))
+        post.responses.append(response)
+
+        assert list(chat_client.generate_text_stream("主题", temperature=0.5)) == ["[封面]", "\n标题：", "秋季"]
+
+        url, kwargs = post.calls[0]
+        assert url == "https://api.example.com/v1/chat/completions"
+        assert kwargs["stream"] is True
+        assert kwargs["json"]["stream"] is True
+        assert kwargs["json"]["model"] == "test-model"
+        assert kwargs["headers"]["Accept"] == "text/event-stream"
+        assert response.closed
+        assert chat_client.limiter.in_flight == 0
+
+    def test_skips_empty_deltas_and_stops_at_done(self, chat_client, post):
+        lines = sse_lines("a", "", "b") + [b'data: {"choices": [{"delta": {"content": "after done"}}]}']
+        lines.insert(0, b'data: {"choices": [{"delta": {"role": "assistant"}}]}')
+        post.responses.append(FakeResponse(lines=lines))
+
+        assert list(chat_client.generate_text_stream("主题")) == ["a", "b"]
+
+    def test_json_fallback_when_stream_is_ignored(self, chat_client, post):
+        body = {"choices": [{"message": {"content": "完整大纲"}}]}
+        post.responses.append(FakeResponse(body=body, headers={"Content-Type": "application/json; charset=utf-8"}))
+
+        assert list(chat_client.generate_text_stream("主题")) == ["完整大纲"]
+
+    def test_retries_before_first_delta(self, chat_client, post):
+        post.responses += [
+            FakeResponse(status_code=429, body={"error": "rate limited"}),
+            FakeResponse(lines=[ProviderServerError("连接中断", status_code=502)]),
+            FakeResponse(lines=sse_lines("ok")),
+        ]
+
+        assert list(chat_client.generate_text_stream("主题")) == ["ok"]
+        assert len(post.calls) == 3
+        assert chat_client.limiter.in_flight == 0
+
+    def test_no_retry_after_first_delta(self, chat_client, post):
+        lines = sse_lines("第一段", done=False) + [b'data: {"error": {"message": "overloaded"}}']
+        post.responses += [FakeResponse(lines=lines), FakeResponse(lines=sse_lines("重复"))]
+
+        stream = chat_client.generate_text_stream("主题")
+        assert next(stream) == "第一段"
+        with pytest.raises(ProviderError, match="overloaded"):
+            next(stream)
+        assert len(post.calls) == 1
+        assert chat_client.limiter.in_flight == 0
+
+    def test_non_retryable_status_raises_immediately(self, chat_client, post):
+        post.responses += [FakeResponse(status_code=401, body={"error": "bad key"}), FakeResponse(lines=sse_lines("x"))]
+
+        with pytest.raises(Exception, match="API Key 认证失败"):
+            list(chat_client.generate_text_stream("主题"))
+        assert len(post.calls) == 1
+
+    def test_gives_up_after_max_attempts(self, chat_client, post):
+        post.responses += [FakeResponse(status_code=429, body={}) for _ in range(3)]
+
+        with pytest.raises(RateLimitError):
+            list(chat_client.generate_text_stream("主题"))
+        assert len(post.calls) == chat_client.retry_policy.max_attempts == 3
+
+
+def genai_chunk(text):
+    part = SimpleNamespace(text=text)
+    return SimpleNamespace(text=text, candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+
+class TestGenAIClientStream:
+    """Gemini SDK 的 generate_content_stream"""
+
+    @pytest.fixture
+    def genai_client(self):
+        pytest.importorskip("google.genai")
+        from backend.utils.genai_client import GenAIClient
+
+        config = provider_config("google_gemini")
+        return GenAIClient(api_key=config["api_key"], provider_config=config)
+
+    def stub_stream(self, client, *attempts):
+        """每次调用 generate_content_stream 依次取一组片段（异常在对应位置抛出）"""
+        calls = []
+
+        def generate_content_stream(model, contents, config):
+            calls.append(model)
+            for item in attempts[len(calls) - 1]:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        client.client = SimpleNamespace(models=SimpleNamespace(generate_content_stream=generate_content_stream))
+        return calls
+
+    def test_yields_text_chunks(self, genai_client):
+        empty = SimpleNamespace(text=None, candidates=[])
+        calls = self.stub_stream(genai_client, [genai_chunk("秋季"), empty, genai_chunk("穿搭")])
+
+        assert list(genai_client.generate_text_stream("主题", model="gemini-test")) == ["秋季", "穿搭"]
+        assert calls == ["gemini-test"]
+        assert genai_client.text_limiter.in_flight == 0
+
+    def test_retries_before_first_chunk(self, genai_client):
+        calls = self.stub_stream(
+            genai_client, [ProviderServerError("503 UNAVAILABLE", status_code=503)], [genai_chunk("ok")]
+        )
+
+        assert list(genai_client.generate_text_stream("主题")) == ["ok"]
+        assert len(calls) == 2
+
+    def test_error_after_first_chunk_is_wrapped_not_retried(self, genai_client):
+        calls = self.stub_stream(
+            genai_client,
+            [genai_chunk("第一段"), RateLimitError("429 RESOURCE_EXHAUSTED", status_code=429, retry_after=3)],
+            [genai_chunk("重复")],
+        )
+
+        stream = genai_client.generate_text_stream("主题")
+        assert next(stream) == "第一段"
+        with pytest.raises(RateLimitError) as exc_info:
+            next(stream)
+        assert exc_info.value.retry_after == 3
+        assert len(calls) == 1
+        assert genai_client.text_limiter.in_flight == 0
+
+
+class StubStreamClient:
+    """只实现 generate_text_stream 的文本客户端"""
+
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+        self.kwargs = None
+
+    def generate_text_stream(self, prompt, images=None, **kwargs):
+        self.kwargs = kwargs
+        yield from self.chunks
+        if self.error:
+            raise self.error
+
+
+def parse_sse(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class TestOutlineStreamRoute:
+    """POST /api/outline/stream"""
+
+    OUTLINE = "[封面]\n标题：秋季穿搭\n<page>\n[内容]\n基础款\n<page>\n[总结]\n要点"
+
+    @pytest.fixture
+    def stream_client(self, monkeypatch):
+        pytest.importorskip("flask")
+        pytest.importorskip("yaml")
+        from backend.routes import outline_routes
+        from backend.services.outline import OutlineService
+
+        stub = StubStreamClient([self.OUTLINE[:12], self.OUTLINE[12:30], self.OUTLINE[30:]])
+        service = OutlineService.__new__(OutlineService)
+        service.client = stub
+        service.prompt_template = "主题：{topic}"
+        service.text_config = {"active_provider": "stub", "providers": {"stub": {"model": "stub-model"}}}
+        monkeypatch.setattr(outline_routes, "get_outline_service", lambda: service)
+        return stub
+
+    @pytest.fixture
+    def client(self, stream_client):
+        from backend.app import create_app
+
+        app = create_app()
+        app.config["TESTING"] = True
+        return app.test_client()
+
+    def test_events(self, client, stream_client):
+        from backend.services.outline import parse_outline
+
+        response = client.post("/api/outline/stream", json={"topic": "秋季穿搭"})
+        assert response.status_code == 200
+        assert response.mimetype == "text/event-stream"
+
+        events = parse_sse(response.get_data(as_text=True))
+        names = [name for name, _ in events]
+        assert names.count("delta") == 3
+        assert "".join(data["text"] for name, data in events if name == "delta") == self.OUTLINE
+        pages = parse_outline(self.OUTLINE)
+        assert [data["page"] for name, data in events if name == "page"] == pages[:-1]
+        assert names[-1] == "complete"
+        assert events[-1][1] == {"success": True, "outline": self.OUTLINE, "pages": pages, "has_images": False}
+        assert stream_client.kwargs["model"] == "stub-model"
+
+    def test_error_event_after_partial_output(self, client, stream_client):
+        stream_client.error = RuntimeError("429 Too Many Requests")
+        events = parse_sse(client.post("/api/outline/stream", json={"topic": "秋季穿搭"}).get_data(as_text=True))
+
+        assert [name for name, _ in events][-1] == "error"
+        assert events[-1][1]["success"] is False
+        assert "complete" not in [name for name, _ in events]
+
+    def test_missing_topic(self, client):
+        response = client.post("/api/outline/stream", json={})
+        assert response.status_code == 400
+        assert response.get_json()["success"] is False
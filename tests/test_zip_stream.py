@@ -0,0 +1,138 @@
+"""
+流式 ZIP 输出测试：读回校验、压缩方式、tee 缓存与批量下载
+"""
+import io
+import os
+import zipfile
+
+import pytest
+
+from backend.services import history
+from backend.services.history import HistoryService
+from backend.utils.zip_stream import stream_zip
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + os.urandom(200 * 1024)
+TEXT_BYTES = b"page content\n" * 20000
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = {}
+    for name, data in (("0.png", PNG_BYTES), ("1.jpg", PNG_BYTES[:5000]), ("notes.txt", TEXT_BYTES)):
+        path = tmp_path / name
+        path.write_bytes(data)
+        paths[name] = str(path)
+    return paths
+
+
+def read_zip(data: bytes):
+    zf = zipfile.ZipFile(io.BytesIO(data))
+    assert zf.testzip() is None
+    return zf
+
+
+class TestStreamZip:
+    """stream_zip 输出的压缩包可被 zipfile 完整读回"""
+
+    def test_round_trip(self, files):
+        entries = [(files["0.png"], "page_1.png"), (files["1.jpg"], "dir/page_2.jpg"), (files["notes.txt"], "notes.txt")]
+        chunks = list(stream_zip(entries, chunk_size=64 * 1024))
+        assert len(chunks) > 1
+
+        zf = read_zip(b"".join(chunks))
+        assert zf.namelist() == ["page_1.png", "dir/page_2.jpg", "notes.txt"]
+        assert zf.read("page_1.png") == PNG_BYTES
+        assert zf.read("dir/page_2.jpg") == PNG_BYTES[:5000]
+        assert zf.read("notes.txt") == TEXT_BYTES
+
+    def test_stored_for_images_deflated_for_others(self, files):
+        entries = [(files["0.png"], "a.PNG"), (files["1.jpg"], "b.jpg"), (files["notes.txt"], "c.txt")]
+        zf = read_zip(b"".join(stream_zip(entries)))
+        types = {info.filename: info.compress_type for info in zf.infolist()}
+        assert types == {"a.PNG": zipfile.ZIP_STORED, "b.jpg": zipfile.ZIP_STORED, "c.txt": zipfile.ZIP_DEFLATED}
+        assert zf.getinfo("c.txt").compress_size < len(TEXT_BYTES) // 10
+
+    def test_missing_file_is_skipped(self, files, tmp_path):
+        entries = [(str(tmp_path / "missing.png"), "missing.png"), (files["1.jpg"], "page.jpg")]
+        assert read_zip(b"".join(stream_zip(entries))).namelist() == ["page.jpg"]
+
+    def test_tee_writes_identical_archive(self, files, tmp_path):
+        tee_path = str(tmp_path / "cache" / "task.zip")
+        data = b"".join(stream_zip([(files["0.png"], "page_1.png")], tee_path=tee_path))
+        with open(tee_path, "rb") as f:
+            assert f.read() == data
+        assert os.listdir(tmp_path / "cache") == ["task.zip"]
+
+    def test_interrupted_tee_leaves_no_cache_file(self, files, tmp_path):
+        tee_path = str(tmp_path / "cache" / "task.zip")
+        entries = [(files["0.png"], "page_1.png"), (files["notes.txt"], "notes.txt")]
+        chunks = stream_zip(entries, tee_path=tee_path, chunk_size=16 * 1024)
+        next(chunks)
+        next(chunks)
+        chunks.close()  # 客户端中途断开
+
+        assert os.listdir(tmp_path / "cache") == []
+
+    def test_failed_source_leaves_no_cache_file(self, files, tmp_path):
+        tee_path = str(tmp_path / "cache" / "task.zip")
+
+        def broken_entries():
+            yield files["1.jpg"], "page_1.jpg"
+            raise OSError("disk error")
+
+        with pytest.raises(OSError):
+            b"".join(stream_zip(broken_entries(), tee_path=tee_path))
+        assert os.listdir(tmp_path / "cache") == []
+
+
+class TestBulkDownload:
+    """批量下载：每条记录一个子目录，同名标题追加序号"""
+
+    @pytest.fixture(autouse=True)
+    def require_flask(self):
+        pytest.importorskip("flask")
+
+    @pytest.fixture
+    def history_service(self, temp_history_dir, monkeypatch):
+        service = HistoryService(temp_history_dir)
+        monkeypatch.setattr(history, "_service_instance", service)
+        yield service
+        service._writer.flush_all()
+
+    def add_record(self, service, title, images):
+        record_id = service.create_record(title, {"raw": title, "pages": []})
+        task_id = f"task_{record_id[:8]}"
+        task_dir = os.path.join(service.history_dir, task_id)
+        os.makedirs(task_dir)
+        for filename in images:
+            with open(os.path.join(task_dir, filename), "wb") as f:
+                f.write(PNG_BYTES[:1000])
+        service.update_record(record_id, images={"task_id": task_id, "generated": images})
+        return record_id
+
+    def test_duplicate_titles_get_suffix(self, client, history_service):
+        ids = [
+            self.add_record(history_service, "秋季穿搭", ["0.png", "1.png", "thumb_0.png"]),
+            self.add_record(history_service, "秋季穿搭", ["0.png"]),
+            self.add_record(history_service, "秋季/穿搭", ["0.png"]),
+            self.add_record(history_service, "空记录", []),
+        ]
+        response = client.post("/api/history/download", json={"record_ids": ids + [ids[0]]})
+        assert response.status_code == 200
+        assert response.mimetype == "application/zip"
+
+        names = read_zip(response.get_data()).namelist()
+        assert names == [
+            "秋季穿搭/page_1.png",
+            "秋季穿搭/page_2.png",
+            "秋季穿搭_2/page_1.png",
+            "秋季穿搭_3/page_1.png",
+        ]
+
+    def test_no_images(self, client, history_service):
+        record_id = self.add_record(history_service, "空记录", [])
+        response = client.post("/api/history/download", json={"record_ids": [record_id]})
+        assert response.status_code == 404
+
+    def test_invalid_request(self, client, history_service):
+        assert client.post("/api/history/download", json={}).status_code == 400